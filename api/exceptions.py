@@ -26,6 +26,19 @@ class IAServiceError(FasoTuteurException):
     default_code = "ia_service_error"
 
 
+class IARateLimitError(IAServiceError):
+    """Limite de débit de l'API IA atteinte (attente trop longue pour la requête)."""
+    status_code = status.HTTP_429_TOO_MANY_REQUESTS
+    default_detail = "Le service IA est très sollicité. Réessayez dans quelques instants."
+    default_code = "ia_rate_limited"
+
+
+class IACircuitOpenError(IAServiceError):
+    """Disjoncteur IA ouvert : le fournisseur est considéré en panne, pas d'appel."""
+    default_detail = "Le service IA est momentanément indisponible. Réessayez dans quelques instants."
+    default_code = "ia_circuit_open"
+
+
 class IAConfigurationError(FasoTuteurException):
     """Erreur de configuration de l'API IA (clé manquante, etc.)."""
     status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -0,0 +1,37 @@
+"""
+Renderers personnalisés pour l'API FASO Tuteur.
+"""
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+def format_sse(event, data):
+    """
+    Formate un événement server-sent events.
+
+    Args:
+        event: Nom de l'événement (token, done, error)
+        data: Données sérialisables en JSON
+
+    Returns:
+        bytes: Événement prêt à être envoyé
+    """
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n".encode('utf-8')
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Rend une réponse DRF classique (erreur 400/403/500) sous forme d'événement
+    SSE `error`, pour les clients qui ont demandé `Accept: text/event-stream`.
+    Les flux eux-mêmes sont envoyés par StreamingHttpResponse.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return format_sse('error', data)
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from core.models import ProfilEleve, Matiere, Topic, Exercice, Soumission, Progression
 from django.contrib.auth.models import User
+from ia.variants import negotiate, variant_url
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -59,13 +60,30 @@ class ProfilEleveSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
-class MatiereSerializer(serializers.ModelSerializer):
+class AudioVariantMixin:
+    """Sert dans `audio_fields` la variante audio négociée avec le client (voir ia.variants)."""
+    audio_fields = ()
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        request = self.context.get('request')
+        variante = negotiate(request) if request else None
+        if variante:
+            for field in self.audio_fields:
+                data[field] = variant_url(data.get(field), variante)
+        return data
+
+
+class MatiereSerializer(AudioVariantMixin, serializers.ModelSerializer):
+    audio_fields = ('audio_intro_url',)
+
     class Meta:
         model = Matiere
         fields = ['id', 'nom', 'description', 'image_url', 'audio_intro_url', 'ordre']
 
 
-class TopicSerializer(serializers.ModelSerializer):
+class TopicSerializer(AudioVariantMixin, serializers.ModelSerializer):
+    audio_fields = ('audio_url',)
     matiere_nom = serializers.CharField(source='matiere.get_nom_display', read_only=True)
     
     class Meta:
@@ -74,7 +92,8 @@ class TopicSerializer(serializers.ModelSerializer):
                   'image_url', 'audio_url', 'ordre']
 
 
-class ExerciceSerializer(serializers.ModelSerializer):
+class ExerciceSerializer(AudioVariantMixin, serializers.ModelSerializer):
+    audio_fields = ('question_audio_url', 'feedback_success_audio_url', 'feedback_fail_audio_url')
     topic_titre = serializers.CharField(source='topic.titre', read_only=True)
     
     class Meta:
@@ -1,8 +1,39 @@
-from django.test import TestCase
+import json
+import uuid
+import shutil
+import tempfile
+import zipfile
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.test import TestCase, override_settings
 from django.contrib.auth.models import User
+from unittest.mock import patch
 from rest_framework.test import APIClient
 from rest_framework import status
 from core.models import ProfilEleve, Matiere, Topic, Exercice
+from api.exceptions import IAServiceError
+from ia.breaker import circuit_breaker
+from ia.singleflight import acquire
+from ia.jobs import claim, run_job
+from ia.models import AudioAsset
+
+_state_dir = None
+_state_settings = None
+
+
+def setUpModule():
+    """État partagé IA (disjoncteur, limiteur) isolé dans un répertoire temporaire."""
+    global _state_dir, _state_settings
+    _state_dir = tempfile.mkdtemp()
+    _state_settings = override_settings(IA_STATE_DIR=Path(_state_dir))
+    _state_settings.enable()
+
+
+def tearDownModule():
+    _state_settings.disable()
+    shutil.rmtree(_state_dir, ignore_errors=True)
 
 
 class AccueilAPITest(TestCase):
@@ -78,6 +109,51 @@ class ExerciceAPITest(TestCase):
         self.assertIn('erreurs_consecutives', data)
 
 
+    def test_variante_audio_negociee(self):
+        """Les URLs audio transcodées suivent l'en-tête Accept, les autres restent l'original"""
+        key = 'ab' * 32
+        audio_dir = Path(_state_dir) / 'audio'
+        (audio_dir / 'ab' / 'ab').mkdir(parents=True)
+        (audio_dir / 'ab' / 'ab' / f'{key}.opus').write_bytes(b'opus')
+        url = f'{settings.MEDIA_URL}audio/ab/ab/{key}.mp3'
+        Exercice.objects.filter(id=self.exercice.id).update(
+            question_audio_url=url, feedback_fail_audio_url='/media/audio/ancien.mp3',
+        )
+        self.client.force_authenticate(user=self.user)
+        
+        with override_settings(AUDIO_STORAGE_PATH=audio_dir):
+            response = self.client.get(f'/api/exercices/{self.exercice.id}/', HTTP_ACCEPT='application/json, audio/ogg')
+            self.assertEqual(response.json()['question_audio_url'], url.removesuffix('.mp3') + '.opus')
+            self.assertEqual(response.json()['feedback_fail_audio_url'], '/media/audio/ancien.mp3')
+            self.assertIn('Accept', response['Vary'])
+            
+            response = self.client.get(f'/api/exercices/{self.exercice.id}/')
+            self.assertEqual(response.json()['question_audio_url'], url)
+    
+    def test_feedback_audio_de_la_soumission_negocie(self):
+        """L'audio de retour d'une soumission suit Accept puis Save-Data"""
+        key = 'cd' * 32
+        audio_dir = Path(_state_dir) / 'audio'
+        (audio_dir / 'cd' / 'cd').mkdir(parents=True)
+        (audio_dir / 'cd' / 'cd' / f'{key}.opus').write_bytes(b'opus')
+        (audio_dir / 'cd' / 'cd' / f'{key}.bas.mp3').write_bytes(b'mp3')
+        url = f'{settings.MEDIA_URL}audio/cd/cd/{key}.mp3'
+        Exercice.objects.filter(id=self.exercice.id).update(feedback_success_audio_url=url)
+        self.client.force_authenticate(user=self.user)
+        data = {'exercice_id': self.exercice.id, 'reponse_index': 1}
+        
+        with override_settings(AUDIO_STORAGE_PATH=audio_dir):
+            response = self.client.post('/api/exercices/soumettre/', data, format='json', HTTP_ACCEPT='application/json, audio/ogg')
+            self.assertEqual(response.json()['feedback_audio_url'], url.removesuffix('.mp3') + '.opus')
+            self.assertIn('Save-Data', response['Vary'])
+            
+            response = self.client.post('/api/exercices/soumettre/', data, format='json', HTTP_SAVE_DATA='on')
+            self.assertEqual(response.json()['feedback_audio_url'], url.removesuffix('.mp3') + '.bas.mp3')
+            
+            response = self.client.post('/api/exercices/soumettre/', data, format='json')
+            self.assertEqual(response.json()['feedback_audio_url'], url)
+
+
 class ExplicationAPITest(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -97,3 +173,214 @@ class ExplicationAPITest(TestCase):
         self.assertEqual(data['topic_id'], self.topic.id)
         self.assertFalse(data['utilise_ia'])
         self.assertIn('explication', data)
+    
+    @override_settings(IA_BREAKER_FAILURE_THRESHOLD=1)
+    @patch('api.views.learning.generate_explication_ia')
+    def test_explication_disjoncteur_ouvert(self, mock_generate):
+        """Disjoncteur ouvert : le résumé est servi sans appel IA ni sauvegarde"""
+        topic = Topic.objects.create(
+            matiere=self.matiere, classe='ce1', titre='Fractions', resume='Partager en parts égales'
+        )
+        circuit_breaker.record_failure()
+        self.addCleanup(circuit_breaker.reset)
+        
+        response = self.client.get(f'/api/explication/{topic.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['explication'], 'Partager en parts égales')
+        mock_generate.assert_not_called()
+        topic.refresh_from_db()
+        self.assertFalse(topic.contenu_cours)
+    
+    @patch('api.views.learning.generate_explication_ia')
+    def test_explication_generee_une_fois(self, mock_generate):
+        """Première requête : génération sauvegardée ; les suivantes la réutilisent"""
+        mock_generate.return_value = {'explication': 'Cours IA', 'audio_url': None}
+        topic = Topic.objects.create(matiere=self.matiere, classe='ce1', titre='Fractions', resume='Résumé')
+        
+        for _ in range(2):
+            response = self.client.get(f'/api/explication/{topic.id}/')
+            self.assertEqual(response.json()['explication'], 'Cours IA')
+        mock_generate.assert_called_once()
+    
+    @override_settings(IA_SINGLE_FLIGHT_WAIT=0)
+    @patch('api.views.learning.generate_explication_ia')
+    def test_explication_generation_en_cours(self, mock_generate):
+        """Génération déjà en cours ailleurs : résumé servi après l'attente bornée"""
+        topic = Topic.objects.create(matiere=self.matiere, classe='ce1', titre='Fractions', resume='Résumé')
+        acquire(f'explication:{topic.id}', ttl=60)
+        
+        response = self.client.get(f'/api/explication/{topic.id}/')
+        self.assertEqual(response.json()['explication'], 'Résumé')
+        mock_generate.assert_not_called()
+
+    
+    @patch('ia.services.generate_explication_ia')
+    def test_explication_en_fond(self, mock_generate):
+        """Prefer: respond-async : 202 + URL de statut, une seule tâche, contenu servi une fois exécutée"""
+        mock_generate.return_value = {'explication': 'Cours IA', 'audio_url': None}
+        topic = Topic.objects.create(matiere=self.matiere, classe='ce1', titre='Fractions', resume='Résumé')
+        
+        response = self.client.get(f'/api/explication/{topic.id}/', HTTP_PREFER='respond-async')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        data = response.json()
+        self.assertEqual((data['explication'], data['etat']), ('Résumé', 'en_attente'))
+        again = self.client.get(f'/api/explication/{topic.id}/', HTTP_PREFER='respond-async').json()
+        self.assertEqual(again['tache_id'], data['tache_id'])
+        mock_generate.assert_not_called()
+        
+        tache, = claim('test-worker')
+        self.assertEqual(run_job(tache, 'test-worker'), 'terminee')
+        statut = self.client.get(data['statut_url']).json()
+        self.assertEqual((statut['etat'], statut['resultat']), ('terminee', {'topic_id': topic.id}))
+        # URL de statut non devinable : ni l'id séquentiel ni un jeton inventé ne répondent
+        self.assertTrue(data['statut_url'].endswith(f"/api/ia/taches/{tache.jeton}/"))
+        self.assertEqual(self.client.get(f'/api/ia/taches/{tache.id}/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(f'/api/ia/taches/{uuid.uuid4()}/').status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(f'/api/explication/{topic.id}/', HTTP_PREFER='respond-async')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['explication'], 'Cours IA')
+
+
+class PaquetAudioAPITest(TestCase):
+    """Paquets audio hors ligne d'un topic ou d'une classe"""
+    def setUp(self):
+        self.client = APIClient()
+        override = override_settings(
+            MEDIA_ROOT=Path(tempfile.mkdtemp(dir=_state_dir)), AUDIO_STORAGE_PATH=Path(tempfile.mkdtemp(dir=_state_dir)),
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        
+        urls = []
+        for i, key in enumerate(['ab' * 32, 'cd' * 32]):
+            path = settings.AUDIO_STORAGE_PATH / key[:2] / key[2:4] / f'{key}.mp3'
+            path.parent.mkdir(parents=True)
+            path.write_bytes(bytes([i]) * 1000)
+            chemin = f'audio/{key[:2]}/{key[2:4]}/{key}.mp3'
+            AudioAsset.objects.create(cle=key, chemin=chemin, lang='fr', taille=1000, duree_ms=500)
+            urls.append(f'{settings.MEDIA_URL}{chemin}')
+        matiere = Matiere.objects.create(nom='mathematiques', ordre=1)
+        self.topic = Topic.objects.create(matiere=matiere, classe='cp1', titre='Compter', resume='Compter', audio_url=urls[0])
+        self.exercice = Exercice.objects.create(
+            topic=self.topic, type_exercice='choix_multiple', question='Combien ?', correct_index=0,
+            question_audio_url=urls[1], feedback_success_audio_url=urls[0],
+        )
+        self.url = f'/api/paquets-audio/topic/{self.topic.id}/'
+    
+    def test_paquet_topic(self):
+        response = self.client.get(self.url, HTTP_ACCEPT='application/zip')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertIn('Accept', response['Vary'])
+        contenu = response.getvalue()
+        with zipfile.ZipFile(BytesIO(contenu)) as archive:
+            manifeste = json.loads(archive.read('manifest.json'))
+            self.assertEqual(len(archive.namelist()), 3)
+        self.assertEqual(manifeste['exercices'][str(self.exercice.id)]['question'], f"audio/{'cd' * 32}.mp3")
+        self.assertIsNone(manifeste['exercices'][str(self.exercice.id)]['echec'])
+        self.assertEqual(response['ETag'], f'"{manifeste["version"]}.zip"')
+        
+        # Version déjà téléchargée, puis reprise d'un téléchargement interrompu
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"{manifeste["version"]}.zip"')
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response.getvalue(), contenu[100:])
+        
+        # Le contenu change : nouvelle version
+        Exercice.objects.filter(id=self.exercice.id).update(feedback_fail_audio_url=self.topic.audio_url)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"{manifeste["version"]}.zip"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], f'"{manifeste["version"]}.zip"')
+    
+    def test_paquet_classe(self):
+        response = self.client.get('/api/paquets-audio/classe/CP1/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with zipfile.ZipFile(BytesIO(response.getvalue())) as archive:
+            self.assertEqual(json.loads(archive.read('manifest.json'))['portee'], 'classe-cp1')
+        self.assertEqual(self.client.get('/api/paquets-audio/classe/inconnue/').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get('/api/paquets-audio/topic/999/').status_code, status.HTTP_404_NOT_FOUND)
+
+
+class IAStatusAPITest(TestCase):
+    @override_settings(IA_BREAKER_FAILURE_THRESHOLD=1)
+    def test_statut_disjoncteur(self):
+        """Le statut reflète l'état du disjoncteur partagé ; le détail est réservé aux admins"""
+        client = APIClient()
+        self.assertEqual(client.get('/api/ia/status/').json(), {'disponible': True})
+        
+        client.force_authenticate(user=User.objects.create_user(username='eleve', password='x'))
+        self.assertEqual(client.get('/api/ia/status/').json(), {'disponible': True})
+        
+        client.force_authenticate(user=User.objects.create_superuser(username='admin', password='x'))
+        data = client.get('/api/ia/status/').json()
+        self.assertTrue(data['disponible'])
+        self.assertEqual(data['disjoncteur']['etat'], 'closed')
+        self.assertIn('tokens_disponibles', data['limiteur'])
+        
+        circuit_breaker.record_failure()
+        self.addCleanup(circuit_breaker.reset)
+        data = client.get('/api/ia/status/').json()
+        self.assertFalse(data['disponible'])
+        self.assertEqual(data['disjoncteur']['etat'], 'open')
+        
+        client.force_authenticate(user=None)
+        self.assertEqual(client.get('/api/ia/status/').json(), {'disponible': False})
+    
+    def test_telemetrie_reservee_aux_admins(self):
+        client = APIClient()
+        self.assertIn(client.get('/api/ia/telemetrie/').status_code, (401, 403))
+        
+        client.force_authenticate(user=User.objects.create_user(username='eleve', password='x'))
+        self.assertEqual(client.get('/api/ia/telemetrie/').status_code, status.HTTP_403_FORBIDDEN)
+        
+        client.force_authenticate(user=User.objects.create_superuser(username='admin', password='x'))
+        response = client.get('/api/ia/telemetrie/?fenetre=1h')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {'fenetre': '1h', 'appelants': []})
+        self.assertEqual(client.get('/api/ia/telemetrie/?fenetre=2h').status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ChatbotAPITest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='fatou', password='testpass')
+        self.profil = ProfilEleve.objects.create(user=self.user, classe='ce2')
+        self.client.force_authenticate(user=self.user)
+    
+    @patch('api.views.chatbot.chat_tuteur_ia')
+    def test_chat_json(self, mock_chat):
+        """Les anciens clients reçoivent toujours une réponse JSON complète"""
+        mock_chat.return_value = "Bonjour Fatou !"
+        response = self.client.post('/api/tuteur-intelligent/chat/', {'message': 'Salut'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {'response': "Bonjour Fatou !"})
+    
+    @patch('api.views.chatbot.chat_tuteur_ia_stream')
+    def test_chat_stream_sse(self, mock_stream):
+        """Accept: text/event-stream renvoie les fragments puis un événement final"""
+        mock_stream.return_value = iter(["Bon", "jour", " !"])
+        response = self.client.post(
+            '/api/tuteur-intelligent/chat/', {'message': 'Salut'},
+            format='json', HTTP_ACCEPT='text/event-stream'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/event-stream'))
+        
+        body = b''.join(response.streaming_content).decode('utf-8')
+        events = [block for block in body.split('\n\n') if block]
+        self.assertEqual(len(events), 4)
+        self.assertTrue(events[0].startswith('event: token\ndata: {"delta": "Bon"}'))
+        self.assertTrue(events[-1].startswith('event: done'))
+        self.assertIn('"response": "Bonjour !"', events[-1])
+    
+    @patch('api.views.chatbot.chat_tuteur_ia_stream')
+    def test_chat_stream_erreur_immediate(self, mock_stream):
+        """Une panne IA avant le premier fragment donne une vraie erreur 500"""
+        def failing(*args, **kwargs):
+            raise IAServiceError("panne")
+            yield
+        mock_stream.side_effect = failing
+        response = self.client.post('/api/tuteur-intelligent/chat/?stream=1', {'message': 'Salut'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
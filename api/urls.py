@@ -8,7 +8,8 @@ from rest_framework.authtoken.views import obtain_auth_token
 from api.views import (
     SignupView, ProfilEleveViewSet, MatiereViewSet, TopicViewSet,
     ExerciceViewSet, ExerciceAdaptatifViewSet, AccueilViewSet,
-    ExplicationViewSet, ChatbotViewSet, ProgressionViewSet
+    ExplicationViewSet, ChatbotViewSet, ProgressionViewSet, IAStatusViewSet,
+    IATelemetrieViewSet, TacheFondViewSet, PaquetAudioViewSet
 )
 
 router = DefaultRouter()
@@ -22,6 +23,10 @@ router.register(r'accueil', AccueilViewSet, basename='accueil')
 router.register(r'explication', ExplicationViewSet, basename='explication')
 router.register(r'exercices-adaptatifs', ExerciceAdaptatifViewSet, basename='exercice-adaptatif')
 router.register(r'tuteur-intelligent', ChatbotViewSet, basename='tuteur-intelligent')
+router.register(r'ia/status', IAStatusViewSet, basename='ia-status')
+router.register(r'ia/telemetrie', IATelemetrieViewSet, basename='ia-telemetrie')
+router.register(r'ia/taches', TacheFondViewSet, basename='ia-taches')
+router.register(r'paquets-audio', PaquetAudioViewSet, basename='paquet-audio')
 
 urlpatterns = [
     path('auth/login/', obtain_auth_token),
@@ -12,6 +12,8 @@ Modules:
     - learning: Apprentissage (AccueilViewSet, ExplicationViewSet)
     - chatbot: Tuteur intelligent Sandy (ChatbotViewSet)
     - progression: Suivi de progression (ProgressionViewSet)
+    - ia: Statut, télémétrie et tâches de fond du service IA (IAStatusViewSet, IATelemetrieViewSet, TacheFondViewSet)
+    - offline: Paquets audio hors ligne (PaquetAudioViewSet)
 """
 
 # Auth
@@ -35,6 +37,12 @@ from api.views.chatbot import ChatbotViewSet
 # Progression
 from api.views.progression import ProgressionViewSet
 
+# IA
+from api.views.ia import IAStatusViewSet, IATelemetrieViewSet, TacheFondViewSet
+
+# Hors ligne
+from api.views.offline import PaquetAudioViewSet
+
 # Exports publics
 __all__ = [
     'SignupView',
@@ -47,4 +55,8 @@ __all__ = [
     'ExplicationViewSet',
     'ChatbotViewSet',
     'ProgressionViewSet',
+    'IAStatusViewSet',
+    'IATelemetrieViewSet',
+    'TacheFondViewSet',
+    'PaquetAudioViewSet',
 ]
@@ -1,17 +1,21 @@
 """
 Views API FASO Tuteur - Tuteur Intelligent (Chatbot Sandy).
 """
+import time
 import logging
 
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.settings import api_settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 
 from core.models import ProfilEleve
-from api.exceptions import ClasseNonAutoriseeError
-from ia.services import chat_tuteur_ia
+from api.exceptions import ClasseNonAutoriseeError, IAServiceError, IAConfigurationError
+from api.renderers import EventStreamRenderer, format_sse
+from ia.services import chat_tuteur_ia, chat_tuteur_ia_stream
 
 logger = logging.getLogger(__name__)
 
@@ -26,7 +30,10 @@ class ChatbotViewSet(viewsets.ViewSet):
     """
     permission_classes = [IsAuthenticated]
 
-    @action(detail=False, methods=['post'])
+    @action(
+        detail=False, methods=['post'],
+        renderer_classes=api_settings.DEFAULT_RENDERER_CLASSES + [EventStreamRenderer],
+    )
     def chat(self, request):
         """
         Envoie un message au tuteur intelligent Sandy.
@@ -34,9 +41,12 @@ class ChatbotViewSet(viewsets.ViewSet):
         Body:
             - message (str): Message de l'élève
             - history (list, optionnel): Historique de conversation
+            - stream (bool, optionnel): Réponse en server-sent events
+              (équivalent à `Accept: text/event-stream` ou `?stream=1`)
         
         Returns:
             200: {response: str} - Réponse de Sandy
+            200 (stream): événements `token` {delta}, puis `done` {response, ...}
             400: Message requis
             403: Classe non autorisée (CP1/CP2)
             500: Erreur IA
@@ -63,6 +73,9 @@ class ChatbotViewSet(viewsets.ViewSet):
             'points': profil.points
         }
         
+        if self._wants_stream(request):
+            return self._chat_stream(request, message, profil, history, user_info)
+        
         logger.info(f"Chat Sandy: user={request.user.username}, classe={profil.classe}")
         
         response_text = chat_tuteur_ia(message, profil.classe, history, user_info=user_info)
@@ -72,5 +85,61 @@ class ChatbotViewSet(viewsets.ViewSet):
                 {'error': "Erreur lors de la communication avec l'IA."},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-            
+        
         return Response({'response': response_text})
+
+    def _wants_stream(self, request):
+        """Le client demande le mode streaming (body, query param ou en-tête Accept)."""
+        flag = request.data.get('stream', request.query_params.get('stream'))
+        if flag is not None:
+            return str(flag).lower() in ('1', 'true', 'yes')
+        return isinstance(request.accepted_renderer, EventStreamRenderer)
+
+    def _chat_stream(self, request, message, profil, history, user_info):
+        """
+        Répond en server-sent events. Le premier fragment est attendu ici :
+        une erreur IA immédiate donne encore une vraie réponse 500.
+        """
+        logger.info(f"Chat Sandy (stream): user={request.user.username}, classe={profil.classe}")
+        
+        started = time.monotonic()
+        chunks = chat_tuteur_ia_stream(message, profil.classe, history, user_info=user_info)
+        try:
+            first = next(chunks, '')
+        except (IAServiceError, IAConfigurationError) as e:
+            logger.warning(f"Chat Sandy (stream) indisponible: {e}")
+            return Response(
+                {'error': "Erreur lors de la communication avec l'IA."},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        
+        first_token_ms = int((time.monotonic() - started) * 1000)
+        
+        response = StreamingHttpResponse(
+            self._sse_events(first, chunks, started, first_token_ms, profil.classe),
+            content_type='text/event-stream; charset=utf-8',
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Pas de mise en tampon côté proxy
+        return response
+
+    def _sse_events(self, first, chunks, started, first_token_ms, classe):
+        """Événements `token` pour chaque fragment, puis `done` avec les métadonnées."""
+        parts = []
+        try:
+            if first:
+                parts.append(first)
+                yield format_sse('token', {'delta': first})
+            for delta in chunks:
+                parts.append(delta)
+                yield format_sse('token', {'delta': delta})
+        except (IAServiceError, IAConfigurationError) as e:
+            logger.warning(f"Chat Sandy (stream) interrompu: {e}")
+            yield format_sse('error', {'error': "Erreur lors de la communication avec l'IA."})
+        
+        yield format_sse('done', {
+            'response': ''.join(parts),
+            'classe': classe,
+            'premier_token_ms': first_token_ms,
+            'duree_ms': int((time.monotonic() - started) * 1000),
+        })
@@ -12,6 +12,7 @@ from django.contrib.auth.models import User
 from core.models import ProfilEleve, Topic, Exercice, Soumission, Progression
 from api.serializers import ExerciceSerializer
 from api.exceptions import ExerciceInvalideError
+from ia.variants import negotiate, variant_url
 
 logger = logging.getLogger(__name__)
 
@@ -107,7 +108,8 @@ class ExerciceViewSet(viewsets.ReadOnlyModelViewSet):
         
         logger.info(f"Soumission: user={profil.user.username}, exercice={exercice_id}, correct={est_correcte}")
         
-        # Préparer réponse avec feedback détaillé
+        # Préparer réponse avec feedback détaillé (audio dans la variante négociée, voir ia.variants)
+        feedback_audio_url = exercice.feedback_success_audio_url if est_correcte else exercice.feedback_fail_audio_url
         feedback = {
             'success': est_correcte,
             'score': score,
@@ -115,7 +117,7 @@ class ExerciceViewSet(viewsets.ReadOnlyModelViewSet):
             'explication': explication,
             'reponse_correcte': reponse_correcte,
             'reponse_choisie': reponse_choisie,
-            'feedback_audio_url': exercice.feedback_success_audio_url if est_correcte else exercice.feedback_fail_audio_url,
+            'feedback_audio_url': variant_url(feedback_audio_url, negotiate(request)),
             'visuel_desc': 'Étoiles ! Animations joyeuses !' if est_correcte else 'Essaie encore !',
             'points_total': points_total,
             'erreurs_consecutives': erreurs_consecutives
@@ -220,7 +222,7 @@ class ExerciceAdaptatifViewSet(viewsets.ViewSet):
             id__in=final_exclude + [e.id for e in exercices]
         ).count()
         
-        serializer = ExerciceSerializer(exercices, many=True)
+        serializer = ExerciceSerializer(exercices, many=True, context={'request': request})
         return Response({
             'exercices': serializer.data,
             'has_more': remaining_count > 0,
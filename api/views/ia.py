@@ -0,0 +1,108 @@
+"""
+Views API FASO Tuteur - Statut, télémétrie et tâches de fond du service IA.
+"""
+from django.db.models import Count
+from django.shortcuts import get_object_or_404
+from rest_framework import viewsets
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from api.exceptions import ValidationError
+from ia.breaker import circuit_breaker, OUVERT
+from ia.faq import faq_cache
+from ia.models import TacheFond
+from ia.prompts import chat_prompt_builder
+from ia.ratelimit import rate_limiter
+from ia.routing import model_router
+from ia.telemetry import FENETRES, statistiques
+
+
+class IAStatusViewSet(viewsets.ViewSet):
+    """
+    État du service IA. Public : seulement {disponible} ; le détail
+    (disjoncteur, limiteur de débit, routage des modèles, file des tâches de
+    fond) est réservé aux administrateurs.
+    
+    Endpoints:
+        GET /ia/status/ - Statut courant, partagé par tous les workers
+    """
+    
+    def list(self, request):
+        """
+        Returns:
+            200: {disponible} ; administrateurs : {disponible, disjoncteur, limiteur,
+                 prompts_chat, faq_chat, routage, taches_fond}
+        """
+        disjoncteur = circuit_breaker.snapshot()
+        disponible = disjoncteur['etat'] != OUVERT
+        if not request.user.is_staff:
+            return Response({'disponible': disponible})
+        return Response({
+            'disponible': disponible,
+            'disjoncteur': disjoncteur,
+            'limiteur': rate_limiter.snapshot(),
+            'prompts_chat': chat_prompt_builder.report(),  # Compteurs de ce worker
+            'faq_chat': faq_cache.stats(),
+            'routage': model_router.snapshot(),  # Décisions et replis de ce worker
+            'taches_fond': dict(TacheFond.objects.values_list('etat').annotate(n=Count('id')).order_by()),
+        })
+
+
+class IATelemetrieViewSet(viewsets.ViewSet):
+    """
+    Consommation IA par appelant (vue ou commande), réservée aux administrateurs.
+    
+    Endpoints:
+        GET /ia/telemetrie/?fenetre=24h - Latence p50/p95, tokens et coût estimé
+                                          par appelant (fenetre: 1h, 24h ou 7j)
+    """
+    permission_classes = [IsAdminUser]
+    
+    def list(self, request):
+        """
+        Returns:
+            200: {fenetre, appelants: [{appelant, appels, hits_cache, echecs, rejeux,
+                  p50_ms, p95_ms, tokens_prompt, tokens_reponse, cout_usd}]}
+            400: Fenêtre inconnue
+        """
+        fenetre = request.query_params.get('fenetre', '24h')
+        if fenetre not in FENETRES:
+            raise ValidationError(f"fenetre doit valoir {', '.join(FENETRES)}")
+        
+        return Response({
+            'fenetre': fenetre,
+            'appelants': statistiques(FENETRES[fenetre], request.query_params.get('appelant')),
+        })
+
+
+class TacheFondViewSet(viewsets.ViewSet):
+    """
+    Statut d'une tâche de fond (URL renvoyée avec les réponses 202). La tâche
+    est désignée par son jeton (UUID) et non par son id séquentiel : seul
+    celui qui a reçu l'URL peut la consulter.
+    
+    Endpoints:
+        GET /ia/taches/{jeton}/ - État, tentatives et résultat de la tâche
+    """
+    lookup_value_regex = '[0-9a-f-]{36}'
+    
+    def retrieve(self, request, pk=None):
+        """
+        Returns:
+            200: {id, nom, etat, tentatives, max_tentatives, resultat, erreur,
+                  date_creation, date_debut, date_fin} (id : le jeton)
+            404: Tâche inconnue (ou supprimée après IA_JOBS_RETENTION_DAYS)
+        """
+        tache = get_object_or_404(TacheFond, jeton=pk)
+        return Response({
+            'id': tache.jeton,
+            'nom': tache.nom,
+            'etat': tache.etat,
+            'tentatives': tache.tentatives,
+            'max_tentatives': tache.max_tentatives,
+            'resultat': tache.resultat,
+            'erreur': tache.erreur if request.user.is_staff else bool(tache.erreur),
+            'date_creation': tache.date_creation,
+            'date_debut': tache.date_debut,
+            'date_fin': tache.date_fin,
+        })
@@ -3,16 +3,22 @@ Views API FASO Tuteur - Apprentissage (Accueil et Explications).
 """
 import logging
 
-from rest_framework import viewsets
+from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.conf import settings
 
 from core.models import ProfilEleve, Matiere, Topic
 from core.programme_officiel import get_matieres_pour_classe
 from api.serializers import MatiereSerializer, TopicSerializer
+from ia.audiostore import audio_store
+from ia.breaker import circuit_breaker
+from ia.jobs import enqueue, PRIORITE_ELEVE
 from ia.services import generate_explication_ia
+from ia.singleflight import single_flight
+from ia.variants import negotiate, variant_url
 
 logger = logging.getLogger(__name__)
 
@@ -54,13 +60,13 @@ class AccueilViewSet(viewsets.ViewSet):
         
         matieres = matieres.order_by('ordre')
             
-        matieres_data = MatiereSerializer(matieres, many=True).data
+        matieres_data = MatiereSerializer(matieres, many=True, context={'request': request}).data
         
         # Pour CP1/CP2, ajouter topics populaires
         topics_data = []
         if not utilise_ia:
             topics = Topic.objects.filter(classe=classe)[:5]
-            topics_data = TopicSerializer(topics, many=True).data
+            topics_data = TopicSerializer(topics, many=True, context={'request': request}).data
         
         logger.debug(f"Accueil pour classe {classe}: {len(matieres_data)} matières")
         
@@ -78,6 +84,10 @@ class ExplicationViewSet(viewsets.ViewSet):
     
     Endpoints:
         GET /explication/{topic_id}/ - Explication d'un topic
+    
+    Avec IA_EXPLICATION_EN_FOND (ou l'en-tête « Prefer: respond-async »), une
+    explication à générer est mise en file (manage.py run_worker) : réponse 202
+    avec le résumé et l'URL de statut de la tâche.
     """
     
     @action(detail=False, methods=['get'], url_path='(?P<topic_id>[^/.]+)')
@@ -89,7 +99,10 @@ class ExplicationViewSet(viewsets.ViewSet):
         Pour >CP2: génère avec IA si nécessaire.
         
         Returns:
-            200: {topic_id, titre, explication, audio_url, image_url, utilise_ia}
+            200: {topic_id, titre, explication, audio_url, audio_morceaux, image_url, utilise_ia}
+                 audio_morceaux: [{url, debut_ms, duree_ms}] pour un audio long, lisible
+                 morceau par morceau avant la fin du téléchargement (sinon null)
+            202: Idem avec le résumé, plus {tache_id, etat, statut_url}
             404: Topic non trouvé
         """
         topic = get_object_or_404(Topic.objects.select_related('matiere'), id=topic_id)
@@ -105,20 +118,52 @@ class ExplicationViewSet(viewsets.ViewSet):
         
         utilise_ia = classe not in settings.CLASSES_SANS_IA
         
+        if utilise_ia and not topic.contenu_cours and self._en_fond(request) and not circuit_breaker.is_open():
+            return self._enqueue_content(request, topic, classe)
+        
         # Récupérer ou générer le contenu
         explication, audio_url = self._get_or_generate_content(topic, classe, utilise_ia)
         
         logger.info(f"Explication topic {topic_id} pour classe {classe}, IA={utilise_ia}")
         
+        variante = negotiate(request)
+        morceaux = audio_store.manifest(audio_url)
+        if morceaux and variante:
+            morceaux = [dict(m, url=variant_url(m['url'], variante)) for m in morceaux]
+        
         return Response({
             'topic_id': topic.id,
             'titre': topic.titre,
             'explication': explication,
-            'audio_url': audio_url,
+            'audio_url': variant_url(audio_url, variante),
+            'audio_morceaux': morceaux,
             'image_url': topic.image_url,
             'utilise_ia': utilise_ia
         })
     
+    def _en_fond(self, request):
+        return settings.IA_EXPLICATION_EN_FOND or 'respond-async' in request.headers.get('Prefer', '')
+    
+    def _enqueue_content(self, request, topic, classe):
+        """Met la génération en file (une tâche par topic) et sert le résumé en attendant."""
+        tache = enqueue(
+            'explication', {'topic_id': topic.id, 'classe': classe},
+            cle=f"explication:{topic.id}", priorite=PRIORITE_ELEVE,
+        )
+        logger.info(f"Explication topic {topic.id} mise en file (tâche {tache.id})")
+        
+        return Response({
+            'topic_id': topic.id,
+            'titre': topic.titre,
+            'explication': topic.resume,
+            'audio_url': variant_url(topic.audio_url, negotiate(request)),
+            'image_url': topic.image_url,
+            'utilise_ia': True,
+            'tache_id': tache.jeton,
+            'etat': tache.etat,
+            'statut_url': request.build_absolute_uri(reverse('ia-taches-detail', args=[tache.jeton])),
+        }, status=status.HTTP_202_ACCEPTED)
+    
     def _get_or_generate_content(self, topic, classe, utilise_ia):
         """
         Récupère le contenu existant ou le génère avec IA.
@@ -130,20 +175,46 @@ class ExplicationViewSet(viewsets.ViewSet):
             # Utiliser le contenu déjà généré
             return topic.contenu_cours, topic.audio_url
         
+        if utilise_ia and circuit_breaker.is_open():
+            # IA en panne : servir le résumé tout de suite, sans rien sauvegarder
+            logger.info(f"Disjoncteur IA ouvert, résumé servi pour topic {topic.id}")
+            return topic.resume, topic.audio_url
+        
         if utilise_ia:
-            # Générer avec IA si manquant
-            result = generate_explication_ia(topic, classe)
-            explication = result.get('explication', topic.resume)
-            audio_url = result.get('audio_url', topic.audio_url)
-            
-            # Sauvegarder pour plus tard
-            topic.contenu_cours = explication
-            if audio_url:
-                topic.audio_url = audio_url
-            topic.save()
-            
-            logger.info(f"Contenu IA généré et sauvegardé pour topic {topic.id}")
-            return explication, audio_url
+            # Générer avec IA si manquant : une seule génération par topic,
+            # les requêtes concurrentes (tous workers) attendent son résultat
+            content = single_flight(
+                f"explication:{topic.id}",
+                produce=lambda: self._generate_content(topic, classe),
+                poll=lambda: self._stored_content(topic.id),
+            )
+            if content is None:
+                logger.info(f"Génération en cours ailleurs pour topic {topic.id}, résumé servi")
+                return topic.resume, topic.audio_url
+            return content
         
         # Pour CP1/CP2 sans IA générative
         return topic.resume, topic.audio_url
+    
+    def _generate_content(self, topic, classe):
+        """Génère l'explication (et l'audio) puis la sauvegarde pour plus tard."""
+        result = generate_explication_ia(topic, classe)
+        explication = result.get('explication', topic.resume)
+        audio_url = result.get('audio_url') or topic.audio_url
+        if explication == topic.resume:
+            # Repli sur le résumé (IA en échec) : rien de sauvegardé, la prochaine requête réessaiera
+            return topic.resume, topic.audio_url
+        
+        # Mise à jour ciblée : pas d'écrasement des autres champs du topic
+        Topic.objects.filter(id=topic.id).update(contenu_cours=explication, audio_url=audio_url)
+        topic.contenu_cours, topic.audio_url = explication, audio_url
+        
+        logger.info(f"Contenu IA généré et sauvegardé pour topic {topic.id}")
+        return explication, audio_url
+    
+    def _stored_content(self, topic_id):
+        """Contenu déjà sauvegardé (par ce worker ou un autre), ou None."""
+        row = Topic.objects.filter(id=topic_id).values('contenu_cours', 'audio_url').first()
+        if row and row['contenu_cours']:
+            return row['contenu_cours'], row['audio_url']
+        return None
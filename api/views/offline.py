@@ -0,0 +1,70 @@
+"""
+Views API FASO Tuteur - Paquets audio hors ligne (mode vocal CP1/CP2).
+"""
+import logging
+
+from rest_framework import viewsets
+from rest_framework.decorators import action
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.http import parse_etags, quote_etag
+
+from api.exceptions import ValidationError
+from core.models import ProfilEleve, Topic
+from ia.bundles import build, bundle_name, classe_manifest, topic_manifest
+from ia.variants import negotiate
+from tuteur_intelligent.media import serve_media
+
+logger = logging.getLogger(__name__)
+
+
+class PaquetAudioViewSet(viewsets.ViewSet):
+    """
+    Paquets audio hors ligne (ia.bundles) : archive zip de tous les audios d'un
+    topic ou d'une classe, avec manifest.json (exercice -> fichiers audio).
+
+    Endpoints:
+        GET /paquets-audio/topic/{topic_id}/ - Paquet d'un topic
+        GET /paquets-audio/classe/{classe}/ - Paquet de toute une classe
+
+    L'ETag est la version du paquet : If-None-Match -> 304 sans rien
+    reconstruire, Range pour reprendre un téléchargement interrompu. Le format
+    suit la variante négociée (Accept, Save-Data, ECT : voir ia.variants).
+    """
+
+    def perform_content_negotiation(self, request, force=False):
+        # Réponse zip : les erreurs sont rendues en JSON quel que soit l'en-tête Accept
+        return super().perform_content_negotiation(request, force=True)
+
+    @action(detail=False, methods=['get'], url_path=r'topic/(?P<topic_id>\d+)')
+    def paquet_topic(self, request, topic_id=None):
+        """
+        Returns:
+            200/206: Archive zip ; 304: version déjà téléchargée ; 404: Topic non trouvé
+        """
+        topic = get_object_or_404(Topic, id=topic_id)
+        return self._serve(request, topic_manifest(topic, negotiate(request)))
+
+    @action(detail=False, methods=['get'], url_path='classe/(?P<classe>[^/.]+)')
+    def paquet_classe(self, request, classe=None):
+        """
+        Returns:
+            200/206: Archive zip ; 304: version déjà téléchargée ; 400: Classe inconnue
+        """
+        classe = classe.lower()
+        if classe not in dict(ProfilEleve.CLASSE_CHOICES):
+            raise ValidationError(f"Classe inconnue: {classe}")
+        return self._serve(request, classe_manifest(classe, negotiate(request)))
+
+    def _serve(self, request, manifeste):
+        etag = quote_etag(f"{manifeste['version']}.zip")
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponse(status=304)
+            response['ETag'] = etag
+        else:
+            build(manifeste)
+            response = serve_media(request._request, bundle_name(manifeste))
+            response['Content-Disposition'] = f'attachment; filename="{manifeste["portee"]}.zip"'
+        # L'URL reste la même d'une version à l'autre : revalidation à chaque lecture
+        response['Cache-Control'] = 'no-cache'
+        return response
@@ -0,0 +1,48 @@
+"""
+Commande Django pour inspecter et purger le cache des réponses IA et le cache FAQ du chat.
+Usage: python manage.py cache_ia [--evincer] [--vider]
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from ia.cache import response_cache
+from ia.faq import faq_cache
+from ia.models import ReponseIACache, ReponseFAQ
+
+
+class Command(BaseCommand):
+    help = 'Affiche les statistiques du cache des réponses IA, éviction et purge'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--evincer',
+            action='store_true',
+            help='Supprime les entrées expirées et les moins utilisées au-delà de IA_CACHE_MAX_ENTRIES / IA_FAQ_MAX_ENTRIES',
+        )
+        parser.add_argument(
+            '--vider',
+            action='store_true',
+            help='Supprime toutes les entrées du cache',
+        )
+
+    def handle(self, *args, **options):
+        if options['vider']:
+            count = ReponseIACache.objects.count() + ReponseFAQ.objects.count()
+            response_cache.clear()
+            faq_cache.clear()
+            self.stdout.write(self.style.SUCCESS(f'✓ {count} entrées supprimées'))
+            return
+
+        if options['evincer']:
+            deleted = response_cache.evict() + faq_cache.evict()
+            self.stdout.write(self.style.SUCCESS(f'✓ {deleted} entrées évincées'))
+
+        total = ReponseIACache.objects.count()
+        hits = ReponseIACache.objects.aggregate(total=Sum('hits'))['total'] or 0
+        self.stdout.write(f'Entrées en cache : {total}')
+        self.stdout.write(f'Hits cumulés     : {hits}')
+        for entry in ReponseIACache.objects.order_by('-hits')[:10]:
+            self.stdout.write(f'  {entry.hits:>5}  {entry.modele}  {entry.cle[:12]}  (dernier accès {entry.dernier_acces:%Y-%m-%d %H:%M})')
+
+        self.stdout.write(f'\nQuestions FAQ    : {ReponseFAQ.objects.count()}')
+        for entry in ReponseFAQ.objects.order_by('-hits')[:10]:
+            self.stdout.write(f'  {entry.hits:>5}  {entry.classe:<8} {entry.question[:60]}')
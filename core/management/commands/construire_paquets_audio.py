@@ -0,0 +1,58 @@
+"""
+Commande Django qui construit à l'avance les paquets audio hors ligne (voir
+ia.bundles) de chaque classe et de chacun de ses topics.
+
+Seuls les paquets dont le contenu a changé depuis la dernière construction
+sont reconstruits : à relancer après generer_audio ou transcoder_audio.
+Usage: python manage.py construire_paquets_audio [--classe=cp1] [--formats=mp3,opus]
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.models import Topic
+from ia.bundles import FORMAT_ORIGINAL, build, classe_manifest, topic_manifest
+from ia.variants import VARIANTES, enabled_variants
+
+
+class Command(BaseCommand):
+    help = 'Construit les paquets audio hors ligne par classe et par topic (mode vocal)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--classe',
+            action='append',
+            help='Classe à traiter (répétable, défaut: CLASSES_SANS_IA)',
+        )
+        parser.add_argument(
+            '--formats',
+            help=f'Formats séparés par des virgules (défaut: {FORMAT_ORIGINAL} et AUDIO_VARIANTES)',
+        )
+
+    def handle(self, *args, **options):
+        classes = [classe.lower() for classe in options['classe'] or settings.CLASSES_SANS_IA]
+        formats = options['formats'].split(',') if options['formats'] else [FORMAT_ORIGINAL, *enabled_variants()]
+        inconnus = [nom for nom in formats if nom != FORMAT_ORIGINAL and nom not in VARIANTES]
+        if inconnus:
+            self.stdout.write(self.style.ERROR(
+                f"Formats inconnus: {', '.join(inconnus)} (connus: {FORMAT_ORIGINAL}, {', '.join(VARIANTES)})"
+            ))
+            return
+
+        construits = a_jour = taille = 0
+        for classe in classes:
+            topics = list(Topic.objects.filter(classe=classe).order_by('id'))
+            for nom in formats:
+                variante = None if nom == FORMAT_ORIGINAL else nom
+                manifestes = [classe_manifest(classe, variante), *(topic_manifest(t, variante) for t in topics)]
+                for manifeste in manifestes:
+                    path, construit = build(manifeste)
+                    construits += construit
+                    a_jour += not construit
+                    if construit:
+                        taille += path.stat().st_size
+                        self.stdout.write(f"  {manifeste['portee']} ({nom}): {len(manifeste['fichiers'])} fichiers")
+            self.stdout.write(f"{classe}: {len(topics)} topics")
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {construits} paquets construits ({taille / 1e6:.1f} Mo), {a_jour} déjà à jour'
+        ))
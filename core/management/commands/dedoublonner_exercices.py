@@ -0,0 +1,71 @@
+"""
+Commande Django pour repérer (et supprimer) les exercices quasi-dupliqués.
+Usage: python manage.py dedoublonner_exercices [--classe 6eme] [--topic ID] [--seuil 0.9] [--supprimer]
+
+Seuls les exercices générés par l'IA sont supprimés : les exercices du
+programme (genere_par_ia=False) et ceux qui ont des soumissions restent.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from core.models import Topic, Exercice
+from ia.dedup import exercise_index
+
+
+class Command(BaseCommand):
+    help = 'Affiche les groupes d\'exercices quasi-identiques par topic et supprime les doublons'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--classe', type=str, help='Limiter à une classe')
+        parser.add_argument('--topic', type=int, help='Limiter à un topic (ID)')
+        parser.add_argument(
+            '--seuil', type=float, default=settings.IA_DEDUP_THRESHOLD,
+            help='Similarité à partir de laquelle deux exercices sont des doublons',
+        )
+        parser.add_argument(
+            '--supprimer',
+            action='store_true',
+            help="Garde un exercice par groupe et supprime les autres générés par l'IA sans soumission",
+        )
+
+    def handle(self, *args, **options):
+        topics = Topic.objects.order_by('classe', 'ordre')
+        if options['classe']:
+            topics = topics.filter(classe=options['classe'])
+        if options['topic']:
+            topics = topics.filter(id=options['topic'])
+
+        nb_groupes = nb_doublons = nb_supprimes = 0
+        for topic in topics:
+            clusters = exercise_index.clusters(topic.id, threshold=options['seuil'])
+            if not clusters:
+                continue
+
+            exercices = {
+                e.id: e for e in Exercice.objects.filter(id__in=[i for c in clusters for i in c])
+                .annotate(nb_soumissions=Count('soumissions'))
+            }
+            self.stdout.write(self.style.MIGRATE_LABEL(f"{topic.classe.upper()} - {topic.titre} : {len(clusters)} groupes"))
+
+            a_supprimer = []
+            for cluster in clusters:
+                membres = [exercices[i] for i in cluster if i in exercices]
+                # Un exercice du programme est gardé de préférence, puis le plus utilisé, puis le plus ancien
+                garde = min(membres, key=lambda e: (e.genere_par_ia, -e.nb_soumissions, e.id))
+                for e in membres:
+                    supprimable = e is not garde and e.genere_par_ia and not e.nb_soumissions
+                    marque = '=' if e is garde else '-' if supprimable else '+'
+                    self.stdout.write(f"  {marque} #{e.id} ({e.nb_soumissions} soumissions) {e.question[:70]}")
+                    if supprimable:
+                        a_supprimer.append(e.id)
+                nb_groupes += 1
+                nb_doublons += len(membres) - 1
+
+            if options['supprimer'] and a_supprimer:
+                Exercice.objects.filter(id__in=a_supprimer).delete()
+                exercise_index.remove(topic.id, a_supprimer)
+                nb_supprimes += len(a_supprimer)
+
+        self.stdout.write(f"\nGroupes de quasi-doublons : {nb_groupes} ({nb_doublons} exercices en trop)")
+        if options['supprimer']:
+            self.stdout.write(self.style.SUCCESS(f"✓ {nb_supprimes} exercices supprimés"))
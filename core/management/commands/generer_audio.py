@@ -1,9 +1,18 @@
 """
 Commande Django pour générer les fichiers audio (gTTS) pour les topics et exercices.
+
+Les textes distincts sont rendus en parallèle par tranches (voir ia.audio) ;
+chaque tranche est réécrite en base puis notée dans le fichier de reprise :
+relancer la même commande après une interruption reprend où elle s'est arrêtée.
 """
+import time
+from pathlib import Path
+
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from core.models import Topic, Exercice
-from ia.services import generate_audio
+from core.models import Topic
+from ia.audio import Checkpoint, collect_slots, render_audio, write_urls
+from ia.jobs import enqueue
 
 
 class Command(BaseCommand):
@@ -20,51 +29,100 @@ class Command(BaseCommand):
             action='store_true',
             help='Générer audio pour tous les topics et exercices',
         )
+        parser.add_argument(
+            '--manquants',
+            action='store_true',
+            help="Ignorer les champs qui ont déjà une URL audio",
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=settings.AUDIO_CONCURRENCY,
+            help='Rendus gTTS simultanés',
+        )
+        parser.add_argument('--tranche', type=int, default=200, help='Textes rendus entre deux sauvegardes')
+        parser.add_argument('--progression', type=float, default=10, help='Intervalle des messages de progression (s)')
+        parser.add_argument(
+            '--reprise',
+            type=Path,
+            help='Fichier de reprise (défaut: IA_STATE_DIR/generer_audio.json)',
+        )
+        parser.add_argument(
+            '--recommencer',
+            action='store_true',
+            help='Ignorer le fichier de reprise et tout reprendre',
+        )
+        parser.add_argument(
+            '--en-fond',
+            action='store_true',
+            help='Mettre les topics en file pour manage.py run_worker au lieu de les traiter',
+        )
 
     def handle(self, *args, **options):
         if options['topic_id']:
-            topics = Topic.objects.filter(id=options['topic_id'])
+            topic_ids = [options['topic_id']]
         elif options['all']:
-            topics = Topic.objects.all()
+            topic_ids = None
         else:
             self.stdout.write(self.style.ERROR('Utilisez --topic-id=X ou --all'))
             return
-        
-        count = 0
-        for topic in topics:
-            # Générer audio pour le résumé du topic
-            if topic.resume:
-                audio_url = generate_audio(topic.resume, lang='fr')
-                if audio_url:
-                    topic.audio_url = audio_url
-                    topic.save()
-                    count += 1
-                    self.stdout.write(f'  ✓ Audio généré pour topic: {topic.titre}')
-            
-            # Générer audio pour les exercices du topic
-            for exercice in topic.exercices.all():
-                # Question
-                if exercice.question:
-                    audio_url = generate_audio(exercice.question, lang='fr')
-                    if audio_url:
-                        exercice.question_audio_url = audio_url
-                        exercice.save()
-                        count += 1
-                
-                # Feedback success
-                if exercice.feedback_success_text:
-                    audio_url = generate_audio(exercice.feedback_success_text, lang='fr')
-                    if audio_url:
-                        exercice.feedback_success_audio_url = audio_url
-                        exercice.save()
-                        count += 1
-                
-                # Feedback fail
-                if exercice.feedback_fail_text:
-                    audio_url = generate_audio(exercice.feedback_fail_text, lang='fr')
-                    if audio_url:
-                        exercice.feedback_fail_audio_url = audio_url
-                        exercice.save()
-                        count += 1
-        
-        self.stdout.write(self.style.SUCCESS(f'{count} fichiers audio générés avec succès !'))
+
+        if options['en_fond']:
+            topics = Topic.objects.filter(id__in=topic_ids) if topic_ids else Topic.objects.all()
+            ids = list(topics.values_list('id', flat=True))
+            for topic_id in ids:
+                enqueue('audio', {'topic_id': topic_id}, cle=f'audio:{topic_id}')
+            self.stdout.write(self.style.SUCCESS(f'{len(ids)} topics mis en file (manage.py run_worker)'))
+            return
+
+        slots, texts = collect_slots(topic_ids, manquants=options['manquants'])
+        selection = f"{'tous' if topic_ids is None else topic_ids[0]}{':manquants' if options['manquants'] else ''}"
+        checkpoint = Checkpoint(options['reprise'] or settings.IA_STATE_DIR / 'generer_audio.json', selection)
+        if options['recommencer']:
+            checkpoint.clear()
+
+        # Textes rendus lors d'une exécution interrompue : seuls leurs nouveaux champs sont réécrits
+        updated = write_urls(slots, checkpoint.done)
+        pending = [h for h in texts if h not in checkpoint.done]
+        self.stdout.write(
+            f'{len(slots)} champs audio, {len(texts)} textes distincts, '
+            f'{len(texts) - len(pending)} déjà rendus, {len(pending)} à rendre '
+            f"({options['concurrency']} rendus simultanés)"
+        )
+
+        slots_by_key = {}
+        for slot in slots:
+            slots_by_key.setdefault(slot.cle, []).append(slot)
+
+        start = last = time.monotonic()
+        rendered = failed = 0
+        for i in range(0, len(pending), options['tranche']):
+            chunk = pending[i:i + options['tranche']]
+            urls = {}
+            for h, url in render_audio({h: texts[h] for h in chunk}, options['concurrency']):
+                rendered += 1
+                if url:
+                    urls[h] = url
+                else:
+                    failed += 1
+                if time.monotonic() - last >= options['progression']:
+                    last = time.monotonic()
+                    self.write_progress(rendered, len(pending), failed, last - start)
+
+            updated += write_urls([s for h in urls for s in slots_by_key[h]], urls)
+            checkpoint.done.update(urls)
+            checkpoint.save()
+            self.write_progress(rendered, len(pending), failed, time.monotonic() - start)
+
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{failed} textes en échec : relancez la commande pour les reprendre'))
+        else:
+            checkpoint.clear()
+        self.stdout.write(self.style.SUCCESS(f'{updated} champs audio mis à jour avec succès !'))
+
+    def write_progress(self, rendered, total, failed, elapsed):
+        rate = rendered / elapsed if elapsed else 0
+        remaining = (total - rendered) / rate if rate else 0
+        self.stdout.write(
+            f'  [{rendered}/{total}] {rate:.1f} textes/s, {failed} échecs, reste ~{remaining:.0f}s'
+        )
@@ -2,12 +2,16 @@
 Commande Django pour générer le contenu détaillé des cours avec l'IA (Groq).
 Améliorée pour gérer le volume et les erreurs.
 """
-import time
+import asyncio
 import logging
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.db.models import Q
 from core.models import Topic
-from ia.services import generate_explication_ia
+from ia.services import agenerate_explication_ia, generate_audio, run_bounded
+from ia.jobs import enqueue
+from ia.ratelimit import mode_batch
+from ia.telemetry import appelant
 
 logger = logging.getLogger(__name__)
 
@@ -18,13 +22,18 @@ class Command(BaseCommand):
         parser.add_argument('--classe', type=str, help='Filtrer par classe (cp1, cp2, etc.)')
         parser.add_argument('--audio-only', action='store_true', help='Générer seulement les audios manquants')
         parser.add_argument('--limit', type=int, default=50, help='Nombre maximum de topics à traiter')
+        parser.add_argument('--concurrency', type=int, default=settings.IA_CONCURRENCY, help="Nombre d'appels IA simultanés")
+        parser.add_argument('--en-fond', action='store_true', help='Met les topics sans contenu en file pour manage.py run_worker')
 
+    @mode_batch()
+    @appelant('commande:generer_contenu_cours')
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('--- Démarrage de la génération robuste ---'))
         
         classe = options.get('classe')
         audio_only = options.get('audio_only')
         limit = options.get('limit')
+        concurrency = options.get('concurrency')
         
         # Filtre de base
         query = Q()
@@ -41,40 +50,53 @@ class Command(BaseCommand):
                 Q(audio_url='')
             )
         
-        topics = Topic.objects.filter(query).order_by('classe', 'ordre')[:limit]
-        total = topics.count()
+        topics = list(Topic.objects.filter(query).select_related('matiere').order_by('classe', 'ordre')[:limit])
+        total = len(topics)
         
         if total == 0:
             self.stdout.write(self.style.SUCCESS('Aucun topic ne nécessite de mise à jour !'))
             return
 
-        self.stdout.write(f'Topics à traiter (limite {limit}) : {total}')
+        if options['en_fond']:
+            if audio_only:
+                self.stdout.write(self.style.ERROR('Audios seuls : utilisez generer_audio --en-fond'))
+                return
+            sans_contenu = [topic for topic in topics if not topic.contenu_cours]
+            for topic in sans_contenu:
+                enqueue('explication', {'topic_id': topic.id}, cle=f'explication:{topic.id}')
+            self.stdout.write(self.style.SUCCESS(f'{len(sans_contenu)} topics mis en file (manage.py run_worker)'))
+            return
+        
+        self.stdout.write(f'Topics à traiter (limite {limit}) : {total}, {concurrency} appels simultanés')
         
         count_success = 0
         count_error = 0
         
-        for index, topic in enumerate(topics):
-            self.stdout.write(f'[{index+1}/{total}] {topic.classe.upper()} - {topic.titre}...')
+        # Traitement par tranches : les appels IA d'une tranche partent en
+        # parallèle, puis les résultats sont sauvegardés avant la suivante.
+        chunk_size = max(concurrency, 1) * 5
+        for start in range(0, total, chunk_size):
+            chunk = topics[start:start + chunk_size]
+            results = run_bounded(chunk, lambda topic: self._generate(topic, audio_only), concurrency)
             
-            try:
-                # Si on a déjà le contenu mais qu'on veut l'audio
-                if audio_only or (topic.contenu_cours and not topic.audio_url):
-                    from ia.services import generate_audio
-                    self.stdout.write(f'  -> Génération audio uniquement...')
-                    audio_url = generate_audio(topic.contenu_cours)
-                    if audio_url:
-                        topic.audio_url = audio_url
-                        topic.save()
-                        count_success += 1
-                        self.stdout.write(self.style.SUCCESS(f'    ✓ Audio OK'))
-                    else:
-                        self.stdout.write(self.style.ERROR(f'    ✗ Échec audio'))
-                        count_error += 1
-                else:
-                    # Génération complète (contenu + audio)
-                    result = generate_explication_ia(topic, topic.classe, generate_audio_flag=True)
+            for index, (topic, result) in enumerate(zip(chunk, results), start=start):
+                self.stdout.write(f'[{index+1}/{total}] {topic.classe.upper()} - {topic.titre}...')
+                
+                try:
+                    if isinstance(result, Exception):
+                        raise result
                     
-                    if result and result.get('explication'):
+                    if result.get('audio_only'):
+                        # On avait déjà le contenu, seul l'audio manquait
+                        if result.get('audio_url'):
+                            topic.audio_url = result['audio_url']
+                            topic.save()
+                            count_success += 1
+                            self.stdout.write(self.style.SUCCESS(f'    ✓ Audio OK'))
+                        else:
+                            self.stdout.write(self.style.ERROR(f'    ✗ Échec audio'))
+                            count_error += 1
+                    elif result.get('explication'):
                         topic.contenu_cours = result['explication']
                         if result.get('audio_url'):
                             topic.audio_url = result['audio_url']
@@ -87,12 +109,18 @@ class Command(BaseCommand):
                         topic.contenu_cours = topic.resume
                         topic.save()
                         count_success += 1
-                
-                # Pause pour éviter le Rate Limit
-                time.sleep(2)
-                
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f'    ✗ Erreur: {e}'))
-                count_error += 1
+                    
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f'    ✗ Erreur: {e}'))
+                    count_error += 1
         
         self.stdout.write(self.style.SUCCESS(f'\nTerminé ! Succès: {count_success}, Erreurs: {count_error}'))
+
+    async def _generate(self, topic, audio_only):
+        """Génère le contenu (et l'audio) d'un topic, sans toucher à la base."""
+        if audio_only or (topic.contenu_cours and not topic.audio_url):
+            audio_url = await asyncio.to_thread(generate_audio, topic.contenu_cours)
+            return {'audio_only': True, 'audio_url': audio_url}
+        
+        # Génération complète (contenu + audio)
+        return await agenerate_explication_ia(topic, topic.classe, generate_audio_flag=True)
@@ -1,13 +1,16 @@
 import json
-import time
 from django.core.management.base import BaseCommand
 from core.models import Matiere, Topic, ProfilEleve
 from core.programme_officiel import get_matieres_pour_classe
 from ia.services import call_groq
+from ia.ratelimit import mode_batch
+from ia.telemetry import appelant
 
 class Command(BaseCommand):
     help = 'Génère les thèmes (Topics) manquants pour les classes supérieures (CE1-CM2)'
 
+    @mode_batch()
+    @appelant('commande:generer_curriculum')
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('Démarrage de la génération du curriculum...'))
         
@@ -47,7 +50,7 @@ Retourne UNIQUEMENT un objet JSON sous cette forme, sans texte avant ou après :
 ]
 Génère environ 5 à 8 thèmes majeurs pour cette matière."""
 
-                response = call_groq(prompt, classe=classe)
+                response = call_groq(prompt, classe=classe, tache='curriculum')
                 if not response:
                     self.stdout.write(self.style.ERROR(f'    ✗ Échec de réponse pour {matiere.get_nom_display()}'))
                     continue
@@ -79,8 +82,5 @@ Génère environ 5 à 8 thèmes majeurs pour cette matière."""
                     
                 except Exception as e:
                     self.stdout.write(self.style.ERROR(f'    ✗ Erreur parsing JSON : {e}'))
-                
-                # Pause pour le rate limit
-                time.sleep(2)
 
         self.stdout.write(self.style.SUCCESS('\nGénération du curriculum terminée !'))
@@ -1,12 +1,17 @@
-import time
 from django.core.management.base import BaseCommand
-from core.models import Topic, Exercice, Matiere
-from ia.services import generate_essential_questions_ia
+from core.models import Topic, Matiere
+from ia.services import stream_essential_questions_ia
+from ia.ratelimit import mode_batch
+from ia.telemetry import appelant
+from ia.dedup import create_exercice_unique
+from ia.validation import validation_stats
 from django.db.models import Count
 
 class Command(BaseCommand):
     help = 'Génère 20 exercices ESSENTIELS pour chaque matière de chaque classe'
 
+    @mode_batch()
+    @appelant('commande:generer_essentiels')
     def handle(self, *args, **options):
         classes = ['cp1', 'cp2', 'ce1', 'ce2', 'cm1', 'cm2']
         matieres = Matiere.objects.all()
@@ -42,14 +47,9 @@ class Command(BaseCommand):
                 total_created = 0
                 for lot in range(2):
                     self.stdout.write(f"    - Lot {lot+1}/2...")
-                    questions = generate_essential_questions_ia(matiere.nom, classe, topics_data, count=10)
-                    
-                    if not questions:
-                        self.stdout.write(self.style.ERROR(f"      ✗ Échec de génération pour le lot {lot+1}"))
-                        continue
-                    
+                    # Chaque question est sauvegardée dès que le modèle l'a terminée
                     created = 0
-                    for data in questions:
+                    for data in stream_essential_questions_ia(matiere.nom, classe, topics_data, count=10):
                         try:
                             # Trouver le topic cible
                             t_id = data.get('topic_id')
@@ -60,26 +60,23 @@ class Command(BaseCommand):
                             if not target_topic:
                                 target_topic = topics[0] if isinstance(topics, list) else topics.first()
 
-                            Exercice.objects.create(
-                                topic=target_topic,
-                                type_exercice=data.get('type', 'choix_multiple'),
-                                question=data.get('question', ''),
-                                options_text=data.get('options', []),
-                                correct_index=data.get('correct_index', 0),
-                                feedback_success_text=data.get('feedback_success', 'Bravo !'),
-                                feedback_fail_text=data.get('feedback_fail', 'Essaie encore !'),
-                                difficulte=data.get('difficulte', 2),
-                                genere_par_ia=True
-                            )
-                            created += 1
+                            if create_exercice_unique(target_topic, data):
+                                created += 1
                         except Exception as e:
                             self.stdout.write(self.style.ERROR(f"      ✗ Erreur création question: {e}"))
                     
+                    if not created:
+                        self.stdout.write(self.style.ERROR(f"      ✗ Échec de génération pour le lot {lot+1}"))
+                        continue
+                    
                     total_created += created
                     self.stdout.write(self.style.SUCCESS(f"      ✓ {created} exercices créés"))
-                    time.sleep(2)
                 
                 self.stdout.write(self.style.SUCCESS(f"    => Total: {total_created}/20 exercices essentiels créés"))
-                time.sleep(3)
 
         self.stdout.write(self.style.SUCCESS("\nTerminé ! Tous les essentiels sont en place."))
+        report = validation_stats.report()
+        self.stdout.write(
+            f"Validation : {report['valides']} valides, {report['corriges']} corrigés, {report['rejetes']} rejetés, "
+            f"~{report['tokens_economises']} tokens économisés par rapport au rejeu des lots"
+        )
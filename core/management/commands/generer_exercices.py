@@ -1,7 +1,14 @@
-import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from core.models import Topic, Exercice
-from ia.services import generate_exercises_batch_ia
+from core.models import Topic
+from ia.services import astream_exercises_batch_ia, astream_exercises_pack_ia, run_bounded
+from ia.packing import plan_packs, pack_report
+from ia.jobs import enqueue
+from ia.ratelimit import mode_batch
+from ia.telemetry import appelant
+from ia.dedup import create_exercice_unique
+from ia.validation import validation_stats
 from django.db.models import Count
 
 class Command(BaseCommand):
@@ -10,58 +17,149 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('--limit', type=int, default=10, help='Nombre de topics à traiter')
         parser.add_argument('--target', type=int, default=20, help='Nombre cible d exercices par topic')
+        parser.add_argument('--concurrency', type=int, default=settings.IA_CONCURRENCY, help="Nombre d'appels IA simultanés")
+        parser.add_argument(
+            '--pack', action='store_true',
+            help="Regroupe plusieurs topics d'une même classe/matière par appel (taille selon IA_PACK_MAX_TOKENS)",
+        )
+        parser.add_argument('--en-fond', action='store_true', help='Met les topics en file pour manage.py run_worker')
 
+    @mode_batch()
+    @appelant('commande:generer_exercices')
     def handle(self, *args, **options):
         limit = options['limit']
         target = options['target']
-        
+        concurrency = options['concurrency']
+        self.doublons = 0
+
         self.stdout.write(self.style.MIGRATE_HEADING(f"Vérification des exercices (Cible: {target} par topic)"))
-        
+
         # Trouver les topics qui ont moins de target exercices
-        topics = Topic.objects.annotate(nb_ex=Count('exercices')).filter(nb_ex__lt=target).order_by('classe', 'ordre')[:limit]
-        
-        total_topics = topics.count()
-        self.stdout.write(f"Topics à traiter : {total_topics}")
-
-        for i, topic in enumerate(topics):
-            current_count = topic.exercices.count()
-            needed = target - current_count
-            self.stdout.write(self.style.MIGRATE_LABEL(f"[{i+1}/{total_topics}] {topic.classe.upper()} - {topic.titre} ({current_count}/{target})"))
-            
-            while needed > 0:
-                batch_size = min(needed, 5) # Générer par lots de 5 max
-                self.stdout.write(f"  -> Génération de {batch_size} exercices...")
-                
-                exercises_data = generate_exercises_batch_ia(topic, topic.classe, count=batch_size)
-                
-                if not exercises_data:
-                    self.stdout.write(self.style.ERROR("    ✗ Échec de génération batch"))
-                    break
-                
-                created = 0
-                for data in exercises_data:
-                    try:
-                        Exercice.objects.create(
-                            topic=topic,
-                            type_exercice=data.get('type', 'choix_multiple'),
-                            question=data.get('question', ''),
-                            options_text=data.get('options', []),
-                            correct_index=data.get('correct_index', 0),
-                            feedback_success_text=data.get('feedback_success', 'Bravo !'),
-                            feedback_fail_text=data.get('feedback_fail', 'Essaie encore !'),
-                            difficulte=data.get('difficulte', 1),
-                            genere_par_ia=True
-                        )
-                        created += 1
-                    except Exception as e:
-                        self.stdout.write(self.style.ERROR(f"    ✗ Erreur création: {e}"))
-                
-                self.stdout.write(self.style.SUCCESS(f"    ✓ {created} exercices créés"))
-                
-                current_count = topic.exercices.count()
-                needed = target - current_count
-                time.sleep(1) # Petit délai entre les batches
-
-            time.sleep(2) # Délai entre les topics
+        topics = list(
+            Topic.objects.select_related('matiere')
+            .annotate(nb_ex=Count('exercices')).filter(nb_ex__lt=target)
+            .order_by('classe', 'ordre')[:limit]
+        )
+
+        total_topics = len(topics)
+        self.stdout.write(f"Topics à traiter : {total_topics}, {concurrency} appels simultanés")
+
+        if options['en_fond']:
+            for topic in topics:
+                enqueue('exercices', {'topic_id': topic.id, 'cible': target}, cle=f'exercices:{topic.id}')
+            self.stdout.write(self.style.SUCCESS(f"{total_topics} topics mis en file (manage.py run_worker)"))
+            return
+
+        if options['pack']:
+            self.handle_packs(topics, target, concurrency)
+            return
+
+        # Les topics sont traités par tranches : tous les lots d'une tranche
+        # partent en parallèle, chaque exercice est sauvegardé dès sa réception.
+        chunk_size = max(concurrency, 1) * 2
+        for start in range(0, total_topics, chunk_size):
+            chunk = topics[start:start + chunk_size]
+
+            # Un lot de 5 exercices max par appel
+            batches = []
+            for topic in chunk:
+                needed = target - topic.nb_ex
+                while needed > 0:
+                    batch_size = min(needed, 5)
+                    batches.append((topic, batch_size))
+                    needed -= batch_size
+
+            results = run_bounded(batches, self.generate_batch, concurrency)
+
+            created_by_topic = {}
+            for (topic, batch_size), created in zip(batches, results):
+                if isinstance(created, Exception) or not created:
+                    self.stdout.write(self.style.ERROR(f"  ✗ Échec de génération batch ({topic.titre})"))
+                    continue
+                created_by_topic[topic.id] = created_by_topic.get(topic.id, 0) + created
+
+            for i, topic in enumerate(chunk, start=start):
+                self.stdout.write(self.style.MIGRATE_LABEL(f"[{i+1}/{total_topics}] {topic.classe.upper()} - {topic.titre} ({topic.nb_ex}/{target})"))
+                self.stdout.write(self.style.SUCCESS(f"    ✓ {created_by_topic.get(topic.id, 0)} exercices créés"))
+
+        self.stdout.write(self.style.SUCCESS("\nTerminé !"))
+        if self.doublons:
+            self.stdout.write(f"{self.doublons} exercices quasi-identiques ignorés")
+        self.write_validation_report()
+
+    def handle_packs(self, topics, target, concurrency):
+        """Mode groupé : un appel sert plusieurs topics, exercices rendus à leur topic par topic_id."""
+        demands = [(topic, target - topic.nb_ex) for topic in topics]
+        packs = plan_packs(demands)
+        report = pack_report(demands, packs, batch_size=5)
+        self.stdout.write(f"{len(packs)} appels groupés pour {sum(n for _, n in demands)} exercices")
+
+        chunk_size = max(concurrency, 1) * 2
+        for start in range(0, len(packs), chunk_size):
+            chunk = packs[start:start + chunk_size]
+            results = run_bounded(chunk, self.generate_pack, concurrency)
+            for i, (pack, created) in enumerate(zip(chunk, results), start=start):
+                self.stdout.write(self.style.MIGRATE_LABEL(
+                    f"[{i+1}/{len(packs)}] {pack.classe.upper()} - {pack.matiere.get_nom_display()} "
+                    f"({len(pack.items)} topics, {pack.count} exercices)"
+                ))
+                if isinstance(created, Exception) or not created:
+                    self.stdout.write(self.style.ERROR("    ✗ Échec de génération du paquet"))
+                    continue
+                for topic, count in pack.items:
+                    self.stdout.write(f"    {topic.titre}: {created.get(topic.id, 0)}/{count}")
 
         self.stdout.write(self.style.SUCCESS("\nTerminé !"))
+        if self.doublons:
+            self.stdout.write(f"{self.doublons} exercices quasi-identiques ignorés")
+        self.stdout.write(
+            f"Regroupement : {report['requetes']} requêtes au lieu de {report['requetes_sans_regroupement']} "
+            f"({report['requetes_evitees']} évitées), ~{report['tokens_prompt']} tokens de prompt au lieu de "
+            f"~{report['tokens_prompt_sans_regroupement']} (~{report['tokens_economises']} économisés)"
+        )
+        self.write_validation_report()
+
+    async def generate_pack(self, pack):
+        """Génère un paquet en streaming ; les exercices au-delà du nombre demandé pour un topic sont ignorés."""
+        topics = {topic.id: topic for topic, _ in pack.items}
+        remaining = {topic.id: count for topic, count in pack.items}
+        created = {}
+        async for data in astream_exercises_pack_ia(pack):
+            topic_id = data['topic_id']
+            if remaining[topic_id] <= 0:
+                continue
+            if await sync_to_async(self.create_exercice)(topics[topic_id], data):
+                remaining[topic_id] -= 1
+                created[topic_id] = created.get(topic_id, 0) + 1
+        return created
+
+    async def generate_batch(self, batch):
+        """Génère un lot en streaming et sauvegarde chaque exercice à son arrivée."""
+        topic, batch_size = batch
+        created = 0
+        async for data in astream_exercises_batch_ia(topic, topic.classe, count=batch_size):
+            if await sync_to_async(self.create_exercice)(topic, data):
+                created += 1
+        return created
+
+    def create_exercice(self, topic, data):
+        try:
+            if create_exercice_unique(topic, data):
+                return True
+            self.doublons += 1
+            return False
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"    ✗ Erreur création: {e}"))
+            return False
+
+    def write_validation_report(self):
+        report = validation_stats.report()
+        self.stdout.write(
+            f"Validation : {report['valides']} valides, {report['corriges']} corrigés, "
+            f"{report['rejetes']} rejetés ({report['reparations']} demandes de correction)"
+        )
+        if report['reparations']:
+            self.stdout.write(
+                f"Tokens : ~{report['tokens_reparation']} pour les corrections au lieu de "
+                f"~{report['tokens_lots_evites']} en rejouant les lots (~{report['tokens_economises']} économisés)"
+            )
@@ -1,10 +1,17 @@
 import json
-import time
 import re
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from core.models import Matiere, Topic, Exercice, ProfilEleve
+from django.db.models import Count
+from core.models import Matiere, Topic, ProfilEleve
 from core.programme_officiel import get_matieres_pour_classe
-from ia.services import call_groq, generate_explication_ia, generate_exercises_batch_ia
+from ia.services import (
+    call_groq, agenerate_explication_ia, agenerate_exercises_batch_ia, agenerate_exercises_pack_ia, run_bounded,
+)
+from ia.packing import plan_packs, pack_report
+from ia.ratelimit import mode_batch
+from ia.telemetry import appelant
+from ia.dedup import create_exercice_unique
 
 class Command(BaseCommand):
     help = 'Génère massivement le contenu (curriculum, cours, exercices) pour tout le programme.'
@@ -13,11 +20,17 @@ class Command(BaseCommand):
         parser.add_argument('--step', type=str, help='Step to run: topics, content, exercises')
         parser.add_argument('--classe', type=str, help='Specific class to process')
         parser.add_argument('--limit', type=int, default=5, help='Number of items per category')
+        parser.add_argument('--concurrency', type=int, default=settings.IA_CONCURRENCY, help='Number of concurrent IA calls')
+        parser.add_argument('--pack', action='store_true', help='Exercises: several topics of a classe/matiere per IA call')
 
+    @mode_batch()
+    @appelant('commande:generer_tout')
     def handle(self, *args, **options):
         step = options.get('step')
         classe_limit = options.get('classe')
         limit = options.get('limit')
+        self.concurrency = options.get('concurrency')
+        self.pack = options.get('pack')
 
         classes = [
             'cp1', 'cp2', 'ce1', 'ce2', 'cm1', 'cm2',
@@ -65,7 +78,7 @@ Retourne UNIQUEMENT une liste JSON :
 [
     {{ "titre": "...", "resume": "...", "ordre": ... }}
 ]"""
-                response = call_groq(prompt, classe=classe)
+                response = call_groq(prompt, classe=classe, tache='curriculum')
                 if response:
                     try:
                         data = self.parse_json(response)
@@ -77,53 +90,88 @@ Retourne UNIQUEMENT une liste JSON :
                         self.stdout.write(self.style.SUCCESS(f"    ✓ Créés"))
                     except:
                         self.stdout.write(self.style.ERROR("    ✗ Erreur JSON"))
-                time.sleep(1)
 
     def generate_content(self, classes):
         self.stdout.write(self.style.MIGRATE_HEADING("\n--- STEP 2: GENERATION DES COURS ---"))
-        topics = Topic.objects.filter(classe__in=classes, contenu_cours__isnull=True)
-        total = topics.count()
-        self.stdout.write(f"Total topics à traiter: {total}")
-
-        for i, topic in enumerate(topics):
-            self.stdout.write(f"[{i+1}/{total}] {topic.classe} - {topic.titre}...")
-            try:
-                result = generate_explication_ia(topic, topic.classe, generate_audio_flag=False)
-                topic.contenu_cours = result['explication']
-                topic.save()
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f"  ✗ Erreur: {e}"))
-            time.sleep(1)
+        topics = list(Topic.objects.filter(classe__in=classes, contenu_cours__isnull=True).select_related('matiere'))
+        total = len(topics)
+        self.stdout.write(f"Total topics à traiter: {total} ({self.concurrency} appels simultanés)")
+
+        for start, chunk, results in self.run_chunks(
+            topics, lambda topic: agenerate_explication_ia(topic, topic.classe, generate_audio_flag=False)
+        ):
+            for i, (topic, result) in enumerate(zip(chunk, results), start=start):
+                self.stdout.write(f"[{i+1}/{total}] {topic.classe} - {topic.titre}...")
+                try:
+                    if isinstance(result, Exception):
+                        raise result
+                    topic.contenu_cours = result['explication']
+                    topic.save()
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f"  ✗ Erreur: {e}"))
 
     def generate_exercises(self, classes):
         self.stdout.write(self.style.MIGRATE_HEADING("\n--- STEP 3: GENERATION DES EXERCICES ---"))
-        topics = Topic.objects.filter(classe__in=classes)
-        total = topics.count()
-
-        for i, topic in enumerate(topics):
-            existing = Exercice.objects.filter(topic=topic).count()
-            if existing >= 10:
-                continue
-
-            self.stdout.write(f"[{i+1}/{total}] {topic.classe} - {topic.titre} ({existing} existants)...")
-            try:
-                exercises = generate_exercises_batch_ia(topic, topic.classe, count=10-existing)
+        topics = list(
+            Topic.objects.filter(classe__in=classes).select_related('matiere')
+            .annotate(existing=Count('exercices')).filter(existing__lt=10)
+        )
+        total = len(topics)
+        if self.pack:
+            return self.generate_exercise_packs(topics)
+
+        for start, chunk, results in self.run_chunks(
+            topics, lambda topic: agenerate_exercises_batch_ia(topic, topic.classe, count=10-topic.existing)
+        ):
+            for i, (topic, exercises) in enumerate(zip(chunk, results), start=start):
+                self.stdout.write(f"[{i+1}/{total}] {topic.classe} - {topic.titre} ({topic.existing} existants)...")
+                try:
+                    if isinstance(exercises, Exception):
+                        raise exercises
+                    added = sum(1 for ex_data in exercises if create_exercice_unique(topic, ex_data))
+                    self.stdout.write(self.style.SUCCESS(
+                        f"  ✓ {added} exercices ajoutés ({len(exercises) - added} doublons ignorés)"
+                    ))
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f"  ✗ Erreur: {e}"))
+
+    def generate_exercise_packs(self, topics):
+        """Exercices de plusieurs topics par appel, rendus à leur topic par topic_id."""
+        demands = [(topic, 10 - topic.existing) for topic in topics]
+        packs = plan_packs(demands)
+        report = pack_report(demands, packs)
+
+        for start, chunk, results in self.run_chunks(packs, agenerate_exercises_pack_ia):
+            for i, (pack, exercises) in enumerate(zip(chunk, results), start=start):
+                self.stdout.write(f"[{i+1}/{len(packs)}] {pack.classe} - {pack.matiere.nom} ({len(pack.items)} topics)...")
+                if isinstance(exercises, Exception):
+                    self.stdout.write(self.style.ERROR(f"  ✗ Erreur: {exercises}"))
+                    continue
+                remaining = {topic.id: count for topic, count in pack.items}
+                topics_by_id = {topic.id: topic for topic, _ in pack.items}
+                added = 0
                 for ex_data in exercises:
-                    Exercice.objects.create(
-                        topic=topic,
-                        type_exercice='choix_multiple',
-                        question=ex_data['question'],
-                        options_text=ex_data['options'],
-                        correct_index=ex_data['correct_index'],
-                        feedback_success_text=ex_data['feedback_success'],
-                        feedback_fail_text=ex_data['feedback_fail'],
-                        difficulte=ex_data.get('difficulte', 1),
-                        genere_par_ia=True
-                    )
-                self.stdout.write(self.style.SUCCESS(f"  ✓ {len(exercises)} exercices ajoutés"))
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f"  ✗ Erreur: {e}"))
-            time.sleep(2)
+                    topic_id = ex_data['topic_id']
+                    if remaining[topic_id] > 0 and create_exercice_unique(topics_by_id[topic_id], ex_data):
+                        remaining[topic_id] -= 1
+                        added += 1
+                self.stdout.write(self.style.SUCCESS(f"  ✓ {added}/{pack.count} exercices ajoutés"))
+
+        self.stdout.write(
+            f"Regroupement : {report['requetes']} requêtes au lieu de {report['requetes_sans_regroupement']} "
+            f"({report['requetes_evitees']} évitées), ~{report['tokens_economises']} tokens de prompt économisés"
+        )
+
+    def run_chunks(self, topics, worker):
+        """
+        Lance worker sur les topics par tranches, avec self.concurrency appels en vol.
+        Chaque tranche est rendue (start, chunk, résultats) pour être sauvegardée
+        avant de lancer la suivante.
+        """
+        chunk_size = max(self.concurrency, 1) * 5
+        for start in range(0, len(topics), chunk_size):
+            chunk = topics[start:start + chunk_size]
+            yield start, chunk, run_bounded(chunk, worker, self.concurrency)
 
     def parse_json(self, response):
         match = re.search(r'\[.*\]', response, re.DOTALL)
@@ -0,0 +1,102 @@
+"""
+Commande Django qui recompte les références des audios (table AudioAsset)
+et supprime ceux qu'aucun topic ni exercice n'utilise plus. Les morceaux d'un
+audio long (voir ia.audiostore) comptent une référence par audio conservé qui
+les joint ; les variantes légères (voir ia.variants) partent avec leur original,
+en local comme dans le stockage partagé (MEDIA_STORAGE=s3).
+Usage: python manage.py nettoyer_audio [--delai=24] [--fichiers] [--simulation]
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ia.audio import CHAMPS_AUDIO
+from ia.audiostore import asset_file, asset_url
+from ia.models import AudioAsset
+from ia.variants import VARIANTES, variant_file, variant_name
+from tuteur_intelligent import storage
+
+
+class Command(BaseCommand):
+    help = "Recompte les références des fichiers audio et supprime les orphelins"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--delai', type=float, default=24,
+            help="Âge minimal (heures) d'un audio orphelin supprimé : un rendu récent n'est peut-être pas encore enregistré",
+        )
+        parser.add_argument(
+            '--fichiers',
+            action='store_true',
+            help="Supprime aussi les fichiers non indexés et non référencés (anciens audios, rendus interrompus)",
+        )
+        parser.add_argument('--simulation', action='store_true', help='Affiche sans rien modifier')
+
+    def handle(self, *args, **options):
+        simulation = options['simulation']
+        limite = timezone.now() - timedelta(hours=options['delai'])
+
+        references = Counter()
+        for model, _, url_field in CHAMPS_AUDIO:
+            urls = model.objects.exclude(**{f'{url_field}__isnull': True}).exclude(**{url_field: ''})
+            references.update(urls.values_list(url_field, flat=True).iterator())
+
+        fields = ['id', 'cle', 'chemin', 'references', 'taille', 'date_creation', 'morceaux']
+        assets = list(AudioAsset.objects.only(*fields).iterator())
+        counts = {asset.cle: references.get(asset_url(asset.chemin), 0) for asset in assets}
+        part_counts = Counter()
+        for asset in assets:
+            if asset.morceaux and (counts[asset.cle] or asset.date_creation >= limite):
+                part_counts.update(asset.morceaux)
+
+        changed, orphans = [], []
+        for asset in assets:
+            count = counts[asset.cle] + part_counts[asset.cle]
+            if count != asset.references:
+                asset.references = count
+                changed.append(asset)
+            if not count and asset.date_creation < limite:
+                orphans.append(asset)
+        self.stdout.write(f'{len(changed)} compteurs de références mis à jour')
+
+        if not simulation:
+            AudioAsset.objects.bulk_update(changed, fields=['references'], batch_size=500)
+            for asset in orphans:
+                asset_file(asset.cle).unlink(missing_ok=True)
+                for nom in VARIANTES:
+                    variant_file(asset.cle, nom).unlink(missing_ok=True)
+                storage.remove([asset.chemin, *(variant_name(asset.cle, nom) for nom in VARIANTES)])
+            for i in range(0, len(orphans), 500):
+                AudioAsset.objects.filter(id__in=[a.id for a in orphans[i:i + 500]]).delete()
+        freed = sum(asset.taille for asset in orphans)
+        self.stdout.write(self.style.SUCCESS(f'✓ {len(orphans)} audios orphelins supprimés ({freed / 1e6:.1f} Mo)'))
+
+        if options['fichiers']:
+            self.clean_files(references, limite.timestamp(), simulation)
+
+    def clean_files(self, references, limite, simulation):
+        """Fichiers du dossier audio absents de l'index et des références, plus vieux que le délai."""
+        indexed = set(AudioAsset.objects.values_list('chemin', flat=True))
+        root = settings.AUDIO_STORAGE_PATH
+        suffixes = {'.mp3', '.tmp'} | {'.' + v.suffixe.rsplit('.', 1)[-1] for v in VARIANTES.values()}
+        deleted, freed = 0, 0
+        for path in root.rglob('*'):
+            if not path.is_file() or path.suffix not in suffixes:
+                continue
+            stat = path.stat()
+            if stat.st_mtime >= limite:
+                continue
+            name = path.name
+            if not name.startswith('.'):
+                name = f"{name.split('.')[0]}.mp3"  # Une variante suit son original
+            chemin = f"audio/{(path.parent / name).relative_to(root).as_posix()}"
+            if chemin in indexed or asset_url(chemin) in references:
+                continue
+            if not simulation:
+                path.unlink(missing_ok=True)
+            deleted += 1
+            freed += stat.st_size
+        self.stdout.write(self.style.SUCCESS(f'✓ {deleted} fichiers non indexés supprimés ({freed / 1e6:.1f} Mo)'))
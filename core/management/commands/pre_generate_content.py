@@ -7,6 +7,8 @@ from django.core.management.base import BaseCommand
 from django.conf import settings
 from core.models import Topic
 from ia.services import generate_explication_ia
+from ia.ratelimit import mode_batch
+from ia.telemetry import appelant
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +39,8 @@ class Command(BaseCommand):
             help='Régénère même si le contenu existe déjà',
         )
 
+    @mode_batch()
+    @appelant('commande:pre_generate_content')
     def handle(self, *args, **options):
         classe = options.get('classe')
         all_classes = options.get('all')
@@ -116,8 +120,8 @@ class Command(BaseCommand):
                         ending=''
                     )
 
-                    # Générer le contenu IA
-                    result = generate_explication_ia(topic, current_classe)
+                    # Générer le contenu IA (--force ignore aussi le cache des réponses)
+                    result = generate_explication_ia(topic, current_classe, refresh=force)
                     
                     # Sauvegarder
                     topic.contenu_cours = result.get('explication', topic.resume)
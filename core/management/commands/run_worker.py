@@ -0,0 +1,53 @@
+"""
+Commande Django qui exécute les tâches de fond (table TacheFond, voir ia.jobs).
+Usage: python manage.py run_worker [--concurrency=2] [--noms=explication,audio] [--une-passe]
+"""
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ia.jobs import TRAITEMENTS, Worker, purge
+
+
+class Command(BaseCommand):
+    help = 'Exécute les tâches de fond (explications, exercices, audio) mises en file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=settings.IA_JOBS_CONCURRENCY,
+            help='Nombre de tâches exécutées en parallèle (threads)',
+        )
+        parser.add_argument('--noms', help=f"Traitements à exécuter (parmi {', '.join(TRAITEMENTS)})")
+        parser.add_argument(
+            '--une-passe',
+            action='store_true',
+            help="S'arrête quand plus aucune tâche n'est prête (au lieu d'attendre les suivantes)",
+        )
+
+    def handle(self, *args, **options):
+        noms = [nom for nom in (options['noms'] or '').split(',') if nom] or None
+        inconnus = set(noms or []) - set(TRAITEMENTS)
+        if inconnus:
+            self.stdout.write(self.style.ERROR(f"Traitements inconnus : {', '.join(sorted(inconnus))}"))
+            return
+
+        deleted = purge()
+        if deleted:
+            self.stdout.write(f'{deleted} tâches terminées anciennes supprimées')
+
+        worker = Worker(concurrency=options['concurrency'], noms=noms)
+        # Arrêt propre : plus de nouvelles tâches, celles en cours vont jusqu'au bout
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: worker.stop())
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Worker {worker.proprietaire[:8]} : {worker.concurrency} threads, "
+            f"traitements {', '.join(noms or TRAITEMENTS)}"
+        ))
+        worker.run(une_passe=options['une_passe'])
+
+        stats = worker.stats
+        self.stdout.write(self.style.SUCCESS(
+            f"Terminé ! {stats['terminee']} terminées, {stats['en_attente']} à réessayer, {stats['echec']} en échec"
+        ))
@@ -0,0 +1,63 @@
+"""
+Commande Django pour lancer le serveur local qui imite l'API Groq (voir ia.standin).
+Usage: python manage.py serveur_ia_local [--port 8765] [--latence lognormale:300,0.5] [--taux-429 0.05]
+                                         [--cassette var/cassettes/chat.jsonl [--enregistrer]]
+
+Puis, dans un autre terminal : GROQ_BASE_URL=http://127.0.0.1:8765 GROQ_API_KEY=local python manage.py runserver
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ia.standin import StandInConfig, StandInServer, GROQ_URL
+
+
+class Command(BaseCommand):
+    help = "Lance un serveur chat-completions local (latence, streaming, 429, erreurs, cassettes)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latence', default='0', help='Latence des réponses en ms (ex: 80, uniforme:20,200, lognormale:300,0.5)')
+        parser.add_argument('--latence-fragment', default='0', help='Délai entre deux fragments en streaming (ms)')
+        parser.add_argument('--taux-429', type=float, default=0.0, help='Part des requêtes refusées en 429')
+        parser.add_argument('--taux-erreur', type=float, default=0.0, help='Part des requêtes en erreur 503')
+        parser.add_argument('--retry-after', type=int, default=1, help='En-tête Retry-After des 429 (secondes)')
+        parser.add_argument('--cassette', help='Fichier JSONL des réponses enregistrées (rejouées par défaut)')
+        parser.add_argument(
+            '--enregistrer', action='store_true',
+            help="Relaie les requêtes vers l'API réelle (GROQ_API_KEY) et enregistre les réponses dans la cassette",
+        )
+        parser.add_argument('--amont', default=GROQ_URL, help="URL de l'API réelle (mode --enregistrer)")
+        parser.add_argument('--graine', type=int, help='Graine des tirages (runs reproductibles)')
+
+    def handle(self, *args, **options):
+        if options['enregistrer'] and not (options['cassette'] and settings.GROQ_API_KEY):
+            raise CommandError("--enregistrer demande --cassette et GROQ_API_KEY")
+
+        try:
+            config = StandInConfig(
+                latency=options['latence'],
+                chunk_latency=options['latence_fragment'],
+                rate_429=options['taux_429'],
+                rate_error=options['taux_erreur'],
+                retry_after=options['retry_after'],
+                cassette=options['cassette'],
+                mode='record' if options['enregistrer'] else 'replay',
+                upstream=options['amont'],
+                upstream_key=settings.GROQ_API_KEY,
+                seed=options['graine'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        server = StandInServer(config, port=options['port'])
+        self.stdout.write(self.style.SUCCESS(f"Serveur IA local sur {server.url}"))
+        if config.cassette:
+            self.stdout.write(f"Cassette : {config.cassette.path} ({len(config.cassette.entries)} réponses, mode {config.mode})")
+        self.stdout.write(f"Exemple : GROQ_BASE_URL={server.url} GROQ_API_KEY=local python manage.py runserver")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.httpd.server_close()
+            self.stdout.write(f"\n{server.stats.snapshot()}")
@@ -0,0 +1,35 @@
+"""
+Commande Django pour lancer le serveur local qui imite l'API S3 (voir tuteur_intelligent.s3standin).
+Usage: python manage.py serveur_s3_local [--port 9000] [--bucket medias]
+
+Puis, dans un autre terminal :
+MEDIA_STORAGE=s3 MEDIA_S3_ENDPOINT_URL=http://127.0.0.1:9000 MEDIA_S3_BUCKET=medias \
+MEDIA_S3_ACCESS_KEY=local MEDIA_S3_SECRET_KEY=local python manage.py runserver
+"""
+from django.core.management.base import BaseCommand
+
+from tuteur_intelligent.s3standin import S3StandInServer
+
+
+class Command(BaseCommand):
+    help = "Lance un serveur S3 local en mémoire (stockage partagé des médias sans compte S3)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=9000)
+        parser.add_argument('--bucket', action='append', help='Bucket à créer (répétable, défaut: medias)')
+
+    def handle(self, *args, **options):
+        buckets = options['bucket'] or ['medias']
+        server = S3StandInServer(buckets=buckets, port=options['port'])
+        self.stdout.write(self.style.SUCCESS(f"Serveur S3 local sur {server.url} (buckets: {', '.join(buckets)})"))
+        self.stdout.write(
+            f"Exemple : MEDIA_STORAGE=s3 MEDIA_S3_ENDPOINT_URL={server.url} MEDIA_S3_BUCKET={buckets[0]} "
+            f"MEDIA_S3_ACCESS_KEY=local MEDIA_S3_SECRET_KEY=local python manage.py runserver"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.httpd.server_close()
+            self.stdout.write(f"\n{server.stats}")
@@ -0,0 +1,52 @@
+"""
+Commande Django pour afficher la consommation IA par appelant (vue ou commande).
+Usage: python manage.py telemetrie_ia [--fenetre 24h] [--appelant ChatbotViewSet.chat] [--purger]
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ia.models import AppelIA
+from ia.telemetry import FENETRES, statistiques
+
+
+class Command(BaseCommand):
+    help = 'Latence p50/p95, tokens, rejeux, hits du cache et coût estimé des appels IA par appelant'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fenetre', choices=list(FENETRES), help='Une seule fenêtre (par défaut : toutes)')
+        parser.add_argument('--appelant', help='Limite à un appelant (ex: commande:generer_exercices)')
+        parser.add_argument(
+            '--purger',
+            action='store_true',
+            help='Supprime les mesures plus anciennes que IA_TELEMETRY_RETENTION_DAYS',
+        )
+
+    def handle(self, *args, **options):
+        if options['purger']:
+            limite = timezone.now() - timedelta(days=settings.IA_TELEMETRY_RETENTION_DAYS)
+            deleted, _ = AppelIA.objects.filter(date__lt=limite).delete()
+            self.stdout.write(self.style.SUCCESS(f'✓ {deleted} mesures supprimées'))
+
+        fenetres = [options['fenetre']] if options['fenetre'] else list(FENETRES)
+        for fenetre in fenetres:
+            lignes = statistiques(FENETRES[fenetre], options['appelant'])
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\nDernières {fenetre} ({len(lignes)} appelants)'))
+            if not lignes:
+                continue
+            self.stdout.write(
+                f"  {'appelant':<40} {'appels':>6} {'cache':>6} {'échecs':>6} {'rejeux':>6} "
+                f"{'p50 ms':>7} {'p95 ms':>7} {'tokens in':>10} {'tokens out':>10} {'coût $':>10}"
+            )
+            for l in lignes:
+                self.stdout.write(
+                    f"  {l['appelant'][:40]:<40} {l['appels']:>6} {l['hits_cache']:>6} {l['echecs']:>6} "
+                    f"{l['rejeux']:>6} {_ms(l['p50_ms']):>7} {_ms(l['p95_ms']):>7} "
+                    f"{l['tokens_prompt']:>10} {l['tokens_reponse']:>10} {l['cout_usd']:>10.6f}"
+                )
+
+
+def _ms(value):
+    return '-' if value is None else value
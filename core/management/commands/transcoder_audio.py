@@ -0,0 +1,83 @@
+"""
+Commande Django qui transcode les audios déjà rendus en variantes légères
+(Opus, mp3 bas débit, voir ia.variants), en parallèle.
+Usage: python manage.py transcoder_audio [--variantes=opus,mp3-bas] [--concurrency=4]
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ia.models import AudioAsset
+from ia.variants import VARIANTES, enabled_variants, transcode, variant_file, variant_name
+from tuteur_intelligent import storage
+
+
+class Command(BaseCommand):
+    help = 'Transcode les audios existants en variantes légères pour les connexions lentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--variantes',
+            help='Variantes à produire, séparées par des virgules (défaut: AUDIO_VARIANTES)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=settings.AUDIO_CONCURRENCY,
+            help='Processus ffmpeg simultanés',
+        )
+        parser.add_argument('--progression', type=float, default=10, help='Intervalle des messages de progression (s)')
+
+    def handle(self, *args, **options):
+        noms = options['variantes'].split(',') if options['variantes'] else enabled_variants()
+        inconnues = [nom for nom in noms if nom not in VARIANTES]
+        if inconnues or not noms:
+            self.stdout.write(self.style.ERROR(
+                f"Variantes inconnues ou absentes: {', '.join(inconnues) or '-'} (connues: {', '.join(VARIANTES)})"
+            ))
+            return
+
+        assets = list(AudioAsset.objects.values_list('cle', 'taille'))
+        pending = [
+            cle for cle, _ in assets
+            if not all(storage.exists(variant_name(cle, nom), variant_file(cle, nom)) for nom in noms)
+        ]
+        self.stdout.write(
+            f"{len(assets)} audios, {len(pending)} à transcoder en {', '.join(noms)} "
+            f"({options['concurrency']} simultanés)"
+        )
+
+        start = last = time.monotonic()
+        done = failed = 0
+        with ThreadPoolExecutor(max_workers=max(options['concurrency'], 1), thread_name_prefix='ffmpeg') as pool:
+            futures = {pool.submit(transcode, cle, noms): cle for cle in pending}
+            for future in as_completed(futures):
+                done += 1
+                try:
+                    future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'  Échec {futures[future]}: {e}')
+                if time.monotonic() - last >= options['progression']:
+                    last = time.monotonic()
+                    self.stdout.write(f'  [{done}/{len(pending)}] {done / (last - start):.1f} audios/s, {failed} échecs')
+
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{failed} audios en échec : relancez la commande pour les reprendre'))
+
+        # Octets servis par variante, sur les audios qui l'ont, face aux originaux
+        for nom in noms:
+            original = variant = 0
+            for cle, taille in assets:
+                path = variant_file(cle, nom)
+                if path.exists():
+                    original += taille
+                    variant += path.stat().st_size
+            if variant:
+                self.stdout.write(
+                    f'  {nom}: {variant / 1e6:.1f} Mo pour {original / 1e6:.1f} Mo d\'originaux '
+                    f'({original / variant:.1f}x plus léger)'
+                )
+        self.stdout.write(self.style.SUCCESS(f'✓ {done - failed} audios transcodés'))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:52
+
+import tuteur_intelligent.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_alter_matiere_nom'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profileleve',
+            name='photo_profil',
+            field=models.ImageField(blank=True, null=True, storage=tuteur_intelligent.storage.media_storage, upload_to='avatars/'),
+        ),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.conf import settings
 
+from tuteur_intelligent.storage import media_storage
+
 
 class ProfilEleve(models.Model):
     """Profil d'un élève avec sa classe et progression"""
@@ -27,7 +29,7 @@ class ProfilEleve(models.Model):
     
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profil_eleve')
     classe = models.CharField(max_length=10, choices=CLASSE_CHOICES)
-    photo_profil = models.ImageField(upload_to='avatars/', null=True, blank=True)
+    photo_profil = models.ImageField(upload_to='avatars/', storage=media_storage, null=True, blank=True)
     points = models.IntegerField(default=0)
     badges = models.JSONField(default=list, blank=True)
     date_creation = models.DateTimeField(auto_now_add=True)
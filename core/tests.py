@@ -1,7 +1,15 @@
-from django.test import TestCase
+import hashlib
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
 from django.contrib.auth.models import User
 from core.models import ProfilEleve, Matiere, Topic, Exercice, Soumission, Progression
 from django.conf import settings
+from tuteur_intelligent import storage
+from tuteur_intelligent.s3standin import S3StandInServer
 
 
 class ProfilEleveModelTest(TestCase):
@@ -143,3 +151,108 @@ class ProgressionModelTest(TestCase):
             exercices_total=0
         )
         self.assertEqual(progression.taux_reussite, 0.0)
+
+
+class MediaServingTest(TestCase):
+    """Service des médias en production (tuteur_intelligent.media)"""
+    def setUp(self):
+        media_root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        
+        self.key = 'ab' * 32
+        self.audio = bytes(range(100))
+        (media_root / 'audio' / 'ab' / 'ab').mkdir(parents=True)
+        (media_root / 'audio' / 'ab' / 'ab' / f'{self.key}.mp3').write_bytes(self.audio)
+        (media_root / 'avatars').mkdir()
+        (media_root / 'avatars' / 'photo.png').write_bytes(b'png')
+        self.url = f'/media/audio/ab/ab/{self.key}.mp3'
+    
+    def test_audio_complet_immuable(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.getvalue(), self.audio)
+        self.assertEqual(response['Content-Type'], 'audio/mpeg')
+        self.assertEqual(response['ETag'], f'"{self.key}.mp3"')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"{self.key}.mp3"')
+        self.assertEqual(response.status_code, 304)
+    
+    def test_plages(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.getvalue(), self.audio[10:20])
+        self.assertEqual((response['Content-Range'], response['Content-Length']), ('bytes 10-19/100', '10'))
+        
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=-5').getvalue(), self.audio[-5:])
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=95-').getvalue(), self.audio[95:])
+        response = self.client.get(self.url, HTTP_RANGE='bytes=500-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */100'))
+        # If-Range d'une autre version : fichier entier
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='"autre"')
+        self.assertEqual((response.status_code, response.getvalue()), (200, self.audio))
+    
+    def test_avatar_et_chemins_interdits(self):
+        response = self.client.get('/media/avatars/photo.png')
+        self.assertEqual(response['ETag'], f'"{hashlib.sha256(b"png").hexdigest()}"')
+        self.assertEqual(response['Cache-Control'], f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}')
+        self.assertEqual(self.client.head('/media/avatars/photo.png')['Content-Length'], '3')
+        self.assertEqual(self.client.get('/media/..%2Fmanage.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/avatars/absent.png').status_code, 404)
+
+
+class S3StorageTest(TestCase):
+    """Stockage partagé des médias sur un serveur S3 local (tuteur_intelligent.storage)"""
+    def setUp(self):
+        self.server = S3StandInServer(buckets=('medias',)).start()
+        self.addCleanup(self.server.stop)
+        override = override_settings(
+            MEDIA_STORAGE='s3', MEDIA_S3_ENDPOINT_URL=self.server.url, MEDIA_S3_BUCKET='medias',
+            MEDIA_S3_ACCESS_KEY='local', MEDIA_S3_SECRET_KEY='local', MEDIA_S3_MULTIPART_MB=5,
+            MEDIA_ROOT=Path(tempfile.mkdtemp()),
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, settings.MEDIA_ROOT, ignore_errors=True)
+    
+    def test_avatar_et_existence_en_cache(self):
+        profil = ProfilEleve.objects.create(user=User.objects.create_user(username='awa', password='x'), classe='cm1')
+        profil.photo_profil.save('photo.png', ContentFile(b'png'))
+        data, _, content_type, cache_control = self.server.store.objects[('medias', 'avatars/photo.png')]
+        self.assertEqual((data, content_type), (b'png', 'image/png'))
+        self.assertEqual(cache_control, f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}')
+        self.assertEqual(profil.photo_profil.url, f'{self.server.url}/medias/avatars/photo.png')
+        
+        heads = self.server.stats['head']
+        for _ in range(5):
+            self.assertTrue(storage.exists('avatars/photo.png'))
+            self.assertFalse(storage.exists('avatars/absente.png'))
+        self.assertEqual(self.server.stats['head'] - heads, 1)  # L'absente ; la présente est connue depuis l'envoi
+    
+    def test_envoi_multipart_en_arriere_plan(self):
+        path = Path(settings.MEDIA_ROOT) / 'audio' / 'ab' / 'ab' / f"{'ab' * 32}.mp3"
+        path.parent.mkdir(parents=True)
+        path.write_bytes(bytes(range(256)) * 45000)  # 11,5 Mo : trois parties de 5 Mo au plus
+        name = path.relative_to(settings.MEDIA_ROOT).as_posix()
+        
+        storage.wait_published(storage.publish([(name, path)]))
+        self.assertEqual((self.server.stats['multipart'], self.server.stats['parties']), (1, 3))
+        data, _, content_type, cache_control = self.server.store.objects[('medias', name)]
+        self.assertEqual((data, content_type), (path.read_bytes(), 'audio/mpeg'))
+        self.assertEqual(cache_control, 'public, max-age=31536000, immutable')
+        
+        # Déjà publié : pas de second envoi
+        storage.wait_published(storage.publish([(name, path)]))
+        self.assertEqual(self.server.stats['multipart'], 1)
+        
+        # Un autre nœud (fichier absent en local) redirige vers le bucket, puis le rapatrie
+        path.unlink()
+        response = self.client.get(f'/media/{name}')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], f'{self.server.url}/medias/{name}')
+        self.assertTrue(storage.fetch(name, path))
+        self.assertEqual(path.read_bytes(), data)
@@ -0,0 +1,48 @@
+from django.contrib import admin
+from .models import ReponseIACache, VerrouGeneration, ReponseFAQ, AppelIA, TacheFond, AudioAsset
+
+
+@admin.register(ReponseIACache)
+class ReponseIACacheAdmin(admin.ModelAdmin):
+    list_display = ['cle', 'modele', 'hits', 'dernier_acces', 'date_expiration']
+    list_filter = ['modele']
+    search_fields = ['cle', 'reponse']
+    ordering = ['-hits']
+
+
+@admin.register(VerrouGeneration)
+class VerrouGenerationAdmin(admin.ModelAdmin):
+    list_display = ['cle', 'proprietaire', 'date_creation', 'date_expiration']
+    search_fields = ['cle']
+
+
+@admin.register(ReponseFAQ)
+class ReponseFAQAdmin(admin.ModelAdmin):
+    """Questions du chat les plus demandées en premier"""
+    list_display = ['question', 'classe', 'hits', 'dernier_acces', 'date_expiration']
+    list_filter = ['classe']
+    search_fields = ['question', 'reponse']
+    ordering = ['-hits']
+
+
+@admin.register(AppelIA)
+class AppelIAAdmin(admin.ModelAdmin):
+    list_display = ['date', 'appelant', 'classe', 'modele', 'tokens_prompt', 'tokens_reponse', 'duree_ms', 'rejeux', 'cache', 'succes']
+    list_filter = ['appelant', 'modele', 'cache', 'succes']
+    ordering = ['-date']
+
+
+@admin.register(TacheFond)
+class TacheFondAdmin(admin.ModelAdmin):
+    list_display = ['id', 'nom', 'etat', 'priorite', 'tentatives', 'cle', 'date_creation', 'date_fin']
+    list_filter = ['nom', 'etat']
+    search_fields = ['cle', 'erreur']
+    ordering = ['-id']
+
+
+@admin.register(AudioAsset)
+class AudioAssetAdmin(admin.ModelAdmin):
+    list_display = ['chemin', 'lang', 'lent', 'taille', 'duree_ms', 'references', 'date_creation']
+    list_filter = ['lang', 'lent']
+    search_fields = ['cle']
+    ordering = ['-date_creation']
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class IaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ia'
+
+    def ready(self):
+        from ia import signals  # noqa: F401
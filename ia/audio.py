@@ -0,0 +1,185 @@
+"""
+Génération des audios (gTTS) en masse : voir manage.py generer_audio.
+
+Les textes à lire (résumé des topics, question et feedbacks des exercices)
+sont collectés champ par champ puis dédoublonnés par clé du stockage audio
+(ia.audiostore) : un feedback partagé par des centaines d'exercices n'est
+rendu qu'une fois. Les textes déjà indexés sont retrouvés en une requête, les
+autres rendus par un pool de threads borné (et publiés en arrière-plan vers
+le stockage partagé, voir tuteur_intelligent.storage) ; les URLs sont réécrites par
+bulk_update sur le seul champ concerné, et un fichier de reprise garde les
+clés déjà traitées pour qu'une exécution interrompue reprenne où elle s'est
+arrêtée. Chaque audio rendu est aussi transcodé en variantes légères
+(ia.variants) par le thread qui l'a rendu, si ffmpeg est disponible.
+"""
+import os
+import json
+import logging
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from django.db.models import Q
+
+from core.models import Topic, Exercice
+from ia.audiostore import asset_key, asset_url, audio_store
+from ia import variants
+from tuteur_intelligent import storage
+
+logger = logging.getLogger(__name__)
+
+# (modèle, champ texte, champ URL)
+CHAMPS_AUDIO = [
+    (Topic, 'resume', 'audio_url'),
+    (Exercice, 'question', 'question_audio_url'),
+    (Exercice, 'feedback_success_text', 'feedback_success_audio_url'),
+    (Exercice, 'feedback_fail_text', 'feedback_fail_audio_url'),
+]
+
+AudioSlot = namedtuple('AudioSlot', ['model', 'pk', 'url_field', 'url', 'cle'])
+
+
+def collect_slots(topic_ids=None, manquants=False):
+    """
+    Champs audio à remplir, avec la clé audio de leur texte.
+
+    Args:
+        topic_ids: Limite aux topics (et à leurs exercices), None = tous
+        manquants: Ignore les champs qui ont déjà une URL
+
+    Returns:
+        tuple: (liste d'AudioSlot, dict clé -> texte des textes distincts)
+    """
+    slots, texts = [], {}
+    for model, text_field, url_field in CHAMPS_AUDIO:
+        rows = model.objects.exclude(**{text_field: ''}).exclude(**{f'{text_field}__isnull': True})
+        if topic_ids is not None:
+            rows = rows.filter(**{'id__in' if model is Topic else 'topic_id__in': topic_ids})
+        if manquants:
+            rows = rows.filter(Q(**{f'{url_field}__isnull': True}) | Q(**{url_field: ''}))
+        for pk, text, url in rows.values_list('id', text_field, url_field).iterator():
+            if not text.strip():
+                continue
+            h = asset_key(text)
+            texts.setdefault(h, text)
+            slots.append(AudioSlot(model, pk, url_field, url, h))
+    return slots, texts
+
+
+def render_audio(texts, concurrency=4, lang='fr'):
+    """
+    Rend les textes en parallèle ; ceux déjà indexés ne sont pas rendus.
+    Les threads ne font qu'écrire les fichiers, l'index est mis à jour ici,
+    une fois l'audio publié (les rendus suivants n'attendent pas les envois).
+
+    Args:
+        texts: dict clé -> texte (clés de asset_key avec `lang`)
+        concurrency: Rendus gTTS simultanés
+
+    Yields:
+        tuple: (clé, URL ou None), dans l'ordre d'achèvement
+    """
+    known = audio_store.lookup_many(texts)
+    yield from known.items()
+
+    transcode = variants.available()
+    pool = ThreadPoolExecutor(max_workers=max(concurrency, 1), thread_name_prefix='audio')
+    try:
+        futures = {
+            pool.submit(_render, h, text, lang, transcode): h
+            for h, text in texts.items() if h not in known
+        }
+        pending = set(futures)
+        uploading = {}  # clé -> (asset, envois en cours)
+        while pending or uploading:
+            waiting = pending | {f for _, uploads in uploading.values() for f in uploads}
+            done, _ = wait(waiting, return_when=FIRST_COMPLETED) if waiting else (set(), set())
+            for future in done & pending:
+                pending.discard(future)
+                try:
+                    asset = future.result()
+                except Exception as e:
+                    logger.error(f"Erreur génération audio: {e}")
+                    yield futures[future], None
+                    continue
+                uploading[futures[future]] = (asset, audio_store.publish(asset))
+            for h, (asset, uploads) in list(uploading.items()):
+                if not all(f.done() for f in uploads):
+                    continue
+                del uploading[h]
+                try:
+                    storage.wait_published(uploads)
+                except Exception as e:
+                    logger.error(f"Erreur d'envoi de l'audio {h}: {e}")
+                    yield h, None
+                    continue
+                audio_store.index([asset])
+                yield h, asset_url(asset.chemin)
+    finally:
+        # Interruption : les rendus pas encore commencés sont abandonnés
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _render(key, text, lang, transcode):
+    asset = audio_store.render(key, text, lang)
+    if transcode:
+        for cle in [key, *(asset.morceaux or [])]:
+            try:
+                variants.transcode(cle)
+            except Exception as e:
+                # L'original reste servi : transcoder_audio reprendra cette variante
+                logger.warning(f"Transcodage de {cle} impossible: {e}")
+    return asset
+
+
+def write_urls(slots, urls, batch_size=500):
+    """
+    Réécrit les URLs rendues, par bulk_update du seul champ URL concerné.
+
+    Args:
+        slots: AudioSlot à mettre à jour
+        urls: dict clé -> URL (les clés absentes ou sans URL sont ignorées)
+
+    Returns:
+        int: Champs mis à jour
+    """
+    groups = {}
+    for slot in slots:
+        url = urls.get(slot.cle)
+        if url and url != slot.url:
+            groups.setdefault((slot.model, slot.url_field), []).append(slot.model(id=slot.pk, **{slot.url_field: url}))
+
+    count = 0
+    for (model, url_field), objs in groups.items():
+        model.objects.bulk_update(objs, fields=[url_field], batch_size=batch_size)
+        count += len(objs)
+    return count
+
+
+class Checkpoint:
+    """
+    Clés déjà rendues et réécrites en base, dans un fichier JSON (écriture
+    atomique par renommage). Ignoré si la sélection a changé.
+    """
+
+    def __init__(self, path, selection):
+        self.path = path
+        self.selection = selection
+        self.done = {}
+        if path.exists():
+            try:
+                data = json.loads(path.read_text())
+            except ValueError:
+                logger.warning(f"Fichier de reprise illisible, ignoré: {path}")
+                data = {}
+            if data.get('selection') == selection:
+                self.done = data.get('faits', {})
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix('.tmp')
+        tmp.write_text(json.dumps({'selection': self.selection, 'faits': self.done}))
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        self.done = {}
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,297 @@
+"""
+Stockage des audios adressé par le contenu.
+
+La clé d'un audio est le SHA-256 du texte réellement lu (Markdown retiré,
+espaces réduits), de la langue et du débit : deux textes qui ne diffèrent que
+par leur mise en forme partagent le même fichier.
+Les fichiers sont rangés en sous-répertoires (audio/ab/cd/<clé>.mp3) pour ne
+pas accumuler des centaines de milliers de fichiers dans un seul dossier, et
+indexés dans la table AudioAsset (taille, durée, références) : savoir si un
+audio existe coûte une requête indexée, pas un accès disque.
+
+Un rendu est écrit dans un fichier temporaire du même dossier puis renommé :
+un client ne reçoit jamais un fichier à moitié écrit. Les rendus simultanés
+d'une même clé dans un processus n'en font qu'un ; entre processus, le
+renommage atomique et la contrainte d'unicité de la clé suffisent.
+
+Un texte long (un cours) est découpé en morceaux aux fins de paragraphe et de
+phrase (AUDIO_CHUNK_CARACTERES), rendus en parallèle comme des audios à part
+entière puis joints trame à trame en un seul mp3. L'index garde la liste des
+morceaux (manifeste) : un client peut lire le premier morceau sans attendre
+le fichier complet, et une révision du cours ne fait rendre que les morceaux
+dont le texte a changé.
+
+Avec un stockage partagé (MEDIA_STORAGE=s3, voir tuteur_intelligent.storage),
+le dossier local sert de cache : un audio n'est indexé qu'une fois publié, et
+un fichier rendu par un autre nœud est rapatrié au lieu d'être rendu à nouveau.
+"""
+import re
+import hashlib
+import logging
+import threading
+import unicodedata
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from gtts import gTTS
+
+from ia.models import AudioAsset
+from ia.mp3 import concat, duration_ms
+from tuteur_intelligent import storage
+from tuteur_intelligent.storage import atomic_file
+
+logger = logging.getLogger(__name__)
+
+# Paragraphes : ligne vide, ou ligne qui commence par un titre ou un élément de liste
+_PARAGRAPHES = re.compile(r'\n\s*\n|\n(?=\s*(?:#|\d+\.\s|[-*]\s))')
+_PHRASES = re.compile(r'(?<=[.!?…:;])\s+')
+# URL d'un audio du stockage : .../audio/ab/cd/<clé>.mp3
+_URL_STOCKAGE = re.compile(r'/audio/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})\.mp3$')
+
+
+def spoken_text(text):
+    """Texte réellement lu : sans Markdown (Sandy ne lit pas les ** ni les #), espaces réduits."""
+    text = unicodedata.normalize('NFC', text or '')
+    text = re.sub(r'\*+', '', text)
+    text = re.sub(r'#+\s*', '', text)
+    return ' '.join(text.split())
+
+
+def split_chunks(text, limit=None):
+    """
+    Morceaux lus d'un texte, d'au plus `limit` caractères (AUDIO_CHUNK_CARACTERES).
+
+    Un morceau ne déborde jamais sur le paragraphe suivant (sauf un titre,
+    rattaché à son paragraphe) : modifier un paragraphe ne change pas les
+    morceaux des autres. Dans un paragraphe, les phrases sont regroupées ;
+    une phrase trop longue est coupée à une virgule, sinon à un espace.
+
+    Returns:
+        list: Textes lus (voir spoken_text), dans l'ordre
+    """
+    limit = limit or settings.AUDIO_CHUNK_CARACTERES
+    chunks, current = [], ''
+    for paragraph in _PARAGRAPHES.split(text or ''):
+        for sentence in _sentences(spoken_text(paragraph), limit):
+            if current and len(current) + 1 + len(sentence) > limit:
+                chunks.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}" if current else sentence
+        if len(current) > limit // 5:
+            chunks.append(current)
+            current = ''
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _sentences(spoken, limit):
+    for sentence in _PHRASES.split(spoken):
+        while len(sentence) > limit:
+            cut = sentence.rfind(', ', 0, limit) + 1
+            if cut < limit // 2:
+                cut = sentence.rfind(' ', 0, limit)
+            if cut <= 0:
+                cut = limit
+            yield sentence[:cut].strip()
+            sentence = sentence[cut:].strip()
+        if sentence:
+            yield sentence
+
+
+def asset_key(text, lang='fr', slow=False):
+    """Clé de l'audio d'un texte brut."""
+    return _key(spoken_text(text), lang, slow)
+
+
+def _key(spoken, lang, slow):
+    return hashlib.sha256(f"{lang}|{int(bool(slow))}|{spoken}".encode('utf-8')).hexdigest()
+
+
+def asset_path(key):
+    """Chemin relatif à MEDIA_ROOT : audio/ab/cd/<clé>.mp3."""
+    return f"audio/{key[:2]}/{key[2:4]}/{key}.mp3"
+
+
+def asset_file(key):
+    """Fichier de la clé sous AUDIO_STORAGE_PATH."""
+    return settings.AUDIO_STORAGE_PATH / key[:2] / key[2:4] / f"{key}.mp3"
+
+
+def asset_url(chemin):
+    return f"{settings.MEDIA_URL}{chemin}"
+
+
+def url_key(url):
+    """Clé de l'audio du stockage servi à `url`, ou None (URL vide ou externe)."""
+    match = _URL_STOCKAGE.search(url or '')
+    return match.group(1) if match else None
+
+
+def _render_gtts(spoken, lang, slow, path):
+    gTTS(text=spoken, lang=lang, slow=slow).save(str(path))
+
+
+class AudioStore:
+    """Rendu, écriture atomique et index des audios. Thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}  # clé -> threading.Event du rendu en cours
+
+    def lookup_many(self, keys):
+        """
+        Returns:
+            dict: clé -> URL des audios déjà indexés (une requête)
+        """
+        rows = AudioAsset.objects.filter(cle__in=list(keys)).values_list('cle', 'chemin')
+        return {cle: asset_url(chemin) for cle, chemin in rows}
+
+    def url_for(self, text, lang='fr', slow=False):
+        """
+        URL de l'audio du texte, rendu et indexé au premier appel.
+
+        Returns:
+            str: URL de l'audio, ou None si le texte est vide
+        """
+        spoken = spoken_text(text)
+        if not spoken:
+            return None
+        key = _key(spoken, lang, slow)
+        url = self.lookup_many([key]).get(key)
+        if url:
+            return url
+        asset = self.render(key, text, lang, slow)
+        storage.wait_published(self.publish(asset))
+        self.index([asset])
+        from ia.variants import schedule  # ia.variants importe ce module
+        schedule(asset)
+        return asset_url(asset.chemin)
+
+    def manifest(self, url):
+        """
+        Morceaux de l'audio servi à `url`, dans l'ordre de lecture.
+
+        Returns:
+            list: [{url, debut_ms, duree_ms}], ou None pour un audio d'un seul morceau (ou inconnu)
+        """
+        if not url:
+            return None
+        key = url.rsplit('/', 1)[-1].removesuffix('.mp3')
+        keys = AudioAsset.objects.filter(cle=key).values_list('morceaux', flat=True).first()
+        if not keys:
+            return None
+        parts = {
+            cle: (chemin, duree_ms)
+            for cle, chemin, duree_ms in AudioAsset.objects.filter(cle__in=keys).values_list('cle', 'chemin', 'duree_ms')
+        }
+        if len(parts) < len(set(keys)):
+            return None  # Morceau supprimé entre-temps : le fichier complet reste lisible
+        result, debut = [], 0
+        for cle in keys:
+            chemin, duree = parts[cle]
+            result.append({'url': asset_url(chemin), 'debut_ms': debut, 'duree_ms': duree})
+            debut += duree or 0
+        return result
+
+    def render(self, key, text, lang='fr', slow=False):
+        """
+        Écrit le fichier de la clé s'il n'existe pas (sans toucher à la base).
+        Un seul rendu à la fois par clé : les appels concurrents attendent le premier.
+        Un texte de plusieurs morceaux (split_chunks) est rendu morceau par morceau
+        (AUDIO_CHUNK_CONCURRENCY à la fois) puis joint.
+
+        Returns:
+            AudioAsset: Non sauvegardé, taille et durée renseignées ; pour un texte
+            découpé, `morceaux` et `parts` (les AudioAsset des morceaux, à indexer aussi)
+        """
+        chunks = split_chunks(text)
+        if len(chunks) <= 1:
+            return self._render_one(key, spoken_text(text), lang, slow)
+
+        workers = min(settings.AUDIO_CHUNK_CONCURRENCY, len(chunks))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='audio-morceau') as pool:
+            parts = list(pool.map(
+                lambda chunk: self._render_one(_key(chunk, lang, slow), chunk, lang, slow), chunks
+            ))
+        path = asset_file(key)
+        with self._single(key) as owner:
+            if owner and not path.exists():
+                self._join(path, [asset_file(part.cle) for part in parts])
+        if not path.exists():
+            raise FileNotFoundError(f"Rendu audio absent: {path}")
+        asset = self._asset(key, path, lang, slow)
+        asset.morceaux = [part.cle for part in parts]
+        asset.parts = parts
+        return asset
+
+    def publish(self, asset):
+        """
+        Envoie en arrière-plan l'audio et ses morceaux vers le stockage partagé.
+
+        Returns:
+            list: Futures des envois (vide en stockage local)
+        """
+        return storage.publish(
+            (part.chemin, asset_file(part.cle)) for part in [*getattr(asset, 'parts', ()), asset]
+        )
+
+    def index(self, assets):
+        """Indexe les fichiers rendus et leurs morceaux (ceux déjà indexés par un autre processus sont ignorés)."""
+        rows = {}
+        for asset in assets:
+            for part in getattr(asset, 'parts', ()):
+                rows.setdefault(part.cle, part)
+            rows[asset.cle] = asset
+        AudioAsset.objects.bulk_create(list(rows.values()), ignore_conflicts=True)
+
+    def _render_one(self, key, spoken, lang, slow):
+        path = asset_file(key)
+        with self._single(key) as owner:
+            # Déjà rendu par un autre processus, une révision ou un autre nœud
+            if owner and not path.exists() and not storage.fetch(asset_path(key), path):
+                self._write(path, spoken, lang, slow)
+        if not path.exists():
+            raise FileNotFoundError(f"Rendu audio absent: {path}")
+        return self._asset(key, path, lang, slow)
+
+    @contextmanager
+    def _single(self, key):
+        """Vrai pour le premier appelant de la clé ; les suivants attendent sa sortie et reçoivent faux."""
+        with self._lock:
+            event = self._inflight.get(key)
+            owner = event is None
+            if owner:
+                event = self._inflight[key] = threading.Event()
+        if not owner:
+            event.wait()
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            event.set()
+
+    def _write(self, path, spoken, lang, slow):
+        with atomic_file(path) as tmp:
+            _render_gtts(spoken, lang, slow, tmp)
+        logger.info(f"Audio généré: {path.name}")
+
+    def _join(self, path, part_files):
+        with atomic_file(path) as tmp:
+            tmp.write_bytes(concat(f.read_bytes() for f in part_files))
+        logger.info(f"Audio joint ({len(part_files)} morceaux): {path.name}")
+
+    def _asset(self, key, path, lang, slow):
+        data = path.read_bytes()
+        return AudioAsset(
+            cle=key, chemin=asset_path(key), lang=lang, lent=bool(slow),
+            taille=len(data), duree_ms=duration_ms(data),
+        )
+
+
+audio_store = AudioStore()
@@ -0,0 +1,133 @@
+"""
+Disjoncteur (circuit breaker) autour du fournisseur IA.
+
+Trois états, partagés entre workers via ia.state.SharedState :
+  - fermé : les appels passent, les échecs consécutifs sont comptés ;
+  - ouvert : après IA_BREAKER_FAILURE_THRESHOLD échecs, plus aucun appel
+    pendant IA_BREAKER_RESET_TIMEOUT secondes (réponse de repli immédiate) ;
+  - semi-ouvert : un seul appel d'essai ; un succès referme le circuit,
+    un échec le rouvre, un essai conclu sans verdict rend son créneau.
+Un appel interactif plus lent que IA_BREAKER_SLOW_CALL compte comme un échec
+(les appels batch, plus longs par nature, ne passent pas de durée).
+"""
+import time
+import logging
+
+from django.conf import settings
+
+from ia.state import SharedState
+
+logger = logging.getLogger(__name__)
+
+FERME = 'closed'
+OUVERT = 'open'
+SEMI_OUVERT = 'half_open'
+
+
+class CircuitBreaker:
+    """Disjoncteur fermé / ouvert / semi-ouvert, commun à tous les processus."""
+
+    def __init__(self, name='groq'):
+        self.state = SharedState(f"breaker_{name}")
+
+    def allow(self):
+        """
+        Indique si un appel peut partir. En semi-ouvert, un seul appel
+        d'essai est autorisé à la fois.
+
+        Returns:
+            bool: False si le circuit est ouvert
+        """
+        now = time.time()
+        with self.state.locked() as s:
+            etat = s.get('etat', FERME)
+            if etat == FERME:
+                return True
+            if etat == OUVERT and now < s['ouvert_jusqua']:
+                return False
+            # Délai écoulé (ou essai précédent resté sans réponse) : un nouvel essai
+            if etat == SEMI_OUVERT and now < s.get('essai_jusqua', 0):
+                return False
+            s['etat'] = SEMI_OUVERT
+            s['essai_jusqua'] = now + settings.GROQ_TIMEOUT
+            logger.info("Disjoncteur IA semi-ouvert: appel d'essai")
+            return True
+
+    def is_open(self):
+        """
+        Lecture rapide, sans réserver d'appel d'essai : True tant que le
+        circuit refuse les appels.
+        """
+        s = self.state.read()
+        etat = s.get('etat', FERME)
+        if etat == OUVERT:
+            return time.time() < s['ouvert_jusqua']
+        if etat == SEMI_OUVERT:
+            return time.time() < s.get('essai_jusqua', 0)
+        return False
+
+    def record_success(self, duration=0):
+        """Enregistre un appel réussi (un appel trop lent compte comme un échec)."""
+        if duration > settings.IA_BREAKER_SLOW_CALL:
+            logger.warning(f"Appel IA lent ({duration:.1f}s) compté comme échec")
+            self.record_failure()
+            return
+        with self.state.locked() as s:
+            if s.get('etat', FERME) != FERME:
+                logger.info("Disjoncteur IA refermé")
+            s.update(etat=FERME, echecs=0)
+            s.pop('essai_jusqua', None)
+
+    def record_failure(self):
+        """Enregistre un échec ; ouvre le circuit au seuil (ou si l'essai échoue)."""
+        now = time.time()
+        with self.state.locked() as s:
+            etat = s.get('etat', FERME)
+            s['echecs'] = s.get('echecs', 0) + 1
+            s['dernier_echec'] = now
+            if etat == SEMI_OUVERT or s['echecs'] >= settings.IA_BREAKER_FAILURE_THRESHOLD:
+                s['etat'] = OUVERT
+                s['ouvert_jusqua'] = now + settings.IA_BREAKER_RESET_TIMEOUT
+                s['ouvertures'] = s.get('ouvertures', 0) + 1
+                s.pop('essai_jusqua', None)
+                logger.error(
+                    f"Disjoncteur IA ouvert pour {settings.IA_BREAKER_RESET_TIMEOUT}s "
+                    f"({s['echecs']} échecs)"
+                )
+
+    def release_probe(self):
+        """
+        Rend le créneau d'essai d'un appel semi-ouvert terminé sans succès ni
+        échec enregistré (429, modèle introuvable, limiteur) : l'appel suivant
+        devient l'essai, sans attendre l'expiration de essai_jusqua. Sans
+        effet si le circuit est fermé ou ouvert.
+        """
+        if self.state.read().get('etat', FERME) != SEMI_OUVERT:
+            return
+        with self.state.locked() as s:
+            if s.get('etat', FERME) == SEMI_OUVERT:
+                s.pop('essai_jusqua', None)
+
+    def reset(self):
+        """Referme le circuit (tests, intervention manuelle)."""
+        with self.state.locked() as s:
+            s.clear()
+
+    def snapshot(self):
+        """État courant pour l'endpoint de statut."""
+        s = self.state.read()
+        now = time.time()
+        etat = s.get('etat', FERME)
+        if etat == OUVERT and now >= s['ouvert_jusqua']:
+            etat = SEMI_OUVERT  # Le prochain appel sera un essai
+        return {
+            'etat': etat,
+            'echecs_consecutifs': s.get('echecs', 0),
+            'reouverture_dans': round(max(s.get('ouvert_jusqua', 0) - now, 0), 1),
+            'ouvertures': s.get('ouvertures', 0),
+            'seuil_echecs': settings.IA_BREAKER_FAILURE_THRESHOLD,
+            'delai_reouverture': settings.IA_BREAKER_RESET_TIMEOUT,
+        }
+
+
+circuit_breaker = CircuitBreaker()
@@ -0,0 +1,150 @@
+"""
+Paquets audio hors ligne, par topic ou par classe (mode vocal CP1/CP2).
+
+En CP1/CP2, chaque exercice fait jouer l'audio de sa question puis celui du
+retour (réussite ou échec) : une leçon, ce sont des dizaines de petites
+requêtes sur un réseau lent. Un paquet réunit tous les audios d'un topic (ou
+d'une classe) dans une archive zip, avec un manifeste (manifest.json) qui
+associe matières, topics et exercices à leurs fichiers : le client le
+télécharge une fois et joue la leçon hors ligne.
+
+- Un fichier par clé audio (audio/<clé>.mp3) : les retours « Bravo ! »
+  communs à beaucoup d'exercices ne sont rangés qu'une fois.
+- Format : l'original (mp3) ou une variante légère (ia.variants), fichier par
+  fichier selon ce qui est déjà transcodé.
+- Les audios sont déjà compressés : ils sont rangés tels quels (ZIP_STORED),
+  seul le manifeste est compressé.
+- Version : SHA-256 du manifeste, calculé depuis l'index sans lire les
+  fichiers. L'archive est rangée sous bundles/<portée>/<format>/<version>.zip :
+  elle n'est reconstruite que si le contenu de sa portée a changé, et sa
+  version sert d'ETag. Les versions précédentes sont supprimées.
+- Archive déterministe (dates fixes, entrées triées) : deux nœuds qui
+  construisent la même version écrivent les mêmes octets.
+"""
+import json
+import shutil
+import hashlib
+import logging
+import zipfile
+from pathlib import Path
+
+from django.conf import settings
+
+from core.models import Exercice, Topic
+from ia.audiostore import asset_file, asset_path, url_key
+from ia.models import AudioAsset
+from ia.variants import VARIANTES, variant_file, variant_name
+from tuteur_intelligent import storage
+from tuteur_intelligent.storage import atomic_file
+
+logger = logging.getLogger(__name__)
+
+FORMAT_ORIGINAL = 'mp3'
+MANIFESTE = 'manifest.json'
+
+_DATE_FIXE = (1980, 1, 1, 0, 0, 0)
+
+
+def topic_manifest(topic, variante=None):
+    """Manifeste du paquet d'un topic (`variante` : nom de ia.variants, ou None pour l'original)."""
+    return _manifest(f"topic-{topic.id}", Topic.objects.filter(id=topic.id), variante)
+
+
+def classe_manifest(classe, variante=None):
+    """Manifeste du paquet de tous les topics d'une classe."""
+    return _manifest(f"classe-{classe}", Topic.objects.filter(classe=classe), variante)
+
+
+def _manifest(portee, topics, variante):
+    """
+    Returns:
+        dict: {portee, format, matieres, topics, exercices, fichiers, version} ;
+        fichiers : nom dans l'archive -> {duree_ms} ; un audio absent de
+        l'index (ou d'URL externe) est noté None
+    """
+    topics = list(topics.select_related('matiere').order_by('matiere__ordre', 'ordre', 'id'))
+    exercices = list(
+        Exercice.objects.filter(topic__in=topics).order_by('topic_id', 'difficulte', 'id').values_list(
+            'id', 'topic_id', 'question_audio_url', 'feedback_success_audio_url', 'feedback_fail_audio_url',
+        )
+    )
+    urls = [t.audio_url for t in topics] + [t.matiere.audio_intro_url for t in topics]
+    urls += [url for row in exercices for url in row[2:]]
+    durees = dict(
+        AudioAsset.objects.filter(cle__in={url_key(url) for url in urls} - {None}).values_list('cle', 'duree_ms')
+    )
+
+    fichiers = {}
+
+    def entry(url):
+        key = url_key(url)
+        if key not in durees:
+            return None
+        nom = f"audio/{key}.mp3"
+        if variante and storage.exists(variant_name(key, variante), variant_file(key, variante)):
+            nom = f"audio/{key}{VARIANTES[variante].suffixe}"
+        fichiers[nom] = {'duree_ms': durees[key]}
+        return nom
+
+    manifeste = {
+        'portee': portee,
+        'format': variante or FORMAT_ORIGINAL,
+        'matieres': {t.matiere.nom: {'audio': entry(t.matiere.audio_intro_url)} for t in topics},
+        'topics': {
+            str(t.id): {'titre': t.titre, 'matiere': t.matiere.nom, 'classe': t.classe, 'audio': entry(t.audio_url)}
+            for t in topics
+        },
+        'exercices': {
+            str(pk): {'topic': topic_id, 'question': entry(question), 'succes': entry(succes), 'echec': entry(echec)}
+            for pk, topic_id, question, succes, echec in exercices
+        },
+        'fichiers': fichiers,
+    }
+    manifeste['version'] = hashlib.sha256(json.dumps(manifeste, sort_keys=True).encode('utf-8')).hexdigest()
+    return manifeste
+
+
+def bundle_name(manifeste):
+    """Chemin relatif à MEDIA_ROOT : bundles/<portée>/<format>/<version>.zip."""
+    return f"bundles/{manifeste['portee']}/{manifeste['format']}/{manifeste['version']}.zip"
+
+
+def build(manifeste):
+    """
+    Écrit l'archive du manifeste si cette version n'existe pas encore et
+    supprime les versions précédentes de la même portée et du même format.
+
+    Returns:
+        tuple: (chemin de l'archive, vrai si elle vient d'être construite)
+    """
+    path = Path(settings.MEDIA_ROOT) / bundle_name(manifeste)
+    if path.exists():
+        return path, False
+
+    with atomic_file(path) as tmp:
+        with zipfile.ZipFile(tmp, 'w') as archive:
+            info = zipfile.ZipInfo(MANIFESTE, _DATE_FIXE)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, json.dumps(manifeste, ensure_ascii=False, sort_keys=True))
+            for nom in sorted(manifeste['fichiers']):
+                info = zipfile.ZipInfo(nom, _DATE_FIXE)
+                info.compress_type = zipfile.ZIP_STORED
+                with _source(nom).open('rb') as src, archive.open(info, 'w') as dst:
+                    shutil.copyfileobj(src, dst, 1 << 16)
+
+    for old in path.parent.glob('*.zip'):
+        if old != path:
+            old.unlink(missing_ok=True)
+    logger.info(f"Paquet audio construit: {bundle_name(manifeste)} ({len(manifeste['fichiers'])} fichiers)")
+    return path, True
+
+
+def _source(nom):
+    """Fichier local d'une entrée audio/<clé><suffixe>, rapatrié du stockage partagé si besoin."""
+    key, _, suffixe = nom.removeprefix('audio/').partition('.')
+    variante = next((v for v, spec in VARIANTES.items() if spec.suffixe == f'.{suffixe}'), None)
+    path = variant_file(key, variante) if variante else asset_file(key)
+    name = variant_name(key, variante) if variante else asset_path(key)
+    if not path.exists() and not storage.fetch(name, path):
+        raise FileNotFoundError(f"Audio absent: {path}")
+    return path
@@ -0,0 +1,179 @@
+"""
+Cache des réponses IA adressé par contenu.
+
+La clé est le SHA-256 de la requête (modèle, messages système/utilisateur,
+température, max_tokens) : un prompt identique ne repaie jamais ses tokens.
+Deux niveaux :
+  - mémoire : LRU par processus, borné en nombre d'entrées ;
+  - base de données : table ReponseIACache partagée par les workers et les
+    commandes, avec TTL et taille maximale (les entrées les moins récemment
+    utilisées sont supprimées en premier).
+"""
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(model, messages, temperature, max_tokens, **params):
+    """Hash stable de tout ce qui détermine la réponse du modèle (params : response_format...)."""
+    parts = [model, messages, temperature, max_tokens]
+    if params:
+        parts.append(params)  # Absent si vide : les clés existantes restent valides
+    payload = json.dumps(
+        parts,
+        ensure_ascii=False, sort_keys=True, separators=(',', ':'),
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    Cache à deux niveaux (LRU mémoire + base) avec compteurs hit/miss.
+
+    Toutes les erreurs de la base sont absorbées : le cache ne doit jamais
+    empêcher un appel IA d'aboutir.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._stores_since_eviction = 0
+        self.counters = {'hits_memoire': 0, 'hits_db': 0, 'misses': 0, 'ecritures': 0}
+
+    def get(self, key):
+        """
+        Retourne la réponse en cache ou None.
+
+        Args:
+            key: Clé calculée par make_key
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[1] > now:
+                self._memory.move_to_end(key)
+                self.counters['hits_memoire'] += 1
+                return entry[0]
+            if entry:
+                del self._memory[key]
+
+        value = self._get_db(key)
+        with self._lock:
+            if value is None:
+                self.counters['misses'] += 1
+            else:
+                self.counters['hits_db'] += 1
+                self._remember(key, value, now + settings.IA_CACHE_TTL)
+        return value
+
+    def set(self, key, value, model=''):
+        """Enregistre une réponse dans les deux niveaux."""
+        with self._lock:
+            self._remember(key, value, time.time() + settings.IA_CACHE_TTL)
+            self.counters['ecritures'] += 1
+            self._stores_since_eviction += 1
+            evict = self._stores_since_eviction >= settings.IA_CACHE_EVICTION_INTERVAL
+            if evict:
+                self._stores_since_eviction = 0
+
+        self._set_db(key, value, model)
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """
+        Supprime les entrées expirées puis, au-delà de IA_CACHE_MAX_ENTRIES,
+        les moins récemment utilisées.
+
+        Returns:
+            int: Nombre d'entrées supprimées
+        """
+        from ia.models import ReponseIACache
+
+        try:
+            deleted, _ = ReponseIACache.objects.filter(date_expiration__lte=timezone.now()).delete()
+            excess = ReponseIACache.objects.count() - settings.IA_CACHE_MAX_ENTRIES
+            if excess > 0:
+                old_ids = list(
+                    ReponseIACache.objects.order_by('dernier_acces').values_list('id', flat=True)[:excess]
+                )
+                deleted += ReponseIACache.objects.filter(id__in=old_ids).delete()[0]
+            if deleted:
+                logger.info(f"Cache IA: {deleted} entrées supprimées")
+            return deleted
+        except Exception as e:
+            logger.warning(f"Cache IA: éviction impossible: {e}")
+            return 0
+
+    def clear(self, memory_only=False):
+        """Vide le cache mémoire (et la table si memory_only=False)."""
+        with self._lock:
+            self._memory.clear()
+        if not memory_only:
+            from ia.models import ReponseIACache
+            ReponseIACache.objects.all().delete()
+
+    def stats(self):
+        """Compteurs du processus + taille des deux niveaux."""
+        from ia.models import ReponseIACache
+
+        with self._lock:
+            stats = dict(self.counters, entrees_memoire=len(self._memory))
+        try:
+            stats['entrees_db'] = ReponseIACache.objects.count()
+        except Exception:
+            stats['entrees_db'] = None
+        lookups = stats['hits_memoire'] + stats['hits_db'] + stats['misses']
+        stats['taux_hit'] = round((stats['hits_memoire'] + stats['hits_db']) / lookups, 3) if lookups else 0.0
+        return stats
+
+    def _remember(self, key, value, expires_at):
+        # Appelé sous self._lock
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > settings.IA_CACHE_LRU_SIZE:
+            self._memory.popitem(last=False)
+
+    def _get_db(self, key):
+        from ia.models import ReponseIACache
+
+        try:
+            now = timezone.now()
+            entry = ReponseIACache.objects.filter(cle=key, date_expiration__gt=now).only('id', 'reponse').first()
+            if entry is None:
+                return None
+            ReponseIACache.objects.filter(id=entry.id).update(hits=F('hits') + 1, dernier_acces=now)
+            return entry.reponse
+        except Exception as e:
+            logger.warning(f"Cache IA: lecture impossible: {e}")
+            return None
+
+    def _set_db(self, key, value, model):
+        from ia.models import ReponseIACache
+
+        try:
+            now = timezone.now()
+            ReponseIACache.objects.update_or_create(
+                cle=key,
+                defaults={
+                    'modele': model,
+                    'reponse': value,
+                    'date_expiration': now + timedelta(seconds=settings.IA_CACHE_TTL),
+                    'dernier_acces': now,
+                },
+            )
+        except Exception as e:
+            logger.warning(f"Cache IA: écriture impossible: {e}")
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,158 @@
+"""
+Registre de clients Groq partagés au niveau du processus.
+
+Un client Groq (et son pool de connexions HTTP keep-alive) est créé une seule
+fois par processus puis réutilisé par tous les appels de ia.services, ce qui
+évite de payer la poignée de main TLS et l'ouverture de connexion à chaque
+message. Après un fork (workers gunicorn), le registre est vidé dans l'enfant
+pour ne jamais partager de sockets avec le processus parent.
+"""
+import os
+import asyncio
+import threading
+import weakref
+import logging
+
+import httpx
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def build_http_client():
+    """
+    Construit le client httpx (pool keep-alive + timeouts) à partir des settings.
+
+    Returns:
+        httpx.Client: Client HTTP configuré
+    """
+    return httpx.Client(limits=build_limits(), timeout=build_timeout())
+
+
+def build_async_http_client():
+    """Équivalent asynchrone de build_http_client (même pool, mêmes timeouts)."""
+    return httpx.AsyncClient(limits=build_limits(), timeout=build_timeout())
+
+
+def build_limits():
+    """Taille du pool et durée de vie des connexions keep-alive."""
+    return httpx.Limits(
+        max_connections=settings.GROQ_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.GROQ_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=settings.GROQ_POOL_KEEPALIVE_EXPIRY,
+    )
+
+
+def build_timeout(timeout=None):
+    """Timeout des requêtes IA (défaut GROQ_TIMEOUT), avec un délai de connexion plus court."""
+    timeout = settings.GROQ_TIMEOUT if timeout is None else timeout
+    return httpx.Timeout(timeout, connect=min(settings.GROQ_CONNECT_TIMEOUT, timeout))
+
+
+class ClientRegistry:
+    """
+    Registre thread-safe de clients API, indexés par (classe, clé API, URL).
+
+    La classe du client fait partie de la clé : un client substitué (tests,
+    serveur local) ne récupère jamais une instance créée pour un autre.
+    Les clients asynchrones sont en plus rattachés à leur boucle asyncio.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._pid = os.getpid()
+
+    def get(self, factory, api_key, base_url=None):
+        """
+        Retourne le client partagé, en le créant au premier appel.
+
+        Args:
+            factory: Classe du client (ex: groq.Groq)
+            api_key: Clé API
+            base_url: URL de l'API (None = URL par défaut du SDK)
+
+        Returns:
+            Instance partagée du client
+        """
+        if self._pid != os.getpid():
+            self._after_fork()
+
+        key = (factory, api_key, base_url)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = factory(
+                    api_key=api_key,
+                    base_url=base_url,
+                    http_client=build_http_client(),
+                    timeout=build_timeout(),
+                    max_retries=0,  # Rejeux gérés par ia.services (limiteur de débit)
+                )
+                self._clients[key] = client
+                logger.debug(f"Client IA créé (pid={self._pid}, pool={settings.GROQ_POOL_MAX_CONNECTIONS})")
+        return client
+
+    def get_async(self, factory, api_key, base_url=None):
+        """
+        Retourne le client asynchrone partagé par la boucle asyncio courante.
+
+        Un client httpx asynchrone ne peut pas changer de boucle : chaque
+        boucle (ex: un asyncio.run() par commande) a donc son propre pool.
+        """
+        if self._pid != os.getpid():
+            self._after_fork()
+
+        loop = asyncio.get_running_loop()
+        clients = self._async_clients.setdefault(loop, {})
+        key = (factory, api_key, base_url)
+        client = clients.get(key)
+        if client is None:
+            client = factory(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=build_async_http_client(),
+                timeout=build_timeout(),
+                max_retries=0,  # Rejeux gérés par ia.services (limiteur de débit)
+            )
+            clients[key] = client
+        return client
+
+    async def aclose_loop(self):
+        """Ferme les clients asynchrones de la boucle courante avant sa fin."""
+        clients = self._async_clients.pop(asyncio.get_running_loop(), {})
+        for client in clients.values():
+            try:
+                await client.close()
+            except Exception as e:
+                logger.debug(f"Fermeture client IA async: {e}")
+
+    def close(self):
+        """Ferme tous les clients du processus courant (arrêt, tests)."""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            try:
+                client.close()
+            except Exception as e:
+                logger.debug(f"Fermeture client IA: {e}")
+
+    def _after_fork(self):
+        # Les sockets appartiennent au parent : on oublie les clients sans
+        # les fermer, sinon on couperait les connexions du parent.
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._pid = os.getpid()
+
+
+client_registry = ClientRegistry()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=client_registry._after_fork)
@@ -0,0 +1,209 @@
+"""
+Détection des exercices quasi-dupliqués (MinHash + LSH, par topic).
+
+Seule la question est comparée : les options (« Vrai / Faux », chiffres de
+1 à 4...) se ressemblent d'un exercice à l'autre et masqueraient une question
+différente. La question est découpée en mots significatifs (ia.text.tokenize :
+sans accents, ponctuation ni mots vides), puis en shingles de mots (mots seuls
+et paires de mots voisins) : un mot changé (« droits » / « devoirs ») fait
+perdre trois shingles. Une signature MinHash de 64 valeurs et des bandes LSH
+trouvent les candidats ; deux exercices sont quasi-dupliqués quand la
+similarité de Jaccard exacte de leurs shingles atteint IA_DEDUP_THRESHOLD et
+qu'ils citent les mêmes nombres (« 0 x 10 » et « 1 x 100 » restent distincts).
+
+L'index est construit à la demande, topic par topic, depuis les lignes
+Exercice existantes, puis complété à chaque insertion. Chaque accès le
+confronte à la base (COUNT et MAX(id) du topic) : les exercices créés par
+d'autres processus (workers, generer_exercices) sont ajoutés avant toute
+comparaison, et une suppression faite ailleurs fait recharger le topic.
+"""
+import hashlib
+import logging
+import threading
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from core.models import Exercice
+from ia.text import tokenize
+from ia.validation import exercice_fields
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 64  # Cases de la signature
+BANDES = 16  # 16 bandes de 4 cases : candidats dès ~50 % de similarité
+_VIDE = 1 << 58  # Case sans shingle (valeurs sur 58 bits)
+
+# Empreinte d'une question : signature MinHash, shingles et nombres cités
+Empreinte = namedtuple('Empreinte', ['signature', 'shingles', 'nombres'])
+
+
+def fingerprint(question):
+    """Empreinte de la question (les options ne sont pas comparées)."""
+    words = tokenize(question) or ['']
+    shingles = frozenset(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+    nombres = tuple(sorted(w for w in words if w.isdigit()))
+    return Empreinte(signature(shingles), shingles, nombres)
+
+
+def signature(shingles):
+    """
+    Signature MinHash des shingles, en une seule passe (« one permutation
+    hashing ») : chaque shingle est haché une fois et tombe dans une des
+    NUM_PERM cases, qui garde son minimum. Une case vide reprend la valeur de
+    la suivante (densification), décalée pour rester distincte.
+    """
+    cases = [_VIDE] * NUM_PERM
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), 'big')
+        case, valeur = h % NUM_PERM, h >> 6
+        if valeur < cases[case]:
+            cases[case] = valeur
+    pleines = [i for i, v in enumerate(cases) if v != _VIDE]
+    if len(pleines) < NUM_PERM:
+        for i in range(NUM_PERM):
+            if cases[i] == _VIDE:
+                source = next((j for j in pleines if j > i), pleines[0])
+                cases[i] = cases[source] + ((source - i) % NUM_PERM) * _VIDE
+    return tuple(cases)
+
+
+def similarity(a, b):
+    """Similarité de Jaccard des shingles de deux empreintes ; 0 si elles ne citent pas les mêmes nombres."""
+    if a.nombres != b.nombres:
+        return 0.0
+    return len(a.shingles & b.shingles) / len(a.shingles | b.shingles)
+
+
+class _TopicIndex:
+    def __init__(self):
+        self.empreintes = {}
+        self.buckets = defaultdict(set)
+        self.max_id = 0
+
+    def add(self, exercise_id, empreinte):
+        self.empreintes[exercise_id] = empreinte
+        self.max_id = max(self.max_id, exercise_id)
+        for key in _bands(empreinte.signature):
+            self.buckets[key].add(exercise_id)
+
+    def remove(self, exercise_id):
+        empreinte = self.empreintes.pop(exercise_id, None)
+        if empreinte:
+            for key in _bands(empreinte.signature):
+                self.buckets[key].discard(exercise_id)
+
+    def matches(self, empreinte, threshold):
+        """IDs des exercices quasi-identiques, du plus proche (puis plus ancien) au moins proche."""
+        candidates = set()
+        for key in _bands(empreinte.signature):
+            candidates |= self.buckets.get(key, set())
+        scored = sorted((-similarity(empreinte, self.empreintes[c]), c) for c in candidates)
+        return [c for score, c in scored if -score >= threshold]
+
+
+def _bands(sig):
+    rows = NUM_PERM // BANDES
+    return [(b, hash(sig[b * rows:(b + 1) * rows])) for b in range(BANDES)]
+
+
+class NearDuplicateIndex:
+    """Index des exercices par topic, chargé depuis la base et rattrapé à chaque accès."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._topics = {}
+
+    def find(self, topic_id, question, threshold=None):
+        """
+        Returns:
+            int: ID d'un exercice existant quasi-identique, ou None
+        """
+        threshold = settings.IA_DEDUP_THRESHOLD if threshold is None else threshold
+        empreinte = fingerprint(question)
+        with self._lock:
+            matches = self._topic(topic_id).matches(empreinte, threshold)
+        return matches[0] if matches else None
+
+    def add(self, topic_id, exercise_id, question):
+        empreinte = fingerprint(question)
+        with self._lock:
+            self._topic(topic_id).add(exercise_id, empreinte)
+
+    def remove(self, topic_id, exercise_ids):
+        with self._lock:
+            index = self._topics.get(topic_id)
+            if index:
+                for exercise_id in exercise_ids:
+                    index.remove(exercise_id)
+
+    def clusters(self, topic_id, threshold=None):
+        """
+        Groupes d'exercices quasi-dupliqués du topic (union des paires similaires).
+
+        Returns:
+            list: Listes d'IDs triées (groupes de 2 exercices ou plus)
+        """
+        threshold = settings.IA_DEDUP_THRESHOLD if threshold is None else threshold
+        with self._lock:
+            index = self._topic(topic_id)
+            parent = {i: i for i in index.empreintes}
+
+            def root(i):
+                while parent[i] != i:
+                    parent[i] = parent[parent[i]]
+                    i = parent[i]
+                return i
+
+            for exercise_id, empreinte in index.empreintes.items():
+                for other in index.matches(empreinte, threshold):
+                    parent[root(other)] = root(exercise_id)
+
+        groups = defaultdict(list)
+        for exercise_id in parent:
+            groups[root(exercise_id)].append(exercise_id)
+        return sorted((sorted(g) for g in groups.values() if len(g) > 1), key=lambda g: g[0])
+
+    def clear(self):
+        with self._lock:
+            self._topics.clear()
+
+    def _topic(self, topic_id):
+        # Appelé sous self._lock
+        rows = Exercice.objects.filter(topic_id=topic_id)
+        etat = rows.aggregate(n=Count('id'), max_id=Max('id'))
+        index = self._topics.get(topic_id)
+        if index is not None and (etat['max_id'] or 0) > index.max_id:
+            # Exercices créés par un autre processus depuis le dernier accès
+            for exercise_id, question in rows.filter(id__gt=index.max_id).values_list('id', 'question'):
+                index.add(exercise_id, fingerprint(question))
+        if index is None or len(index.empreintes) != etat['n']:
+            # Premier accès, ou exercices supprimés ailleurs : rechargement complet
+            index = self._topics[topic_id] = _TopicIndex()
+            for exercise_id, question in rows.values_list('id', 'question'):
+                index.add(exercise_id, fingerprint(question))
+        return index
+
+
+exercise_index = NearDuplicateIndex()
+
+
+def create_exercice_unique(topic, exercise):
+    """
+    Crée l'exercice validé sauf s'il est quasi-identique à un exercice du topic.
+
+    Args:
+        topic: Instance de Topic
+        exercise: Exercice validé (voir ia.validation.validate_exercise)
+
+    Returns:
+        Exercice: L'exercice créé, ou None si c'est un doublon
+    """
+    duplicate = exercise_index.find(topic.id, exercise['question'])
+    if duplicate:
+        logger.info(f"Exercice ignoré (doublon de #{duplicate}) : {exercise['question'][:60]}")
+        return None
+    exercice = Exercice.objects.create(topic=topic, **exercice_fields(exercise))
+    exercise_index.add(topic.id, exercice.id, exercise['question'])
+    return exercice
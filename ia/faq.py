@@ -0,0 +1,256 @@
+"""
+Cache FAQ du chat : réponses réutilisées pour les questions similaires.
+
+Les élèves d'une même classe posent souvent la même question (« c'est quoi
+une fraction ? ») avec d'autres mots. Chaque réponse du chat à une question
+isolée (sans historique) est gardée dans la table ReponseFAQ ; une nouvelle
+question est comparée aux questions connues de la classe par similarité
+cosinus TF-IDF (index inversé en mémoire, rechargé depuis la base toutes les
+IA_FAQ_RELOAD_INTERVAL secondes pour voir les entrées des autres workers).
+Au-delà de IA_FAQ_THRESHOLD, la réponse est servie sans appel IA.
+
+Les entrées expirent après IA_FAQ_TTL ; au-delà de IA_FAQ_MAX_ENTRIES, les
+moins demandées sont supprimées.
+
+Une réponse gardée est servie à toute la classe : la question est posée sans
+les points de l'élève (voir ia.services.chat_tuteur_ia) et son prénom, mot
+entier, est remplacé par un repère remis au moment de servir.
+"""
+import re
+import math
+import hashlib
+import time
+import logging
+import threading
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from ia.prompts import count_tokens
+from ia.text import normalize, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Le prénom de l'élève est remplacé dans les réponses gardées, puis remis au moment de servir
+NOM_ELEVE = '⟪eleve⟫'
+
+
+def question_key(question):
+    """Clé d'unicité d'une question normalisée (SHA-256)."""
+    return hashlib.sha256(question.encode('utf-8')).hexdigest()
+
+
+class _ClasseIndex:
+    """Index TF-IDF des questions d'une classe."""
+
+    def __init__(self):
+        self.docs = {}  # id -> (termes, réponse, expiration)
+        self.postings = {}  # terme -> ids
+        self.norms = {}
+        self.loaded_at = time.monotonic()
+
+    def add(self, entry_id, question, answer, expires_at):
+        self.remove(entry_id)
+        terms = Counter(tokenize(question))
+        self.docs[entry_id] = (terms, answer, expires_at)
+        for term in terms:
+            self.postings.setdefault(term, set()).add(entry_id)
+        self.norms.clear()  # Les IDF ont changé
+
+    def remove(self, entry_id):
+        doc = self.docs.pop(entry_id, None)
+        if doc:
+            for term in doc[0]:
+                self.postings[term].discard(entry_id)
+            self.norms.clear()
+
+    def search(self, terms):
+        """
+        Returns:
+            tuple: (id, réponse, score cosinus) de la question la plus proche, ou None
+        """
+        query = Counter(terms)
+        idf = {t: self._idf(t) for t in query}
+        query_norm = math.sqrt(sum((tf * idf[t]) ** 2 for t, tf in query.items()))
+        if not query_norm:
+            return None
+
+        now = time.time()
+        best = None
+        candidates = set().union(*(self.postings.get(t, ()) for t in query))
+        for entry_id in candidates:
+            doc_terms, answer, expires_at = self.docs[entry_id]
+            if expires_at <= now:
+                continue
+            dot = sum(tf * idf[t] * doc_terms[t] * idf[t] for t, tf in query.items() if t in doc_terms)
+            score = dot / (query_norm * self._norm(entry_id))
+            if best is None or score > best[2]:
+                best = (entry_id, answer, score)
+        return best
+
+    def _idf(self, term):
+        return math.log((len(self.docs) + 1) / (len(self.postings.get(term, ())) + 1)) + 1
+
+    def _norm(self, entry_id):
+        norm = self.norms.get(entry_id)
+        if norm is None:
+            terms = self.docs[entry_id][0]
+            norm = self.norms[entry_id] = math.sqrt(sum((tf * self._idf(t)) ** 2 for t, tf in terms.items()))
+        return norm
+
+
+class FAQCache:
+    """
+    Réponses du chat par classe, retrouvées par similarité de question.
+
+    Comme le cache des réponses IA, les erreurs de la base sont absorbées :
+    le cache ne doit jamais empêcher le chat de répondre.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indexes = {}
+        self._stores_since_eviction = 0
+        self.counters = {'hits': 0, 'misses': 0, 'ecritures': 0}
+
+    def eligible(self, message, history=None):
+        """Seules les questions isolées et courtes sont partagées entre élèves."""
+        return not history and 0 < count_tokens(message) <= settings.IA_FAQ_MAX_QUESTION_TOKENS
+
+    def get(self, message, classe, username=None):
+        """
+        Retourne la réponse gardée pour une question similaire, ou None.
+
+        Args:
+            message: Question de l'élève
+            classe: Classe de l'élève
+            username: Prénom remis dans la réponse
+        """
+        terms = tokenize(message)
+        with self._lock:
+            match = self._index(classe).search(terms) if terms else None
+            hit = match is not None and match[2] >= settings.IA_FAQ_THRESHOLD
+            self.counters['hits' if hit else 'misses'] += 1
+        if not hit:
+            return None
+
+        entry_id, answer, score = match
+        logger.info(f"FAQ {classe}: réponse #{entry_id} réutilisée (similarité {score:.2f})")
+        self._touch(entry_id)
+        return answer.replace(NOM_ELEVE, username or 'toi')
+
+    def set(self, message, classe, answer, username=None):
+        """Garde la réponse à une question isolée."""
+        from ia.models import ReponseFAQ
+
+        if username:
+            # Mot entier seulement : « mu » ne doit pas toucher « multiplier »
+            answer = re.sub(rf'(?<!\w){re.escape(username)}(?!\w)', NOM_ELEVE, answer, flags=re.IGNORECASE)
+        now = timezone.now()
+        question = normalize(message)
+        try:
+            entry, _ = ReponseFAQ.objects.update_or_create(
+                classe=classe, cle=question_key(question),
+                defaults={
+                    'question': question,
+                    'reponse': answer,
+                    'date_expiration': now + timedelta(seconds=settings.IA_FAQ_TTL),
+                    'dernier_acces': now,
+                },
+            )
+        except Exception as e:
+            logger.warning(f"Cache FAQ: écriture impossible: {e}")
+            return
+
+        with self._lock:
+            self._index(classe).add(entry.id, entry.question, answer, time.time() + settings.IA_FAQ_TTL)
+            self.counters['ecritures'] += 1
+            self._stores_since_eviction += 1
+            evict = self._stores_since_eviction >= settings.IA_CACHE_EVICTION_INTERVAL
+            if evict:
+                self._stores_since_eviction = 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """
+        Supprime les entrées expirées puis, au-delà de IA_FAQ_MAX_ENTRIES,
+        les moins demandées (puis les moins récemment servies).
+
+        Returns:
+            int: Nombre d'entrées supprimées
+        """
+        from ia.models import ReponseFAQ
+
+        try:
+            deleted, _ = ReponseFAQ.objects.filter(date_expiration__lte=timezone.now()).delete()
+            excess = ReponseFAQ.objects.count() - settings.IA_FAQ_MAX_ENTRIES
+            if excess > 0:
+                cold_ids = list(
+                    ReponseFAQ.objects.order_by('hits', 'dernier_acces').values_list('id', flat=True)[:excess]
+                )
+                deleted += ReponseFAQ.objects.filter(id__in=cold_ids).delete()[0]
+        except Exception as e:
+            logger.warning(f"Cache FAQ: éviction impossible: {e}")
+            return 0
+
+        if deleted:
+            logger.info(f"Cache FAQ: {deleted} entrées supprimées")
+            with self._lock:
+                self._indexes.clear()
+        return deleted
+
+    def clear(self, memory_only=False):
+        """Vide les index (et la table si memory_only=False)."""
+        with self._lock:
+            self._indexes.clear()
+        if not memory_only:
+            from ia.models import ReponseFAQ
+            ReponseFAQ.objects.all().delete()
+
+    def stats(self):
+        """Compteurs du processus + nombre d'entrées en base."""
+        from ia.models import ReponseFAQ
+
+        with self._lock:
+            stats = dict(self.counters)
+        try:
+            stats['entrees'] = ReponseFAQ.objects.count()
+        except Exception:
+            stats['entrees'] = None
+        lookups = stats['hits'] + stats['misses']
+        stats['taux_hit'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
+
+    def _index(self, classe):
+        # Appelé sous self._lock
+        index = self._indexes.get(classe)
+        if index is None or time.monotonic() - index.loaded_at > settings.IA_FAQ_RELOAD_INTERVAL:
+            index = self._indexes[classe] = self._load(classe)
+        return index
+
+    def _load(self, classe):
+        from ia.models import ReponseFAQ
+
+        index = _ClasseIndex()
+        try:
+            rows = ReponseFAQ.objects.filter(classe=classe, date_expiration__gt=timezone.now())
+            for entry in rows.only('id', 'question', 'reponse', 'date_expiration'):
+                index.add(entry.id, entry.question, entry.reponse, entry.date_expiration.timestamp())
+        except Exception as e:
+            logger.warning(f"Cache FAQ: lecture impossible: {e}")
+        return index
+
+    def _touch(self, entry_id):
+        from ia.models import ReponseFAQ
+
+        try:
+            ReponseFAQ.objects.filter(id=entry_id).update(hits=F('hits') + 1, dernier_acces=timezone.now())
+        except Exception as e:
+            logger.warning(f"Cache FAQ: mise à jour impossible: {e}")
+
+
+faq_cache = FAQCache()
@@ -0,0 +1,305 @@
+"""
+File d'attente durable des tâches lentes (génération IA, audio), en base.
+
+Une tâche (TacheFond) nomme un traitement enregistré ici (`@traitement`) et
+ses paramètres JSON. `manage.py run_worker` les exécute dans un pool de
+threads, par priorité décroissante puis dans l'ordre d'arrivée.
+
+- Prise d'une tâche : UPDATE conditionnel sur l'état (compare-and-swap),
+  sans SELECT FOR UPDATE ni courtier externe : SQLite comme PostgreSQL.
+- Bail : le worker prolonge `bail_expiration` (battement) tant que la tâche
+  tourne ; un bail expiré (worker tué) rend la tâche aux autres workers.
+- Échec : nouvel essai différé (IA_JOBS_RETRY_DELAY, doublé à chaque
+  tentative) jusqu'à `max_tentatives`, puis état « echec ».
+- Dédoublonnage : une seule tâche en attente ou en cours par `cle` ;
+  `cle_active` (index unique simple, respecté aussi par MySQL qui ignore
+  les contraintes partielles) vaut `cle` tant que la tâche est active et
+  NULL une fois finie. enqueue rend la tâche existante.
+"""
+import uuid
+import logging
+import threading
+import traceback
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ia.models import TacheFond
+from ia.ratelimit import mode_batch
+from ia.telemetry import appelant
+
+logger = logging.getLogger(__name__)
+
+PRIORITE_COMMANDE = 0
+PRIORITE_ELEVE = 10  # Demandée par un élève qui attend le résultat
+
+TRAITEMENTS = {}
+
+
+def traitement(nom):
+    """Enregistre la fonction décorée comme traitement `nom` (appelée avec les params de la tâche)."""
+    def register(func):
+        TRAITEMENTS[nom] = func
+        return func
+    return register
+
+
+def enqueue(nom, params=None, cle=None, priorite=PRIORITE_COMMANDE, max_tentatives=None):
+    """
+    Met une tâche en file, ou rend la tâche active de même clé.
+
+    Args:
+        nom: Traitement enregistré (ex. "explication")
+        params: Paramètres JSON passés au traitement
+        cle: Clé de dédoublonnage (ex. "explication:42"), None = pas de dédoublonnage
+        priorite: PRIORITE_COMMANDE, PRIORITE_ELEVE...
+        max_tentatives: Défaut IA_JOBS_MAX_TENTATIVES
+
+    Returns:
+        TacheFond: Tâche créée ou déjà active
+    """
+    if nom not in TRAITEMENTS:
+        raise ValueError(f"Traitement inconnu: {nom}")
+
+    while True:
+        if cle:
+            existing = TacheFond.objects.filter(cle_active=cle).first()
+            if existing:
+                if priorite > existing.priorite:
+                    # Un élève attend désormais une tâche lancée par une commande
+                    TacheFond.objects.filter(id=existing.id).update(priorite=priorite)
+                    existing.priorite = priorite
+                return existing
+        try:
+            with transaction.atomic():
+                return TacheFond.objects.create(
+                    nom=nom, params=params or {}, cle=cle, cle_active=cle, priorite=priorite,
+                    max_tentatives=max_tentatives or settings.IA_JOBS_MAX_TENTATIVES,
+                    disponible_a=timezone.now(),
+                )
+        except IntegrityError:
+            # Créée entre-temps par un autre processus : la relire
+            continue
+
+
+def claim(proprietaire, limit=1, noms=None):
+    """
+    Prend jusqu'à `limit` tâches prêtes (ou au bail expiré) pour `proprietaire`.
+
+    Returns:
+        list: Tâches prises, état en_cours et tentatives incrémentées
+    """
+    now = timezone.now()
+    # Bail expiré sans tentative restante : le traitement fait probablement tomber le worker
+    TacheFond.objects.filter(
+        etat=TacheFond.EN_COURS, bail_expiration__lt=now, tentatives__gte=F('max_tentatives'),
+    ).update(etat=TacheFond.ECHEC, cle_active=None, erreur="Bail expiré (worker arrêté)", date_fin=now)
+
+    ready = Q(etat=TacheFond.EN_ATTENTE, disponible_a__lte=now) | Q(etat=TacheFond.EN_COURS, bail_expiration__lt=now)
+    candidates = TacheFond.objects.filter(ready)
+    if noms:
+        candidates = candidates.filter(nom__in=noms)
+
+    taken = []
+    for tache_id in candidates.order_by('-priorite', 'id').values_list('id', flat=True)[:limit * 4]:
+        # L'UPDATE ne réussit que si la tâche est toujours prête : un seul worker l'obtient
+        won = TacheFond.objects.filter(ready, id=tache_id).update(
+            etat=TacheFond.EN_COURS, proprietaire=proprietaire, tentatives=F('tentatives') + 1,
+            bail_expiration=now + timedelta(seconds=settings.IA_JOBS_LEASE), date_debut=now,
+        )
+        if won:
+            taken.append(TacheFond.objects.get(id=tache_id))
+            if len(taken) >= limit:
+                break
+    return taken
+
+
+def heartbeat(proprietaire, ids):
+    """Prolonge le bail des tâches `ids` encore détenues par `proprietaire`."""
+    if ids:
+        TacheFond.objects.filter(id__in=ids, proprietaire=proprietaire, etat=TacheFond.EN_COURS).update(
+            bail_expiration=timezone.now() + timedelta(seconds=settings.IA_JOBS_LEASE)
+        )
+
+
+def run_job(tache, proprietaire):
+    """
+    Exécute le traitement d'une tâche prise, puis enregistre le résultat ou l'échec.
+
+    Returns:
+        str: État final de la tâche (en_attente si un nouvel essai est prévu)
+    """
+    mine = TacheFond.objects.filter(id=tache.id, proprietaire=proprietaire, etat=TacheFond.EN_COURS)
+    try:
+        with mode_batch(), appelant(f"worker:{tache.nom}"):
+            result = TRAITEMENTS[tache.nom](**tache.params)
+    except Exception as e:
+        now = timezone.now()
+        if tache.tentatives < tache.max_tentatives:
+            delay = settings.IA_JOBS_RETRY_DELAY * 2 ** (tache.tentatives - 1)
+            logger.warning(f"Tâche {tache}: {e}, nouvel essai dans {delay}s")
+            mine.update(etat=TacheFond.EN_ATTENTE, erreur=str(e), bail_expiration=None,
+                        disponible_a=now + timedelta(seconds=delay))
+            return TacheFond.EN_ATTENTE
+        logger.error(f"Tâche {tache} en échec: {e}\n{traceback.format_exc()}")
+        mine.update(etat=TacheFond.ECHEC, cle_active=None, erreur=str(e), bail_expiration=None, date_fin=now)
+        return TacheFond.ECHEC
+
+    if not mine.update(etat=TacheFond.TERMINEE, cle_active=None, resultat=result, erreur='', bail_expiration=None,
+                       date_fin=timezone.now()):
+        # Bail expiré pendant l'exécution et tâche reprise ailleurs
+        logger.warning(f"Tâche {tache} terminée après la perte de son bail")
+    return TacheFond.TERMINEE
+
+
+def purge(days=None):
+    """Supprime les tâches finies depuis plus de IA_JOBS_RETENTION_DAYS jours."""
+    limite = timezone.now() - timedelta(days=days or settings.IA_JOBS_RETENTION_DAYS)
+    deleted, _ = TacheFond.objects.filter(
+        etat__in=[TacheFond.TERMINEE, TacheFond.ECHEC], date_fin__lt=limite
+    ).delete()
+    return deleted
+
+
+class Worker:
+    """
+    Boucle de `run_worker` : prend des tâches tant qu'un thread est libre,
+    prolonge leurs baux pendant l'exécution.
+    """
+
+    def __init__(self, concurrency=None, noms=None, poll=None):
+        self.proprietaire = uuid.uuid4().hex
+        self.concurrency = max(concurrency or settings.IA_JOBS_CONCURRENCY, 1)
+        self.noms = noms
+        self.poll = poll or settings.IA_JOBS_POLL
+        self.stats = {TacheFond.TERMINEE: 0, TacheFond.EN_ATTENTE: 0, TacheFond.ECHEC: 0}
+        self._running = {}  # future -> tâche
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Arrête de prendre des tâches ; celles en cours vont jusqu'au bout."""
+        self._stop.set()
+
+    def run(self, une_passe=False):
+        """
+        Args:
+            une_passe: S'arrêter dès qu'aucune tâche n'est prête ni en cours
+        """
+        beat = threading.Thread(target=self._heartbeat, daemon=True)
+        beat.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='worker') as pool:
+                while not self._stop.is_set():
+                    free = self.concurrency - len(self._running)
+                    taches = claim(self.proprietaire, free, self.noms) if free else []
+                    for tache in taches:
+                        logger.info(f"Tâche {tache} prise")
+                        with self._lock:
+                            self._running[pool.submit(self._execute, tache)] = tache
+                    if taches:
+                        continue
+                    if not self._running:
+                        if une_passe:
+                            break
+                        self._stop.wait(self.poll)
+                        continue
+                    done, _ = wait(list(self._running), timeout=self.poll, return_when=FIRST_COMPLETED)
+                    self._reap(done)
+                wait(list(self._running))
+                self._reap(list(self._running))
+        finally:
+            self._stop.set()
+            beat.join()
+
+    def _execute(self, tache):
+        try:
+            return run_job(tache, self.proprietaire)
+        finally:
+            connection.close()  # Une connexion par thread du pool
+
+    def _reap(self, done):
+        with self._lock:
+            for future in done:
+                tache = self._running.pop(future)
+                etat = future.result() if not future.exception() else TacheFond.ECHEC
+                self.stats[etat] += 1
+                logger.info(f"Tâche {tache.nom} #{tache.id}: {etat}")
+
+    def _heartbeat(self):
+        interval = settings.IA_JOBS_HEARTBEAT
+        while not self._stop.wait(interval):
+            with self._lock:
+                ids = [tache.id for tache in self._running.values()]
+            try:
+                heartbeat(self.proprietaire, ids)
+            except Exception as e:
+                logger.warning(f"Battement du worker impossible: {e}")
+            finally:
+                connection.close()
+
+
+# Traitements ---------------------------------------------------------------
+
+@traitement('explication')
+def generer_explication(topic_id, classe=None):
+    """Génère et sauvegarde l'explication (et l'audio) d'un topic qui n'en a pas."""
+    from core.models import Topic
+    from ia.services import generate_explication_ia
+
+    topic = Topic.objects.select_related('matiere').get(id=topic_id)
+    if not topic.contenu_cours:
+        # Erreur IA levée (pas de repli sur le résumé) : nouvel essai de la tâche
+        result = generate_explication_ia(topic, classe or topic.classe, safe=False)
+        if result['explication'].strip() == (topic.resume or '').strip():
+            raise RuntimeError("Explication IA identique au résumé")
+        Topic.objects.filter(id=topic.id).update(
+            contenu_cours=result['explication'], audio_url=result.get('audio_url') or topic.audio_url
+        )
+    return {'topic_id': topic.id}
+
+
+@traitement('exercices')
+def generer_exercices(topic_id, cible=20):
+    """Complète les exercices d'un topic jusqu'à `cible`, par lots de 5."""
+    from core.models import Topic
+    from ia.dedup import create_exercice_unique
+    from ia.services import generate_exercises_batch_ia
+
+    topic = Topic.objects.select_related('matiere').get(id=topic_id)
+    crees = 0
+    needed = cible - topic.exercices.count()
+    while needed > 0:
+        exercises = generate_exercises_batch_ia(topic, topic.classe, count=min(needed, 5))
+        if not exercises:
+            break
+        batch = sum(1 for data in exercises if create_exercice_unique(topic, data))
+        if not batch:
+            break  # Que des doublons : inutile d'insister
+        crees += batch
+        needed -= batch
+    if needed > 0 and not crees:
+        raise RuntimeError("Aucun exercice généré")
+    return {'topic_id': topic.id, 'crees': crees}
+
+
+@traitement('audio')
+def generer_audio_topic(topic_id):
+    """Génère les audios (gTTS) du résumé et des exercices d'un topic."""
+    from ia.audio import collect_slots, render_audio, write_urls
+
+    slots, texts = collect_slots([topic_id])
+    urls = {h: url for h, url in render_audio(texts, settings.AUDIO_CONCURRENCY) if url}
+    return {'topic_id': topic_id, 'audios': write_urls(slots, urls)}
+
+
+@traitement('variantes_audio')
+def transcoder_variantes(cles):
+    """Transcode les variantes légères (Opus, mp3 bas débit) d'audios déjà rendus."""
+    from ia.variants import transcode
+
+    return {'tailles': {cle: transcode(cle) for cle in cles}}
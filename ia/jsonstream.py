@@ -0,0 +1,155 @@
+"""
+Lecture incrémentale des listes d'objets JSON produites par l'IA.
+
+Le modèle renvoie une liste d'exercices ([{...}, {...}]), parfois entourée
+de texte, de commentaires ou d'un objet englobant ({"exercices": [...]}).
+JSONItemStream reçoit le texte fragment par fragment (streaming) et rend
+chaque objet dès que son accolade fermante arrive : un objet invalide est
+ignoré sans perdre les autres, et une réponse tronquée (max_tokens) garde
+tous les objets complets déjà reçus.
+"""
+import re
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class JSONItemStream:
+    """
+    Extrait les objets JSON « éléments » d'un flux de texte.
+
+    Un élément est un objet dont le parent direct est une liste. Un objet
+    racine sans liste d'objets à l'intérieur est lui-même rendu comme élément.
+
+    Usage:
+        parser = JSONItemStream()
+        for fragment in stream:
+            for item in parser.feed(fragment):
+                ...
+        parser.close()
+    """
+
+    def __init__(self, context_name="json"):
+        self.context_name = context_name
+        self.buffer = ''
+        self.pos = 0
+        self.stack = []          # Conteneurs ouverts : '{' ou '['
+        self.in_string = False
+        self.escape = False
+        self.item_start = None   # Début de l'élément en cours
+        self.item_depth = 0      # Profondeur de pile à laquelle il se referme
+        self.root_start = None   # Début d'un objet racine
+        self.root_items = 0      # Éléments trouvés dans l'objet racine
+        self.items = 0
+        self.invalid = 0
+        self.chars = 0           # Taille totale reçue
+
+    def feed(self, text):
+        """
+        Ajoute un fragment de texte.
+
+        Yields:
+            dict: Chaque élément complet et valide
+        """
+        self.buffer += text
+        self.chars += len(text)
+        while self.pos < len(self.buffer):
+            char = self.buffer[self.pos]
+            self.pos += 1
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == '\\':
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                continue
+
+            if char == '"':
+                self.in_string = True
+            elif char in '{[':
+                if char == '{' and self.item_start is None:
+                    if self.stack and self.stack[-1] == '[':
+                        self.item_start = self.pos - 1
+                        self.item_depth = len(self.stack)
+                    elif not self.stack:
+                        self.root_start = self.pos - 1
+                        self.root_items = 0
+                self.stack.append(char)
+            elif char in '}]':
+                if not self.stack:
+                    continue  # Texte parasite hors JSON
+                self.stack.pop()
+                if char != '}':
+                    continue
+                if self.item_start is not None and len(self.stack) == self.item_depth:
+                    item = self._load(self.buffer[self.item_start:self.pos])
+                    self.item_start = None
+                    self.root_items += 1
+                    if item is not None:
+                        yield item
+                elif not self.stack and self.root_start is not None:
+                    if not self.root_items:
+                        item = self._load(self.buffer[self.root_start:self.pos])
+                        if item is not None:
+                            yield item
+                    self.root_start = None
+
+        self._compact()
+
+    def close(self):
+        """Fin du flux : signale une éventuelle troncature."""
+        if self.stack:
+            logger.warning(
+                f"Réponse JSON tronquée ({self.context_name}): "
+                f"{self.items} éléments complets conservés"
+            )
+
+    def _load(self, raw):
+        try:
+            data = json.loads(raw)
+        except json.JSONDecodeError:
+            try:
+                data = json.loads(_strip_comments(raw))
+            except json.JSONDecodeError as e:
+                self.invalid += 1
+                logger.warning(f"Élément JSON invalide ignoré ({self.context_name}): {e}")
+                return None
+        if not isinstance(data, dict):
+            return None
+        self.items += 1
+        return data
+
+    def _compact(self):
+        """Libère le texte déjà traité qui n'appartient à aucun élément en cours."""
+        keep = min(
+            (start for start in (self.item_start, self.root_start) if start is not None),
+            default=self.pos,
+        )
+        if keep:
+            self.buffer = self.buffer[keep:]
+            self.pos -= keep
+            if self.item_start is not None:
+                self.item_start -= keep
+            if self.root_start is not None:
+                self.root_start -= keep
+
+
+def _strip_comments(json_str):
+    json_str = re.sub(r'//.*?\n', '\n', json_str)
+    return re.sub(r'/\*.*?\*/', '', json_str, flags=re.DOTALL)
+
+
+def parse_json_items(text, context_name="json"):
+    """
+    Version non streaming : tous les éléments valides d'une réponse complète.
+
+    Returns:
+        list: Liste de dicts (vide si aucun élément exploitable)
+    """
+    parser = JSONItemStream(context_name)
+    items = list(parser.feed(text))
+    parser.close()
+    return items
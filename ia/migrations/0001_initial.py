@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReponseIACache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cle', models.CharField(help_text='SHA-256 de la requête', max_length=64, unique=True)),
+                ('modele', models.CharField(max_length=100)),
+                ('reponse', models.TextField()),
+                ('hits', models.IntegerField(default=0)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_expiration', models.DateTimeField(db_index=True)),
+                ('dernier_acces', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Réponse IA en cache',
+                'verbose_name_plural': 'Réponses IA en cache',
+            },
+        ),
+    ]
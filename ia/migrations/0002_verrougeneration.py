@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ia', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VerrouGeneration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cle', models.CharField(max_length=100, unique=True)),
+                ('proprietaire', models.CharField(help_text='Jeton du détenteur', max_length=32)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_expiration', models.DateTimeField(db_index=True, help_text='Verrou repris au-delà (détenteur mort)')),
+            ],
+            options={
+                'verbose_name': 'Verrou de génération',
+                'verbose_name_plural': 'Verrous de génération',
+            },
+        ),
+    ]
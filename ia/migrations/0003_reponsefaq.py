@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ia', '0002_verrougeneration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReponseFAQ',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('classe', models.CharField(db_index=True, max_length=10)),
+                ('question', models.TextField(help_text='Question normalisée')),
+                ('reponse', models.TextField()),
+                ('hits', models.IntegerField(default=0)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_expiration', models.DateTimeField(db_index=True)),
+                ('dernier_acces', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Réponse FAQ du chat',
+                'verbose_name_plural': 'Réponses FAQ du chat',
+                'unique_together': {('classe', 'question')},
+            },
+        ),
+    ]
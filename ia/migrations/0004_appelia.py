@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ia', '0003_reponsefaq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppelIA',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField(db_index=True)),
+                ('appelant', models.CharField(db_index=True, help_text="Vue ou commande à l'origine de l'appel", max_length=80)),
+                ('classe', models.CharField(blank=True, max_length=10)),
+                ('topic_id', models.IntegerField(blank=True, null=True)),
+                ('modele', models.CharField(max_length=100)),
+                ('flux', models.BooleanField(default=False, help_text='Réponse en streaming')),
+                ('cache', models.BooleanField(default=False, help_text='Servie par un cache, sans appel IA')),
+                ('succes', models.BooleanField(default=True)),
+                ('rejeux', models.IntegerField(default=0)),
+                ('tokens_prompt', models.IntegerField(default=0)),
+                ('tokens_reponse', models.IntegerField(default=0)),
+                ('duree_ms', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Appel IA',
+                'verbose_name_plural': 'Appels IA',
+            },
+        ),
+    ]
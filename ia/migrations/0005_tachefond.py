@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ia', '0004_appelia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TacheFond',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(help_text='Traitement enregistré dans ia.jobs', max_length=50)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('etat', models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('terminee', 'Terminée'), ('echec', 'Échec')], default='en_attente', max_length=12)),
+                ('priorite', models.IntegerField(default=0, help_text="Les plus hautes d'abord")),
+                ('cle', models.CharField(blank=True, help_text='Dédoublonnage : une seule tâche en attente ou en cours par clé', max_length=100, null=True)),
+                ('tentatives', models.IntegerField(default=0)),
+                ('max_tentatives', models.IntegerField(default=3)),
+                ('proprietaire', models.CharField(blank=True, help_text="Jeton du worker qui l'exécute", max_length=32)),
+                ('bail_expiration', models.DateTimeField(blank=True, help_text='Reprise par un autre worker au-delà (worker arrêté)', null=True)),
+                ('disponible_a', models.DateTimeField(help_text='Pas exécutée avant (nouvel essai différé)')),
+                ('resultat', models.JSONField(blank=True, null=True)),
+                ('erreur', models.TextField(blank=True)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_debut', models.DateTimeField(blank=True, null=True)),
+                ('date_fin', models.DateTimeField(blank=True, db_index=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Tâche de fond',
+                'verbose_name_plural': 'Tâches de fond',
+                'indexes': [models.Index(fields=['etat', 'priorite', 'disponible_a'], name='ia_tachefon_etat_09ad8b_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('etat__in', ['en_attente', 'en_cours'])), fields=('cle',), name='tache_fond_cle_active')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ia', '0005_tachefond'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AudioAsset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cle', models.CharField(help_text='SHA-256 du texte lu, de la langue et du débit', max_length=64, unique=True)),
+                ('chemin', models.CharField(help_text='Relatif à MEDIA_ROOT (audio/ab/cd/<cle>.mp3)', max_length=200)),
+                ('lang', models.CharField(max_length=10)),
+                ('lent', models.BooleanField(default=False)),
+                ('taille', models.IntegerField(default=0, help_text='Octets')),
+                ('duree_ms', models.IntegerField(blank=True, null=True)),
+                ('references', models.IntegerField(default=0, help_text='Champs qui pointent vers ce fichier (recomptés par nettoyer_audio)')),
+                ('date_creation', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Fichier audio',
+                'verbose_name_plural': 'Fichiers audio',
+            },
+        ),
+    ]
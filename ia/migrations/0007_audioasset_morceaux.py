@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ia', '0006_audioasset'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audioasset',
+            name='morceaux',
+            field=models.JSONField(blank=True, help_text="Clés des morceaux joints dans ce fichier, dans l'ordre (textes longs)", null=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:30
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def remplir_cles(apps, schema_editor):
+    ReponseFAQ = apps.get_model('ia', 'ReponseFAQ')
+    for entry in ReponseFAQ.objects.only('id', 'question'):
+        entry.cle = hashlib.sha256(entry.question.encode('utf-8')).hexdigest()
+        entry.save(update_fields=['cle'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ia', '0007_audioasset_morceaux'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='reponsefaq',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='reponsefaq',
+            name='cle',
+            field=models.CharField(default='', help_text='SHA-256 de la question normalisée', max_length=64),
+            preserve_default=False,
+        ),
+        migrations.RunPython(remplir_cles, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='reponsefaq',
+            constraint=models.UniqueConstraint(fields=('classe', 'cle'), name='reponse_faq_classe_cle'),
+        ),
+    ]
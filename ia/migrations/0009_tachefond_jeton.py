@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:15
+
+import uuid
+
+from django.db import migrations, models
+
+
+def remplir_jetons(apps, schema_editor):
+    TacheFond = apps.get_model('ia', 'TacheFond')
+    for tache in TacheFond.objects.only('id'):
+        tache.jeton = uuid.uuid4()
+        tache.save(update_fields=['jeton'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ia', '0008_reponsefaq_cle'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tachefond',
+            name='jeton',
+            field=models.UUIDField(editable=False, help_text='Identifiant public (URL de statut)', null=True),
+        ),
+        migrations.RunPython(remplir_jetons, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tachefond',
+            name='jeton',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, help_text='Identifiant public (URL de statut)', unique=True),
+        ),
+    ]
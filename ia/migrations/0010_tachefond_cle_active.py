@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+
+def remplir_cles_actives(apps, schema_editor):
+    """Une tâche active par clé : la plus ancienne garde la clé (MySQL a pu en laisser plusieurs)."""
+    TacheFond = apps.get_model('ia', 'TacheFond')
+    vues = set()
+    actives = TacheFond.objects.filter(etat__in=['en_attente', 'en_cours'], cle__isnull=False).order_by('id')
+    for tache in actives.only('id', 'cle'):
+        if tache.cle not in vues:
+            vues.add(tache.cle)
+            TacheFond.objects.filter(id=tache.id).update(cle_active=tache.cle)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ia', '0009_tachefond_jeton'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tachefond',
+            name='cle_active',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True),
+        ),
+        migrations.RunPython(remplir_cles_actives, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tachefond',
+            name='cle_active',
+            field=models.CharField(blank=True, editable=False, help_text='`cle` tant que la tâche est en attente ou en cours, NULL ensuite : une seule tâche active par clé (index unique simple, MySQL compris)', max_length=100, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='tachefond',
+            name='cle',
+            field=models.CharField(blank=True, help_text='Clé de dédoublonnage (voir cle_active)', max_length=100, null=True),
+        ),
+        migrations.RemoveConstraint(
+            model_name='tachefond',
+            name='tache_fond_cle_active',
+        ),
+    ]
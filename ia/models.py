@@ -0,0 +1,150 @@
+import uuid
+
+from django.db import models
+
+
+class ReponseIACache(models.Model):
+    """Réponse IA mise en cache, adressée par le hash de la requête (modèle, prompts, paramètres)"""
+    cle = models.CharField(max_length=64, unique=True, help_text="SHA-256 de la requête")
+    modele = models.CharField(max_length=100)
+    reponse = models.TextField()
+    hits = models.IntegerField(default=0)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_expiration = models.DateTimeField(db_index=True)
+    dernier_acces = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = "Réponse IA en cache"
+        verbose_name_plural = "Réponses IA en cache"
+
+    def __str__(self):
+        return f"{self.modele} - {self.cle[:12]} ({self.hits} hits)"
+
+
+class VerrouGeneration(models.Model):
+    """Verrou inter-processus : une seule génération à la fois par clé (ex. explication:42)"""
+    cle = models.CharField(max_length=100, unique=True)
+    proprietaire = models.CharField(max_length=32, help_text="Jeton du détenteur")
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_expiration = models.DateTimeField(db_index=True, help_text="Verrou repris au-delà (détenteur mort)")
+
+    class Meta:
+        verbose_name = "Verrou de génération"
+        verbose_name_plural = "Verrous de génération"
+
+    def __str__(self):
+        return f"{self.cle} (jusqu'à {self.date_expiration:%H:%M:%S})"
+
+
+class ReponseFAQ(models.Model):
+    """Réponse du chat réutilisable pour les questions similaires d'une même classe"""
+    classe = models.CharField(max_length=10, db_index=True)
+    cle = models.CharField(max_length=64, help_text="SHA-256 de la question normalisée")
+    question = models.TextField(help_text="Question normalisée")
+    reponse = models.TextField()
+    hits = models.IntegerField(default=0)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_expiration = models.DateTimeField(db_index=True)
+    dernier_acces = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Réponse FAQ du chat"
+        verbose_name_plural = "Réponses FAQ du chat"
+        # Sur le hash : MySQL n'indexe pas une colonne TEXT sans longueur de préfixe
+        constraints = [
+            models.UniqueConstraint(fields=['classe', 'cle'], name='reponse_faq_classe_cle'),
+        ]
+
+    def __str__(self):
+        return f"{self.classe} - {self.question[:50]} ({self.hits} hits)"
+
+
+class AppelIA(models.Model):
+    """Mesure d'un appel IA (ou d'une réponse servie par un cache), voir ia.telemetry"""
+    date = models.DateTimeField(db_index=True)
+    appelant = models.CharField(max_length=80, db_index=True, help_text="Vue ou commande à l'origine de l'appel")
+    classe = models.CharField(max_length=10, blank=True)
+    topic_id = models.IntegerField(null=True, blank=True)
+    modele = models.CharField(max_length=100)
+    flux = models.BooleanField(default=False, help_text="Réponse en streaming")
+    cache = models.BooleanField(default=False, help_text="Servie par un cache, sans appel IA")
+    succes = models.BooleanField(default=True)
+    rejeux = models.IntegerField(default=0)
+    tokens_prompt = models.IntegerField(default=0)
+    tokens_reponse = models.IntegerField(default=0)
+    duree_ms = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Appel IA"
+        verbose_name_plural = "Appels IA"
+
+    def __str__(self):
+        return f"{self.appelant} - {self.tokens_prompt}+{self.tokens_reponse} tokens ({self.duree_ms} ms)"
+
+
+class TacheFond(models.Model):
+    """Tâche de fond durable (file d'attente en base), exécutée par manage.py run_worker, voir ia.jobs"""
+    EN_ATTENTE = 'en_attente'
+    EN_COURS = 'en_cours'
+    TERMINEE = 'terminee'
+    ECHEC = 'echec'
+    ETATS = [
+        (EN_ATTENTE, 'En attente'),
+        (EN_COURS, 'En cours'),
+        (TERMINEE, 'Terminée'),
+        (ECHEC, 'Échec'),
+    ]
+
+    jeton = models.UUIDField(
+        default=uuid.uuid4, unique=True, editable=False, help_text="Identifiant public (URL de statut)",
+    )
+    nom = models.CharField(max_length=50, help_text="Traitement enregistré dans ia.jobs")
+    params = models.JSONField(default=dict, blank=True)
+    etat = models.CharField(max_length=12, choices=ETATS, default=EN_ATTENTE)
+    priorite = models.IntegerField(default=0, help_text="Les plus hautes d'abord")
+    cle = models.CharField(max_length=100, null=True, blank=True, help_text="Clé de dédoublonnage (voir cle_active)")
+    cle_active = models.CharField(
+        max_length=100, null=True, blank=True, unique=True, editable=False,
+        help_text="`cle` tant que la tâche est en attente ou en cours, NULL ensuite : "
+                  "une seule tâche active par clé (index unique simple, MySQL compris)",
+    )
+    tentatives = models.IntegerField(default=0)
+    max_tentatives = models.IntegerField(default=3)
+    proprietaire = models.CharField(max_length=32, blank=True, help_text="Jeton du worker qui l'exécute")
+    bail_expiration = models.DateTimeField(
+        null=True, blank=True, help_text="Reprise par un autre worker au-delà (worker arrêté)",
+    )
+    disponible_a = models.DateTimeField(help_text="Pas exécutée avant (nouvel essai différé)")
+    resultat = models.JSONField(null=True, blank=True)
+    erreur = models.TextField(blank=True)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_debut = models.DateTimeField(null=True, blank=True)
+    date_fin = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Tâche de fond"
+        verbose_name_plural = "Tâches de fond"
+        indexes = [models.Index(fields=['etat', 'priorite', 'disponible_a'])]
+
+    def __str__(self):
+        return f"{self.nom} #{self.id} ({self.etat}, {self.tentatives}/{self.max_tentatives})"
+
+
+class AudioAsset(models.Model):
+    """Fichier audio adressé par son contenu (texte lu normalisé, langue, débit), voir ia.audiostore"""
+    cle = models.CharField(max_length=64, unique=True, help_text="SHA-256 du texte lu, de la langue et du débit")
+    chemin = models.CharField(max_length=200, help_text="Relatif à MEDIA_ROOT (audio/ab/cd/<cle>.mp3)")
+    lang = models.CharField(max_length=10)
+    lent = models.BooleanField(default=False)
+    taille = models.IntegerField(default=0, help_text="Octets")
+    duree_ms = models.IntegerField(null=True, blank=True)
+    references = models.IntegerField(default=0, help_text="Champs qui pointent vers ce fichier (recomptés par nettoyer_audio)")
+    morceaux = models.JSONField(null=True, blank=True, help_text="Clés des morceaux joints dans ce fichier, dans l'ordre (textes longs)")
+    date_creation = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Fichier audio"
+        verbose_name_plural = "Fichiers audio"
+
+    def __str__(self):
+        return f"{self.chemin} ({self.taille} octets, {self.references} références)"
@@ -0,0 +1,90 @@
+"""
+Lecture minimale des trames MP3 (MPEG 1/2/2.5, couche III, celles de gTTS) :
+durée d'un fichier et jonction de plusieurs fichiers, sans dépendance externe.
+"""
+
+# Débits (kbit/s) de la couche III par index, MPEG 1 puis MPEG 2 / 2.5
+_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 25: [11025, 12000, 8000]}
+_VERSIONS = {0b00: 25, 0b10: 2, 0b11: 1}
+
+
+def skip_id3(data):
+    """Position de la première trame, après une éventuelle étiquette ID3v2."""
+    if data[:3] != b'ID3' or len(data) < 10:
+        return 0
+    size = (data[6] & 0x7f) << 21 | (data[7] & 0x7f) << 14 | (data[8] & 0x7f) << 7 | (data[9] & 0x7f)
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def frame_header(data, pos):
+    """
+    Trame commençant à `pos`.
+
+    Returns:
+        tuple: (longueur en octets, échantillons, fréquence) ou None si ce n'est pas une trame
+    """
+    if pos + 4 > len(data) or data[pos] != 0xff or data[pos + 1] & 0xe0 != 0xe0:
+        return None
+    version = _VERSIONS.get((data[pos + 1] >> 3) & 0b11)
+    layer = (data[pos + 1] >> 1) & 0b11
+    bitrate_index = data[pos + 2] >> 4
+    rate_index = (data[pos + 2] >> 2) & 0b11
+    if version is None or layer != 0b01 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = _BITRATES[1 if version == 1 else 2][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    padding = (data[pos + 2] >> 1) & 1
+    samples = 1152 if version == 1 else 576
+    length = samples // 8 * bitrate // sample_rate + padding
+    return length, samples, sample_rate
+
+
+def frames(data):
+    """Trames successives (position, longueur, échantillons, fréquence), arrêt à la première invalide."""
+    pos = skip_id3(data)
+    while True:
+        header = frame_header(data, pos)
+        if header is None or pos + header[0] > len(data):
+            return
+        yield (pos,) + header
+        pos += header[0]
+
+
+def duration_ms(data):
+    """Durée en millisecondes, ou None si aucune trame n'est reconnue."""
+    total = 0.0
+    found = False
+    for _, _, samples, sample_rate in frames(data):
+        total += samples / sample_rate
+        found = True
+    return round(total * 1000) if found else None
+
+
+def _is_info_frame(frame):
+    """Trame d'en-tête Xing/Info/VBRI : décrit le nombre de trames d'un seul fichier."""
+    return b'Xing' in frame[:64] or b'Info' in frame[:64] or frame[36:40] == b'VBRI'
+
+
+def audio_frames(data):
+    """Octets des trames audio, sans étiquettes ID3 (v2 en tête, v1 en fin) ni trame d'en-tête Xing/Info."""
+    spans = list(frames(data))
+    if not spans:
+        return data[skip_id3(data):]  # Format non reconnu : tel quel
+    start = spans[0][0]
+    if _is_info_frame(data[start:start + spans[0][1]]):
+        start += spans[0][1]
+    end = spans[-1][0] + spans[-1][1]
+    return data[start:end]
+
+
+def concat(datas):
+    """
+    Joint des fichiers MP3 de même format trame à trame : un lecteur les lit comme un seul fichier.
+    Les en-têtes Xing/Info sont retirés, sans quoi la durée annoncée serait celle du premier.
+    """
+    return b''.join(audio_frames(data) for data in datas)
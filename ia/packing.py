@@ -0,0 +1,124 @@
+"""
+Génération groupée d'exercices : les demandes de plusieurs petits topics
+d'une même classe et matière sont servies par un seul appel IA, qui paie le
+prompt système, les consignes et l'aller-retour une seule fois
+(voir ia.services.generate_exercises_pack_ia).
+
+La taille des paquets découle d'un budget de tokens : la réponse attendue
+(IA_PACK_TOKENS_EXERCICE par exercice) doit tenir dans IA_PACK_MAX_TOKENS,
+les sections des topics dans IA_PACK_PROMPT_BUDGET. Une demande trop grosse
+pour un paquet est répartie sur plusieurs.
+"""
+from django.conf import settings
+
+from ia.prompts import count_tokens
+from ia.services import _build_messages, _pack_section, _prompt_exercises_batch, _prompt_exercises_pack
+
+MARGE = 0.9  # Part du budget de réponse réellement planifiée
+
+
+class Pack:
+    """Topics (et nombres d'exercices demandés) servis par un même appel."""
+
+    def __init__(self, classe, matiere):
+        self.classe = classe
+        self.matiere = matiere
+        self.items = []  # (topic, nombre d'exercices)
+        self.section_tokens = 0
+
+    @property
+    def count(self):
+        return sum(count for _, count in self.items)
+
+    @property
+    def topic_ids(self):
+        return {topic.id for topic, _ in self.items}
+
+    @property
+    def max_tokens(self):
+        """max_tokens de l'appel : réponse attendue, avec marge, dans la limite du budget."""
+        expected = self.count * settings.IA_PACK_TOKENS_EXERCICE
+        return min(int(expected / MARGE) + 1, settings.IA_PACK_MAX_TOKENS)
+
+    def __repr__(self):
+        return f"Pack({self.classe}/{self.matiere.nom}: {len(self.items)} topics, {self.count} exercices)"
+
+
+def pack_capacity(max_tokens=None):
+    """Nombre d'exercices par appel permis par le budget de réponse."""
+    budget = max_tokens or settings.IA_PACK_MAX_TOKENS
+    return max(int(budget * MARGE) // settings.IA_PACK_TOKENS_EXERCICE, 1)
+
+
+def plan_packs(demands, max_tokens=None):
+    """
+    Répartit les demandes en paquets d'une même classe et matière.
+
+    Args:
+        demands: Liste de (topic, nombre d'exercices), topics avec select_related('matiere')
+        max_tokens: Budget de réponse d'un appel (défaut IA_PACK_MAX_TOKENS)
+
+    Returns:
+        list: Paquets (Pack), dans l'ordre des demandes
+    """
+    capacity = pack_capacity(max_tokens)
+    groups = {}
+    for topic, count in demands:
+        if count > 0:
+            groups.setdefault((topic.classe, topic.matiere_id), []).append((topic, count))
+
+    packs = []
+    for (classe, _), items in groups.items():
+        pack = None
+        for topic, count in items:
+            section = count_tokens(_pack_section(topic, count))
+            while count > 0:
+                if pack is None or pack.count >= capacity or (pack.items and (
+                    pack.section_tokens + section > settings.IA_PACK_PROMPT_BUDGET
+                    or len(pack.items) >= settings.IA_PACK_MAX_TOPICS
+                )):
+                    pack = Pack(classe, topic.matiere)
+                    packs.append(pack)
+                n = min(count, capacity - pack.count)
+                pack.items.append((topic, n))
+                pack.section_tokens += section
+                count -= n
+    return packs
+
+
+def pack_report(demands, packs, batch_size=None):
+    """
+    Requêtes et tokens de prompt (estimés) avec et sans regroupement.
+
+    Args:
+        demands: Demandes (topic, nombre d'exercices) à l'origine des paquets
+        packs: Paquets planifiés (plan_packs)
+        batch_size: Exercices par appel sans regroupement (None = un appel par topic)
+
+    Returns:
+        dict: requetes, requetes_sans_regroupement, requetes_evitees, tokens_prompt,
+              tokens_prompt_sans_regroupement, tokens_economises
+    """
+    requetes_sans, tokens_sans = 0, 0
+    for topic, count in demands:
+        if count <= 0:
+            continue
+        size = batch_size or count
+        for start in range(0, count, size):
+            prompt = _prompt_exercises_batch(topic, topic.classe, min(size, count - start))
+            requetes_sans += 1
+            tokens_sans += _prompt_tokens(prompt, topic.classe)
+
+    tokens = sum(_prompt_tokens(_prompt_exercises_pack(pack), pack.classe) for pack in packs)
+    return {
+        'requetes': len(packs),
+        'requetes_sans_regroupement': requetes_sans,
+        'requetes_evitees': requetes_sans - len(packs),
+        'tokens_prompt': tokens,
+        'tokens_prompt_sans_regroupement': tokens_sans,
+        'tokens_economises': tokens_sans - tokens,
+    }
+
+
+def _prompt_tokens(prompt, classe):
+    return sum(count_tokens(m['content']) for m in _build_messages(prompt, classe))
@@ -0,0 +1,168 @@
+"""
+Construction des prompts du chat (Prof. Plankton) sous budget de tokens.
+
+La persona statique est calculée une fois par classe et mise en cache ; seuls
+le nom et les points de l'élève s'y ajoutent. L'historique envoyé par le
+client est borné : les derniers échanges sont gardés tels quels (chaque
+message tronqué au-delà de IA_CHAT_MESSAGE_MAX_TOKENS), les plus anciens
+sont résumés en un court mémo, et le tout tient dans IA_CHAT_PROMPT_BUDGET
+(extraits du cours compris).
+Les tokens sont estimés à ~4 caractères par token, comme pour le limiteur.
+"""
+import logging
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CLASSES_PRIMAIRE = ['cp1', 'cp2', 'ce1', 'ce2', 'cm1', 'cm2']
+# Ancien format (pour le rapport d'économie) : préambule système + persona complète
+# (~385 tokens mesurés) et les 5 derniers messages d'historique, sans limite de taille
+ANCIEN_SYSTEME_TOKENS = 385
+ANCIEN_HISTORIQUE = 5
+
+
+def count_tokens(text):
+    """Estimation du nombre de tokens d'un texte (~4 caractères par token)."""
+    return len(text) // 4 + 1 if text else 0
+
+
+def truncate(text, max_tokens):
+    """Coupe un texte au-delà de max_tokens (en fin de mot si possible)."""
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars].rsplit(' ', 1)[0] or text[:max_chars]
+    return cut + " […]"
+
+
+@lru_cache(maxsize=32)
+def chat_persona(classe):
+    """Persona statique du Prof. Plankton pour une classe (calculée une fois)."""
+    est_secondaire = classe.lower() not in CLASSES_PRIMAIRE
+    niveau = (
+        "Élève du secondaire : ton plus mature, précis et structuré ; aide à préparer le BEPC ou le Baccalauréat."
+        if est_secondaire else
+        "Élève du primaire : langage simple, très pédagogue, beaucoup d'encouragements et des emojis de science (🧪, 🔬, 🧬)."
+    )
+    return f"""Tu es le Professeur Plankton, le Tuteur Intelligent de 'FASO Tuteur' : un scientifique génial, un peu excentrique, dévoué à la réussite des élèves du Burkina Faso 🧪.
+Classe de l'élève : {classe.upper()}.
+
+CONTEXTE (2024-2026) : IPEQ (Initiative Présidentielle pour une Éducation de Qualité), anglais dès le CP1, Faso Dan Fani le lundi et le jeudi, éducation civique et patriotique, langues nationales valorisées.
+
+TON STYLE :
+- Scientifique, enthousiaste, un peu "professeur fou" mais toujours bienveillant.
+- {niveau}
+- Exemples du quotidien burkinabè (le mil, le Faso Dan Fani, l'énergie solaire, les barrages, etc.).
+- Hors cadre scolaire : ramène gentiment l'élève vers ses études.
+- Quelques emojis pour rendre la discussion vivante."""
+
+
+class ChatPromptBuilder:
+    """
+    Construit les messages du chat sous budget et compte les tokens économisés
+    par rapport à l'ancien prompt (persona complète + 5 messages non bornés).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {'prompts': 0, 'tokens_envoyes': 0, 'tokens_economises': 0}
+
+    def build(self, message, classe, history=None, user_info=None, passages=None):
+        """
+        Args:
+            message: Message de l'élève
+            classe: Classe de l'élève
+            history: Historique [{'role': 'user'|'assistant', 'content': str}, ...]
+            user_info: Infos utilisateur {'username': str, 'points': int} (points absents : non cités)
+            passages: Extraits du cours (voir ia.retrieval), ajoutés au prompt système
+
+        Returns:
+            list: Messages (système, derniers échanges, message de l'élève)
+        """
+        budget = settings.IA_CHAT_PROMPT_BUDGET
+        max_message = settings.IA_CHAT_MESSAGE_MAX_TOKENS
+
+        nom_eleve = (user_info or {}).get('username') or 'Élève'
+        points = (user_info or {}).get('points')
+        system = chat_persona(classe) + f"\nL'élève s'appelle {nom_eleve}"
+        system += f" et a cumulé {points} points de savoir." if points is not None else "."
+        if passages:
+            system += "\n\n" + _extraits(passages)
+
+        user_message = {'role': 'user', 'content': truncate(message, max_message)}
+        turns = _clean_history(history)
+
+        # Derniers échanges, du plus récent au plus ancien, tant que le budget le permet
+        remaining = budget - count_tokens(system) - count_tokens(user_message['content'])
+        remaining -= settings.IA_CHAT_MEMO_TOKENS  # Place gardée pour le mémo
+        recent = []
+        for turn in reversed(turns[-settings.IA_CHAT_HISTORY_TURNS:]):
+            content = truncate(turn['content'], max_message)
+            cost = count_tokens(content)
+            if cost > remaining:
+                break
+            recent.insert(0, {'role': turn['role'], 'content': content})
+            remaining -= cost
+
+        older = turns[:len(turns) - len(recent)]
+        if older:
+            system += "\n\n" + _memo(older, settings.IA_CHAT_MEMO_TOKENS)
+
+        messages = [{'role': 'system', 'content': system}, *recent, user_message]
+        self._record(messages, _legacy_tokens(message, history))
+        return messages
+
+    def report(self):
+        with self._lock:
+            return dict(self.counters)
+
+    def _record(self, messages, legacy):
+        sent = sum(count_tokens(m['content']) for m in messages)
+        with self._lock:
+            self.counters['prompts'] += 1
+            self.counters['tokens_envoyes'] += sent
+            self.counters['tokens_economises'] += max(legacy - sent, 0)
+        logger.debug(f"Prompt chat: ~{sent} tokens (ancien format: ~{legacy})")
+
+
+def _clean_history(history):
+    """Garde les messages bien formés de l'historique envoyé par le client."""
+    turns = []
+    for msg in history or []:
+        if not isinstance(msg, dict) or not isinstance(msg.get('content'), str) or not msg['content'].strip():
+            continue
+        role = 'user' if msg.get('role') == 'user' else 'assistant'
+        turns.append({'role': role, 'content': msg['content'].strip()})
+    return turns
+
+
+def _memo(turns, max_tokens):
+    """Mémo court des échanges anciens : début des dernières questions de l'élève."""
+    questions = [truncate(t['content'], 15) for t in turns if t['role'] == 'user'][-5:]
+    memo = "Mémo des échanges précédents : l'élève a demandé " + " ; ".join(f"« {q} »" for q in questions)
+    if not questions:
+        memo = f"Mémo : {len(turns)} réponses précédentes du Prof. Plankton."
+    return truncate(memo, max_tokens)
+
+
+def _extraits(passages):
+    """Extraits du cours de l'élève, avec la consigne de réponse courte."""
+    lines = [f"- {p['texte']}" for p in passages]
+    return (
+        "EXTRAITS DU COURS DE L'ÉLÈVE (appuie-toi dessus, réponds en quelques phrases) :\n"
+        + "\n".join(lines)
+    )
+
+
+def _legacy_tokens(message, history):
+    """Taille du prompt tel qu'il était construit avant le builder (pour le rapport)."""
+    legacy = ANCIEN_SYSTEME_TOKENS + count_tokens(message)
+    for msg in _clean_history(history)[-ANCIEN_HISTORIQUE:]:
+        legacy += count_tokens(msg['content']) + 3  # + "Élève: " / "Prof. Plankton: "
+    return legacy
+
+
+chat_prompt_builder = ChatPromptBuilder()
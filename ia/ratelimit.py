@@ -0,0 +1,177 @@
+"""
+Limiteur de débit partagé pour l'API IA (requêtes/minute et tokens/minute).
+
+Deux seaux à jetons (token bucket) stockés dans un état partagé entre
+processus : tous les workers gunicorn et toutes les commandes de management
+puisent dans le même budget. Une réserve est gardée pour le trafic
+interactif (explications, chat) : les traitements batch ne peuvent pas la
+consommer. Les réponses 429 mettent tout le monde en pause (Retry-After ou
+backoff exponentiel), puis le backoff décroît à chaque succès.
+"""
+import time
+import asyncio
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from api.exceptions import IARateLimitError
+from ia.state import SharedState
+
+logger = logging.getLogger(__name__)
+
+PRIORITE_INTERACTIVE = 'interactive'
+PRIORITE_BATCH = 'batch'
+
+_priorite = ContextVar('priorite_ia', default=PRIORITE_INTERACTIVE)
+
+
+@contextmanager
+def mode_batch():
+    """
+    Marque les appels IA du bloc (ou de la fonction décorée) comme batch :
+    ils attendent leur tour au lieu d'échouer, sans toucher à la réserve interactive.
+    """
+    token = _priorite.set(PRIORITE_BATCH)
+    try:
+        yield
+    finally:
+        _priorite.reset(token)
+
+
+def current_priority():
+    return _priorite.get()
+
+
+class RateLimiter:
+    """Token bucket RPM + TPM partagé entre processus, avec pause adaptative sur 429."""
+
+    def __init__(self, name='groq'):
+        self.state = SharedState(f"ratelimit_{name}")
+
+    def acquire(self, tokens, priority=None):
+        """
+        Réserve une requête et `tokens` tokens, en attendant si nécessaire.
+
+        Args:
+            tokens: Estimation des tokens de la requête (prompt + max_tokens)
+            priority: PRIORITE_INTERACTIVE ou PRIORITE_BATCH (défaut: contexte courant)
+
+        Returns:
+            int: Tokens réservés (à passer à settle)
+
+        Raises:
+            IARateLimitError: Si l'attente dépasserait le délai max de la priorité
+        """
+        priority = priority or current_priority()
+        deadline = time.monotonic() + self._max_wait(priority)
+        while True:
+            reserved, wait = self._try_acquire(tokens, priority)
+            if not wait:
+                return reserved
+            self._check_deadline(deadline, wait, priority)
+            time.sleep(min(wait, 1.0))  # Revérifier : d'autres processus peuvent rendre des jetons
+
+    async def aacquire(self, tokens, priority=None):
+        """Version asynchrone de acquire (attente non bloquante)."""
+        priority = priority or current_priority()
+        deadline = time.monotonic() + self._max_wait(priority)
+        while True:
+            reserved, wait = self._try_acquire(tokens, priority)
+            if not wait:
+                return reserved
+            self._check_deadline(deadline, wait, priority)
+            await asyncio.sleep(min(wait, 1.0))
+
+    def settle(self, reserved, used):
+        """
+        Ajuste le seau de tokens avec la consommation réelle (response.usage)
+        et fait décroître le backoff après un succès.
+        """
+        with self.state.locked() as s:
+            self._refill(s, time.time())
+            if used is not None:
+                s['tokens'] = min(settings.IA_RATE_TPM, s['tokens'] + reserved - used)
+            if s.get('backoff'):
+                s['backoff'] = s['backoff'] / 2 if s['backoff'] >= 1 else 0
+
+    def penalize(self, retry_after=None):
+        """
+        Réagit à une réponse 429 : pause globale de Retry-After secondes si
+        fourni, sinon backoff exponentiel (1 s, 2 s, 4 s... max IA_RATE_MAX_BACKOFF).
+        """
+        now = time.time()
+        with self.state.locked() as s:
+            self._refill(s, now)
+            if retry_after:
+                pause = retry_after
+            else:
+                pause = min(max(s.get('backoff', 0) * 2, 1), settings.IA_RATE_MAX_BACKOFF)
+                s['backoff'] = pause
+            s['pause_jusqua'] = max(s.get('pause_jusqua', 0), now + pause)
+            s['requetes'] = 0
+        logger.warning(f"Limite de débit IA atteinte (429), pause de {pause:.1f}s")
+
+    def snapshot(self):
+        """État courant (jetons disponibles, pause) pour la supervision."""
+        s = self.state.read()
+        now = time.time()
+        if s:
+            self._refill(s, now)
+        return {
+            'requetes_disponibles': round(s.get('requetes', settings.IA_RATE_RPM), 1),
+            'tokens_disponibles': int(s.get('tokens', settings.IA_RATE_TPM)),
+            'pause_restante': round(max(s.get('pause_jusqua', 0) - now, 0), 1),
+            'backoff': s.get('backoff', 0),
+            'rpm': settings.IA_RATE_RPM,
+            'tpm': settings.IA_RATE_TPM,
+        }
+
+    def _try_acquire(self, tokens, priority):
+        """Retourne (tokens réservés, 0) ou (0, secondes à attendre)."""
+        rpm, tpm = settings.IA_RATE_RPM, settings.IA_RATE_TPM
+        reserve = settings.IA_RATE_RESERVE_INTERACTIVE if priority == PRIORITE_BATCH else 0
+        # Une requête plus grosse que le seau ne passerait jamais
+        tokens = int(min(tokens, tpm * (1 - reserve)))
+        now = time.time()
+
+        with self.state.locked() as s:
+            self._refill(s, now)
+            pause = s.get('pause_jusqua', 0) - now
+            if pause > 0:
+                return 0, pause
+
+            wait = max(
+                (1 + rpm * reserve - s['requetes']) * 60 / rpm,
+                (tokens + tpm * reserve - s['tokens']) * 60 / tpm,
+                0,
+            )
+            if wait > 0:
+                return 0, wait
+
+            s['requetes'] -= 1
+            s['tokens'] -= tokens
+            return tokens, 0
+
+    def _refill(self, s, now):
+        rpm, tpm = settings.IA_RATE_RPM, settings.IA_RATE_TPM
+        if 'ts' not in s:
+            s.update(requetes=rpm, tokens=tpm, ts=now)
+        elapsed = max(now - s['ts'], 0)
+        s['requetes'] = min(rpm, s['requetes'] + elapsed * rpm / 60)
+        s['tokens'] = min(tpm, s['tokens'] + elapsed * tpm / 60)
+        s['ts'] = now
+
+    def _max_wait(self, priority):
+        if priority == PRIORITE_BATCH:
+            return settings.IA_RATE_MAX_WAIT_BATCH
+        return settings.IA_RATE_MAX_WAIT_INTERACTIVE
+
+    def _check_deadline(self, deadline, wait, priority):
+        if time.monotonic() + wait > deadline:
+            logger.warning(f"Limiteur IA: attente de {wait:.1f}s refusée (priorité {priority})")
+            raise IARateLimitError()
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,218 @@
+"""
+Recherche locale dans les cours pour ancrer les réponses du chat.
+
+Chaque topic est découpé en courts passages (titre + résumé, puis
+paragraphes de contenu_cours regroupés jusqu'à IA_RETRIEVAL_PASSAGE_TOKENS).
+Un index inversé par classe, limité aux matières du PROGRAMME_OFFICIEL de
+la classe, classe les passages avec BM25 ; les mots du titre comptent dans
+chaque passage du topic. Le chat n'envoie au modèle que les
+IA_RETRIEVAL_TOP_K meilleurs passages.
+
+L'index est tenu à jour topic par topic : immédiatement via les signaux de
+Topic (voir ia.signals), et toutes les IA_RETRIEVAL_REFRESH_INTERVAL
+secondes en comparant l'empreinte des topics en base (modifications faites
+par un autre processus ou par queryset.update).
+"""
+import re
+import math
+import time
+import hashlib
+import logging
+import threading
+from collections import Counter
+
+from django.conf import settings
+
+from core.models import Topic
+from core.programme_officiel import get_matieres_pour_classe
+from ia.text import tokenize
+
+logger = logging.getLogger(__name__)
+
+K1 = 1.2
+B = 0.75
+MIN_SCORE_RATIO = 0.3  # Score minimal d'un passage, relatif au meilleur
+
+
+def split_passages(titre, resume, contenu):
+    """
+    Passages courts d'un topic : le résumé, puis le cours par paragraphes
+    regroupés (ou coupés par phrases) jusqu'à IA_RETRIEVAL_PASSAGE_TOKENS.
+    """
+    max_chars = settings.IA_RETRIEVAL_PASSAGE_TOKENS * 4
+    passages = [f"{titre} : {resume}".strip(' :')]
+    current = ''
+    for paragraph in re.split(r'\n\s*\n', contenu or ''):
+        paragraph = ' '.join(paragraph.replace('*', '').replace('#', '').split())
+        if not paragraph:
+            continue
+        pieces = [paragraph] if len(paragraph) <= max_chars else re.split(r'(?<=[.!?])\s+', paragraph)
+        for piece in pieces:
+            if current and len(current) + len(piece) + 1 > max_chars:
+                passages.append(current)
+                current = ''
+            current = f"{current} {piece}".strip()[:max_chars]
+    if current:
+        passages.append(current)
+    return passages
+
+
+class _ClasseIndex:
+    """Index BM25 des passages des topics d'une classe."""
+
+    def __init__(self):
+        self.passages = {}  # (topic_id, n) -> (texte, titre, longueur)
+        self.postings = {}  # terme -> {(topic_id, n): tf}
+        self.fingerprints = {}  # topic_id -> empreinte du contenu indexé
+        self.topic_terms = {}  # topic_id -> termes de ses passages
+        self.total_length = 0
+        self.checked_at = time.monotonic()
+
+    def set_topic(self, topic_id, titre, resume, contenu, fingerprint):
+        self.remove_topic(topic_id)
+        title_terms = tokenize(titre)
+        topic_terms = set()
+        for n, text in enumerate(split_passages(titre, resume, contenu)):
+            terms = Counter(tokenize(text))
+            if n:
+                terms.update(title_terms)
+            key = (topic_id, n)
+            length = sum(terms.values())
+            self.passages[key] = (text, titre, length)
+            self.total_length += length
+            for term, tf in terms.items():
+                self.postings.setdefault(term, {})[key] = tf
+            topic_terms.update(terms)
+        self.fingerprints[topic_id] = fingerprint
+        self.topic_terms[topic_id] = topic_terms
+
+    def remove_topic(self, topic_id):
+        if self.fingerprints.pop(topic_id, None) is None:
+            return
+        keys = [key for key in self.passages if key[0] == topic_id]
+        for key in keys:
+            self.total_length -= self.passages.pop(key)[2]
+        for term in self.topic_terms.pop(topic_id):
+            posting = self.postings[term]
+            for key in keys:
+                posting.pop(key, None)
+            if not posting:
+                del self.postings[term]
+
+    def search(self, terms, k):
+        if not self.passages:
+            return []
+        n = len(self.passages)
+        avg_length = self.total_length / n or 1
+        scores = {}
+        for term in set(terms):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for key, tf in posting.items():
+                length = self.passages[key][2]
+                scores[key] = scores.get(key, 0.0) + idf * tf * (K1 + 1) / (
+                    tf + K1 * (1 - B + B * length / avg_length)
+                )
+        best = sorted(scores.items(), key=lambda item: -item[1])[:k]
+        # Les passages loin derrière le meilleur n'apportent que du bruit
+        best = [(key, score) for key, score in best if score >= best[0][1] * MIN_SCORE_RATIO] if best else []
+        return [
+            {'topic_id': key[0], 'titre': self.passages[key][1], 'texte': self.passages[key][0], 'score': round(score, 3)}
+            for key, score in best
+        ]
+
+
+class RetrievalIndex:
+    """Index des cours par classe, construit au premier accès puis mis à jour par topic."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indexes = {}
+
+    def search(self, query, classe, k=None):
+        """
+        Passages de cours les plus pertinents pour la question.
+
+        Args:
+            query: Question de l'élève
+            classe: Classe de l'élève (seuls ses topics du programme officiel)
+            k: Nombre de passages (défaut IA_RETRIEVAL_TOP_K)
+
+        Returns:
+            list: [{'topic_id', 'titre', 'texte', 'score'}, ...] par score décroissant
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            return self._index(classe).search(terms, k or settings.IA_RETRIEVAL_TOP_K)
+
+    def update_topic(self, topic):
+        """Réindexe un topic (ou le retire s'il n'est plus au programme de sa classe)."""
+        with self._lock:
+            for classe, index in self._indexes.items():
+                if classe != topic.classe:
+                    index.remove_topic(topic.id)
+            index = self._indexes.get(topic.classe)
+            if index is None:
+                return  # Construit au premier accès
+            if topic.matiere.nom in get_matieres_pour_classe(topic.classe):
+                index.set_topic(
+                    topic.id, topic.titre, topic.resume, topic.contenu_cours,
+                    _fingerprint(topic.titre, topic.resume, topic.contenu_cours),
+                )
+            else:
+                index.remove_topic(topic.id)
+
+    def remove_topic(self, topic_id):
+        with self._lock:
+            for index in self._indexes.values():
+                index.remove_topic(topic_id)
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+    def _index(self, classe):
+        # Appelé sous self._lock
+        index = self._indexes.get(classe)
+        if index is None:
+            index = self._indexes[classe] = _ClasseIndex()
+            self._sync(classe, index)
+        elif time.monotonic() - index.checked_at > settings.IA_RETRIEVAL_REFRESH_INTERVAL:
+            self._sync(classe, index)
+        return index
+
+    def _sync(self, classe, index):
+        """Réindexe les topics ajoutés, modifiés ou retirés depuis le dernier passage."""
+        started = time.monotonic()
+        rows = Topic.objects.filter(
+            classe=classe, matiere__nom__in=get_matieres_pour_classe(classe)
+        ).values_list('id', 'titre', 'resume', 'contenu_cours')
+
+        seen, changed = set(), 0
+        for topic_id, titre, resume, contenu in rows:
+            seen.add(topic_id)
+            fingerprint = _fingerprint(titre, resume, contenu)
+            if index.fingerprints.get(topic_id) != fingerprint:
+                index.set_topic(topic_id, titre, resume, contenu, fingerprint)
+                changed += 1
+        for topic_id in set(index.fingerprints) - seen:
+            index.remove_topic(topic_id)
+            changed += 1
+
+        index.checked_at = time.monotonic()
+        if changed:
+            logger.info(
+                f"Index des cours {classe}: {changed} topics réindexés, {len(index.passages)} passages "
+                f"({(index.checked_at - started) * 1000:.0f} ms)"
+            )
+
+
+def _fingerprint(titre, resume, contenu):
+    return hashlib.blake2b(f"{titre}\0{resume}\0{contenu or ''}".encode(), digest_size=8).digest()
+
+
+retrieval_index = RetrievalIndex()
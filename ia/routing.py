@@ -0,0 +1,102 @@
+"""
+Routage des appels IA par tâche (voir ROUTES dans ia.services).
+
+Une route donne, pour une tâche (chat, explication, exercices...), la chaîne
+de modèles à essayer dans l'ordre, le max_tokens et la température. Quand un
+modèle répond 429 ou est en erreur (5xx, modèle introuvable), l'appel passe
+au modèle suivant de la chaîne, et le modèle fautif est évité pendant
+Retry-After (ou IA_ROUTAGE_PAUSE) secondes par les appels suivants de ce
+processus. Les décisions sont journalisées et comptées (voir /api/ia/status/).
+"""
+import time
+import logging
+import threading
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Route:
+    """Modèles (dans l'ordre de repli), max_tokens et température d'une tâche."""
+
+    def __init__(self, tache, modeles, max_tokens, temperature):
+        self.tache = tache
+        self.modeles = modeles
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+
+    @property
+    def modele(self):
+        """Modèle principal (clé du cache des réponses)."""
+        return self.modeles[0]
+
+    def __repr__(self):
+        return f"Route({self.tache}: {' → '.join(self.modeles)}, {self.max_tokens} tokens, t={self.temperature})"
+
+
+class ModelRouter:
+    """
+    Choix du modèle d'une route et replis, état propre au processus.
+    Thread-safe : partagé par les threads des workers et des commandes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._pauses = {}  # modèle -> fin de la pause (time.monotonic)
+            self._decisions = {}  # tâche -> {modèle: appels réussis}
+            self._replis = {}  # "tâche: modèle → modèle" -> nombre
+
+    def choose(self, route):
+        """Premier modèle de la chaîne qui n'est pas en pause (sinon le principal)."""
+        now = time.monotonic()
+        with self._lock:
+            model = next((m for m in route.modeles if self._pauses.get(m, 0) <= now), route.modele)
+        if model == route.modele:
+            logger.debug(f"Routage IA: {route.tache} → {model}")
+        else:
+            logger.info(f"Routage IA: {route.tache} → {model} ({route.modele} en pause)")
+        return model
+
+    def fallback(self, route, model, tried, reason, pause=None):
+        """
+        Met `model` en pause et rend le modèle suivant de la chaîne non encore
+        essayé pour cet appel, ou None s'il n'y en a pas (l'appelant rejoue
+        alors le même modèle). Une route à un seul modèle n'est jamais mise
+        en pause.
+        """
+        if len(route.modeles) < 2:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            self._pauses[model] = now + (pause or settings.IA_ROUTAGE_PAUSE)
+            candidates = [m for m in route.modeles if m not in tried]
+            if not candidates:
+                return None
+            # Modèles disponibles d'abord, puis ceux dont la pause finit le plus tôt
+            following = min(candidates, key=lambda m: (self._pauses.get(m, 0) > now, self._pauses.get(m, 0)))
+            key = f"{route.tache}: {model} → {following}"
+            self._replis[key] = self._replis.get(key, 0) + 1
+        logger.warning(f"Routage IA: {model} indisponible ({reason}), repli sur {following} pour {route.tache}")
+        return following
+
+    def record(self, route, model):
+        with self._lock:
+            counts = self._decisions.setdefault(route.tache, {})
+            counts[model] = counts.get(model, 0) + 1
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'pauses': {m: round(end - now, 1) for m, end in self._pauses.items() if end > now},
+                'decisions': {t: dict(c) for t, c in self._decisions.items()},
+                'replis': dict(self._replis),
+            }
+
+
+model_router = ModelRouter()
@@ -3,73 +3,164 @@ Services pour intégration IA (Groq) et génération audio (gTTS).
 Gestion d'erreurs robuste avec logging et exceptions typées.
 """
 import os
-import hashlib
+import time
+import asyncio
 import json
-import re
 import logging
 from pathlib import Path
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from groq import Groq
-from gtts import gTTS
+from django.utils.module_loading import import_string
+from groq import (
+    Groq, AsyncGroq, RateLimitError, APIConnectionError, APITimeoutError, InternalServerError, NotFoundError,
+)
 
-from api.exceptions import IAServiceError, IAConfigurationError, AudioGenerationError
+from api.exceptions import IAServiceError, IAConfigurationError, IACircuitOpenError, AudioGenerationError
+from ia.cache import make_key, response_cache
+from ia.client import build_timeout, client_registry
+from ia.ratelimit import PRIORITE_BATCH, current_priority, rate_limiter
+from ia.breaker import circuit_breaker
+from ia.jsonstream import JSONItemStream, parse_json_items
+from ia.validation import validate_exercise, validation_stats
+from ia.prompts import chat_prompt_builder, truncate
+from ia.faq import faq_cache
+from ia.retrieval import retrieval_index
+from ia.routing import Route, model_router
+from ia.audiostore import audio_store
+from ia import telemetry
 
 logger = logging.getLogger(__name__)
 
+TEMPERATURE = 0.7
+JSON_MODE = {'type': 'json_object'}
+PACK_RESUME_TOKENS = 80  # Résumé d'un topic dans un prompt groupé (voir ia.packing)
+TENTATIVE_MIN = 1.0  # Temps restant (s) en dessous duquel un appel interactif ne relance plus
+
+# Routage par tâche : modèles essayés dans l'ordre (repli sur 429 / erreur, voir
+# ia.routing), max_tokens et température. 'rapide' et 'riche' désignent
+# IA_MODELE_RAPIDE (par défaut GROQ_MODEL) et IA_MODELE_RICHE ; settings.IA_ROUTES
+# surcharge une tâche. Un max_tokens passé à call_groq l'emporte sur celui de la route.
+ROUTES = {
+    'defaut': {'modeles': ['rapide'], 'max_tokens': 2000, 'temperature': TEMPERATURE},
+    # Réponses rédigées : modèle riche (chat : max_tokens = IA_CHAT_MAX_TOKENS)
+    'chat': {'modeles': ['riche', 'rapide'], 'max_tokens': 600, 'temperature': TEMPERATURE},
+    'explication': {'modeles': ['riche', 'rapide'], 'max_tokens': 1500, 'temperature': TEMPERATURE},
+    # JSON structuré : modèle rapide et peu coûteux, température plus basse
+    'exercices': {'modeles': ['rapide', 'riche'], 'max_tokens': 2000, 'temperature': 0.5},
+    'curriculum': {'modeles': ['rapide', 'riche'], 'max_tokens': 1500, 'temperature': 0.3},
+    'reparation': {'modeles': ['rapide', 'riche'], 'max_tokens': 1000, 'temperature': 0.2},
+}
+
+
+def get_groq_client():
+    """
+    Retourne le client Groq partagé du processus (pool keep-alive).
+    
+    Returns:
+        Groq: Client réutilisé par tous les appels IA
+    """
+    return client_registry.get(Groq, settings.GROQ_API_KEY, base_url=settings.GROQ_BASE_URL)
+
+
+def get_async_groq_client():
+    """
+    Retourne le client Groq asynchrone partagé par la boucle asyncio courante.
+    
+    Returns:
+        AsyncGroq: Client réutilisé par tous les appels IA asynchrones
+    """
+    return client_registry.get_async(AsyncGroq, settings.GROQ_API_KEY, base_url=settings.GROQ_BASE_URL)
+
+
+class GroqProvider:
+    """
+    Fournisseur par défaut : API chat-completions de Groq, ou de tout serveur
+    compatible désigné par GROQ_BASE_URL (serveur local ia.standin, proxy).
+    
+    Un fournisseur (voir IA_PROVIDER) expose create/acreate avec les
+    paramètres de chat.completions.create et lève les exceptions du SDK groq
+    (RateLimitError, APIConnectionError, InternalServerError) pour que les
+    rejeux, le limiteur et le disjoncteur s'appliquent.
+    """
+    
+    def create(self, **request):
+        return get_groq_client().chat.completions.create(**request)
+    
+    async def acreate(self, **request):
+        return await get_async_groq_client().chat.completions.create(**request)
+
+
+_providers = {}
+
+
+def get_provider():
+    """
+    Retourne le fournisseur IA configuré (IA_PROVIDER, chemin d'import d'une classe).
+    
+    Returns:
+        Instance partagée du fournisseur
+    """
+    path = settings.IA_PROVIDER
+    provider = _providers.get(path)
+    if provider is None:
+        provider = _providers[path] = import_string(path)()
+    return provider
+
+
+def get_route(tache='defaut', max_tokens=None):
+    """
+    Route d'une tâche (voir ROUTES) : chaîne de modèles résolue, max_tokens
+    (celui passé en argument l'emporte) et température.
+    
+    Raises:
+        ValueError: Si la tâche est inconnue
+    """
+    if tache not in ROUTES:
+        raise ValueError(f"Tâche IA inconnue: {tache} (attendu: {', '.join(ROUTES)})")
+    conf = {**ROUTES['defaut'], **ROUTES[tache], **settings.IA_ROUTES.get(tache, {})}
+    aliases = {
+        'rapide': settings.IA_MODELE_RAPIDE or settings.GROQ_MODEL,
+        'riche': settings.IA_MODELE_RICHE or settings.GROQ_MODEL,
+    }
+    modeles = []
+    for name in conf['modeles']:
+        model = aliases.get(name, name)
+        if model not in modeles:
+            modeles.append(model)
+    return Route(tache, modeles, max_tokens or conf['max_tokens'], conf['temperature'])
+
 
 def generate_audio(text, lang='fr', slow=False):
     """
     Génère un fichier audio à partir d'un texte en utilisant gTTS.
     
+    Le fichier est adressé par le texte lu (sans Markdown), la langue et le
+    débit, et indexé dans AudioAsset (voir ia.audiostore) : un texte déjà lu
+    coûte une requête, sans nouveau rendu.
+    
     Args:
         text: Texte à convertir en audio
         lang: Langue (fr, en, etc.)
         slow: Si True, parle plus lentement
     
     Returns:
-        str: URL relative du fichier audio (ex: 'audio/abc123.mp3') ou None
-    
-    Raises:
-        AudioGenerationError: En cas d'erreur de génération
+        str: URL relative du fichier audio (ex: 'media/audio/ab/cd/abcd….mp3') ou None
     """
     if not text or not text.strip():
         logger.debug("generate_audio: texte vide, retour None")
         return None
     
-    # Créer hash du texte pour nom de fichier unique
-    text_hash = hashlib.md5(text.encode('utf-8')).hexdigest()
-    filename = f"{text_hash}.mp3"
-    filepath = settings.AUDIO_STORAGE_PATH / filename
-    
-    # Si le fichier existe déjà, retourner son URL
-    if filepath.exists():
-        logger.debug(f"Audio déjà existant: {filename}")
-        return f"{settings.MEDIA_URL}audio/{filename}"
-    
     try:
-        # Nettoyage du texte pour gTTS (Sandy ne doit pas lire le Markdown)
-        # Supprimer les astérisques (**Bold** -> Bold)
-        clean_text = re.sub(r'\*+', '', text)
-        # Supprimer les dièses (# Titre -> Titre)
-        clean_text = re.sub(r'#+\s*', '', clean_text)
-        # Tronquer à 800 caractères max pour éviter les délais gTTS extrêmes
-        if len(clean_text) > 800:
-            logger.info(f"Texte trop long ({len(clean_text)}), troncature à 800 chars pour gTTS")
-            clean_text = clean_text[:800] + "..."
-        
-        # Générer audio avec gTTS
-        tts = gTTS(text=clean_text, lang=lang, slow=slow)
-        tts.save(str(filepath))
-        logger.info(f"Audio généré: {filename}")
-        return f"{settings.MEDIA_URL}audio/{filename}"
+        return audio_store.url_for(text, lang=lang, slow=slow)
     except Exception as e:
         logger.error(f"Erreur génération audio: {e}", exc_info=True)
         # Ne pas lever d'exception, retourner None pour permettre un fallback
         return None
 
 
-def call_groq(prompt, classe=None, contexte=None, max_tokens=2000):
+def call_groq(prompt, classe=None, contexte=None, max_tokens=None, cache=True, refresh=False, json_mode=False,
+              messages=None, topic_id=None, tache='defaut'):
     """
     Appelle l'API Groq pour générer du contenu éducatif.
     Utilisé uniquement pour les niveaux >CP2.
@@ -78,7 +169,14 @@ def call_groq(prompt, classe=None, contexte=None, max_tokens=2000):
         prompt: Prompt principal
         classe: Classe de l'élève (optionnel, pour contexte)
         contexte: Contexte additionnel (optionnel)
-        max_tokens: Limite de tokens
+        max_tokens: Limite de tokens (par défaut celle de la route de la tâche)
+        cache: Si False, ni lecture ni écriture dans le cache des réponses
+        refresh: Si True, ignore la réponse en cache et la remplace
+        json_mode: Si True, le modèle doit répondre par un objet JSON
+                   (response_format ; le prompt doit mentionner « JSON »)
+        messages: Messages déjà construits (chat), à la place de prompt/contexte
+        topic_id: Topic concerné, pour la télémétrie (voir ia.telemetry)
+        tache: Type de tâche, qui choisit modèles, max_tokens et température (voir ROUTES)
     
     Returns:
         str: Réponse générée par l'IA
@@ -91,61 +189,443 @@ def call_groq(prompt, classe=None, contexte=None, max_tokens=2000):
         logger.error("GROQ_API_KEY non configurée")
         raise IAConfigurationError("Clé API Groq non configurée")
     
+    messages = messages or _build_messages(prompt, classe, contexte)
+    route = get_route(tache, max_tokens)
+    use_cache = cache and settings.IA_CACHE_ENABLED
+    params = {'response_format': JSON_MODE} if json_mode else {}
+    cache_key = make_key(route.modele, messages, route.temperature, route.max_tokens, **params)
+    
+    if use_cache and not refresh:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            logger.debug(f"Réponse Groq servie depuis le cache ({cache_key[:12]})")
+            telemetry.cache_hit(classe, topic_id, route.modele)
+            return cached
+    
     try:
-        client = Groq(api_key=settings.GROQ_API_KEY)
-        
-        # Construire le prompt complet
-        system_prompt = """Tu es un tuteur éducatif intelligent pour le système scolaire du Burkina Faso.
-Tu adaptes tes explications au niveau de l'élève. Sois clair, encourageant et utilise des exemples concrets
-du contexte burkinabè (marché, village, animaux locaux, etc.)."""
-        
-        if classe:
-            system_prompt += f"\nL'élève est en {classe.upper()}."
+        logger.debug(f"Appel Groq - {tache}, classe: {classe}, tokens max: {route.max_tokens}")
         
-        if contexte:
-            system_prompt += f"\nContexte: {contexte}"
+        with telemetry.mesure(classe, topic_id, route.modele) as m:
+            response = _complete(messages, route, **params)
+            m.usage(response.usage)
         
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": prompt}
-        ]
-        
-        logger.debug(f"Appel Groq - classe: {classe}, tokens max: {max_tokens}")
+        result = response.choices[0].message.content.strip()
+        logger.info(f"Réponse Groq reçue: {len(result)} caractères")
+    
+    except (IAConfigurationError, IAServiceError):
+        raise
+    except Exception as e:
+        logger.error(f"Erreur appel Groq: {e}", exc_info=True)
+        raise IAServiceError(f"Erreur API IA: {str(e)}")
+    
+    if use_cache:
+        response_cache.set(cache_key, result, m.modele)
+    return result
+
+
+async def acall_groq(prompt, classe=None, contexte=None, max_tokens=None, cache=True, refresh=False, json_mode=False,
+                     topic_id=None, tache='defaut'):
+    """
+    Version asynchrone de call_groq (même prompt système, même cache, mêmes erreurs).
+    
+    Raises:
+        IAConfigurationError: Si GROQ_API_KEY non configurée
+        IAServiceError: En cas d'erreur API
+    """
+    if not settings.GROQ_API_KEY:
+        logger.error("GROQ_API_KEY non configurée")
+        raise IAConfigurationError("Clé API Groq non configurée")
+    
+    messages = _build_messages(prompt, classe, contexte)
+    route = get_route(tache, max_tokens)
+    use_cache = cache and settings.IA_CACHE_ENABLED
+    params = {'response_format': JSON_MODE} if json_mode else {}
+    cache_key = make_key(route.modele, messages, route.temperature, route.max_tokens, **params)
+    
+    if use_cache and not refresh:
+        cached = await sync_to_async(response_cache.get)(cache_key)
+        if cached is not None:
+            logger.debug(f"Réponse Groq servie depuis le cache ({cache_key[:12]})")
+            telemetry.cache_hit(classe, topic_id, route.modele)
+            return cached
+    
+    try:
+        logger.debug(f"Appel Groq async - {tache}, classe: {classe}, tokens max: {route.max_tokens}")
         
-        response = client.chat.completions.create(
-            model=settings.GROQ_MODEL,
-            messages=messages,
-            temperature=0.7,
-            max_tokens=max_tokens,
-        )
+        with telemetry.mesure(classe, topic_id, route.modele) as m:
+            response = await _acomplete(messages, route, **params)
+            m.usage(response.usage)
         
         result = response.choices[0].message.content.strip()
         logger.info(f"Réponse Groq reçue: {len(result)} caractères")
-        return result
     
-    except IAConfigurationError:
+    except (IAConfigurationError, IAServiceError):
         raise
     except Exception as e:
         logger.error(f"Erreur appel Groq: {e}", exc_info=True)
         raise IAServiceError(f"Erreur API IA: {str(e)}")
+    
+    if use_cache:
+        await sync_to_async(response_cache.set)(cache_key, result, m.modele)
+    return result
 
 
-def call_groq_safe(prompt, classe=None, contexte=None, max_tokens=2000, default=None):
+def stream_groq(prompt, classe=None, contexte=None, max_tokens=None, messages=None, topic_id=None, tache='defaut'):
+    """
+    Appelle l'API Groq en mode streaming (jamais mis en cache).
+    `messages` remplace prompt/contexte (voir call_groq).
+    
+    Yields:
+        str: Fragments de la réponse, dans l'ordre d'arrivée
+    
+    Raises:
+        IAConfigurationError: Si GROQ_API_KEY non configurée
+        IAServiceError: En cas d'erreur API
+    """
+    if not settings.GROQ_API_KEY:
+        logger.error("GROQ_API_KEY non configurée")
+        raise IAConfigurationError("Clé API Groq non configurée")
+    
+    messages = messages or _build_messages(prompt, classe, contexte)
+    route = get_route(tache, max_tokens)
+    logger.debug(f"Appel Groq (stream) - {tache}, classe: {classe}, tokens max: {route.max_tokens}")
+    
+    # Le générateur peut être repris dans un autre contexte : la mesure
+    # n'est courante que pendant _complete, et enregistrée à la fin du flux
+    m = telemetry.Mesure(classe, topic_id, route.modele, flux=True)
+    succes = False
+    total = 0
+    try:
+        with m.active():
+            stream = _complete(messages, route, stream=True)
+        for chunk in stream:
+            _stream_usage(chunk, m)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                total += len(delta)
+                yield delta
+        succes = True
+    except IAServiceError:
+        raise
+    except Exception as e:
+        logger.error(f"Erreur appel Groq (stream): {e}", exc_info=True)
+        raise IAServiceError(f"Erreur API IA: {str(e)}")
+    finally:
+        telemetry.telemetry_store.record(m, succes)
+    
+    logger.info(f"Réponse Groq (stream) reçue: {total} caractères")
+
+
+async def astream_groq(prompt, classe=None, contexte=None, max_tokens=None, topic_id=None, tache='defaut'):
+    """Version asynchrone de stream_groq (générateur asynchrone)."""
+    if not settings.GROQ_API_KEY:
+        logger.error("GROQ_API_KEY non configurée")
+        raise IAConfigurationError("Clé API Groq non configurée")
+    
+    messages = _build_messages(prompt, classe, contexte)
+    route = get_route(tache, max_tokens)
+    logger.debug(f"Appel Groq async (stream) - {tache}, classe: {classe}, tokens max: {route.max_tokens}")
+    
+    m = telemetry.Mesure(classe, topic_id, route.modele, flux=True)
+    succes = False
+    total = 0
+    try:
+        with m.active():
+            stream = await _acomplete(messages, route, stream=True)
+        async for chunk in stream:
+            _stream_usage(chunk, m)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                total += len(delta)
+                yield delta
+        succes = True
+    except IAServiceError:
+        raise
+    except Exception as e:
+        logger.error(f"Erreur appel Groq (stream): {e}", exc_info=True)
+        raise IAServiceError(f"Erreur API IA: {str(e)}")
+    finally:
+        telemetry.telemetry_store.record(m, succes)
+    
+    logger.info(f"Réponse Groq (stream) reçue: {total} caractères")
+
+
+def _complete(messages, route, **params):
+    """
+    Envoie la requête au fournisseur IA (get_provider) derrière le
+    disjoncteur et le limiteur de débit partagés, avec le modèle choisi pour
+    la route (voir ia.routing). Un 429 ou une erreur du modèle (5xx, modèle
+    introuvable) passe au modèle suivant de la chaîne ; la chaîne épuisée,
+    les 429 (Retry-After) et erreurs transitoires sont rejoués dans la
+    limite du budget de l'appel (_Budget). Le SDK ne rejoue rien lui-même.
+    
+    Chaque tentative en échec (réseau, timeout, 5xx) est comptée par le
+    disjoncteur : dès qu'il s'ouvre, l'appel s'arrête sans attendre la fin
+    des rejeux.
+    
+    Raises:
+        IACircuitOpenError: Si le disjoncteur est ouvert (aucun appel réseau)
+        IARateLimitError: Si le limiteur refuse d'attendre plus longtemps
+    """
+    if not circuit_breaker.allow():
+        raise IACircuitOpenError()
+    try:
+        return _attempts(messages, route, **params)
+    finally:
+        # Essai semi-ouvert conclu sans verdict (429, modèle introuvable, limiteur) : créneau rendu
+        circuit_breaker.release_probe()
+
+
+def _attempts(messages, route, **params):
+    """Tentatives de _complete (modèles de la route, rejeux), disjoncteur déjà franchi."""
+    provider = get_provider()
+    estimate = _estimate_tokens(messages, route.max_tokens)
+    budget = _Budget()
+    model = model_router.choose(route)
+    tried = {model}
+    attempt = 0
+    
+    while True:
+        telemetry.set_model(model)
+        reserved = rate_limiter.acquire(estimate)
+        started = time.monotonic()
+        try:
+            response = provider.create(
+                model=model,
+                messages=messages,
+                temperature=route.temperature,
+                max_tokens=route.max_tokens,
+                timeout=budget.attempt_timeout(),
+                **params
+            )
+        except RateLimitError as e:
+            rate_limiter.settle(reserved, 0)
+            following = model_router.fallback(route, model, tried, '429', _retry_after(e))
+            if not following:
+                rate_limiter.penalize(_retry_after(e))
+                if attempt == budget.retries:
+                    raise
+                attempt += 1
+            if budget.expired():
+                raise
+        except (APIConnectionError, InternalServerError, NotFoundError) as e:
+            rate_limiter.settle(reserved, 0)
+            if not isinstance(e, NotFoundError):
+                circuit_breaker.record_failure()
+                if circuit_breaker.is_open() or budget.expired():
+                    raise
+            following = _model_fallback(e, route, model, tried)
+            if not following:
+                if isinstance(e, NotFoundError) or attempt == budget.retries:
+                    raise
+                time.sleep(0.5 * 2 ** attempt)
+                attempt += 1
+        else:
+            rate_limiter.settle(reserved, _usage_tokens(response, reserved))
+            # Lenteur jugée sur les seuls appels interactifs (batch : jusqu'à GROQ_TIMEOUT, longues réponses)
+            circuit_breaker.record_success(time.monotonic() - started if budget.interactive else 0)
+            model_router.record(route, model)
+            return response
+        
+        telemetry.count_retry()
+        if following:
+            model = following
+            tried.add(model)
+
+
+async def _acomplete(messages, route, **params):
+    """Version asynchrone de _complete (attentes non bloquantes)."""
+    if not circuit_breaker.allow():
+        raise IACircuitOpenError()
+    try:
+        return await _aattempts(messages, route, **params)
+    finally:
+        circuit_breaker.release_probe()
+
+
+async def _aattempts(messages, route, **params):
+    """Version asynchrone de _attempts."""
+    provider = get_provider()
+    estimate = _estimate_tokens(messages, route.max_tokens)
+    budget = _Budget()
+    model = model_router.choose(route)
+    tried = {model}
+    attempt = 0
+    
+    while True:
+        telemetry.set_model(model)
+        reserved = await rate_limiter.aacquire(estimate)
+        started = time.monotonic()
+        try:
+            response = await provider.acreate(
+                model=model,
+                messages=messages,
+                temperature=route.temperature,
+                max_tokens=route.max_tokens,
+                timeout=budget.attempt_timeout(),
+                **params
+            )
+        except RateLimitError as e:
+            rate_limiter.settle(reserved, 0)
+            following = model_router.fallback(route, model, tried, '429', _retry_after(e))
+            if not following:
+                rate_limiter.penalize(_retry_after(e))
+                if attempt == budget.retries:
+                    raise
+                attempt += 1
+            if budget.expired():
+                raise
+        except (APIConnectionError, InternalServerError, NotFoundError) as e:
+            rate_limiter.settle(reserved, 0)
+            if not isinstance(e, NotFoundError):
+                circuit_breaker.record_failure()
+                if circuit_breaker.is_open() or budget.expired():
+                    raise
+            following = _model_fallback(e, route, model, tried)
+            if not following:
+                if isinstance(e, NotFoundError) or attempt == budget.retries:
+                    raise
+                await asyncio.sleep(0.5 * 2 ** attempt)
+                attempt += 1
+        else:
+            rate_limiter.settle(reserved, _usage_tokens(response, reserved))
+            # Lenteur jugée sur les seuls appels interactifs (batch : jusqu'à GROQ_TIMEOUT, longues réponses)
+            circuit_breaker.record_success(time.monotonic() - started if budget.interactive else 0)
+            model_router.record(route, model)
+            return response
+        
+        telemetry.count_retry()
+        if following:
+            model = following
+            tried.add(model)
+
+
+class _Budget:
+    """
+    Temps et rejeux accordés à un appel selon sa priorité (ia.ratelimit).
+    
+    Le batch (commandes, tâches de fond) garde GROQ_TIMEOUT par tentative et
+    GROQ_MAX_RETRIES rejeux. Un appel interactif s'exécute dans un worker
+    gunicorn (--timeout 120) : tentatives de GROQ_TIMEOUT_INTERACTIVE s au
+    plus, GROQ_MAX_RETRIES_INTERACTIVE rejeux, et aucune nouvelle tentative
+    au-delà de IA_INTERACTIVE_DEADLINE s depuis le début de l'appel.
+    """
+    
+    def __init__(self):
+        self.interactive = current_priority() != PRIORITE_BATCH
+        if not self.interactive:
+            self.timeout, self.retries, self.echeance = settings.GROQ_TIMEOUT, settings.GROQ_MAX_RETRIES, None
+        else:
+            self.timeout = settings.GROQ_TIMEOUT_INTERACTIVE
+            self.retries = settings.GROQ_MAX_RETRIES_INTERACTIVE
+            self.echeance = time.monotonic() + settings.IA_INTERACTIVE_DEADLINE
+    
+    def attempt_timeout(self):
+        """Timeout httpx de la prochaine tentative, borné par le temps restant."""
+        if self.echeance is None:
+            return build_timeout(self.timeout)
+        return build_timeout(min(self.timeout, max(self.echeance - time.monotonic(), TENTATIVE_MIN)))
+    
+    def expired(self):
+        """Vrai s'il ne reste plus le temps d'une nouvelle tentative."""
+        return self.echeance is not None and self.echeance - time.monotonic() < TENTATIVE_MIN
+
+
+def _model_fallback(error, route, model, tried):
+    """
+    Modèle de repli après une erreur ; aucun si la connexion elle-même
+    échoue. Un timeout (APITimeoutError, sous-classe d'APIConnectionError)
+    est propre au modèle lent : on passe au suivant.
+    """
+    if isinstance(error, APITimeoutError):
+        return model_router.fallback(route, model, tried, 'timeout')
+    if isinstance(error, APIConnectionError):
+        return None
+    return model_router.fallback(route, model, tried, str(getattr(error, 'status_code', type(error).__name__)))
+
+
+def _estimate_tokens(messages, max_tokens):
+    """Estimation pessimiste (≈ 4 caractères par token + réponse maximale)."""
+    return sum(len(m['content']) for m in messages) // 4 + max_tokens
+
+
+def _usage_tokens(response, default):
+    """Tokens réellement consommés d'après response.usage (défaut si absent)."""
+    total = getattr(getattr(response, 'usage', None), 'total_tokens', None)
+    return total if isinstance(total, int) else default
+
+
+def _stream_usage(chunk, m):
+    """Usage du flux : Groq l'envoie dans x_groq.usage du dernier fragment."""
+    usage = getattr(getattr(chunk, 'x_groq', None), 'usage', None) or getattr(chunk, 'usage', None)
+    if usage is not None:
+        m.usage(usage)
+
+
+def _retry_after(error):
+    """Délai Retry-After (secondes) d'une réponse 429, ou None."""
+    try:
+        return float(error.response.headers.get('retry-after'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _build_messages(prompt, classe=None, contexte=None):
+    """Construit les messages (système + utilisateur) envoyés au modèle."""
+    system_prompt = """Tu es un tuteur éducatif intelligent pour le système scolaire du Burkina Faso.
+Tu adaptes tes explications au niveau de l'élève. Sois clair, encourageant et utilise des exemples concrets
+du contexte burkinabè (marché, village, animaux locaux, etc.)."""
+    
+    if classe:
+        system_prompt += f"\nL'élève est en {classe.upper()}."
+    
+    if contexte:
+        system_prompt += f"\nContexte: {contexte}"
+    
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def call_groq_safe(prompt, classe=None, contexte=None, max_tokens=None, default=None, cache=True, refresh=False,
+                   json_mode=False, messages=None, topic_id=None, tache='defaut'):
     """
     Version sûre de call_groq qui ne lève pas d'exception.
     Utilisée pour les cas où un fallback est acceptable.
+    Disjoncteur ouvert : retourne `default` immédiatement (hors cache).
     
     Returns:
         str: Réponse IA ou valeur par défaut si erreur
     """
     try:
-        return call_groq(prompt, classe, contexte, max_tokens)
+        return call_groq(
+            prompt, classe, contexte, max_tokens, cache=cache, refresh=refresh, json_mode=json_mode, messages=messages,
+            topic_id=topic_id, tache=tache,
+        )
     except (IAConfigurationError, IAServiceError) as e:
         logger.warning(f"call_groq_safe fallback: {e}")
         return default
 
 
-def generate_explication_ia(topic, classe, generate_audio_flag=True):
+async def acall_groq_safe(prompt, classe=None, contexte=None, max_tokens=None, default=None, cache=True, refresh=False,
+                          json_mode=False, topic_id=None, tache='defaut'):
+    """Version asynchrone de call_groq_safe."""
+    try:
+        return await acall_groq(
+            prompt, classe, contexte, max_tokens, cache=cache, refresh=refresh, json_mode=json_mode, topic_id=topic_id,
+            tache=tache,
+        )
+    except (IAConfigurationError, IAServiceError) as e:
+        logger.warning(f"acall_groq_safe fallback: {e}")
+        return default
+
+
+def generate_explication_ia(topic, classe, generate_audio_flag=True, refresh=False, safe=True):
     """
     Génère une explication personnalisée pour un topic en utilisant l'IA.
     Utilisé uniquement pour >CP2.
@@ -154,25 +634,25 @@ def generate_explication_ia(topic, classe, generate_audio_flag=True):
         topic: Instance de Topic
         classe: Classe de l'élève
         generate_audio_flag: Si True, génère aussi l'audio (lent)
+        refresh: Si True, ignore l'explication en cache et la régénère
+        safe: Si False, une erreur IA est levée au lieu de rendre le résumé
+              (tâches de fond : nouvel essai plutôt que résumé sauvegardé)
     
     Returns:
         dict: {'explication': str, 'audio_url': str ou None}
-    """
-    prompt = f"""Explique de manière claire et adaptée le thème enfantin suivant pour un élève de {classe.upper()} au Burkina Faso:
-
-Matière: {topic.matiere.get_nom_display()}
-Titre: {topic.titre}
-Résumé: {topic.resume}
-
-Structure ton explication de la manière suivante:
-1. **Introduction**: Présente le sujet simplement.
-2. **Explication**: Détaille le concept avec des mots simples.
-3. **Exemple concret**: Donne au moins 3 exemples ancrés dans le quotidien du Burkina (marché, village, école, culture locale).
-4. **Récapitulatif**: Les 3 points clés à retenir.
-
-Génère une explication détaillée, encourageante et pédagogique."""
     
-    explication = call_groq_safe(prompt, classe=classe, default=topic.resume)
+    Raises:
+        IAServiceError: Erreur IA ou réponse vide (safe=False seulement)
+    """
+    prompt = _prompt_explication(topic, classe)
+    if safe:
+        explication = call_groq_safe(
+            prompt, classe=classe, default=topic.resume, refresh=refresh, topic_id=topic.id, tache='explication'
+        )
+    else:
+        explication = call_groq(prompt, classe=classe, refresh=refresh, topic_id=topic.id, tache='explication')
+        if not explication:
+            raise IAServiceError("Explication IA vide")
     
     if not explication:
         explication = topic.resume
@@ -189,6 +669,47 @@ Génère une explication détaillée, encourageante et pédagogique."""
     }
 
 
+async def agenerate_explication_ia(topic, classe, generate_audio_flag=True, refresh=False):
+    """
+    Version asynchrone de generate_explication_ia.
+    Le topic doit être chargé avec select_related('matiere').
+    L'audio (gTTS, bloquant) est généré dans un thread.
+    """
+    prompt = _prompt_explication(topic, classe)
+    explication = await acall_groq_safe(
+        prompt, classe=classe, default=topic.resume, refresh=refresh, topic_id=topic.id, tache='explication'
+    )
+    
+    if not explication:
+        explication = topic.resume
+        logger.warning(f"Fallback sur résumé pour topic {topic.id}")
+    
+    audio_url = None
+    if generate_audio_flag and explication:
+        audio_url = await asyncio.to_thread(generate_audio, explication, 'fr')
+    
+    return {
+        'explication': explication,
+        'audio_url': audio_url
+    }
+
+
+def _prompt_explication(topic, classe):
+    return f"""Explique de manière claire et adaptée le thème enfantin suivant pour un élève de {classe.upper()} au Burkina Faso:
+
+Matière: {topic.matiere.get_nom_display()}
+Titre: {topic.titre}
+Résumé: {topic.resume}
+
+Structure ton explication de la manière suivante:
+1. **Introduction**: Présente le sujet simplement.
+2. **Explication**: Détaille le concept avec des mots simples.
+3. **Exemple concret**: Donne au moins 3 exemples ancrés dans le quotidien du Burkina (marché, village, école, culture locale).
+4. **Récapitulatif**: Les 3 points clés à retenir.
+
+Génère une explication détaillée, encourageante et pédagogique."""
+
+
 def generate_exercice_ia(topic, classe, difficulte=1):
     """
     Génère un exercice personnalisé pour un topic en utilisant l'IA.
@@ -200,7 +721,7 @@ def generate_exercice_ia(topic, classe, difficulte=1):
         difficulte: Niveau de difficulté (1-3)
     
     Returns:
-        dict: Données de l'exercice généré, ou None en cas d'erreur
+        dict: Exercice validé, ou None en cas d'erreur
     """
     prompt = f"""Génère un exercice éducatif adapté pour un élève de {classe.upper()} au Burkina Faso:
 
@@ -220,12 +741,13 @@ Format de réponse (JSON):
 
 Utilise des noms et contextes burkinabè (Ali, Fatou, le marché de Rood Woko, le village, etc.)."""
     
-    response = call_groq_safe(prompt, classe=classe)
+    response = call_groq_safe(prompt, classe=classe, json_mode=True, topic_id=topic.id, tache='exercices')
     
     if not response:
         return None
     
-    return _parse_json_response(response, "exercice")
+    exercises = validate_exercises(parse_json_items(response, "exercice"), prompt, response, classe)
+    return exercises[0] if exercises else None
 
 
 def generate_exercises_batch_ia(topic, classe, count=5):
@@ -238,9 +760,272 @@ def generate_exercises_batch_ia(topic, classe, count=5):
         count: Nombre d'exercices à générer (max 10 recommandés par appel)
     
     Returns:
-        list: Liste de dicts d'exercices, ou [] en cas d'erreur
+        list: Exercices validés (voir validate_exercises), ou [] en cas d'erreur
+    """
+    prompt = _prompt_exercises_batch(topic, classe, count)
+    # Pas de cache : des lots identiques doivent donner des exercices différents
+    response = call_groq_safe(
+        prompt, classe=classe, cache=False, json_mode=True, topic_id=topic.id, tache='exercices'
+    )
+    
+    if not response:
+        return []
+    
+    return validate_exercises(parse_json_items(response, "batch_exercises"), prompt, response, classe)
+
+
+async def agenerate_exercises_batch_ia(topic, classe, count=5):
+    """
+    Version asynchrone de generate_exercises_batch_ia.
+    Le topic doit être chargé avec select_related('matiere').
+    """
+    prompt = _prompt_exercises_batch(topic, classe, count)
+    response = await acall_groq_safe(
+        prompt, classe=classe, cache=False, json_mode=True, topic_id=topic.id, tache='exercices'
+    )
+    
+    if not response:
+        return []
+    
+    return await avalidate_exercises(parse_json_items(response, "batch_exercises"), prompt, response, classe)
+
+
+def stream_exercises_batch_ia(topic, classe, count=5):
+    """
+    Version streaming de generate_exercises_batch_ia : chaque exercice valide
+    est rendu dès que son objet JSON est complet, pendant que la suite du lot
+    est encore générée. Une erreur ou une troncature (max_tokens) en cours
+    de route conserve les exercices déjà rendus. Les exercices invalides sont
+    corrigés en une seule demande, à la fin du flux.
+    
+    Yields:
+        dict: Exercice validé
+    """
+    prompt = _prompt_exercises_batch(topic, classe, count)
+    chunks = stream_groq(prompt, classe=classe, topic_id=topic.id, tache='exercices')
+    yield from _stream_valid_exercises(chunks, prompt, classe, "batch_exercises")
+
+
+async def astream_exercises_batch_ia(topic, classe, count=5):
+    """
+    Version asynchrone de stream_exercises_batch_ia.
+    Le topic doit être chargé avec select_related('matiere').
+    """
+    prompt = _prompt_exercises_batch(topic, classe, count)
+    chunks = astream_groq(prompt, classe=classe, topic_id=topic.id, tache='exercices')
+    async for exercise in _astream_valid_exercises(chunks, prompt, classe, "batch_exercises"):
+        yield exercise
+
+
+def generate_exercises_pack_ia(pack):
+    """
+    Génère en un seul appel les exercices de plusieurs topics d'une même
+    classe et matière (voir ia.packing) : le prompt système et l'en-tête ne
+    sont payés qu'une fois. Chaque exercice porte le `topic_id` de son topic.
+    
+    Args:
+        pack: Pack (topics avec select_related('matiere') et nombres demandés)
+    
+    Returns:
+        list: Exercices validés avec topic_id, ou [] en cas d'erreur
     """
-    prompt = f"""Génère un lot de {count} exercices éducatifs différents pour un élève de {classe.upper()} au Burkina Faso:
+    prompt = _prompt_exercises_pack(pack)
+    response = call_groq_safe(
+        prompt, classe=pack.classe, max_tokens=pack.max_tokens, cache=False, json_mode=True, tache='exercices'
+    )
+    if not response:
+        return []
+    
+    return validate_exercises(
+        parse_json_items(response, "pack_exercises"), prompt, response, pack.classe, pack.topic_ids
+    )
+
+
+async def agenerate_exercises_pack_ia(pack):
+    """Version asynchrone de generate_exercises_pack_ia."""
+    prompt = _prompt_exercises_pack(pack)
+    response = await acall_groq_safe(
+        prompt, classe=pack.classe, max_tokens=pack.max_tokens, cache=False, json_mode=True, tache='exercices'
+    )
+    if not response:
+        return []
+    
+    return await avalidate_exercises(
+        parse_json_items(response, "pack_exercises"), prompt, response, pack.classe, pack.topic_ids
+    )
+
+
+async def astream_exercises_pack_ia(pack):
+    """
+    Version streaming asynchrone de generate_exercises_pack_ia (voir
+    stream_exercises_batch_ia).
+    
+    Yields:
+        dict: Exercice validé avec topic_id
+    """
+    prompt = _prompt_exercises_pack(pack)
+    chunks = astream_groq(prompt, classe=pack.classe, max_tokens=pack.max_tokens, tache='exercices')
+    async for exercise in _astream_valid_exercises(chunks, prompt, pack.classe, "pack_exercises", pack.topic_ids):
+        yield exercise
+
+
+def _stream_valid_exercises(chunks, prompt, classe, context_name, topic_ids=None):
+    """
+    Rend les exercices valides d'un flux de fragments au fil de l'eau, puis
+    les exercices corrigés. Une erreur IA arrête le flux sans lever.
+    """
+    parser = JSONItemStream(context_name)
+    invalid = []
+    try:
+        for delta in chunks:
+            for item in parser.feed(delta):
+                exercise, errors = validate_exercise(item, topic_ids)
+                if exercise:
+                    validation_stats.add(valides=1)
+                    yield exercise
+                else:
+                    invalid.append((item, errors))
+    except (IAConfigurationError, IAServiceError) as e:
+        logger.warning(f"Flux {context_name} interrompu après {parser.items} éléments: {e}")
+    parser.close()
+    
+    if invalid:
+        yield from _repair_exercises(invalid, prompt, parser.chars, classe, topic_ids)
+
+
+async def _astream_valid_exercises(chunks, prompt, classe, context_name, topic_ids=None):
+    """Version asynchrone de _stream_valid_exercises."""
+    parser = JSONItemStream(context_name)
+    invalid = []
+    try:
+        async for delta in chunks:
+            for item in parser.feed(delta):
+                exercise, errors = validate_exercise(item, topic_ids)
+                if exercise:
+                    validation_stats.add(valides=1)
+                    yield exercise
+                else:
+                    invalid.append((item, errors))
+    except (IAConfigurationError, IAServiceError) as e:
+        logger.warning(f"Flux {context_name} interrompu après {parser.items} éléments: {e}")
+    parser.close()
+    
+    if invalid:
+        for exercise in await _arepair_exercises(invalid, prompt, parser.chars, classe, topic_ids):
+            yield exercise
+
+
+def validate_exercises(items, prompt, response, classe, topic_ids=None):
+    """
+    Valide un lot d'exercices contre le schéma Exercice. Seuls les éléments
+    invalides sont renvoyés au modèle, en une seule demande compacte (mode
+    JSON) : les bons exercices ne sont jamais régénérés.
+    
+    Args:
+        items: Objets JSON extraits de la réponse
+        prompt: Prompt du lot (pour estimer le coût d'un rejeu complet)
+        response: Réponse brute du lot
+        classe: Classe de l'élève
+        topic_ids: IDs de topics autorisés pour `topic_id` (questions essentielles)
+    
+    Returns:
+        list: Exercices valides (normalisés), puis exercices corrigés
+    """
+    valid, invalid = _split_exercises(items, topic_ids)
+    if invalid:
+        valid += _repair_exercises(invalid, prompt, len(response), classe, topic_ids)
+    return valid
+
+
+async def avalidate_exercises(items, prompt, response, classe, topic_ids=None):
+    """Version asynchrone de validate_exercises."""
+    valid, invalid = _split_exercises(items, topic_ids)
+    if invalid:
+        valid += await _arepair_exercises(invalid, prompt, len(response), classe, topic_ids)
+    return valid
+
+
+def _split_exercises(items, topic_ids):
+    valid, invalid = [], []
+    for item in items:
+        exercise, errors = validate_exercise(item, topic_ids)
+        if exercise:
+            valid.append(exercise)
+        else:
+            invalid.append((item, errors))
+    validation_stats.add(valides=len(valid))
+    return valid, invalid
+
+
+def _repair_exercises(invalid, prompt, response_chars, classe, topic_ids=None):
+    """Demande la correction des seuls exercices invalides (un appel)."""
+    repair_prompt = _prompt_repair(invalid, topic_ids)
+    response = call_groq_safe(
+        repair_prompt, classe=classe, max_tokens=_repair_max_tokens(invalid), cache=False, json_mode=True,
+        tache='reparation',
+    )
+    return _finish_repair(invalid, prompt, response_chars, repair_prompt, response, topic_ids)
+
+
+async def _arepair_exercises(invalid, prompt, response_chars, classe, topic_ids=None):
+    repair_prompt = _prompt_repair(invalid, topic_ids)
+    response = await acall_groq_safe(
+        repair_prompt, classe=classe, max_tokens=_repair_max_tokens(invalid), cache=False, json_mode=True,
+        tache='reparation',
+    )
+    return _finish_repair(invalid, prompt, response_chars, repair_prompt, response, topic_ids)
+
+
+def _repair_max_tokens(invalid):
+    return min(2000, 400 * len(invalid))
+
+
+def _finish_repair(invalid, prompt, response_chars, repair_prompt, response, topic_ids):
+    """Valide les corrections et comptabilise les tokens économisés."""
+    repaired = []
+    if response:
+        for item in parse_json_items(response, "reparation")[:len(invalid)]:
+            exercise, _ = validate_exercise(item, topic_ids)
+            if exercise:
+                repaired.append(exercise)
+    
+    # Un rejeu complet aurait coûté le prompt du lot + une réponse de même taille
+    full_retry = (len(prompt) + response_chars) // 4
+    repair_cost = (len(repair_prompt) + len(response or '')) // 4
+    validation_stats.add(
+        corriges=len(repaired), rejetes=len(invalid) - len(repaired), reparations=1,
+        tokens_reparation=repair_cost, tokens_lots_evites=full_retry,
+    )
+    logger.info(
+        f"Validation: {len(repaired)}/{len(invalid)} exercices corrigés "
+        f"(~{repair_cost} tokens au lieu de ~{full_retry} pour un rejeu du lot)"
+    )
+    return repaired
+
+
+def _prompt_repair(invalid, topic_ids=None):
+    items = []
+    for i, (item, errors) in enumerate(invalid, start=1):
+        payload = json.dumps(item, ensure_ascii=False) if isinstance(item, dict) else str(item)
+        items.append(f"{i}. {payload}\n   Erreurs : {'; '.join(errors)}")
+    
+    keys = '"question", "type", "options", "correct_index", "feedback_success", "feedback_fail", "difficulte"'
+    rules = '"options" = 2 à 6 textes différents, "correct_index" = position (à partir de 0) de la bonne option, "difficulte" = 1, 2 ou 3'
+    if topic_ids is not None:
+        keys += ', "topic_id"'
+        rules += f', "topic_id" parmi {sorted(topic_ids)}'
+    
+    return f"""Ces exercices générés sont invalides. Corrige uniquement les erreurs indiquées, sans changer le thème.
+
+{chr(10).join(items)}
+
+Règles : {rules}.
+
+Réponds en JSON uniquement, dans le même ordre : {{"exercices": [objets avec {keys}]}}"""
+
+
+def _prompt_exercises_batch(topic, classe, count):
+    return f"""Génère un lot de {count} exercices éducatifs différents pour un élève de {classe.upper()} au Burkina Faso:
 
 Matière: {topic.matiere.get_nom_display()}
 Thème: {topic.titre}
@@ -248,8 +1033,8 @@ Résumé du cours: {topic.resume}
 
 Chaque exercice doit avoir une difficulté variée (mélange de 1, 2 et 3).
 
-Format de réponse (JSON uniquement, une liste d'objets) :
-[
+Format de réponse (JSON uniquement, un objet contenant la liste) :
+{{"exercices": [
     {{
         "question": "Question claire",
         "type": "choix_multiple",
@@ -260,24 +1045,51 @@ Format de réponse (JSON uniquement, une liste d'objets) :
         "difficulte": 1
     }},
     ...
-]
+]}}
 
 Utilise des noms et contextes burkinabè."""
-    
-    response = call_groq_safe(prompt, classe=classe)
-    
-    if not response:
-        return []
-    
-    data = _parse_json_response(response, "batch_exercises")
-    if isinstance(data, list):
-        return data
-    return [data] if isinstance(data, dict) else []
+
+
+def _prompt_exercises_pack(pack):
+    sections = "\n".join(_pack_section(topic, count) for topic, count in pack.items)
+    return f"""Génère {pack.count} exercices éducatifs différents pour un élève de {pack.classe.upper()} au Burkina Faso.
+
+Matière: {pack.matiere.get_nom_display()}
+Thèmes (topic_id, nombre d'exercices demandés, titre et résumé du cours) :
+{sections}
+
+Respecte exactement le nombre d'exercices demandé pour chaque thème et indique son topic_id.
+Chaque exercice doit avoir une difficulté variée (mélange de 1, 2 et 3).
+
+Format de réponse (JSON uniquement, un objet contenant la liste) :
+{{"exercices": [
+    {{
+        "topic_id": 123,
+        "question": "Question claire",
+        "type": "choix_multiple",
+        "options": ["Option 1", "Option 2", "Option 3", "Option 4"],
+        "correct_index": 0,
+        "feedback_success": "Bravo !...",
+        "feedback_fail": "Essaie encore !...",
+        "difficulte": 1
+    }},
+    ...
+]}}
+
+Utilise des noms et contextes burkinabè."""
+
+
+def _pack_section(topic, count):
+    """Ligne d'un topic dans un prompt groupé (résumé tronqué)."""
+    return f"- topic_id {topic.id} : {count} exercices — {topic.titre}. {truncate(topic.resume or '', PACK_RESUME_TOKENS)}"
 
 
 def chat_tuteur_ia(message, classe, history=None, user_info=None):
     """
-    Simule une conversation avec le tuteur intelligent Sandy.
+    Simule une conversation avec le tuteur intelligent Sandy. Une question
+    isolée proche d'une question déjà posée dans la classe reçoit la réponse
+    du cache FAQ, sans appel IA (voir ia.faq). Sinon, les passages du cours
+    les plus pertinents (voir ia.retrieval) sont joints au prompt.
     
     Args:
         message: Message de l'élève
@@ -288,40 +1100,64 @@ def chat_tuteur_ia(message, classe, history=None, user_info=None):
     Returns:
         str: Réponse de Sandy ou None si erreur
     """
-    nom_eleve = user_info.get('username', 'Élève') if user_info else 'Élève'
-    points = user_info.get('points', 0) if user_info else 0
+    username = user_info.get('username') if user_info else None
+    faq = faq_cache.eligible(message, history)
+    if faq:
+        cached = faq_cache.get(message, classe, username)
+        if cached:
+            telemetry.cache_hit(classe)
+            return cached
     
-    # Adaptation du ton selon le niveau
-    est_secondaire = classe.lower() not in ['cp1', 'cp2', 'ce1', 'ce2', 'cm1', 'cm2']
+    passages = retrieval_index.search(message, classe)
+    # Réponse partagée avec la classe (cache FAQ) : rien de propre à l'élève hors son prénom
+    prompt_info = {'username': username} if faq else user_info
+    messages = chat_prompt_builder.build(message, classe, history, prompt_info, passages)
     
-    pedagogical_context = f"""Tu es le Professeur Plankton, le Tuteur Intelligent de 'FASO Tuteur'. 
-Tu es un scientifique génial, un peu excentrique mais extrêmement dévoué à la réussite de tes élèves 🧪.
-Ton rôle est d'aider les élèves du Burkina Faso avec une expertise scientifique et pédagogique. 
-L'élève actuel s'appelle {nom_eleve}, il est en {classe.upper()} et a cumulé {points} points de savoir.
+    # Conversation personnelle (nom, points, historique) : pas de cache exact,
+    # seules les questions isolées vont dans le cache FAQ de la classe
+    response = call_groq_safe(
+        message, classe=classe, messages=messages, cache=False, max_tokens=settings.IA_CHAT_MAX_TOKENS, tache='chat'
+    )
+    if response and faq:
+        faq_cache.set(message, classe, response, username)
+    return response
 
-REFORMES ET CONTEXTE ACTUEL (2024-2026) :
-- IPEQ : Initiative Présidentielle pour une Éducation de Qualité.
-- Anglais introduit dès le CP1.
-- Port du Faso Dan Fani obligatoire le lundi et jeudi.
-- Focus sur l'éducation civique et patriotique.
-- Langues nationales valorisées.
 
-TON STYLE :
-- Ton : Scientifique, enthousiaste, un peu "professeur fou" mais toujours bienveillant.
-- Pour le primaire : Sois très pédagogue, utilise un langage simple, beaucoup d'encouragements et des emojis de science (🧪, 🔬, 🧬).
-- Pour le secondaire ({'6ème-Terminale' if est_secondaire else ''}) : Adopte un ton plus mature, précis et structuré. Aide-les à préparer le BEPC ou le Baccalauréat.
-- Exemples : Utilise toujours des exemples du quotidien burkinabè (le mil, le Faso Dan Fani, l'énergie solaire, les barrages, etc.).
-- Si le sujet est hors cadre scolaire, ramène gentiment l'élève vers ses études.
-- Tu peux utiliser quelques emojis pour rendre la discussion vivante."""
+def chat_tuteur_ia_stream(message, classe, history=None, user_info=None):
+    """
+    Version streaming de chat_tuteur_ia : rend les fragments de la réponse
+    au fur et à mesure qu'ils arrivent du modèle.
+    
+    Yields:
+        str: Fragments de texte
+    
+    Raises:
+        IAConfigurationError: Si GROQ_API_KEY non configurée
+        IAServiceError: En cas d'erreur API (avant ou pendant le flux)
+    """
+    username = user_info.get('username') if user_info else None
+    faq = faq_cache.eligible(message, history)
+    if faq:
+        cached = faq_cache.get(message, classe, username)
+        if cached:
+            telemetry.cache_hit(classe)
+            yield cached
+            return
     
-    context_with_history = pedagogical_context
-    if history:
-        context_with_history += "\n\nHistorique récent de la conversation :\n"
-        for msg in history[-5:]:  # On garde les 5 derniers échanges
-            role = "Élève" if msg['role'] == 'user' else "Prof. Plankton"
-            context_with_history += f"{role}: {msg['content']}\n"
+    passages = retrieval_index.search(message, classe)
+    prompt_info = {'username': username} if faq else user_info
+    messages = chat_prompt_builder.build(message, classe, history, prompt_info, passages)
+    parts = []
+    chunks = stream_groq(
+        message, classe=classe, messages=messages, max_tokens=settings.IA_CHAT_MAX_TOKENS, tache='chat'
+    )
+    for delta in chunks:
+        parts.append(delta)
+        yield delta
     
-    return call_groq_safe(message, classe=classe, contexte=context_with_history)
+    # Réponse complète seulement (une erreur en cours de flux a déjà levé)
+    if faq and parts:
+        faq_cache.set(message, classe, ''.join(parts), username)
 
 
 def generate_essential_questions_ia(matiere_nom, classe, topics_list, count=10):
@@ -336,11 +1172,49 @@ def generate_essential_questions_ia(matiere_nom, classe, topics_list, count=10):
         count: Nombre de questions à générer
     
     Returns:
-        list: Liste de dicts d'exercices avec topic_id
+        list: Exercices validés avec topic_id
+    """
+    prompt = _prompt_essential_questions(matiere_nom, classe, topics_list, count)
+    # Pas de cache : les lots successifs doivent donner des questions différentes
+    json_str = call_groq_safe(prompt, classe=classe, cache=False, json_mode=True, tache='exercices')
+    if not json_str:
+        return []
+    
+    topic_ids = {t['id'] for t in topics_list}
+    return validate_exercises(parse_json_items(json_str, "essential_questions"), prompt, json_str, classe, topic_ids)
+
+
+async def agenerate_essential_questions_ia(matiere_nom, classe, topics_list, count=10):
+    """Version asynchrone de generate_essential_questions_ia."""
+    prompt = _prompt_essential_questions(matiere_nom, classe, topics_list, count)
+    json_str = await acall_groq_safe(prompt, classe=classe, cache=False, json_mode=True, tache='exercices')
+    if not json_str:
+        return []
+    
+    topic_ids = {t['id'] for t in topics_list}
+    return await avalidate_exercises(
+        parse_json_items(json_str, "essential_questions"), prompt, json_str, classe, topic_ids
+    )
+
+
+def stream_essential_questions_ia(matiere_nom, classe, topics_list, count=10):
+    """
+    Version streaming de generate_essential_questions_ia (voir stream_exercises_batch_ia).
+    
+    Yields:
+        dict: Exercice validé avec topic_id
     """
+    prompt = _prompt_essential_questions(matiere_nom, classe, topics_list, count)
+    topic_ids = {t['id'] for t in topics_list}
+    yield from _stream_valid_exercises(
+        stream_groq(prompt, classe=classe, tache='exercices'), prompt, classe, "essential_questions", topic_ids
+    )
+
+
+def _prompt_essential_questions(matiere_nom, classe, topics_list, count):
     topics_str = "\n".join([f"- {t['id']}: {t['titre']}" for t in topics_list])
     
-    prompt = f"""Tu es un expert pédagogique du programme scolaire au Burkina Faso.
+    return f"""Tu es un expert pédagogique du programme scolaire au Burkina Faso.
 Ta mission est de générer les {count} questions les plus ESSENTIELLES pour un élève de {classe.upper()} en {matiere_nom.upper()}.
 Ces questions doivent couvrir les points fondamentaux que l'élève DOIT absolument maîtriser à la fin de l'année.
 
@@ -349,8 +1223,8 @@ Pour chaque question, choisis le chapitre le plus pertinent parmi la liste suiva
 
 Si aucun chapitre ne correspond vraiment, utilise l'ID du chapitre le plus proche ou le premier de la liste.
 
-Format de réponse (JSON uniquement, une liste d'objets) :
-[
+Format de réponse (JSON uniquement, un objet contenant la liste) :
+{{"exercices": [
     {{
         "question": "La question essentielle...",
         "type": "choix_multiple",
@@ -362,42 +1236,40 @@ Format de réponse (JSON uniquement, une liste d'objets) :
         "topic_id": 123
     }},
     ...
-]
+]}}
 """
-    
-    json_str = call_groq_safe(prompt, classe=classe)
-    if not json_str:
-        return []
-    
-    data = _parse_json_response(json_str, "essential_questions")
-    return data if isinstance(data, list) else []
 
 
-def _parse_json_response(response, context_name="json"):
+async def gather_bounded(items, worker, concurrency=None):
     """
-    Parse une réponse JSON potentiellement mal formatée de l'IA.
+    Exécute worker(item) pour chaque item avec au plus `concurrency` appels en vol.
     
     Args:
-        response: Réponse texte contenant du JSON
-        context_name: Nom du contexte pour les logs
+        items: Éléments à traiter
+        worker: Coroutine function prenant un item
+        concurrency: Nombre max d'appels simultanés (défaut: settings.IA_CONCURRENCY)
     
     Returns:
-        dict ou list: Données parsées, ou None si échec
+        list: Résultats dans l'ordre des items (l'exception si un appel a échoué)
     """
-    try:
-        # Extraire ce qui ressemble à du JSON [...] ou {...}
-        match = re.search(r'(\[.*\]|\{.*\})', response, re.DOTALL)
-        if match:
-            json_str = match.group(0)
-        else:
-            json_str = response
-        
-        # Supprimer d'éventuels commentaires JSON
-        json_str = re.sub(r'//.*?\n', '\n', json_str)
-        json_str = re.sub(r'/\*.*?\*/', '', json_str, flags=re.DOTALL)
-        
-        return json.loads(json_str)
-    except json.JSONDecodeError as e:
-        logger.error(f"Erreur parsing JSON ({context_name}): {e}")
-        logger.debug(f"Réponse brute (début): {response[:300]}...")
-        return None
+    semaphore = asyncio.Semaphore(concurrency or settings.IA_CONCURRENCY)
+    
+    async def _run(item):
+        async with semaphore:
+            return await worker(item)
+    
+    return await asyncio.gather(*(_run(item) for item in items), return_exceptions=True)
+
+
+def run_bounded(items, worker, concurrency=None):
+    """
+    Point d'entrée synchrone de gather_bounded (commandes de management).
+    Ferme le pool asynchrone de la boucle à la fin.
+    """
+    async def _main():
+        try:
+            return await gather_bounded(items, worker, concurrency)
+        finally:
+            await client_registry.aclose_loop()
+    
+    return asyncio.run(_main())
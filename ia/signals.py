@@ -0,0 +1,18 @@
+"""
+Mise à jour de l'index des cours quand un topic change (voir ia.retrieval).
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from core.models import Topic
+from ia.retrieval import retrieval_index
+
+
+@receiver(post_save, sender=Topic)
+def reindex_topic(sender, instance, **kwargs):
+    retrieval_index.update_topic(instance)
+
+
+@receiver(post_delete, sender=Topic)
+def unindex_topic(sender, instance, **kwargs):
+    retrieval_index.remove_topic(instance.id)
@@ -0,0 +1,89 @@
+"""
+Coalescence « single-flight » des générations IA entre processus.
+
+Quand plusieurs requêtes (sur plusieurs workers) demandent la même
+génération, une seule l'exécute : elle détient une ligne VerrouGeneration
+(contrainte d'unicité sur la clé, fonctionne sous SQLite comme PostgreSQL).
+Les autres attendent le résultat, avec un délai borné.
+"""
+import time
+import uuid
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from ia.models import VerrouGeneration
+
+logger = logging.getLogger(__name__)
+
+
+def single_flight(cle, produce, poll, wait=None, ttl=None, interval=0.2):
+    """
+    Exécute `produce` une seule fois pour `cle`, tous processus confondus.
+
+    Args:
+        cle: Clé de coalescence (ex. "explication:42")
+        produce: Fonction de génération, appelée par le détenteur du verrou
+        poll: Fonction retournant le résultat déjà disponible, ou None
+        wait: Attente max (s) d'un résultat produit ailleurs (défaut: IA_SINGLE_FLIGHT_WAIT)
+        ttl: Durée de vie du verrou (défaut: IA_SINGLE_FLIGHT_TTL)
+
+    Returns:
+        Résultat de `produce` ou de `poll`, ou None si l'attente a expiré
+    """
+    wait = settings.IA_SINGLE_FLIGHT_WAIT if wait is None else wait
+    ttl = settings.IA_SINGLE_FLIGHT_TTL if ttl is None else ttl
+    deadline = time.monotonic() + wait
+
+    while True:
+        token = acquire(cle, ttl)
+        if token:
+            try:
+                # Un autre processus a pu terminer juste avant notre prise de verrou
+                result = poll()
+                return result if result is not None else produce()
+            finally:
+                release(cle, token)
+
+        # Génération en cours ailleurs : attendre son résultat
+        while VerrouGeneration.objects.filter(cle=cle).exists():
+            result = poll()
+            if result is not None:
+                return result
+            if time.monotonic() >= deadline:
+                logger.info(f"Single-flight {cle}: attente expirée")
+                return None
+            time.sleep(interval)
+
+        result = poll()
+        if result is not None:
+            return result
+        # Verrou libéré sans résultat (échec du détenteur) : tenter de prendre le relais
+
+
+def acquire(cle, ttl):
+    """
+    Prend le verrou `cle` (en reprenant un verrou expiré).
+
+    Returns:
+        str: Jeton du détenteur, ou None si le verrou est déjà pris
+    """
+    now = timezone.now()
+    VerrouGeneration.objects.filter(cle=cle, date_expiration__lte=now).delete()
+    token = uuid.uuid4().hex
+    try:
+        with transaction.atomic():
+            VerrouGeneration.objects.create(
+                cle=cle, proprietaire=token, date_expiration=now + timedelta(seconds=ttl)
+            )
+    except IntegrityError:
+        return None
+    return token
+
+
+def release(cle, token):
+    """Libère le verrou s'il appartient encore à `token`."""
+    VerrouGeneration.objects.filter(cle=cle, proprietaire=token).delete()
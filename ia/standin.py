@@ -0,0 +1,387 @@
+"""
+Serveur local qui imite l'API chat-completions de Groq (tests de charge, benchmarks).
+
+Pointé par GROQ_BASE_URL, il remplace Groq sur tout le chemin réel des
+requêtes (SDK, pool HTTP, limiteur, disjoncteur, rejeux) :
+  - latence tirée d'une distribution (fixe, uniforme, normale, lognormale) ;
+  - réponses complètes ou en streaming (server-sent events, délai par fragment) ;
+  - 429 avec Retry-After et erreurs 5xx injectés selon des taux donnés,
+    éventuellement différents par modèle (routage et replis, voir ia.routing) ;
+  - cassettes : en mode `record`, les requêtes sont relayées vers la vraie API
+    et les réponses enregistrées (JSONL) ; en mode `replay`, la même requête
+    (même clé que le cache des réponses IA) rejoue la réponse enregistrée.
+
+Usage: python manage.py serveur_ia_local (voir la commande), ou dans un test :
+
+    with StandInServer(StandInConfig(latency='lognormale:80,0.4')) as server:
+        with override_settings(GROQ_BASE_URL=server.url): ...
+"""
+import json
+import time
+import random
+import logging
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from ia.cache import make_key
+
+logger = logging.getLogger(__name__)
+
+GROQ_URL = 'https://api.groq.com'
+CHAT_PATH = '/openai/v1/chat/completions'
+LOIS = ('fixe', 'uniforme', 'normale', 'lognormale')
+
+
+class Latency:
+    """
+    Distribution de latence, décrite par une chaîne (millisecondes) :
+    `50` ou `fixe:50`, `uniforme:20,200`, `normale:100,30` (moyenne, écart-type),
+    `lognormale:80,0.5` (médiane, sigma).
+    """
+
+    def __init__(self, spec='0'):
+        self.spec = str(spec)
+        loi, _, params = self.spec.partition(':')
+        if not params:
+            loi, params = 'fixe', loi
+        if loi not in LOIS:
+            raise ValueError(f"Loi de latence inconnue: {loi} (attendu: {', '.join(LOIS)})")
+        self.loi = loi
+        self.params = [float(p) for p in params.split(',')]
+
+    def sample(self, rng=random):
+        """Latence tirée, en secondes (jamais négative)."""
+        p = self.params
+        if self.loi == 'fixe':
+            ms = p[0]
+        elif self.loi == 'uniforme':
+            ms = rng.uniform(p[0], p[1])
+        elif self.loi == 'normale':
+            ms = rng.gauss(p[0], p[1])
+        else:
+            ms = p[0] * rng.lognormvariate(0, p[1])
+        return max(ms, 0) / 1000
+
+
+class StandInConfig:
+    """
+    Comportement du serveur local.
+
+    Args:
+        latency: Latence avant la réponse (voir Latency)
+        chunk_latency: Délai entre deux fragments en streaming
+        rate_429: Part des requêtes refusées en 429
+        rate_error: Part des requêtes en erreur 5xx
+        retry_after: Valeur de l'en-tête Retry-After des 429 (secondes)
+        reply: Texte des réponses générées (hors cassette)
+        cassette: Fichier JSONL des réponses enregistrées
+        mode: 'replay' (rejoue, sinon répond `reply`) ou 'record' (relaie et enregistre)
+        upstream: URL de la vraie API (mode record)
+        upstream_key: Clé API de la vraie API (mode record)
+        seed: Graine du tirage (latences, erreurs) pour des runs reproductibles
+        models: Comportement propre à certains modèles, ex.
+                {'llama-3.3-70b-versatile': {'latency': 'lognormale:600,0.5', 'rate_429': 0.3}}
+    """
+
+    def __init__(self, latency='0', chunk_latency='0', rate_429=0.0, rate_error=0.0, retry_after=1,
+                 reply="Voici une réponse du serveur local 🧪.", cassette=None, mode='replay',
+                 upstream=GROQ_URL, upstream_key=None, seed=None, models=None):
+        self.latency = Latency(latency)
+        self.chunk_latency = Latency(chunk_latency)
+        self.rate_429 = rate_429
+        self.rate_error = rate_error
+        self.retry_after = retry_after
+        self.reply = reply
+        self.cassette = Cassette(cassette) if cassette else None
+        self.mode = mode
+        self.upstream = upstream
+        self.upstream_key = upstream_key
+        self.rng = random.Random(seed)
+        self.models = {
+            name: {
+                'latency': Latency(spec['latency']) if 'latency' in spec else self.latency,
+                'rate_429': spec.get('rate_429', rate_429),
+                'rate_error': spec.get('rate_error', rate_error),
+            }
+            for name, spec in (models or {}).items()
+        }
+
+    def for_model(self, model):
+        """(latence, taux de 429, taux d'erreurs) appliqués aux requêtes de `model`."""
+        spec = self.models.get(model)
+        if spec:
+            return spec['latency'], spec['rate_429'], spec['rate_error']
+        return self.latency, self.rate_429, self.rate_error
+
+
+class Cassette:
+    """
+    Réponses enregistrées, une par ligne JSON : {"cle", "contenu", "usage"}.
+    La clé est celle du cache des réponses IA (modèle, messages, paramètres).
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry['cle']] = entry
+
+    @staticmethod
+    def key(request):
+        params = {k: request[k] for k in ('response_format',) if request.get(k)}
+        return make_key(
+            request.get('model'), request.get('messages'), request.get('temperature'),
+            request.get('max_tokens'), **params,
+        )
+
+    def get(self, request):
+        return self.entries.get(self.key(request))
+
+    def add(self, request, content, usage=None):
+        entry = {'cle': self.key(request), 'contenu': content, 'usage': usage}
+        with self._lock:
+            self.entries[entry['cle']] = entry
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Requêtes chat-completions, en HTTP/1.1 pour autoriser le keep-alive."""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    server_version = 'StandIn/1.0'
+
+    def setup(self):
+        super().setup()
+        self.server.stats.add('connexions')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self._send_json(400, {'error': {'message': 'JSON invalide', 'type': 'invalid_request_error'}})
+        if not self.path.rstrip('/').endswith('chat/completions'):
+            return self._send_json(404, {'error': {'message': f'Chemin inconnu: {self.path}'}})
+
+        config, stats = self.server.config, self.server.stats
+        stats.add('requetes')
+        stats.add_model(request.get('model'))
+        latency, rate_429, rate_error = config.for_model(request.get('model'))
+        time.sleep(latency.sample(config.rng))
+
+        tirage = config.rng.random()
+        if tirage < rate_429:
+            stats.add('refus_429')
+            return self._send_json(
+                429, {'error': {'message': 'Rate limit reached', 'type': 'tokens', 'code': 'rate_limit_exceeded'}},
+                headers={'Retry-After': str(config.retry_after)},
+            )
+        if tirage < rate_429 + rate_error:
+            stats.add('erreurs')
+            return self._send_json(503, {'error': {'message': 'Service unavailable', 'type': 'internal_server_error'}})
+
+        content, usage = self._content(request)
+        if content is None:
+            stats.add('erreurs')
+            return self._send_json(502, {'error': {'message': "Échec de l'API amont", 'type': 'internal_server_error'}})
+        if request.get('stream'):
+            self._send_stream(request, content, usage)
+        else:
+            self._send_json(200, _completion(request, content, usage))
+
+    def _content(self, request):
+        """Contenu de la réponse : cassette, API amont (record) ou réponse générée."""
+        config, stats = self.server.config, self.server.stats
+        cassette = config.cassette
+        if cassette and config.mode == 'replay':
+            entry = cassette.get(request)
+            if entry:
+                stats.add('rejoues')
+                return entry['contenu'], entry.get('usage')
+            stats.add('absents_cassette')
+        if cassette and config.mode == 'record':
+            content, usage = self._forward(request)
+            if content is not None:
+                cassette.add(request, content, usage)
+                stats.add('enregistres')
+            return content, usage
+        return _generated_reply(request, config.reply), None
+
+    def _forward(self, request):
+        """Relaie la requête (sans streaming) vers l'API amont."""
+        config = self.server.config
+        try:
+            response = httpx.post(
+                config.upstream.rstrip('/') + CHAT_PATH,
+                json=dict(request, stream=False),
+                headers={'Authorization': f'Bearer {config.upstream_key}'},
+                timeout=120,
+            )
+            response.raise_for_status()
+            body = response.json()
+            return body['choices'][0]['message']['content'], body.get('usage')
+        except Exception as e:
+            logger.warning(f"Serveur IA local: relais vers {config.upstream} impossible: {e}")
+            return None, None
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, request, content, usage):
+        """Fragments SSE `chat.completion.chunk` (transfert chunked), puis [DONE]."""
+        config = self.server.config
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        words = content.split(' ')
+        pieces = [w + (' ' if i < len(words) - 1 else '') for i, w in enumerate(words)]
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep(config.chunk_latency.sample(config.rng))
+            self._write_event(_chunk(request, {'content': piece}))
+        self._write_event(_chunk(request, {}, finish_reason='stop', usage=usage or _usage(request, content)))
+        self._write_chunk(b'data: [DONE]\n\n')
+        self._write_chunk(b'')
+
+    def _write_event(self, payload):
+        self._write_chunk(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode('utf-8'))
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counters = {
+            'connexions': 0, 'requetes': 0, 'refus_429': 0, 'erreurs': 0,
+            'rejoues': 0, 'absents_cassette': 0, 'enregistres': 0,
+        }
+        self.models = {}
+
+    def add(self, key, value=1):
+        with self._lock:
+            self.counters[key] += value
+
+    def add_model(self, model):
+        with self._lock:
+            self.models[model] = self.models.get(model, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counters, modeles=dict(self.models))
+
+
+class StandInServer:
+    """Serveur local dans un thread (daemon) ; utilisable comme context manager."""
+
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        self.httpd = ThreadingHTTPServer((host, port), StandInHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.config = config or StandInConfig()
+        self.httpd.stats = StandInStats()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def config(self):
+        return self.httpd.config
+
+    @property
+    def stats(self):
+        return self.httpd.stats
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _generated_reply(request, reply):
+    """Réponse générée : un exercice valide en mode JSON, sinon le texte configuré."""
+    if (request.get('response_format') or {}).get('type') == 'json_object':
+        return json.dumps({'exercices': [{
+            'question': 'Combien font 2 + 3 ?', 'type': 'calcul', 'options': ['4', '5', '6'],
+            'correct_index': 1, 'feedback_success': 'Bravo !', 'feedback_fail': 'Compte encore.', 'difficulte': 1,
+        }]}, ensure_ascii=False)
+    return reply
+
+
+def _usage(request, content):
+    prompt_tokens = sum(len(m.get('content') or '') for m in request.get('messages', [])) // 4 + 1
+    completion_tokens = len(content) // 4 + 1
+    return {
+        'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+        'total_tokens': prompt_tokens + completion_tokens,
+    }
+
+
+def _completion(request, content, usage=None):
+    return {
+        'id': 'chatcmpl-standin',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': request.get('model', 'standin'),
+        'choices': [{
+            'index': 0,
+            'message': {'role': 'assistant', 'content': content},
+            'finish_reason': 'stop',
+        }],
+        'usage': usage or _usage(request, content),
+    }
+
+
+def _chunk(request, delta, finish_reason=None, usage=None):
+    chunk = {
+        'id': 'chatcmpl-standin',
+        'object': 'chat.completion.chunk',
+        'created': int(time.time()),
+        'model': request.get('model', 'standin'),
+        'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+    }
+    if usage:
+        chunk['x_groq'] = {'usage': usage}
+    return chunk
@@ -0,0 +1,73 @@
+"""
+État partagé entre processus (workers gunicorn, commandes de management).
+
+Chaque état est un petit fichier JSON dans settings.IA_STATE_DIR, lu et
+modifié sous verrou exclusif (fcntl.flock). Suffisant pour coordonner les
+processus d'une même machine sans broker externe.
+"""
+import json
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrou limité au processus
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class SharedState:
+    """
+    Dictionnaire JSON persistant, modifiable atomiquement par plusieurs processus.
+
+    Usage:
+        with state.locked() as data:
+            data['compteur'] = data.get('compteur', 0) + 1
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._thread_lock = threading.Lock()
+
+    @property
+    def path(self):
+        return settings.IA_STATE_DIR / f"{self.name}.json"
+
+    @contextmanager
+    def locked(self):
+        """Verrouille l'état, le rend modifiable, puis l'écrit en sortie de bloc."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._thread_lock, open(self.path, 'a+', encoding='utf-8') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                raw = f.read()
+                try:
+                    data = json.loads(raw) if raw else {}
+                except json.JSONDecodeError:
+                    logger.warning(f"État partagé {self.name} illisible, réinitialisé")
+                    data = {}
+                yield data
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(data))
+                f.flush()
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def read(self):
+        """Lecture seule (sans écriture en retour)."""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_SH)
+                raw = f.read()
+            return json.loads(raw) if raw else {}
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
@@ -0,0 +1,275 @@
+"""
+Télémétrie des appels IA : qui consomme le quota, et où passe la latence.
+
+Chaque appel (call_groq, stream_groq et leurs versions asynchrones) est
+mesuré : appelant (vue ou commande), classe, topic, modèle, tokens du prompt
+et de la réponse (response.usage), durée, rejeux et hits du cache. Les
+mesures sont mises en tampon par processus puis écrites par lots dans la
+table AppelIA, qui ne garde que IA_TELEMETRY_RETENTION_DAYS jours.
+
+L'appelant est posé par TelemetryMiddleware pour les vues
+(ex. « ChatbotViewSet.chat ») et par le décorateur appelant() pour les
+commandes (ex. « commande:generer_exercices »).
+"""
+import time
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_appelant = ContextVar('appelant_ia', default='inconnu')
+_mesure = ContextVar('mesure_ia', default=None)
+
+FENETRES = {'1h': 3600, '24h': 24 * 3600, '7j': 7 * 24 * 3600}
+
+
+@contextmanager
+def appelant(nom):
+    """
+    Attribue les appels IA du bloc (ou de la fonction décorée) à `nom`.
+    En sortie, les mesures en attente sont écrites.
+    """
+    token = _appelant.set(nom)
+    try:
+        yield
+    finally:
+        _appelant.reset(token)
+        telemetry_store.flush()
+
+
+def current_caller():
+    return _appelant.get()
+
+
+class TelemetryMiddleware:
+    """Attribue les appels IA d'une requête à sa vue (ex. « ExplicationViewSet.retrieve »)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _appelant.set(f"http:{request.path}")
+        try:
+            return self.get_response(request)
+        finally:
+            _appelant.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        cls = getattr(view_func, 'cls', None)
+        if cls is None:
+            _appelant.set(getattr(view_func, '__name__', 'vue'))
+            return None
+        actions = getattr(view_func, 'actions', None) or {}
+        action = actions.get(request.method.lower(), request.method.lower())
+        _appelant.set(f"{cls.__name__}.{action}")
+        return None
+
+
+class Mesure:
+    """Mesure d'un appel IA, complétée par ia.services pendant l'appel."""
+
+    def __init__(self, classe=None, topic_id=None, modele='', flux=False):
+        self.appelant = current_caller()
+        self.classe = classe or ''
+        self.topic_id = topic_id
+        self.modele = modele
+        self.flux = flux
+        self.cache = False
+        self.rejeux = 0
+        self.tokens_prompt = 0
+        self.tokens_reponse = 0
+        self.debut = time.monotonic()
+
+    def usage(self, usage):
+        """Tokens consommés d'après response.usage (ou x_groq.usage en streaming)."""
+        prompt = getattr(usage, 'prompt_tokens', None)
+        completion = getattr(usage, 'completion_tokens', None)
+        if isinstance(prompt, int):
+            self.tokens_prompt = prompt
+        if isinstance(completion, int):
+            self.tokens_reponse = completion
+
+    @contextmanager
+    def active(self):
+        """Rend la mesure courante (rejeux comptés) sans l'enregistrer : pour les flux."""
+        token = _mesure.set(self)
+        try:
+            yield self
+        finally:
+            _mesure.reset(token)
+
+
+@contextmanager
+def mesure(classe=None, topic_id=None, modele='', flux=False):
+    """
+    Mesure l'appel IA du bloc ; l'enregistrement est fait en sortie (succès
+    ou erreur). _complete y compte les rejeux via count_retry().
+    """
+    m = Mesure(classe, topic_id, modele, flux)
+    succes = False
+    try:
+        with m.active():
+            yield m
+        succes = True
+    finally:
+        telemetry_store.record(m, succes)
+
+
+def cache_hit(classe=None, topic_id=None, modele=''):
+    """Enregistre une réponse servie par un cache (réponses Groq, FAQ), sans appel IA."""
+    m = Mesure(classe, topic_id, modele)
+    m.cache = True
+    telemetry_store.record(m, True)
+
+
+def count_retry():
+    m = _mesure.get()
+    if m is not None:
+        m.rejeux += 1
+
+
+def set_model(modele):
+    """Modèle réellement appelé (après un éventuel repli, voir ia.routing)."""
+    m = _mesure.get()
+    if m is not None:
+        m.modele = modele
+
+
+class TelemetryStore:
+    """
+    Tampon des mesures du processus, écrit par lots (bulk_create) dans AppelIA.
+
+    Rien n'est écrit depuis une boucle asyncio (accès base synchrones
+    interdits) : le lot part au prochain appel synchrone ou à la sortie de
+    appelant(). Les erreurs de la base sont absorbées.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._last_prune = 0.0
+
+    def record(self, m, succes):
+        from ia.models import AppelIA
+
+        appel = AppelIA(
+            appelant=m.appelant[:80],
+            classe=m.classe[:10],
+            topic_id=m.topic_id,
+            modele=m.modele[:100],
+            flux=m.flux,
+            cache=m.cache,
+            succes=succes,
+            rejeux=m.rejeux,
+            tokens_prompt=m.tokens_prompt,
+            tokens_reponse=m.tokens_reponse,
+            duree_ms=int((time.monotonic() - m.debut) * 1000),
+            date=timezone.now(),
+        )
+        with self._lock:
+            self._pending.append(appel)
+            due = (
+                len(self._pending) >= settings.IA_TELEMETRY_BATCH_SIZE
+                or time.monotonic() - self._last_flush >= settings.IA_TELEMETRY_FLUSH_INTERVAL
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Écrit les mesures en attente (sauf depuis une boucle asyncio)."""
+        from ia.models import AppelIA
+
+        try:
+            asyncio.get_running_loop()
+            return
+        except RuntimeError:
+            pass
+
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._last_flush = time.monotonic()
+            prune = self._last_flush - self._last_prune >= 3600
+            if prune:
+                self._last_prune = self._last_flush
+        if not pending:
+            return
+        try:
+            AppelIA.objects.bulk_create(pending)
+            if prune:
+                limite = timezone.now() - timedelta(days=settings.IA_TELEMETRY_RETENTION_DAYS)
+                AppelIA.objects.filter(date__lt=limite).delete()
+        except Exception as e:
+            logger.warning(f"Télémétrie IA: écriture impossible ({len(pending)} mesures perdues): {e}")
+
+    def clear(self):
+        with self._lock:
+            self._pending = []
+
+
+def statistiques(fenetre=24 * 3600, appelant=None):
+    """
+    Latence et consommation par appelant sur les `fenetre` dernières secondes.
+
+    Returns:
+        list: Une ligne par appelant (les plus gros consommateurs de tokens
+              en premier) : appels, hits_cache, echecs, rejeux, p50_ms, p95_ms
+              (appels réels uniquement), tokens_prompt, tokens_reponse, cout_usd
+    """
+    from ia.models import AppelIA
+
+    telemetry_store.flush()
+    rows = AppelIA.objects.filter(date__gte=timezone.now() - timedelta(seconds=fenetre))
+    if appelant:
+        rows = rows.filter(appelant=appelant)
+
+    par_appelant = {}
+    for nom, modele, cache, succes, rejeux, prompt, reponse, duree in rows.values_list(
+        'appelant', 'modele', 'cache', 'succes', 'rejeux', 'tokens_prompt', 'tokens_reponse', 'duree_ms'
+    ):
+        ligne = par_appelant.setdefault(nom, {
+            'appelant': nom, 'appels': 0, 'hits_cache': 0, 'echecs': 0, 'rejeux': 0,
+            'tokens_prompt': 0, 'tokens_reponse': 0, 'cout_usd': 0.0, 'durees': [],
+        })
+        ligne['appels'] += 1
+        ligne['hits_cache'] += cache
+        ligne['echecs'] += not succes
+        ligne['rejeux'] += rejeux
+        ligne['tokens_prompt'] += prompt
+        ligne['tokens_reponse'] += reponse
+        ligne['cout_usd'] += cout_estime(modele, prompt, reponse)
+        if not cache:
+            ligne['durees'].append(duree)
+
+    lignes = []
+    for ligne in par_appelant.values():
+        durees = sorted(ligne.pop('durees'))
+        ligne['p50_ms'] = _percentile(durees, 0.5)
+        ligne['p95_ms'] = _percentile(durees, 0.95)
+        ligne['cout_usd'] = round(ligne['cout_usd'], 6)
+        lignes.append(ligne)
+    return sorted(lignes, key=lambda l: -(l['tokens_prompt'] + l['tokens_reponse']))
+
+
+def _percentile(values, p):
+    if not values:
+        return None
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def cout_estime(modele, tokens_prompt, tokens_reponse):
+    """Coût estimé (USD) d'après IA_PRIX_MODELES (prix par million de tokens)."""
+    prix = settings.IA_PRIX_MODELES.get(modele)
+    if not prix:
+        return 0.0
+    return (tokens_prompt * prix[0] + tokens_reponse * prix[1]) / 1_000_000
+
+
+telemetry_store = TelemetryStore()
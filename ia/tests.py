@@ -1,35 +1,418 @@
 """
 Tests pour les services IA (Groq) et génération audio (gTTS).
 """
-from django.test import TestCase, override_settings
-from unittest.mock import patch, MagicMock
+import json
+import asyncio
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from io import StringIO
+from datetime import timedelta
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
-from core.models import Matiere, Topic
-from ia.services import generate_audio, call_groq, call_groq_safe, generate_explication_ia
-from api.exceptions import IAServiceError, IAConfigurationError
+import httpx
+from groq import APIConnectionError, APITimeoutError, NotFoundError, RateLimitError
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from unittest.mock import patch, MagicMock, AsyncMock
+
+from core.models import Matiere, Topic, Exercice
+from ia.cache import response_cache
+from ia.client import ClientRegistry
+from ia.models import ReponseIACache, VerrouGeneration, ReponseFAQ, AppelIA, TacheFond, AudioAsset
+from ia.audiostore import asset_key, asset_file, asset_path, audio_store, split_chunks
+from ia.mp3 import concat, duration_ms
+from ia.variants import negotiate, transcode, variant_file, variant_url
+from ia.bundles import build, bundle_name, classe_manifest, topic_manifest
+from ia.faq import NOM_ELEVE, faq_cache, question_key
+from ia.retrieval import retrieval_index
+from ia.standin import StandInServer, StandInConfig, Cassette, Latency
+from tuteur_intelligent.s3standin import S3StandInServer
+from ia.telemetry import appelant, statistiques, telemetry_store
+from ia.routing import model_router
+from ia.jsonstream import JSONItemStream, parse_json_items
+from ia.validation import validate_exercise, exercice_fields, validation_stats
+from ia.dedup import exercise_index, create_exercice_unique
+from ia.packing import plan_packs, pack_report, pack_capacity
+from ia.prompts import ChatPromptBuilder, chat_persona, count_tokens
+from ia.singleflight import single_flight, acquire, release
+from ia.jobs import TRAITEMENTS, enqueue, claim, run_job, PRIORITE_ELEVE
+from ia.breaker import CircuitBreaker, circuit_breaker, FERME, OUVERT, SEMI_OUVERT
+from ia.ratelimit import RateLimiter, PRIORITE_BATCH, PRIORITE_INTERACTIVE, mode_batch, current_priority
+from ia.services import (
+    generate_audio, call_groq, call_groq_safe, generate_explication_ia,
+    acall_groq, run_bounded, stream_groq, stream_exercises_batch_ia, generate_exercises_batch_ia,
+    chat_tuteur_ia, get_route, generate_exercises_pack_ia,
+)
+from api.exceptions import IAServiceError, IAConfigurationError, IARateLimitError
+
+_state_dir = None
+_state_settings = None
+
+
+def setUpModule():
+    """État partagé isolé dans un répertoire temporaire, limiteur sans contrainte."""
+    global _state_dir, _state_settings
+    _state_dir = tempfile.mkdtemp()
+    _state_settings = override_settings(
+        IA_STATE_DIR=Path(_state_dir), IA_RATE_RPM=10 ** 4, IA_RATE_TPM=10 ** 7,
+        AUDIO_STORAGE_PATH=Path(_state_dir) / 'audio',
+    )
+    _state_settings.enable()
+
+
+def tearDownModule():
+    _state_settings.disable()
+    shutil.rmtree(_state_dir, ignore_errors=True)
+
+
+# Trame MP3 valide (MPEG 2 couche III, 32 kbit/s, 24 kHz, mono) : 96 octets, 24 ms
+TRAME_MP3 = b'\xff\xf3\x44\xc0' + b'\x00' * 92
+
+
+def fake_gtts(pannes=()):
+    """Remplace gTTS : écrit 10 trames (240 ms), échoue pour les textes de `pannes`."""
+    def make(text, lang='fr', slow=False):
+        tts = MagicMock()
+        def save(path):
+            if text in pannes:
+                raise RuntimeError("gTTS indisponible")
+            Path(path).write_bytes(TRAME_MP3 * 10)
+        tts.save.side_effect = save
+        return tts
+    return MagicMock(side_effect=make)
+
+
+# Cours découpé en 5 morceaux avec AUDIO_CHUNK_CARACTERES=60
+COURS = """1. **Introduction**
+
+Une fraction partage un tout en parts égales. Le nombre du bas compte les parts.
+
+2. **Exemple** : une pizza coupée en quatre, on en mange une, il reste trois quarts de la pizza à partager entre amis."""
+
+
+def isolate_audio(test):
+    """Dossier audio propre au test : un fichier déjà rendu n'est jamais rendu à nouveau."""
+    audio_dir = tempfile.mkdtemp(dir=_state_dir)
+    override = override_settings(AUDIO_STORAGE_PATH=Path(audio_dir))
+    override.enable()
+    test.addCleanup(override.disable)
 
 
 class AudioServiceTest(TestCase):
-    @patch('ia.services.gTTS')
-    def test_generate_audio(self, mock_gtts):
+    def setUp(self):
+        isolate_audio(self)
+    
+    def test_generate_audio(self):
         """Test génération audio avec gTTS"""
-        mock_tts_instance = MagicMock()
-        mock_gtts.return_value = mock_tts_instance
-        
-        # Simuler création fichier
-        with patch('ia.services.Path.exists', return_value=False):
-            with patch('builtins.open', create=True):
-                audio_url = generate_audio("Test texte", lang='fr')
-                self.assertIsNotNone(audio_url)
-                mock_gtts.assert_called_once()
+        with patch('ia.audiostore.gTTS', fake_gtts()) as mock_gtts:
+            audio_url = generate_audio("Test texte", lang='fr')
+        self.assertIsNotNone(audio_url)
+        mock_gtts.assert_called_once()
     
     def test_generate_audio_empty_text(self):
         """Test génération audio avec texte vide"""
         audio_url = generate_audio("")
         self.assertIsNone(audio_url)
+    
+    def test_stockage_adresse_par_le_texte_lu(self):
+        """Même texte lu (Markdown et espaces mis à part) : un seul rendu, fichier rangé par clé et indexé"""
+        with patch('ia.audiostore.gTTS', fake_gtts()) as mock_gtts:
+            url = generate_audio("**Les fractions**  partagent")
+            self.assertEqual(generate_audio("# Les fractions partagent"), url)
+            self.assertNotEqual(generate_audio("Les fractions partagent", lang='en'), url)
+        self.assertEqual(mock_gtts.call_count, 2)
+        
+        key = asset_key("Les fractions partagent")
+        self.assertEqual(url, f"{settings.MEDIA_URL}audio/{key[:2]}/{key[2:4]}/{key}.mp3")
+        self.assertTrue(asset_file(key).exists())
+        asset = AudioAsset.objects.get(cle=key)
+        self.assertEqual((asset.taille, asset.duree_ms), (960, 240))
+        self.assertFalse(list(asset_file(key).parent.glob('*.tmp')))
+    
+    def test_rendus_simultanes_coalesces(self):
+        """Les rendus simultanés d'une même clé n'en font qu'un"""
+        started = threading.Event()
+        def slow_render(text, lang='fr', slow=False):
+            started.set()
+            time.sleep(0.1)
+            return fake_gtts()(text, lang, slow)
+        key = asset_key("Bonjour")
+        with patch('ia.audiostore.gTTS', MagicMock(side_effect=slow_render)) as mock_gtts:
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                assets = list(pool.map(lambda _: audio_store.render(key, "Bonjour"), range(4)))
+        mock_gtts.assert_called_once()
+        self.assertEqual({a.chemin for a in assets}, {asset_path(key)})
+    
+    def test_nettoyer_audio(self):
+        """Les audios sans référence (et les fichiers non indexés) sont supprimés"""
+        matiere = Matiere.objects.create(nom='francais', ordre=1)
+        with patch('ia.audiostore.gTTS', fake_gtts()):
+            url = generate_audio("Lire des mots")
+            generate_audio("Texte abandonné")
+        Topic.objects.create(matiere=matiere, classe='ce1', titre='Lecture', resume='Lire', audio_url=url)
+        ancien = settings.AUDIO_STORAGE_PATH / 'ancien.mp3'
+        ancien.write_bytes(TRAME_MP3)
+        
+        call_command('nettoyer_audio', '--delai=0', '--fichiers', stdout=StringIO())
+        self.assertEqual(list(AudioAsset.objects.values_list('references', flat=True)), [1])
+        self.assertFalse(asset_file(asset_key("Texte abandonné")).exists())
+        self.assertTrue(asset_file(asset_key("Lire des mots")).exists())
+        self.assertFalse(ancien.exists())
+    
+    def test_decoupage_en_morceaux(self):
+        """Morceaux coupés aux paragraphes et aux phrases, puis aux virgules, sans dépasser la limite"""
+        chunks = split_chunks(COURS, limit=60)
+        self.assertEqual(chunks, [
+            '1. Introduction',
+            'Une fraction partage un tout en parts égales.',
+            'Le nombre du bas compte les parts.',
+            '2. Exemple : une pizza coupée en quatre, on en mange une,',
+            'il reste trois quarts de la pizza à partager entre amis.',
+        ])
+        self.assertEqual(split_chunks("Bonjour. Au revoir.", limit=60), ["Bonjour. Au revoir."])
+    
+    def test_jonction_mp3(self):
+        """La jonction ne garde que les trames audio : ni ID3 ni en-tête Xing d'un morceau"""
+        id3 = b'ID3\x04\x00\x00\x00\x00\x00\x05' + b'\x00' * 5
+        xing = b'\xff\xf3\x44\xc0' + b'\x00' * 13 + b'Xing' + b'\x00' * 75
+        data = concat([TRAME_MP3 * 2, id3 + xing + TRAME_MP3 * 3 + b'TAG' + b'\x00' * 125])
+        self.assertEqual(data, TRAME_MP3 * 5)
+        self.assertEqual(duration_ms(data), 120)
+    
+    @override_settings(AUDIO_CHUNK_CARACTERES=60)
+    def test_texte_long_par_morceaux(self):
+        """Un cours long est rendu par morceaux joints ; une révision ne rend que les morceaux modifiés"""
+        with patch('ia.audiostore.gTTS', fake_gtts()) as mock_gtts:
+            url = generate_audio(COURS)
+            self.assertEqual(mock_gtts.call_count, 5)
+            revised = generate_audio(COURS.replace('entre amis', 'entre amies'))
+            self.assertEqual(mock_gtts.call_args.kwargs['text'], 'il reste trois quarts de la pizza à partager entre amies.')
+            self.assertEqual(mock_gtts.call_count, 6)
+            self.assertIsNone(audio_store.manifest(generate_audio("Court")))
+        
+        asset = AudioAsset.objects.get(cle=asset_key(COURS))
+        self.assertEqual((asset.taille, asset.duree_ms), (4800, 1200))
+        manifest = audio_store.manifest(url)
+        self.assertEqual([m['debut_ms'] for m in manifest], [0, 240, 480, 720, 960])
+        self.assertEqual(manifest[0], {
+            'url': f"{settings.MEDIA_URL}{asset_path(asset_key('1. Introduction'))}", 'debut_ms': 0, 'duree_ms': 240,
+        })
+        self.assertEqual(audio_store.manifest(revised)[:4], manifest[:4])
+        
+        # Seul l'audio révisé est référencé : ses morceaux restent, le morceau remplacé part
+        matiere = Matiere.objects.create(nom='maths', ordre=1)
+        Topic.objects.create(matiere=matiere, classe='cm1', titre='Fractions', resume='Fractions', audio_url=revised)
+        call_command('nettoyer_audio', '--delai=0', stdout=StringIO())
+        self.assertEqual(AudioAsset.objects.count(), 6)
+        self.assertFalse(asset_file(asset_key(COURS)).exists())
+        self.assertEqual(len(audio_store.manifest(revised)), 5)
+
+
+def fake_ffmpeg(source, destination, options):
+    """Remplace ffmpeg : variante trois fois plus petite que l'original."""
+    Path(destination).write_bytes(Path(source).read_bytes()[:len(Path(source).read_bytes()) // 3])
+
+
+@patch('ia.variants._run_ffmpeg', side_effect=fake_ffmpeg)
+@patch('ia.variants.shutil.which', return_value='/usr/bin/ffmpeg')
+class AudioVariantTest(TestCase):
+    def setUp(self):
+        isolate_audio(self)
+    
+    def negotiate(self, **headers):
+        return negotiate(RequestFactory().get('/', **headers))
+    
+    def test_negociation(self, mock_which, mock_ffmpeg):
+        """Opus si le client l'accepte, mp3 bas débit sur connexion lente, sinon l'original"""
+        self.assertEqual(self.negotiate(HTTP_ACCEPT='application/json, audio/ogg;q=0.8'), 'opus')
+        self.assertEqual(self.negotiate(HTTP_ACCEPT='audio/ogg;q=0', HTTP_SAVE_DATA='on'), 'mp3-bas')
+        self.assertEqual(self.negotiate(HTTP_ECT='3g'), 'mp3-bas')
+        self.assertIsNone(self.negotiate(HTTP_ACCEPT='*/*', HTTP_ECT='4g'))
+        with override_settings(AUDIO_VARIANTES=['mp3-bas']):
+            self.assertIsNone(self.negotiate(HTTP_ACCEPT='audio/opus'))
+    
+    def test_transcodage(self, mock_which, mock_ffmpeg):
+        """Un audio rendu est transcodé par une tâche de fond ; transcoder_audio reprend les anciens"""
+        with patch('ia.audiostore.gTTS', fake_gtts()):
+            url = generate_audio("Les nombres pairs")
+        key = asset_key("Les nombres pairs")
+        self.assertEqual(variant_url(url, 'opus'), url)  # Pas encore transcodé : l'original
+        tache = TacheFond.objects.get(nom='variantes_audio')
+        self.assertEqual(tache.params, {'cles': [key]})
+        
+        self.assertEqual(TRAITEMENTS['variantes_audio'](**tache.params), {'tailles': {key: {'opus': 320, 'mp3-bas': 320}}})
+        self.assertEqual(variant_url(url, 'opus'), url.removesuffix('.mp3') + '.opus')
+        self.assertEqual(variant_url(url, 'mp3-bas'), url.removesuffix('.mp3') + '.bas.mp3')
+        self.assertEqual(mock_ffmpeg.call_count, 2)
+        
+        variant_file(key, 'opus').unlink()
+        out = StringIO()
+        call_command('transcoder_audio', '--variantes=opus', stdout=out)
+        self.assertIn('1 à transcoder', out.getvalue())
+        self.assertIn('3.0x plus léger', out.getvalue())
+        self.assertEqual(transcode(key), {'opus': 320, 'mp3-bas': 320})
+        self.assertEqual(mock_ffmpeg.call_count, 3)
+
+
+class SharedAudioStorageTest(TestCase):
+    """Audios publiés dans un stockage S3 partagé entre nœuds (tuteur_intelligent.storage)"""
+    def setUp(self):
+        isolate_audio(self)
+        self.server = S3StandInServer(buckets=('medias',)).start()
+        self.addCleanup(self.server.stop)
+        override = override_settings(
+            MEDIA_STORAGE='s3', MEDIA_S3_ENDPOINT_URL=self.server.url, MEDIA_S3_BUCKET='medias',
+            MEDIA_S3_ACCESS_KEY='local', MEDIA_S3_SECRET_KEY='local', MEDIA_S3_PREFIX='prod/',
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+    
+    def test_publication_et_recuperation(self):
+        """Un audio est publié avant d'être indexé ; un nœud sans le fichier le récupère au lieu de le rendre"""
+        with patch('ia.audiostore.gTTS', fake_gtts()) as mock_gtts:
+            url = generate_audio("Les triangles rectangles")
+        key = asset_key("Les triangles rectangles")
+        data, _, content_type, cache_control = self.server.store.objects[('medias', f'prod/{asset_path(key)}')]
+        self.assertEqual((data, content_type), (asset_file(key).read_bytes(), 'audio/mpeg'))
+        self.assertEqual(cache_control, 'public, max-age=31536000, immutable')
+        
+        # Autre nœud : ni fichier local ni index à jour
+        asset_file(key).unlink()
+        AudioAsset.objects.all().delete()
+        with patch('ia.audiostore.gTTS', fake_gtts()) as mock_gtts:
+            self.assertEqual(generate_audio("Les triangles rectangles"), url)
+        mock_gtts.assert_not_called()
+        self.assertEqual(asset_file(key).read_bytes(), data)
+        self.assertEqual(self.server.stats['put'], 1)
+
+
+class AudioBundleTest(TestCase):
+    """Paquets audio hors ligne par topic et par classe (ia.bundles)"""
+    def setUp(self):
+        isolate_audio(self)
+        media_root = tempfile.mkdtemp(dir=_state_dir)
+        override = override_settings(MEDIA_ROOT=Path(media_root))
+        override.enable()
+        self.addCleanup(override.disable)
+        
+        matiere = Matiere.objects.create(nom='mathematiques', ordre=1)
+        self.topic = Topic.objects.create(matiere=matiere, classe='cp1', titre='Compter', resume='Compter de 1 à 10')
+        autre = Topic.objects.create(matiere=matiere, classe='cp1', titre='Formes', resume='Le carré et le rond')
+        with patch('ia.audiostore.gTTS', fake_gtts()):
+            bravo, rate = generate_audio("Bravo !"), generate_audio("Essaie encore !")
+            self.exercices = [
+                Exercice.objects.create(
+                    topic=topic, type_exercice='choix_multiple', question=question, correct_index=0,
+                    question_audio_url=generate_audio(question),
+                    feedback_success_audio_url=bravo, feedback_fail_audio_url=rate,
+                )
+                for topic, question in [(self.topic, "Combien de pommes ?"), (self.topic, "Compte les doigts"),
+                                        (autre, "Montre le carré")]
+            ]
+    
+    def test_paquet_topic(self):
+        """Un fichier par audio distinct, manifeste exercice -> fichiers, archive déterministe"""
+        manifeste = topic_manifest(self.topic)
+        self.assertEqual(len(manifeste['fichiers']), 4)  # Deux questions, retours partagés
+        entree = manifeste['exercices'][str(self.exercices[0].id)]
+        self.assertEqual(entree['succes'], f"audio/{asset_key('Bravo !')}.mp3")
+        self.assertEqual(entree['question'], f"audio/{asset_key('Combien de pommes ?')}.mp3")
+        self.assertIsNone(manifeste['topics'][str(self.topic.id)]['audio'])
+        
+        path, construit = build(manifeste)
+        self.assertTrue(construit)
+        with zipfile.ZipFile(path) as archive:
+            self.assertEqual(json.loads(archive.read('manifest.json')), manifeste)
+            self.assertEqual(archive.read(entree['question']), asset_file(asset_key('Combien de pommes ?')).read_bytes())
+            self.assertEqual(archive.getinfo(entree['question']).compress_type, zipfile.ZIP_STORED)
+        contenu = path.read_bytes()
+        path.unlink()
+        self.assertEqual(build(topic_manifest(self.topic))[0].read_bytes(), contenu)
+        
+        # Classe entière : les trois exercices, cinq fichiers
+        manifeste = classe_manifest('cp1')
+        self.assertEqual((len(manifeste['exercices']), len(manifeste['fichiers'])), (3, 5))
+    
+    def test_reconstruction_incrementale(self):
+        """Reconstruit seulement si le contenu change ; l'ancienne version est supprimée"""
+        ancien = build(topic_manifest(self.topic))[0]
+        self.assertFalse(build(topic_manifest(self.topic))[1])
+        
+        with patch('ia.audiostore.gTTS', fake_gtts()):
+            Exercice.objects.filter(id=self.exercices[1].id).update(question_audio_url=generate_audio("Compte tes doigts"))
+        manifeste = topic_manifest(self.topic)
+        path, construit = build(manifeste)
+        self.assertTrue(construit)
+        self.assertNotEqual(path, ancien)
+        self.assertFalse(ancien.exists())
+        self.assertEqual(path.relative_to(settings.MEDIA_ROOT).as_posix(), bundle_name(manifeste))
+        
+        # Classe et deux topics ; le paquet du topic est déjà à jour
+        out = StringIO()
+        call_command('construire_paquets_audio', '--classe=cp1', '--formats=mp3', stdout=out)
+        self.assertIn('2 paquets construits', out.getvalue())
+        self.assertIn('1 déjà à jour', out.getvalue())
+    
+    @patch('ia.variants._run_ffmpeg', side_effect=fake_ffmpeg)
+    def test_paquet_variante(self, mock_ffmpeg):
+        """Format léger : les audios transcodés en variante, les autres en original"""
+        transcode(asset_key("Bravo !"), ['opus'])
+        manifeste = topic_manifest(self.topic, 'opus')
+        self.assertEqual(manifeste['format'], 'opus')
+        self.assertIn(f"audio/{asset_key('Bravo !')}.opus", manifeste['fichiers'])
+        self.assertIn(f"audio/{asset_key('Essaie encore !')}.mp3", manifeste['fichiers'])
+        self.assertNotEqual(manifeste['version'], topic_manifest(self.topic)['version'])
+        with zipfile.ZipFile(build(manifeste)[0]) as archive:
+            self.assertEqual(len(archive.read(f"audio/{asset_key('Bravo !')}.opus")), 320)
+
+
+class AudioPipelineTest(TestCase):
+    def setUp(self):
+        isolate_audio(self)
+        matiere = Matiere.objects.create(nom='francais', ordre=1)
+        self.topic = Topic.objects.create(matiere=matiere, classe='ce1', titre='Lecture', resume='Lire des mots')
+        for i in range(3):
+            Exercice.objects.create(
+                topic=self.topic, type_exercice='choix_multiple', question=f'Question {i}', correct_index=0,
+            )
+        self.reprise = Path(_state_dir) / 'reprise_audio.json'
+        self.addCleanup(self.reprise.unlink, missing_ok=True)
+    
+    def run_command(self, gtts):
+        with patch('ia.audiostore.gTTS', gtts):
+            call_command('generer_audio', '--all', f'--reprise={self.reprise}', '--tranche=2', stdout=StringIO())
+        return sorted(call.kwargs['text'] for call in gtts.call_args_list)
+    
+    def test_textes_dedoublonnes_et_reprise(self):
+        """Un rendu par texte distinct ; après une interruption, seuls les textes restants sont rendus"""
+        rendered = self.run_command(fake_gtts(pannes={'Question 2'}))
+        # 1 résumé + 3 questions + 2 feedbacks partagés par les 3 exercices
+        self.assertEqual(len(rendered), 6)
+        self.assertTrue(self.reprise.exists())
+        self.assertEqual(Exercice.objects.exclude(feedback_success_audio_url=None).count(), 3)
+        self.assertFalse(Exercice.objects.get(question='Question 2').question_audio_url)
+        
+        rendered = self.run_command(fake_gtts())
+        self.assertEqual(rendered, ['Question 2'])
+        key = asset_key('Question 2')
+        self.assertEqual(Exercice.objects.get(question='Question 2').question_audio_url, f"{settings.MEDIA_URL}{asset_path(key)}")
+        self.assertFalse(self.reprise.exists())
+        self.topic.refresh_from_db()
+        self.assertEqual(self.topic.audio_url, f"{settings.MEDIA_URL}{asset_path(asset_key('Lire des mots'))}")
+        self.assertEqual(AudioAsset.objects.count(), 6)
 
 
 class GroqServiceTest(TestCase):
+    def setUp(self):
+        response_cache.clear(memory_only=True)
+    
     @patch('ia.services.Groq')
     @override_settings(GROQ_API_KEY='test-key', GROQ_MODEL='test-model')
     def test_call_groq_success(self, mock_groq_class):
@@ -46,6 +429,21 @@ class GroqServiceTest(TestCase):
         self.assertIsNotNone(result)
         self.assertEqual(result, "Réponse IA")
     
+    @patch('ia.services.Groq')
+    @override_settings(GROQ_API_KEY='test-key', GROQ_MODEL='test-model')
+    def test_stream_groq(self, mock_groq_class):
+        """Le streaming rend les fragments non vides dans l'ordre"""
+        def chunk(content):
+            c = MagicMock()
+            c.choices = [MagicMock()]
+            c.choices[0].delta.content = content
+            return c
+        create = mock_groq_class.return_value.chat.completions.create
+        create.return_value = iter([chunk("Bon"), chunk(None), chunk("jour")])
+        
+        self.assertEqual(list(stream_groq("Salut", classe='ce1')), ["Bon", "jour"])
+        self.assertTrue(create.call_args.kwargs['stream'])
+    
     @override_settings(GROQ_API_KEY='')
     def test_call_groq_no_key(self):
         """Test appel Groq sans clé API lève une exception"""
@@ -59,6 +457,1031 @@ class GroqServiceTest(TestCase):
         self.assertEqual(result, "Fallback")
 
 
+@override_settings(GROQ_API_KEY='test-key', GROQ_MODEL='test-model')
+class ResponseCacheTest(TestCase):
+    def setUp(self):
+        response_cache.clear(memory_only=True)
+        self.client_patcher = patch('ia.services.Groq')
+        mock_groq_class = self.client_patcher.start()
+        self.addCleanup(self.client_patcher.stop)
+        
+        self.create = mock_groq_class.return_value.chat.completions.create
+        self.create.side_effect = lambda **kwargs: self._response(f"Réponse {self.create.call_count}")
+    
+    def _response(self, content):
+        response = MagicMock()
+        response.choices = [MagicMock()]
+        response.choices[0].message.content = content
+        return response
+    
+    def test_prompt_identique_servi_par_le_cache(self):
+        """Un même prompt ne repart pas vers l'API, même après vidage du LRU"""
+        first = call_groq("Explique les fractions", classe='ce2')
+        self.assertEqual(call_groq("Explique les fractions", classe='ce2'), first)
+        
+        response_cache.clear(memory_only=True)
+        self.assertEqual(call_groq("Explique les fractions", classe='ce2'), first)
+        self.assertEqual(self.create.call_count, 1)
+        self.assertEqual(ReponseIACache.objects.get().hits, 1)
+    
+    def test_parametres_dans_la_cle(self):
+        """max_tokens et classe font partie de la clé"""
+        call_groq("Explique les fractions", classe='ce2')
+        call_groq("Explique les fractions", classe='cm1')
+        call_groq("Explique les fractions", classe='ce2', max_tokens=500)
+        self.assertEqual(self.create.call_count, 3)
+    
+    def test_refresh_et_bypass(self):
+        """refresh remplace l'entrée, cache=False ne lit ni n'écrit"""
+        call_groq("Explique les fractions")
+        refreshed = call_groq("Explique les fractions", refresh=True)
+        self.assertEqual(refreshed, "Réponse 2")
+        self.assertEqual(call_groq("Explique les fractions"), "Réponse 2")
+        
+        call_groq("Message privé", cache=False)
+        call_groq("Message privé", cache=False)
+        self.assertEqual(self.create.call_count, 4)
+        self.assertEqual(ReponseIACache.objects.count(), 1)
+    
+    def test_compteurs(self):
+        """Les compteurs distinguent hits mémoire, hits base et misses"""
+        before = dict(response_cache.counters)
+        call_groq("Compteurs")
+        call_groq("Compteurs")
+        response_cache.clear(memory_only=True)
+        call_groq("Compteurs")
+        
+        self.assertEqual(response_cache.counters['misses'] - before['misses'], 1)
+        self.assertEqual(response_cache.counters['hits_memoire'] - before['hits_memoire'], 1)
+        self.assertEqual(response_cache.counters['hits_db'] - before['hits_db'], 1)
+    
+    @override_settings(IA_CACHE_MAX_ENTRIES=2)
+    def test_eviction_lru(self):
+        """Au-delà de la taille max, les entrées les moins récemment utilisées partent"""
+        for prompt in ["A", "B", "C"]:
+            call_groq(prompt)
+        response_cache.evict()
+        
+        self.assertEqual(ReponseIACache.objects.count(), 2)
+        response_cache.clear(memory_only=True)
+        call_groq("A")
+        self.assertEqual(self.create.call_count, 4)
+
+
+class AsyncGroqServiceTest(TransactionTestCase):
+    def setUp(self):
+        response_cache.clear(memory_only=True)
+    
+    @patch('ia.services.AsyncGroq')
+    @override_settings(GROQ_API_KEY='test-key', GROQ_MODEL='test-model')
+    def test_acall_groq_success(self, mock_async_groq_class):
+        """Test appel Groq asynchrone avec succès"""
+        mock_client = MagicMock()
+        mock_async_groq_class.return_value = mock_client
+        
+        mock_response = MagicMock()
+        mock_response.choices = [MagicMock()]
+        mock_response.choices[0].message.content = " Réponse async "
+        mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
+        
+        result = asyncio.run(acall_groq("Test prompt", classe='ce1'))
+        self.assertEqual(result, "Réponse async")
+    
+    def test_run_bounded_limite_concurrence(self):
+        """Au plus N appels en vol, résultats dans l'ordre, erreurs isolées"""
+        state = {'in_flight': 0, 'max_in_flight': 0}
+        
+        async def worker(item):
+            state['in_flight'] += 1
+            state['max_in_flight'] = max(state['max_in_flight'], state['in_flight'])
+            await asyncio.sleep(0.01)
+            state['in_flight'] -= 1
+            if item == 3:
+                raise ValueError("échec")
+            return item * 10
+        
+        results = run_bounded(range(8), worker, concurrency=2)
+        
+        self.assertEqual(state['max_in_flight'], 2)
+        self.assertEqual(results[:3], [0, 10, 20])
+        self.assertIsInstance(results[3], ValueError)
+        self.assertEqual(results[7], 70)
+
+
+@override_settings(
+    IA_RATE_RPM=10, IA_RATE_TPM=1000, IA_RATE_RESERVE_INTERACTIVE=0.2,
+    IA_RATE_MAX_WAIT_INTERACTIVE=0, IA_RATE_MAX_WAIT_BATCH=0,
+)
+class RateLimiterTest(TestCase):
+    def setUp(self):
+        self.limiter = RateLimiter(name=self.id())
+    
+    def test_reserve_interactive(self):
+        """Le batch s'arrête à la réserve ; l'interactif peut encore passer"""
+        for _ in range(8):
+            self.limiter.acquire(10, priority=PRIORITE_BATCH)
+        with self.assertRaises(IARateLimitError):
+            self.limiter.acquire(10, priority=PRIORITE_BATCH)
+        self.limiter.acquire(10, priority=PRIORITE_INTERACTIVE)
+    
+    def test_budget_tokens(self):
+        """Le seau de tokens limite aussi, et settle rend la part non consommée"""
+        reserved = self.limiter.acquire(900)
+        with self.assertRaises(IARateLimitError):
+            self.limiter.acquire(200)
+        self.limiter.settle(reserved, 100)
+        self.limiter.acquire(200)
+    
+    def test_penalize_met_en_pause(self):
+        """Un 429 met tous les appelants en pause (Retry-After puis backoff exponentiel)"""
+        self.limiter.penalize(retry_after=30)
+        self.assertGreater(self.limiter.snapshot()['pause_restante'], 25)
+        with self.assertRaises(IARateLimitError):
+            self.limiter.acquire(10)
+        
+        self.limiter.penalize()
+        self.limiter.penalize()
+        self.assertEqual(self.limiter.snapshot()['backoff'], 2)
+    
+    def test_mode_batch(self):
+        """Les commandes marquent leurs appels comme batch"""
+        self.assertEqual(current_priority(), PRIORITE_INTERACTIVE)
+        with mode_batch():
+            self.assertEqual(current_priority(), PRIORITE_BATCH)
+        self.assertEqual(current_priority(), PRIORITE_INTERACTIVE)
+    
+    @patch('ia.services.Groq')
+    @override_settings(GROQ_API_KEY='test-key', GROQ_MODEL='test-model', GROQ_MAX_RETRIES_INTERACTIVE=1,
+                       IA_RATE_RPM=6000, IA_RATE_TPM=10 ** 6, IA_RATE_MAX_WAIT_INTERACTIVE=5)
+    def test_call_groq_rejoue_apres_429(self, mock_groq_class):
+        """Un 429 est rejoué après la pause Retry-After"""
+        response = MagicMock()
+        response.choices = [MagicMock()]
+        response.choices[0].message.content = "Après pause"
+        rate_limited = RateLimitError(
+            "limite",
+            response=httpx.Response(
+                429, headers={'retry-after': '0.01'},
+                request=httpx.Request('POST', 'http://groq.test'),
+            ),
+            body=None,
+        )
+        create = mock_groq_class.return_value.chat.completions.create
+        create.side_effect = [rate_limited, response]
+        
+        self.assertEqual(call_groq("Prompt limité", cache=False), "Après pause")
+        self.assertEqual(create.call_count, 2)
+
+
+@override_settings(IA_BREAKER_FAILURE_THRESHOLD=2, IA_BREAKER_RESET_TIMEOUT=60, IA_BREAKER_SLOW_CALL=20)
+class CircuitBreakerTest(TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker(name=self.id())
+    
+    def _expire(self):
+        """Simule l'écoulement du délai de réouverture."""
+        with self.breaker.state.locked() as s:
+            s['ouvert_jusqua'] = 0
+    
+    def test_ouverture_au_seuil(self):
+        """Le circuit s'ouvre après N échecs consécutifs ; un succès remet à zéro"""
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.allow())
+        self.assertTrue(self.breaker.is_open())
+        self.assertEqual(self.breaker.snapshot()['etat'], OUVERT)
+    
+    def test_semi_ouvert(self):
+        """Après le délai, un seul appel d'essai ; son résultat ferme ou rouvre le circuit"""
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self._expire()
+        self.assertEqual(self.breaker.snapshot()['etat'], SEMI_OUVERT)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.is_open())
+        
+        self._expire()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.snapshot()['etat'], FERME)
+        self.assertTrue(self.breaker.allow())
+    
+    def test_appel_lent_compte_comme_echec(self):
+        self.breaker.record_success(duration=30)
+        self.breaker.record_success(duration=30)
+        self.assertTrue(self.breaker.is_open())
+    
+    @patch('ia.services.Groq')
+    @override_settings(GROQ_API_KEY='test-key', IA_BREAKER_FAILURE_THRESHOLD=1)
+    def test_call_groq_safe_repli_immediat(self, mock_groq_class):
+        """Circuit ouvert : call_groq_safe rend le défaut sans appel réseau"""
+        circuit_breaker.record_failure()
+        self.addCleanup(circuit_breaker.reset)
+        
+        result = call_groq_safe("Prompt", default="Résumé", cache=False)
+        self.assertEqual(result, "Résumé")
+        mock_groq_class.return_value.chat.completions.create.assert_not_called()
+    
+    @patch('ia.services.Groq')
+    @override_settings(GROQ_API_KEY='test-key', GROQ_TIMEOUT_INTERACTIVE=20, GROQ_MAX_RETRIES_INTERACTIVE=5,
+                       IA_RATE_RPM=6000, IA_RATE_TPM=10 ** 6)
+    def test_chaque_tentative_comptee(self, mock_groq_class):
+        """Chaque tentative en timeout compte : le circuit s'ouvre et l'appel cesse ses rejeux"""
+        circuit_breaker.reset()
+        self.addCleanup(circuit_breaker.reset)
+        create = mock_groq_class.return_value.chat.completions.create
+        create.side_effect = APITimeoutError(request=httpx.Request('POST', 'http://groq.test'))
+        
+        with self.assertRaises(IAServiceError):
+            call_groq("Prompt lent", cache=False)
+        self.assertEqual(create.call_count, 2)
+        self.assertTrue(circuit_breaker.is_open())
+        # Appel interactif : tentatives bornées par GROQ_TIMEOUT_INTERACTIVE, pas GROQ_TIMEOUT
+        self.assertEqual(create.call_args.kwargs['timeout'].read, 20)
+    
+    @patch('ia.services.Groq')
+    @override_settings(GROQ_API_KEY='test-key', IA_BREAKER_FAILURE_THRESHOLD=1, IA_BREAKER_SLOW_CALL=0,
+                       IA_RATE_RPM=6000, IA_RATE_TPM=10 ** 6)
+    def test_lenteur_jugee_sur_les_appels_interactifs(self, mock_groq_class):
+        """Un appel batch long (génération groupée) n'ouvre pas le circuit des élèves"""
+        circuit_breaker.reset()
+        self.addCleanup(circuit_breaker.reset)
+        response = MagicMock()
+        response.choices = [MagicMock()]
+        response.choices[0].message.content = "Réponse"
+        mock_groq_class.return_value.chat.completions.create.return_value = response
+        
+        with mode_batch():
+            call_groq("Génération groupée", cache=False)
+        self.assertFalse(circuit_breaker.is_open())
+        
+        call_groq("Question d'élève", cache=False)
+        self.assertTrue(circuit_breaker.is_open())
+    
+    @patch('ia.services.Groq')
+    @override_settings(GROQ_API_KEY='test-key', IA_RATE_RPM=6000, IA_RATE_TPM=10 ** 6)
+    def test_essai_sans_verdict_rend_le_creneau(self, mock_groq_class):
+        """Un essai semi-ouvert conclu par une 404 ne bloque pas les appels suivants"""
+        circuit_breaker.reset()
+        self.addCleanup(circuit_breaker.reset)
+        circuit_breaker.record_failure()
+        circuit_breaker.record_failure()
+        with circuit_breaker.state.locked() as s:
+            s['ouvert_jusqua'] = 0
+        create = mock_groq_class.return_value.chat.completions.create
+        create.side_effect = NotFoundError(
+            "modèle inconnu",
+            response=httpx.Response(404, request=httpx.Request('POST', 'http://groq.test')),
+            body=None,
+        )
+        
+        with self.assertRaises(IAServiceError):
+            call_groq("Prompt", cache=False)
+        self.assertEqual(circuit_breaker.snapshot()['etat'], SEMI_OUVERT)
+        self.assertTrue(circuit_breaker.allow())
+
+
+class SingleFlightTest(TestCase):
+    def test_detenteur_genere_puis_libere(self):
+        produce = MagicMock(return_value='contenu')
+        self.assertEqual(single_flight('explication:1', produce, poll=lambda: None), 'contenu')
+        produce.assert_called_once()
+        self.assertFalse(VerrouGeneration.objects.exists())
+    
+    def test_resultat_deja_disponible(self):
+        """Le détenteur revérifie le résultat avant de générer"""
+        produce = MagicMock()
+        self.assertEqual(single_flight('explication:1', produce, poll=lambda: 'déjà là'), 'déjà là')
+        produce.assert_not_called()
+    
+    def test_attente_bornee(self):
+        """Verrou tenu ailleurs : attente du résultat, sinon None après le délai"""
+        token = acquire('explication:1', ttl=60)
+        self.assertIsNone(acquire('explication:1', ttl=60))
+        produce = MagicMock()
+        
+        self.assertIsNone(single_flight('explication:1', produce, poll=lambda: None, wait=0.1, interval=0.02))
+        results = iter([None, None, 'produit ailleurs'])
+        self.assertEqual(
+            single_flight('explication:1', produce, poll=lambda: next(results), wait=1, interval=0.02),
+            'produit ailleurs',
+        )
+        produce.assert_not_called()
+        release('explication:1', token)
+    
+    def test_verrou_expire_repris(self):
+        """Un verrou expiré (détenteur mort) est repris"""
+        acquire('explication:1', ttl=-1)
+        produce = MagicMock(return_value='contenu')
+        self.assertEqual(single_flight('explication:1', produce, poll=lambda: None, wait=0), 'contenu')
+
+
+@override_settings(IA_JOBS_RETRY_DELAY=30)
+class JobQueueTest(TestCase):
+    def setUp(self):
+        self.handler = MagicMock(return_value={'ok': True})
+        patcher = patch.dict(TRAITEMENTS, {'test': self.handler})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_enqueue_dedoublonne(self):
+        """Une seule tâche active par clé ; un élève qui attend relève sa priorité"""
+        tache = enqueue('test', {'n': 1}, cle='test:1')
+        self.assertEqual(enqueue('test', {'n': 1}, cle='test:1', priorite=PRIORITE_ELEVE).id, tache.id)
+        tache.refresh_from_db()
+        self.assertEqual(tache.priorite, PRIORITE_ELEVE)
+        with self.assertRaises(ValueError):
+            enqueue('inconnu')
+        
+        taken, = claim('w1')
+        self.assertEqual(run_job(taken, 'w1'), TacheFond.TERMINEE)
+        self.handler.assert_called_once_with(n=1)
+        tache.refresh_from_db()
+        self.assertIsNone(tache.cle_active)
+        nouvelle = enqueue('test', {'n': 1}, cle='test:1')
+        self.assertNotEqual(nouvelle.id, tache.id)
+        # Index unique simple (sans condition, MySQL compris) : pas de seconde tâche active
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            TacheFond.objects.create(nom='test', cle='test:1', cle_active='test:1', disponible_a=timezone.now())
+    
+    def test_priorite_et_bail(self):
+        """Plus haute priorité d'abord ; une tâche au bail expiré est reprise par un autre worker"""
+        basse = enqueue('test')
+        haute = enqueue('test', priorite=PRIORITE_ELEVE)
+        self.assertEqual([t.id for t in claim('w1')], [haute.id])
+        self.assertEqual([t.id for t in claim('w2', limit=5)], [basse.id])
+        self.assertEqual(claim('w3'), [])
+        
+        TacheFond.objects.filter(id=haute.id).update(bail_expiration=timezone.now() - timedelta(seconds=1))
+        repris, = claim('w3')
+        self.assertEqual((repris.id, repris.tentatives, repris.proprietaire), (haute.id, 2, 'w3'))
+        # L'ancien détenteur ne peut plus écrire le résultat
+        run_job(repris, 'w1')
+        repris.refresh_from_db()
+        self.assertEqual(repris.etat, TacheFond.EN_COURS)
+    
+    def test_nouvel_essai_puis_echec(self):
+        self.handler.side_effect = RuntimeError("IA indisponible")
+        tache = enqueue('test', max_tentatives=2)
+        
+        self.assertEqual(run_job(claim('w1')[0], 'w1'), TacheFond.EN_ATTENTE)
+        self.assertEqual(claim('w1'), [])  # Nouvel essai différé
+        TacheFond.objects.filter(id=tache.id).update(disponible_a=timezone.now())
+        self.assertEqual(run_job(claim('w1')[0], 'w1'), TacheFond.ECHEC)
+        tache.refresh_from_db()
+        self.assertEqual((tache.etat, tache.tentatives, tache.erreur), (TacheFond.ECHEC, 2, "IA indisponible"))
+    
+    @patch('ia.services.generate_audio')
+    @patch('ia.services.call_groq', side_effect=IAServiceError("Groq indisponible"))
+    def test_explication_en_echec_rejouee_sans_resume(self, mock_groq, mock_audio):
+        """IA en échec : la tâche d'explication est replanifiée, le résumé n'est pas sauvegardé"""
+        matiere = Matiere.objects.create(nom='francais', ordre=2)
+        topic = Topic.objects.create(matiere=matiere, classe='ce1', titre='Lecture', resume='Lire des syllabes')
+        enqueue('explication', {'topic_id': topic.id}, cle=f'explication:{topic.id}')
+        
+        self.assertEqual(run_job(claim('w1')[0], 'w1'), TacheFond.EN_ATTENTE)
+        topic.refresh_from_db()
+        self.assertFalse(topic.contenu_cours)
+        mock_audio.assert_not_called()
+        
+        # Réponse identique au résumé : pas sauvegardée non plus
+        mock_groq.side_effect, mock_groq.return_value = None, 'Lire des syllabes'
+        TacheFond.objects.update(disponible_a=timezone.now())
+        self.assertEqual(run_job(claim('w1')[0], 'w1'), TacheFond.EN_ATTENTE)
+        topic.refresh_from_db()
+        self.assertFalse(topic.contenu_cours)
+
+
+class JobWorkerTest(TransactionTestCase):
+    def test_run_worker_une_passe(self):
+        """Les tâches prêtes sont exécutées par le pool de threads, puis la commande s'arrête"""
+        handler = MagicMock(side_effect=lambda n: {'n': n})
+        with patch.dict(TRAITEMENTS, {'test': handler}):
+            for n in range(4):
+                enqueue('test', {'n': n}, cle=f'test:{n}')
+            out = StringIO()
+            call_command('run_worker', '--une-passe', '--concurrency=2', '--noms=test', stdout=out)
+        
+        self.assertEqual(handler.call_count, 4)
+        self.assertEqual(set(TacheFond.objects.values_list('etat', flat=True)), {TacheFond.TERMINEE})
+        self.assertIn("4 terminées", out.getvalue())
+
+
+class JSONItemStreamTest(TestCase):
+    def test_elements_rendus_au_fil_du_flux(self):
+        """Chaque objet est rendu dès son accolade fermante, même découpé en fragments"""
+        parser = JSONItemStream()
+        self.assertEqual(list(parser.feed('Voici : [{"question": "a {b}", ')), [])
+        self.assertEqual(list(parser.feed('"options": ["x"]}, {"quest')), [{'question': 'a {b}', 'options': ['x']}])
+        self.assertEqual(list(parser.feed('ion": "c\\"}"}]')), [{'question': 'c"}'}])
+    
+    def test_element_invalide_ignore(self):
+        """Un objet invalide ne fait pas perdre les autres"""
+        items = parse_json_items('[{"q": 1}, {"q": 2,}, {"q": 3 /* note */}]')
+        self.assertEqual(items, [{'q': 1}, {'q': 3}])
+    
+    def test_troncature(self):
+        """Une réponse coupée à max_tokens garde les éléments complets"""
+        self.assertEqual(parse_json_items('[{"q": 1}, {"q": 2}, {"q": "coup'), [{'q': 1}, {'q': 2}])
+    
+    def test_objet_englobant_ou_seul(self):
+        self.assertEqual(parse_json_items('{"exercices": [{"q": 1}, {"q": 2}]}'), [{'q': 1}, {'q': 2}])
+        self.assertEqual(parse_json_items('{"q": 1}'), [{'q': 1}])
+    
+    @patch('ia.services.Groq')
+    @override_settings(GROQ_API_KEY='test-key', GROQ_MAX_RETRIES_INTERACTIVE=0)
+    def test_stream_exercises_batch_ia(self, mock_groq_class):
+        """Les exercices arrivent un par un ; une coupure du flux garde ceux déjà reçus"""
+        matiere = Matiere.objects.create(nom='mathematiques', ordre=1)
+        topic = Topic.objects.create(matiere=matiere, classe='ce1', titre='Additions', resume='Additionner')
+        
+        first = '{"question": "1+1 ?", "options": ["1", "2"], "correct_index": 1}'
+        second = '{"question": "2+2 ?", "options": ["4", "5"], "correct_index": 0}'
+        
+        def chunks():
+            for text in ['{"exercices": [' + first[:20], first[20:] + ', ' + second[:10], second[10:] + ', {"quest']:
+                c = MagicMock()
+                c.choices = [MagicMock()]
+                c.choices[0].delta.content = text
+                yield c
+            raise ConnectionResetError("flux coupé")
+        mock_groq_class.return_value.chat.completions.create.return_value = chunks()
+        
+        stream = stream_exercises_batch_ia(topic, 'ce1', count=3)
+        self.assertEqual(next(stream)['question'], '1+1 ?')
+        self.assertEqual([e['question'] for e in stream], ['2+2 ?'])
+
+
+class ExerciseValidationTest(TestCase):
+    VALIDE = {
+        "question": "Combien font 2+2 ?", "type": "choix_multiple",
+        "options": ["3", "4", "5"], "correct_index": 1, "difficulte": 1,
+    }
+    
+    def setUp(self):
+        response_cache.clear(memory_only=True)
+        validation_stats.reset()
+    
+    def test_schema(self):
+        exercise, errors = validate_exercise(self.VALIDE)
+        self.assertEqual(errors, [])
+        self.assertEqual(exercise['feedback_success'], 'Bravo !')
+        
+        _, errors = validate_exercise(dict(self.VALIDE, correct_index=3))
+        self.assertEqual(len(errors), 1)
+        self.assertIn('correct_index', errors[0])
+        _, errors = validate_exercise(dict(self.VALIDE, options=["4", "4"], difficulte=5))
+        self.assertEqual(len(errors), 2)
+        _, errors = validate_exercise(dict(self.VALIDE, topic_id=99), topic_ids={1, 2})
+        self.assertIn('topic_id', errors[0])
+    
+    @patch('ia.services.Groq')
+    @override_settings(GROQ_API_KEY='test-key')
+    def test_correction_ciblee(self, mock_groq_class):
+        """Seul l'exercice invalide est redemandé, en mode JSON, et l'économie est comptée"""
+        invalide = dict(self.VALIDE, question="Combien font 3+3 ?", correct_index=7)
+        corrige = dict(invalide, options=["5", "6"], correct_index=1)
+        
+        def response(payload):
+            r = MagicMock()
+            r.choices = [MagicMock()]
+            r.choices[0].message.content = json.dumps({"exercices": payload})
+            return r
+        create = mock_groq_class.return_value.chat.completions.create
+        create.side_effect = [response([self.VALIDE, invalide]), response([corrige])]
+        
+        matiere = Matiere.objects.create(nom='mathematiques', ordre=1)
+        topic = Topic.objects.create(matiere=matiere, classe='ce1', titre='Additions', resume='Additionner')
+        exercises = generate_exercises_batch_ia(topic, 'ce1', count=2)
+        
+        self.assertEqual([e['question'] for e in exercises], ["Combien font 2+2 ?", "Combien font 3+3 ?"])
+        self.assertEqual(create.call_count, 2)
+        repair_prompt = create.call_args.kwargs['messages'][-1]['content']
+        self.assertIn("3+3", repair_prompt)
+        self.assertNotIn("2+2", repair_prompt)
+        self.assertEqual(create.call_args.kwargs['response_format'], {'type': 'json_object'})
+        
+        report = validation_stats.report()
+        self.assertEqual((report['valides'], report['corriges'], report['rejetes']), (1, 1, 0))
+        self.assertGreater(report['tokens_economises'], 0)
+
+
+@override_settings(IA_PACK_MAX_TOKENS=1500, IA_PACK_TOKENS_EXERCICE=150, IA_PACK_MAX_TOPICS=3)
+class PackingTest(TestCase):
+    def setUp(self):
+        validation_stats.reset()
+        maths = Matiere.objects.create(nom='mathematiques', ordre=1)
+        francais = Matiere.objects.create(nom='francais', ordre=2)
+        self.maths = [
+            Topic.objects.create(matiere=maths, classe='ce1', titre=f'Maths {i}', resume='Compter', ordre=i)
+            for i in range(4)
+        ]
+        self.francais = Topic.objects.create(matiere=francais, classe='ce1', titre='Lecture', resume='Lire')
+        self.cm1 = Topic.objects.create(matiere=maths, classe='cm1', titre='Fractions', resume='Partager')
+    
+    def test_plan_par_classe_et_matiere(self):
+        """Un paquet ne mélange ni classes ni matières, respecte le budget et le nombre de topics"""
+        self.assertEqual(pack_capacity(), 9)
+        demands = [(t, 2) for t in self.maths] + [(self.francais, 2), (self.cm1, 2), (self.cm1, 0)]
+        packs = plan_packs(demands)
+        
+        self.assertEqual([(p.classe, p.matiere.nom, len(p.items)) for p in packs], [
+            ('ce1', 'mathematiques', 3), ('ce1', 'mathematiques', 1),
+            ('ce1', 'francais', 1), ('cm1', 'mathematiques', 1),
+        ])
+        self.assertLessEqual(max(p.max_tokens for p in packs), 1500)
+        
+        # Une grosse demande est répartie sur plusieurs paquets
+        packs = plan_packs([(self.cm1, 20)])
+        self.assertEqual([p.count for p in packs], [9, 9, 2])
+        
+        report = pack_report(demands, plan_packs(demands))
+        self.assertEqual((report['requetes'], report['requetes_sans_regroupement']), (4, 6))
+        self.assertGreater(report['tokens_economises'], 0)
+    
+    @patch('ia.services.Groq')
+    @override_settings(GROQ_API_KEY='test-key')
+    def test_exercices_rendus_par_topic(self, mock_groq_class):
+        """Un seul appel, chaque exercice porte le topic_id d'un topic du paquet"""
+        a, b = self.maths[:2]
+        payload = [
+            {"topic_id": a.id, "question": "2+2 ?", "type": "choix_multiple", "options": ["3", "4"], "correct_index": 1},
+            {"topic_id": b.id, "question": "3+3 ?", "type": "choix_multiple", "options": ["6", "7"], "correct_index": 0},
+        ]
+        r = MagicMock()
+        r.choices = [MagicMock()]
+        r.choices[0].message.content = json.dumps({"exercices": payload})
+        create = mock_groq_class.return_value.chat.completions.create
+        create.return_value = r
+        
+        pack, = plan_packs([(a, 1), (b, 1)])
+        exercises = generate_exercises_pack_ia(pack)
+        
+        self.assertEqual(create.call_count, 1)
+        prompt = create.call_args.kwargs['messages'][-1]['content']
+        self.assertIn(f"topic_id {a.id}", prompt)
+        self.assertIn(f"topic_id {b.id}", prompt)
+        self.assertEqual(create.call_args.kwargs['max_tokens'], pack.max_tokens)
+        self.assertEqual([e['topic_id'] for e in exercises], [a.id, b.id])
+
+
+@override_settings(
+    IA_CHAT_PROMPT_BUDGET=700, IA_CHAT_MESSAGE_MAX_TOKENS=100,
+    IA_CHAT_HISTORY_TURNS=4, IA_CHAT_MEMO_TOKENS=60,
+)
+class ChatPromptBuilderTest(TestCase):
+    def setUp(self):
+        self.builder = ChatPromptBuilder()
+        self.history = []
+        for i in range(8):
+            self.history.append({'role': 'user', 'content': f"Question {i} sur les fractions " + "détail " * 100})
+            self.history.append({'role': 'assistant', 'content': f"Réponse {i} " + "explication " * 100})
+    
+    def test_persona_en_cache_par_classe(self):
+        self.assertIs(chat_persona('ce1'), chat_persona('ce1'))
+        self.assertNotEqual(chat_persona('ce1'), chat_persona('3eme'))
+    
+    def test_budget_memo_et_troncature(self):
+        messages = self.builder.build("Et 1/2 + 1/4 ?", 'ce1', self.history, {'username': 'awa', 'points': 12})
+        
+        self.assertEqual(messages[0]['role'], 'system')
+        self.assertIn('awa', messages[0]['content'])
+        self.assertIn('Mémo', messages[0]['content'])
+        self.assertEqual(messages[-1], {'role': 'user', 'content': "Et 1/2 + 1/4 ?"})
+        self.assertLessEqual(len(messages), 1 + 4 + 1)
+        self.assertTrue(all(count_tokens(m['content']) <= 102 for m in messages[1:]))
+        self.assertLessEqual(sum(count_tokens(m['content']) for m in messages), 700)
+        # Les messages gardés sont les plus récents, dans l'ordre
+        self.assertTrue(messages[-2]['content'].startswith("Réponse 7"))
+    
+    def test_rapport_tokens_economises(self):
+        self.builder.build("Bonjour", 'ce1', self.history)
+        report = self.builder.report()
+        self.assertEqual(report['prompts'], 1)
+        self.assertGreater(report['tokens_economises'], 0)
+    
+    def test_historique_invalide_ignore(self):
+        messages = self.builder.build("Salut", '6eme', [{'role': 'user'}, "texte", {'role': 'user', 'content': 'Coucou'}])
+        self.assertEqual([m['content'] for m in messages[1:]], ['Coucou', 'Salut'])
+
+
+class NearDuplicateTest(TestCase):
+    def setUp(self):
+        exercise_index.clear()
+        matiere = Matiere.objects.create(nom='mathematiques', ordre=1)
+        self.topic = Topic.objects.create(matiere=matiere, classe='ce1', titre='Additions', resume='Additionner')
+        self.exercise, _ = validate_exercise({
+            "question": "Combien font 12 + 7 ? Calcule la somme.", "type": "choix_multiple",
+            "options": ["17", "19", "21"], "correct_index": 1,
+        })
+    
+    def test_reformulation_legere_detectee(self):
+        self.assertIsNotNone(create_exercice_unique(self.topic, self.exercise))
+        # Accents, ponctuation, casse et ordre des options ne comptent pas
+        proche = dict(self.exercise, question="combien font 12 + 7 ? calcule la somme !", options=["21", "19", "17"])
+        self.assertIsNone(create_exercice_unique(self.topic, proche))
+        autre = dict(self.exercise, question="Quel est le double de 8 ?", options=["14", "16", "18"])
+        self.assertIsNotNone(create_exercice_unique(self.topic, autre))
+        self.assertEqual(Exercice.objects.filter(topic=self.topic).count(), 2)
+    
+    def test_index_construit_depuis_la_base(self):
+        """Les exercices déjà en base (fixtures, autres processus) sont pris en compte"""
+        first = Exercice.objects.create(topic=self.topic, **exercice_fields(self.exercise))
+        second = Exercice.objects.create(topic=self.topic, **exercice_fields(
+            dict(self.exercise, question="Combien font 12 + 7 ? Calcule la somme")
+        ))
+        self.assertEqual(exercise_index.find(self.topic.id, self.exercise['question']), first.id)
+        self.assertEqual(exercise_index.clusters(self.topic.id), [[first.id, second.id]])
+    
+    def test_index_rattrape_les_autres_processus(self):
+        """Index déjà chargé : les créations et suppressions faites ailleurs sont vues au prochain accès"""
+        self.assertIsNone(exercise_index.find(self.topic.id, self.exercise['question']))
+        ailleurs = Exercice.objects.create(topic=self.topic, **exercice_fields(self.exercise))
+        self.assertEqual(exercise_index.find(self.topic.id, self.exercise['question']), ailleurs.id)
+        self.assertIsNone(create_exercice_unique(self.topic, self.exercise))
+        
+        ailleurs.delete()
+        self.assertIsNone(exercise_index.find(self.topic.id, self.exercise['question']))
+        self.assertIsNotNone(create_exercice_unique(self.topic, self.exercise))
+    
+    def test_commande_supprime_les_doublons(self):
+        first = Exercice.objects.create(topic=self.topic, **exercice_fields(self.exercise))
+        Exercice.objects.create(topic=self.topic, **exercice_fields(dict(self.exercise, options=["21", "17", "19"])))
+        call_command('dedoublonner_exercices', '--supprimer', stdout=StringIO())
+        self.assertEqual(list(Exercice.objects.filter(topic=self.topic).values_list('id', flat=True)), [first.id])
+    
+    def test_questions_differentes_separees(self):
+        """Un mot ou un nombre changé suffit, quelles que soient les options communes"""
+        paires = [
+            ("Quels sont les deux principaux aspects des droits de l'homme ?",
+             "Quels sont les deux principaux aspects des devoirs de l'homme ?"),
+            ("Quelle est la forme d'un cercle ?", "Quelle est la forme d'un rectangle ?"),
+            ("0 x 10 = ?", "1 x 100 = ?"),
+            ("Si j'ai 18 poules et que je veux en acheter 7 de plus, combien de poules aurai-je au total ?",
+             "Si j'ai 18 poules et que je veux en acheter 4 de plus, combien de poules aurai-je au total ?"),
+            ("Qu'est-ce que la tolérance ?", "Qu'est-ce que la confiance ?"),
+        ]
+        for question, autre in paires:
+            exercise = dict(self.exercise, question=question, options=["Vrai", "Faux", "Je ne sais pas"])
+            self.assertIsNotNone(create_exercice_unique(self.topic, exercise))
+            self.assertIsNotNone(create_exercice_unique(self.topic, dict(exercise, question=autre)), autre)
+        self.assertEqual(exercise_index.clusters(self.topic.id), [])
+    
+    def test_exercices_du_programme_jamais_supprimes(self):
+        seed = Exercice.objects.create(topic=self.topic, **dict(exercice_fields(self.exercise), genere_par_ia=False))
+        copie = Exercice.objects.create(topic=self.topic, **dict(exercice_fields(self.exercise), genere_par_ia=False))
+        genere = Exercice.objects.create(topic=self.topic, **exercice_fields(self.exercise))
+        call_command('dedoublonner_exercices', '--supprimer', stdout=StringIO())
+        self.assertEqual(
+            list(Exercice.objects.filter(topic=self.topic).order_by('id').values_list('id', flat=True)), [seed.id, copie.id]
+        )
+        self.assertFalse(Exercice.objects.filter(id=genere.id).exists())
+
+
+class FAQCacheTest(TestCase):
+    def setUp(self):
+        faq_cache.clear(memory_only=True)
+    
+    def _response(self, text):
+        r = MagicMock()
+        r.choices = [MagicMock()]
+        r.choices[0].message.content = text
+        return r
+    
+    @patch('ia.services.Groq')
+    @override_settings(GROQ_API_KEY='test-key')
+    def test_question_similaire_servie_sans_appel(self, mock_groq_class):
+        create = mock_groq_class.return_value.chat.completions.create
+        create.return_value = self._response("Awa, une fraction est une partie d'un tout 🧪")
+        
+        first = chat_tuteur_ia("C'est quoi une fraction ?", 'ce2', user_info={'username': 'Awa', 'points': 3})
+        second = chat_tuteur_ia("qu'est-ce qu'une fraction", 'ce2', user_info={'username': 'Ali', 'points': 0})
+        
+        self.assertEqual(first, "Awa, une fraction est une partie d'un tout 🧪")
+        self.assertEqual(second, "Ali, une fraction est une partie d'un tout 🧪")
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual(ReponseFAQ.objects.get().hits, 1)
+        self.assertEqual(ReponseFAQ.objects.get().cle, question_key("c est quoi une fraction"))
+        
+        # Autre classe, autre question ou conversation en cours : appel IA
+        chat_tuteur_ia("C'est quoi une fraction ?", '6eme')
+        chat_tuteur_ia("Comment additionner deux fractions ?", 'ce2')
+        chat_tuteur_ia("C'est quoi une fraction ?", 'ce2', history=[{'role': 'user', 'content': 'Bonjour'}])
+        self.assertEqual(create.call_count, 4)
+    
+    @patch('ia.services.Groq')
+    @override_settings(GROQ_API_KEY='test-key')
+    def test_rien_de_propre_a_l_eleve_garde(self, mock_groq_class):
+        """Prénom remplacé en mot entier seulement ; les points ne sont pas donnés au modèle"""
+        create = mock_groq_class.return_value.chat.completions.create
+        create.return_value = self._response("Mu, pour multiplier, MU doit compter les groupes.")
+        
+        chat_tuteur_ia("Comment multiplier ?", 'ce1', user_info={'username': 'mu', 'points': 42})
+        system = create.call_args.kwargs['messages'][0]['content']
+        self.assertIn("L'élève s'appelle mu.", system)
+        self.assertNotIn('42', system)
+        self.assertEqual(ReponseFAQ.objects.get().reponse, f"{NOM_ELEVE}, pour multiplier, {NOM_ELEVE} doit compter les groupes.")
+        self.assertEqual(
+            chat_tuteur_ia("comment multiplier", 'ce1', user_info={'username': 'Moussa', 'points': 0}),
+            "Moussa, pour multiplier, Moussa doit compter les groupes.",
+        )
+        
+        # Conversation en cours (jamais partagée) : les points restent dans le prompt
+        chat_tuteur_ia("Et diviser ?", 'ce1', history=[{'role': 'user', 'content': 'Bonjour'}],
+                       user_info={'username': 'mu', 'points': 42})
+        self.assertIn('42 points de savoir', create.call_args.kwargs['messages'][0]['content'])
+    
+    def test_index_tfidf(self):
+        faq_cache.set("C'est quoi la photosynthèse ?", 'cm1', "La photosynthèse...")
+        faq_cache.set("Comment calculer le périmètre d'un carré ?", 'cm1', "Le périmètre...")
+        
+        self.assertEqual(faq_cache.get("c'est quoi LA PHOTOSYNTHESE", 'cm1'), "La photosynthèse...")
+        self.assertEqual(faq_cache.get("calculer le périmètre d'un carré", 'cm1'), "Le périmètre...")
+        self.assertIsNone(faq_cache.get("Comment calculer l'aire d'un carré ?", 'cm1'))
+        self.assertIsNone(faq_cache.get("Quelle est la capitale du Burkina Faso ?", 'cm1'))
+    
+    @override_settings(IA_FAQ_MAX_ENTRIES=1)
+    def test_eviction(self):
+        faq_cache.set("C'est quoi une fraction ?", 'ce2', "Une fraction...")
+        faq_cache.set("C'est quoi un angle droit ?", 'ce2', "Un angle droit...")
+        faq_cache.get("un angle droit", 'ce2')
+        ReponseFAQ.objects.filter(question__contains='fraction').update(date_expiration=timezone.now())
+        
+        self.assertEqual(faq_cache.evict(), 1)
+        self.assertIsNone(faq_cache.get("C'est quoi une fraction ?", 'ce2'))
+        self.assertEqual(faq_cache.get("C'est quoi un angle droit ?", 'ce2'), "Un angle droit...")
+
+
+class RetrievalIndexTest(TestCase):
+    def setUp(self):
+        retrieval_index.clear()
+        faq_cache.clear(memory_only=True)
+        self.arithmetique = Matiere.objects.create(nom='arithmetique', ordre=1)
+        self.fractions = Topic.objects.create(
+            matiere=self.arithmetique, classe='ce1', titre='Les fractions',
+            resume="Partager une galette en parts égales",
+            contenu_cours="Une fraction représente une partie d'un tout.\n\n**Exemple**\n\nLa moitié d'une galette de mil s'écrit 1/2.",
+        )
+        Topic.objects.create(
+            matiere=self.arithmetique, classe='ce1', titre='Les additions',
+            resume="Ajouter des nombres", contenu_cours="Additionner, c'est mettre ensemble.",
+        )
+        # Matière hors programme officiel du CE1 : jamais proposée
+        anglais = Matiere.objects.create(nom='anglais', ordre=2)
+        Topic.objects.create(matiere=anglais, classe='ce1', titre='Fractions in English', resume="Fractions")
+    
+    def test_bm25_filtre_classe_et_programme(self):
+        passages = retrieval_index.search("C'est quoi une fraction ?", 'ce1')
+        self.assertTrue(passages)
+        self.assertEqual({p['topic_id'] for p in passages}, {self.fractions.id})
+        self.assertEqual(retrieval_index.search("une fraction", '6eme'), [])
+        self.assertEqual(retrieval_index.search("photosynthèse", 'ce1'), [])
+    
+    def test_mise_a_jour_incrementale(self):
+        self.assertEqual(retrieval_index.search("multiplication", 'ce1'), [])
+        
+        # Signal post_save : visible immédiatement
+        self.fractions.contenu_cours = "La multiplication est une addition répétée."
+        self.fractions.save()
+        self.assertEqual(retrieval_index.search("multiplication", 'ce1')[0]['topic_id'], self.fractions.id)
+        
+        # queryset.update (ou autre processus) : vu à la vérification périodique
+        Topic.objects.filter(id=self.fractions.id).update(contenu_cours="Le tableau de division.")
+        with override_settings(IA_RETRIEVAL_REFRESH_INTERVAL=0):
+            self.assertEqual(retrieval_index.search("multiplication", 'ce1'), [])
+            self.assertTrue(retrieval_index.search("division", 'ce1'))
+        
+        self.fractions.delete()
+        self.assertEqual(retrieval_index.search("galette", 'ce1'), [])
+    
+    @patch('ia.services.Groq')
+    @override_settings(GROQ_API_KEY='test-key', IA_CHAT_MAX_TOKENS=500)
+    def test_extraits_dans_le_prompt_du_chat(self, mock_groq_class):
+        create = mock_groq_class.return_value.chat.completions.create
+        response = MagicMock()
+        response.choices = [MagicMock()]
+        response.choices[0].message.content = "Une fraction, c'est une part."
+        create.return_value = response
+        
+        chat_tuteur_ia("Explique-moi les fractions", 'ce1')
+        
+        system = create.call_args.kwargs['messages'][0]['content']
+        self.assertIn("EXTRAITS DU COURS", system)
+        self.assertIn("galette de mil", system)
+        self.assertNotIn("Additionner", system)
+        self.assertEqual(create.call_args.kwargs['max_tokens'], 500)
+
+
+@override_settings(GROQ_API_KEY='test-key')
+class StandInServerTest(TestCase):
+    """Chemin réel (SDK, HTTP, rejeux) contre le serveur local ia.standin"""
+    
+    def setUp(self):
+        response_cache.clear(memory_only=True)
+        circuit_breaker.reset()
+        self.server = StandInServer(StandInConfig(reply="Bonjour depuis le serveur local", seed=1)).start()
+        self.addCleanup(self.server.stop)
+    
+    def test_latence(self):
+        self.assertEqual(Latency('50').sample(), 0.05)
+        self.assertTrue(0.02 <= Latency('uniforme:20,30').sample() <= 0.03)
+        self.assertGreater(Latency('lognormale:100,0.5').sample(), 0)
+        with self.assertRaises(ValueError):
+            Latency('poisson:3')
+    
+    def test_reponse_et_streaming(self):
+        with override_settings(GROQ_BASE_URL=self.server.url):
+            self.assertEqual(call_groq("Bonjour", cache=False), "Bonjour depuis le serveur local")
+            self.assertEqual(''.join(stream_groq("Bonjour")), "Bonjour depuis le serveur local")
+        self.assertEqual(self.server.stats.snapshot()['requetes'], 2)
+    
+    @override_settings(GROQ_MAX_RETRIES_INTERACTIVE=1)
+    def test_injection_429_et_erreurs(self):
+        self.server.config.rate_429, self.server.config.retry_after = 1.0, 0.01
+        with override_settings(GROQ_BASE_URL=self.server.url, IA_STATE_DIR=Path(tempfile.mkdtemp())):
+            with self.assertRaises(IAServiceError):
+                call_groq("Bonjour", cache=False)
+            self.assertEqual(self.server.stats.snapshot()['refus_429'], 2)
+            
+            self.server.config.rate_429, self.server.config.rate_error = 0.0, 1.0
+            with self.assertRaises(IAServiceError):
+                call_groq("Bonjour", cache=False)
+        self.assertEqual(self.server.stats.snapshot()['erreurs'], 2)
+        circuit_breaker.reset()
+    
+    def test_cassette_enregistrement_puis_rejeu(self):
+        cassette = Path(tempfile.mkdtemp()) / 'chat.jsonl'
+        self.addCleanup(shutil.rmtree, cassette.parent, ignore_errors=True)
+        
+        # Enregistrement : relais vers l'« API réelle » (ici un second serveur local)
+        with StandInServer(StandInConfig(cassette=cassette, mode='record', upstream=self.server.url)) as recorder:
+            with override_settings(GROQ_BASE_URL=recorder.url):
+                self.assertEqual(call_groq("Bonjour", cache=False), "Bonjour depuis le serveur local")
+        self.assertEqual(len(Cassette(cassette).entries), 1)
+        
+        # Rejeu hors ligne : même requête, même réponse ; requête inconnue, réponse générée
+        with StandInServer(StandInConfig(cassette=cassette, reply="Autre")) as replayer:
+            with override_settings(GROQ_BASE_URL=replayer.url):
+                self.assertEqual(call_groq("Bonjour", cache=False), "Bonjour depuis le serveur local")
+                self.assertEqual(call_groq("Au revoir", cache=False), "Autre")
+            stats = replayer.stats.snapshot()
+        self.assertEqual((stats['rejoues'], stats['absents_cassette']), (1, 1))
+
+
+@override_settings(GROQ_API_KEY='test-key', GROQ_MODEL='llama-3.1-8b-instant')
+class TelemetryTest(TestCase):
+    """Mesures par appelant : tokens de response.usage, rejeux, hits du cache"""
+    
+    def setUp(self):
+        response_cache.clear(memory_only=True)
+        telemetry_store.clear()
+        circuit_breaker.reset()
+        self.server = StandInServer(StandInConfig(reply="Bonjour depuis le serveur local", seed=1)).start()
+        self.addCleanup(self.server.stop)
+    
+    def test_appels_attribues_a_l_appelant(self):
+        with override_settings(GROQ_BASE_URL=self.server.url):
+            with appelant('commande:test'):
+                call_groq("Bonjour", classe='ce1', topic_id=7)
+                call_groq("Bonjour", classe='ce1', topic_id=7)  # Cache
+                ''.join(stream_groq("Bonjour", classe='ce1'))
+        
+        appels = list(AppelIA.objects.filter(appelant='commande:test').order_by('id'))
+        self.assertEqual([(a.cache, a.flux) for a in appels], [(False, False), (True, False), (False, True)])
+        self.assertEqual(appels[0].topic_id, 7)
+        self.assertGreater(appels[0].tokens_prompt, 0)
+        self.assertGreater(appels[0].tokens_reponse, 0)
+        self.assertGreater(appels[2].tokens_reponse, 0)  # x_groq.usage du dernier fragment
+        self.assertEqual(appels[1].tokens_prompt, 0)
+        
+        [ligne] = statistiques(3600)
+        self.assertEqual((ligne['appelant'], ligne['appels'], ligne['hits_cache']), ('commande:test', 3, 1))
+        self.assertIsNotNone(ligne['p95_ms'])
+        self.assertGreater(ligne['cout_usd'], 0)
+    
+    @override_settings(GROQ_MAX_RETRIES_INTERACTIVE=1)
+    def test_rejeux_et_echecs(self):
+        self.server.config.rate_429, self.server.config.retry_after = 1.0, 0.01
+        with override_settings(GROQ_BASE_URL=self.server.url, IA_STATE_DIR=Path(tempfile.mkdtemp())):
+            with appelant('commande:test'):
+                self.assertIsNone(call_groq_safe("Bonjour", cache=False))
+        
+        appel = AppelIA.objects.get()
+        self.assertEqual((appel.rejeux, appel.succes), (1, False))
+        
+        out = StringIO()
+        call_command('telemetrie_ia', '--fenetre', '1h', stdout=out)
+        self.assertIn('commande:test', out.getvalue())
+
+
+@override_settings(GROQ_API_KEY='test-key', GROQ_MODEL='llama-3.1-8b-instant')
+class ModelRoutingTest(TestCase):
+    """Modèle, max_tokens et température par tâche ; repli sur 429 / erreur"""
+    
+    def setUp(self):
+        model_router.reset()
+        self.addCleanup(model_router.reset)
+        telemetry_store.clear()
+        circuit_breaker.reset()
+        self.server = StandInServer(StandInConfig(reply="Réponse", seed=1)).start()
+        self.addCleanup(self.server.stop)
+    
+    def test_routes(self):
+        chat, exercices = get_route('chat'), get_route('exercices')
+        self.assertEqual(chat.modeles, ['llama-3.3-70b-versatile', 'llama-3.1-8b-instant'])
+        self.assertEqual(exercices.modeles, ['llama-3.1-8b-instant', 'llama-3.3-70b-versatile'])
+        self.assertLess(exercices.temperature, chat.temperature)
+        self.assertEqual(get_route('exercices', max_tokens=300).max_tokens, 300)
+        
+        with override_settings(IA_ROUTES={'chat': {'modeles': ['rapide'], 'temperature': 0.2}}):
+            route = get_route('chat')
+        self.assertEqual((route.modeles, route.temperature, route.max_tokens), (['llama-3.1-8b-instant'], 0.2, 600))
+        with self.assertRaises(ValueError):
+            get_route('poesie')
+    
+    def test_repli_sur_429_puis_modele_evite(self):
+        self.server.config.models = {'llama-3.3-70b-versatile': {'latency': Latency('0'), 'rate_429': 1.0, 'rate_error': 0}}
+        with override_settings(GROQ_BASE_URL=self.server.url):
+            self.assertEqual(call_groq("Bonjour", cache=False, tache='chat'), "Réponse")
+            self.assertEqual(call_groq("Salut", cache=False, tache='chat'), "Réponse")
+        
+        # Premier appel : 429 puis repli ; second appel : modèle en pause évité d'emblée
+        self.assertEqual(
+            self.server.stats.snapshot()['modeles'], {'llama-3.3-70b-versatile': 1, 'llama-3.1-8b-instant': 2}
+        )
+        routage = model_router.snapshot()
+        self.assertEqual(routage['decisions'], {'chat': {'llama-3.1-8b-instant': 2}})
+        self.assertEqual(routage['replis'], {'chat: llama-3.3-70b-versatile → llama-3.1-8b-instant': 1})
+        self.assertIn('llama-3.3-70b-versatile', routage['pauses'])
+        
+        telemetry_store.flush()
+        self.assertEqual(
+            list(AppelIA.objects.order_by('id').values_list('modele', 'rejeux')),
+            [('llama-3.1-8b-instant', 1), ('llama-3.1-8b-instant', 0)],
+        )
+    
+    @override_settings(GROQ_MAX_RETRIES_INTERACTIVE=0)
+    def test_repli_sur_erreur_sans_rejeu(self):
+        self.server.config.models = {'llama-3.1-8b-instant': {'latency': Latency('0'), 'rate_429': 0, 'rate_error': 1.0}}
+        with override_settings(GROQ_BASE_URL=self.server.url):
+            self.assertEqual(call_groq("JSON", cache=False, tache='exercices'), "Réponse")
+        self.assertEqual(self.server.stats.snapshot()['erreurs'], 1)
+    
+    @patch('ia.services.Groq')
+    @override_settings(GROQ_MAX_RETRIES_INTERACTIVE=1, IA_RATE_RPM=6000, IA_RATE_TPM=10 ** 6)
+    def test_repli_sur_timeout_pas_sur_coupure(self, mock_groq_class):
+        """Un timeout passe au modèle suivant ; une coupure réseau rejoue le même modèle"""
+        response = MagicMock()
+        response.choices = [MagicMock()]
+        response.choices[0].message.content = "Réponse"
+        request = httpx.Request('POST', 'http://groq.test')
+        create = mock_groq_class.return_value.chat.completions.create
+        
+        create.side_effect = [APITimeoutError(request=request), response]
+        self.assertEqual(call_groq("Bonjour", cache=False, tache='chat'), "Réponse")
+        self.assertEqual(
+            [c.kwargs['model'] for c in create.call_args_list], ['llama-3.3-70b-versatile', 'llama-3.1-8b-instant']
+        )
+        
+        model_router.reset()
+        create.reset_mock()
+        create.side_effect = [APIConnectionError(request=request), response]
+        self.assertEqual(call_groq("Salut", cache=False, tache='chat'), "Réponse")
+        self.assertEqual(
+            [c.kwargs['model'] for c in create.call_args_list], ['llama-3.3-70b-versatile', 'llama-3.3-70b-versatile']
+        )
+
+
+class ClientRegistryTest(TestCase):
+    def test_client_reutilise(self):
+        """Le même client (et son pool) sert tous les appels du processus"""
+        registry = ClientRegistry()
+        factory = MagicMock(side_effect=lambda **kwargs: MagicMock())
+        
+        first = registry.get(factory, 'key-1')
+        self.assertIs(registry.get(factory, 'key-1'), first)
+        self.assertIsNot(registry.get(factory, 'key-2'), first)
+        self.assertEqual(factory.call_count, 2)
+    
+    def test_client_recree_apres_fork(self):
+        """Après un fork, l'enfant crée ses propres clients sans fermer ceux du parent"""
+        registry = ClientRegistry()
+        factory = MagicMock(side_effect=lambda **kwargs: MagicMock())
+        
+        parent_client = registry.get(factory, 'key')
+        registry._pid = -1  # Simule un changement de PID
+        child_client = registry.get(factory, 'key')
+        
+        self.assertIsNot(child_client, parent_client)
+        parent_client.close.assert_not_called()
+
+
 class ExplicationIATest(TestCase):
     def setUp(self):
         self.matiere = Matiere.objects.create(nom='mathematiques', ordre=1)
@@ -0,0 +1,35 @@
+"""
+Normalisation et découpage en mots des textes français (questions, cours).
+
+Partagé par la détection de doublons, le cache FAQ du chat et l'index de
+recherche : minuscules, sans accents ni ponctuation, mots vides retirés et
+pluriels simples ramenés au singulier.
+"""
+import re
+import unicodedata
+
+MOTS_VIDES = frozenset("""
+a au aux avec c ce ces cest cette comment d dans de des du elle en est et etre
+il ils j je l la le les leur lui m ma me mes moi mon n ne nous on ou par pas
+pour qu que quel quelle quelles quels qui quoi s sa se ses si son sur t ta te
+tes toi ton tu un une vos votre vous y
+""".split())
+
+
+def normalize(text):
+    """Minuscules, sans accents ni ponctuation, espaces réduits."""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(re.sub(r'[^\w]+', ' ', text).split())
+
+
+def tokenize(text):
+    """Mots significatifs du texte (sans mots vides, pluriels en -s/-x retirés)."""
+    words = []
+    for word in normalize(text or '').split():
+        if word in MOTS_VIDES:
+            continue
+        if len(word) > 3 and word[-1] in 'sx':
+            word = word[:-1]
+        words.append(word)
+    return words
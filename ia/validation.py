@@ -0,0 +1,130 @@
+"""
+Validation des exercices générés par l'IA avant insertion en base.
+
+Chaque élément est vérifié contre le schéma du modèle Exercice (question,
+type, options, correct_index dans les bornes, difficulté 1-3, topic_id
+connu). Les éléments valides sont normalisés ; les autres repartent avec
+leurs erreurs vers une demande de correction ciblée (voir
+ia.services.validate_exercises), jamais le lot entier.
+"""
+import threading
+
+from core.models import Exercice
+
+TYPES_EXERCICE = {code for code, _ in Exercice.TYPE_EXERCICE}
+MIN_OPTIONS = 2
+MAX_OPTIONS = 6
+
+
+def validate_exercise(data, topic_ids=None):
+    """
+    Vérifie un exercice généré.
+
+    Args:
+        data: Objet JSON de l'IA
+        topic_ids: IDs de topics autorisés pour `topic_id` (None = pas de topic_id attendu)
+
+    Returns:
+        tuple: (exercice normalisé ou None, liste des erreurs)
+    """
+    if not isinstance(data, dict):
+        return None, ["l'élément n'est pas un objet JSON"]
+
+    errors = []
+    question = data.get('question')
+    if not isinstance(question, str) or not question.strip():
+        errors.append("`question` manquante ou vide")
+
+    type_exercice = data.get('type') or 'choix_multiple'
+    if type_exercice not in TYPES_EXERCICE:
+        errors.append(f"`type` doit être l'un de {sorted(TYPES_EXERCICE)}")
+
+    options = data.get('options')
+    if not isinstance(options, list) or not MIN_OPTIONS <= len(options) <= MAX_OPTIONS:
+        errors.append(f"`options` doit être une liste de {MIN_OPTIONS} à {MAX_OPTIONS} textes")
+        options = None
+    elif not all(isinstance(o, str) and o.strip() for o in options):
+        errors.append("chaque option doit être un texte non vide")
+    elif len({o.strip().lower() for o in options}) != len(options):
+        errors.append("les options doivent être différentes")
+
+    correct_index = data.get('correct_index')
+    if isinstance(correct_index, str) and correct_index.strip().isdigit():
+        correct_index = int(correct_index)
+    if not isinstance(correct_index, int) or isinstance(correct_index, bool):
+        errors.append("`correct_index` doit être un entier")
+    elif options is not None and not 0 <= correct_index < len(options):
+        errors.append(f"`correct_index` doit être entre 0 et {len(options) - 1}")
+
+    difficulte = data.get('difficulte', 1)
+    if difficulte not in (1, 2, 3):
+        errors.append("`difficulte` doit valoir 1, 2 ou 3")
+
+    topic_id = data.get('topic_id')
+    if topic_ids is not None and topic_id not in topic_ids:
+        errors.append(f"`topic_id` doit être l'un de {sorted(topic_ids)}")
+
+    for key in ('feedback_success', 'feedback_fail'):
+        if key in data and not isinstance(data[key], str):
+            errors.append(f"`{key}` doit être un texte")
+
+    if errors:
+        return None, errors
+
+    exercise = {
+        'question': question.strip(),
+        'type': type_exercice,
+        'options': [o.strip() for o in options],
+        'correct_index': correct_index,
+        'feedback_success': data.get('feedback_success') or 'Bravo !',
+        'feedback_fail': data.get('feedback_fail') or 'Essaie encore !',
+        'difficulte': difficulte,
+    }
+    if topic_ids is not None:
+        exercise['topic_id'] = topic_id
+    return exercise, []
+
+
+def exercice_fields(exercise):
+    """Champs Exercice (pour objects.create) d'un exercice validé."""
+    return {
+        'type_exercice': exercise['type'],
+        'question': exercise['question'],
+        'options_text': exercise['options'],
+        'correct_index': exercise['correct_index'],
+        'feedback_success_text': exercise['feedback_success'],
+        'feedback_fail_text': exercise['feedback_fail'],
+        'difficulte': exercise['difficulte'],
+        'genere_par_ia': True,
+    }
+
+
+class ValidationStats:
+    """
+    Compteurs de l'étape de validation (par processus), dont les tokens
+    économisés par les corrections ciblées par rapport au rejeu du lot entier.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counters = {
+            'valides': 0, 'corriges': 0, 'rejetes': 0, 'reparations': 0,
+            'tokens_reparation': 0, 'tokens_lots_evites': 0,
+        }
+
+    def add(self, **values):
+        with self._lock:
+            for key, value in values.items():
+                self.counters[key] += value
+
+    def report(self):
+        with self._lock:
+            report = dict(self.counters)
+        report['tokens_economises'] = report['tokens_lots_evites'] - report['tokens_reparation']
+        return report
+
+
+validation_stats = ValidationStats()
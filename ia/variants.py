@@ -0,0 +1,166 @@
+"""
+Variantes légères des audios pour les connexions lentes (2G/3G).
+
+Chaque audio du stockage (ia.audiostore) est transcodé par ffmpeg en
+variantes rangées à côté de l'original (audio/ab/cd/<clé>.opus, <clé>.bas.mp3) :
+
+- opus : Opus mono 10 kbit/s (conteneur Ogg), ~3x plus léger que le mp3 de
+  gTTS (32 kbit/s) pour une voix aussi intelligible ;
+- mp3-bas : mp3 mono 16 kbit/s à 16 kHz, ~2x plus léger, pour les lecteurs sans Opus.
+
+La variante servie est négociée par requête (negotiate) : Opus si l'en-tête
+Accept annonce audio/ogg ou audio/opus ; sinon mp3-bas si le client signale
+une connexion lente (Save-Data: on, ECT: slow-2g, 2g ou 3g) ; sinon
+l'original. Une variante pas encore transcodée n'est jamais servie : l'URL
+de l'original reste valable. Les nouveaux audios sont transcodés par une
+tâche de fond, les anciens par manage.py transcoder_audio. Avec un stockage
+partagé (tuteur_intelligent.storage), les variantes y sont publiées et leur
+existence est vérifiée en cache.
+"""
+import shutil
+import logging
+import mimetypes
+import subprocess
+from collections import namedtuple
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from ia.audiostore import asset_file, asset_path, url_key
+from tuteur_intelligent import storage
+from tuteur_intelligent.storage import atomic_file
+
+logger = logging.getLogger(__name__)
+
+Variante = namedtuple('Variante', ['suffixe', 'options'])
+
+# Options ffmpeg de sortie (après « -ac 1 » : toutes les variantes sont mono)
+VARIANTES = {
+    'opus': Variante('.opus', ['-c:a', 'libopus', '-b:a', '10k', '-application', 'voip', '-f', 'ogg']),
+    'mp3-bas': Variante('.bas.mp3', ['-c:a', 'libmp3lame', '-b:a', '16k', '-ar', '16000', '-f', 'mp3']),
+}
+
+ECT_LENTS = {'slow-2g', '2g', '3g'}
+TYPES_OPUS = {'audio/ogg', 'audio/opus'}
+
+mimetypes.add_type('audio/ogg', '.opus')
+
+
+def enabled_variants():
+    """Variantes de AUDIO_VARIANTES connues de ce module."""
+    return [nom for nom in settings.AUDIO_VARIANTES if nom in VARIANTES]
+
+
+def available():
+    """Vrai si ffmpeg est installé et au moins une variante activée."""
+    return bool(enabled_variants()) and shutil.which(settings.FFMPEG_BIN) is not None
+
+
+def variant_file(key, nom):
+    return asset_file(key).with_name(f"{key}{VARIANTES[nom].suffixe}")
+
+
+def variant_name(key, nom):
+    """Nom relatif à MEDIA_ROOT (audio/ab/cd/<clé>.opus)."""
+    return asset_path(key).removesuffix('.mp3') + VARIANTES[nom].suffixe
+
+
+def variant_url(url, nom):
+    """URL de la variante `nom` de l'audio `url` si elle est transcodée, sinon `url`."""
+    key = url_key(url) if nom else None
+    if not key or not storage.exists(variant_name(key, nom), variant_file(key, nom)):
+        return url
+    return url.removesuffix('.mp3') + VARIANTES[nom].suffixe
+
+
+def transcode(key, noms=None):
+    """
+    Écrit (et publie) les variantes manquantes de l'audio `key`.
+
+    Returns:
+        dict: nom -> taille en octets de chaque variante présente en local
+    """
+    source = asset_file(key)
+    sizes, uploads = {}, []
+    for nom in noms or enabled_variants():
+        path = variant_file(key, nom)
+        if not storage.exists(variant_name(key, nom), path):
+            if not source.exists() and not storage.fetch(asset_path(key), source):
+                raise FileNotFoundError(f"Audio absent: {source}")
+            with atomic_file(path) as tmp:
+                _run_ffmpeg(source, tmp, VARIANTES[nom].options)
+            uploads += storage.publish([(variant_name(key, nom), path)])
+        if path.exists():
+            sizes[nom] = path.stat().st_size
+    storage.wait_published(uploads)
+    return sizes
+
+
+def _run_ffmpeg(source, destination, options):
+    subprocess.run(
+        [settings.FFMPEG_BIN, '-v', 'error', '-y', '-i', str(source), '-ac', '1', *options, str(destination)],
+        check=True, capture_output=True, timeout=120,
+    )
+
+
+def schedule(asset):
+    """Met en file le transcodage d'un audio tout juste rendu (et de ses morceaux)."""
+    if not available():
+        return
+    from ia.jobs import enqueue
+
+    enqueue('variantes_audio', {'cles': [asset.cle, *(asset.morceaux or [])]}, cle=f"variantes:{asset.cle}")
+
+
+def negotiate(request):
+    """
+    Variante à servir pour cette requête, ou None pour l'original.
+    Le choix est noté sur la requête : AudioVariantMiddleware ajoute alors l'en-tête Vary.
+    """
+    request = getattr(request, '_request', request)  # Request DRF -> HttpRequest
+    if hasattr(request, 'audio_variante'):
+        return request.audio_variante
+
+    noms = enabled_variants()
+    variante = None
+    if 'opus' in noms and _accepts_opus(request.headers.get('Accept', '')):
+        variante = 'opus'
+    elif 'mp3-bas' in noms and _slow_connection(request):
+        variante = 'mp3-bas'
+    request.audio_variante = variante
+    return variante
+
+
+def _accepts_opus(accept):
+    for item in accept.split(','):
+        media_type, *params = [part.strip() for part in item.split(';')]
+        if media_type.lower() not in TYPES_OPUS:
+            continue
+        q = next((p[2:] for p in params if p.startswith('q=')), '1')
+        try:
+            if float(q) > 0:
+                return True
+        except ValueError:
+            continue
+    return False
+
+
+def _slow_connection(request):
+    return (
+        request.headers.get('Save-Data', '').strip().lower() == 'on'
+        or request.headers.get('ECT', '').strip().lower() in ECT_LENTS
+    )
+
+
+class AudioVariantMiddleware:
+    """Vary (et Accept-CH) sur les réponses dont les URLs audio dépendent des en-têtes du client."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if hasattr(request, 'audio_variante'):
+            patch_vary_headers(response, ('Accept', 'Save-Data', 'ECT'))
+            response.setdefault('Accept-CH', 'Save-Data, ECT')
+        return response
@@ -0,0 +1,151 @@
+"""
+Test de charge hors ligne des endpoints IA (explication à la demande, chat).
+
+Lance le serveur local qui imite Groq (ia.standin), crée une base de test
+(topics CE1 sans contenu, un élève), puis envoie les requêtes en parallèle à
+/api/explication/<id>/ et /api/tuteur-intelligent/chat/ par le chemin réel
+(vues, cache, limiteur, disjoncteur, single-flight, client Groq).
+L'audio (gTTS, réseau) est désactivé pendant le test.
+
+Usage: python scripts/bench_api_ia.py [--requests=200] [--concurrency=8] [--scenario=tous]
+                                      [--latence=lognormale:300,0.5] [--taux-429=0.05] [--taux-erreur=0]
+                                      [--stream] [--cassette=fichier.jsonl] [--graine=1] [--limiteur]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import logging
+import tempfile
+import statistics
+from pathlib import Path
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+# Ajouter le répertoire courant au PYTHONPATH
+sys.path.append(os.getcwd())
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tuteur_intelligent.settings')
+
+QUESTIONS = [
+    "C'est quoi une fraction ?", "Comment on additionne deux nombres ?", "Pourquoi le ciel est bleu ?",
+    "Explique-moi la soustraction avec retenue", "C'est quoi un nom propre ?", "Comment lire l'heure ?",
+]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[max(int(len(values) * p) - 1, 0)]
+
+
+def report(label, results):
+    timings = [ms for ms, _ in results]
+    codes = Counter(code for _, code in results)
+    print(f"{label:<14} n={len(results):<5} moyenne={statistics.mean(timings):8.1f} ms  "
+          f"p50={percentile(timings, 0.5):8.1f} ms  p95={percentile(timings, 0.95):8.1f} ms  "
+          f"statuts={dict(codes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200, help='Requêtes par scénario')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--scenario', choices=['explication', 'chat', 'tous'], default='tous')
+    parser.add_argument('--latence', default='lognormale:300,0.5', help='Latence du serveur local (ms)')
+    parser.add_argument('--latence-fragment', default='5', help='Délai entre fragments en streaming (ms)')
+    parser.add_argument('--taux-429', type=float, default=0.0)
+    parser.add_argument('--taux-erreur', type=float, default=0.0)
+    parser.add_argument('--stream', action='store_true', help='Chat en server-sent events')
+    parser.add_argument('--cassette', help='Réponses enregistrées à rejouer (voir serveur_ia_local)')
+    parser.add_argument('--graine', type=int, default=1)
+    parser.add_argument('--limiteur', action='store_true', help='Garde les quotas IA_RATE_* (levés par défaut)')
+    args = parser.parse_args()
+
+    import django
+    django.setup()
+    logging.disable(logging.WARNING)
+
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    from rest_framework.test import APIClient
+    from core.models import Matiere, Topic, ProfilEleve
+    from ia.standin import StandInConfig, StandInServer
+
+    server = StandInServer(StandInConfig(
+        latency=args.latence, chunk_latency=args.latence_fragment, rate_429=args.taux_429,
+        rate_error=args.taux_erreur, cassette=args.cassette, seed=args.graine,
+    )).start()
+    state_dir = tempfile.mkdtemp()
+    settings.GROQ_API_KEY = 'bench-key'
+    settings.GROQ_BASE_URL = server.url
+    settings.IA_STATE_DIR = Path(state_dir)
+    if not args.limiteur:
+        settings.IA_RATE_RPM, settings.IA_RATE_TPM = 10 ** 6, 10 ** 9
+
+    # Base de test dans un fichier : les threads partagent la base sans verrou de table
+    # (SQLite en mémoire partagée sérialise mal les écritures concurrentes)
+    if connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = os.path.join(state_dir, 'bench.sqlite3')
+        connection.settings_dict.setdefault('OPTIONS', {})['timeout'] = 30
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        matiere = Matiere.objects.create(nom='arithmetique', ordre=1)
+        # Quatre requêtes par topic : la première génère, les autres attendent ou lisent la base
+        topics = [
+            Topic.objects.create(matiere=matiere, classe='ce1', titre=f'Topic {i}', resume=f'Résumé du topic {i}')
+            for i in range(max(args.requests // 4, 1))
+        ]
+        user = User.objects.create_user(username='bench', password='bench')
+        ProfilEleve.objects.create(user=user, classe='ce1')
+
+        print(f"Serveur IA local: {server.url} — latence {args.latence}, 429 {args.taux_429:.0%}, "
+              f"erreurs {args.taux_erreur:.0%}, {args.concurrency} clients\n")
+
+        def explication(i):
+            client = APIClient()
+            start = time.perf_counter()
+            response = client.get(f'/api/explication/{topics[i % len(topics)].id}/')
+            return (time.perf_counter() - start) * 1000, response.status_code
+
+        def chat(i):
+            client = APIClient()
+            client.force_authenticate(user=user)
+            # Historique : questions non partagées par le cache FAQ
+            payload = {
+                'message': QUESTIONS[i % len(QUESTIONS)],
+                'history': [{'role': 'user', 'content': f'Bonjour, je suis le client {i}'}],
+            }
+            start = time.perf_counter()
+            if args.stream:
+                response = client.post('/api/tuteur-intelligent/chat/', dict(payload, stream=True), format='json')
+                if hasattr(response, 'streaming_content'):
+                    b''.join(response.streaming_content)
+            else:
+                response = client.post('/api/tuteur-intelligent/chat/', payload, format='json')
+            return (time.perf_counter() - start) * 1000, response.status_code
+
+        scenarios = {'explication': explication, 'chat': chat}
+        if args.scenario != 'tous':
+            scenarios = {args.scenario: scenarios[args.scenario]}
+
+        with patch('ia.services.generate_audio', return_value=None):
+            for name, run in scenarios.items():
+                server.stats.reset()
+                with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                    results = list(pool.map(run, range(args.requests)))
+                report(name, results)
+                print(f"{'':<14} serveur local: {server.stats.snapshot()}")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        server.stop()
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark : client Groq créé à chaque appel vs client partagé (pool keep-alive).
+
+Lance le serveur local qui imite l'API chat-completions de Groq (ia.standin),
+puis mesure la latence par appel dans les deux modes.
+
+Usage: python scripts/bench_groq_client.py [--calls=200] [--latency-ms=0]
+"""
+import os
+import sys
+import time
+import argparse
+import logging
+import statistics
+
+# Ajouter le répertoire courant au PYTHONPATH
+sys.path.append(os.getcwd())
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tuteur_intelligent.settings')
+
+
+def measure(get_client, calls):
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        client = get_client()
+        client.chat.completions.create(
+            model='bench',
+            messages=[{'role': 'user', 'content': 'Bonjour'}],
+            max_tokens=10,
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label, timings, connections):
+    p95 = sorted(timings)[int(len(timings) * 0.95) - 1]
+    print(f"{label:<22} moyenne={statistics.mean(timings):7.2f} ms  "
+          f"p50={statistics.median(timings):7.2f} ms  p95={p95:7.2f} ms  connexions={connections}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Latence simulée du serveur')
+    args = parser.parse_args()
+
+    import django
+    django.setup()
+    logging.disable(logging.INFO)
+
+    from groq import Groq
+    from django.conf import settings
+    from ia.services import get_groq_client
+    from ia.standin import StandInConfig, StandInServer
+
+    server = StandInServer(StandInConfig(latency=args.latency_ms)).start()
+    base_url = server.url
+    settings.GROQ_API_KEY = 'bench-key'
+    settings.GROQ_BASE_URL = base_url
+
+    print(f"Stand-in: {base_url} — {args.calls} appels par mode\n")
+
+    server.stats.reset()
+    fresh = measure(lambda: Groq(api_key='bench-key', base_url=base_url), args.calls)
+    report('Client par appel', fresh, server.stats.snapshot()['connexions'])
+
+    server.stats.reset()
+    pooled = measure(get_groq_client, args.calls)
+    report('Client partagé (pool)', pooled, server.stats.snapshot()['connexions'])
+
+    saved = statistics.mean(fresh) - statistics.mean(pooled)
+    print(f"\nGain moyen par appel: {saved:.2f} ms "
+          f"(hors poignée de main TLS, économisée en plus contre l'API réelle)")
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
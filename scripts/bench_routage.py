@@ -0,0 +1,143 @@
+"""
+Banc d'essai hors ligne du routage des modèles par tâche (ia.services.ROUTES).
+
+Lance le serveur local qui imite Groq (ia.standin) avec un comportement par
+modèle (latence, taux de 429), puis envoie les appels de chaque tâche par le
+chemin réel (routage, replis, limiteur, disjoncteur, télémétrie). Compare la
+table de routage à un modèle unique (GROQ_MODEL pour toutes les tâches) :
+latence p50/p95, échecs, modèles réellement utilisés, replis et coût estimé.
+
+Usage: python scripts/bench_routage.py [--appels=100] [--concurrency=8] [--taches=chat,exercices]
+                                       [--latence-rapide=lognormale:150,0.4] [--latence-riche=lognormale:500,0.5]
+                                       [--taux-429-rapide=0] [--taux-429-riche=0.2] [--graine=1]
+"""
+import os
+import sys
+import shutil
+import argparse
+import logging
+import tempfile
+from pathlib import Path
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# Ajouter le répertoire courant au PYTHONPATH
+sys.path.append(os.getcwd())
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tuteur_intelligent.settings')
+
+PROMPTS = {
+    'chat': "Explique-moi simplement ce qu'est une fraction.",
+    'explication': "Explique la soustraction avec retenue à un élève de CE2.",
+    'exercices': "Génère 3 exercices JSON sur les fractions.",
+    'curriculum': "Génère une liste JSON de thèmes de sciences pour le CM1.",
+    'reparation': "Corrige ces exercices JSON invalides.",
+}
+JSON_TASKS = {'exercices', 'curriculum', 'reparation'}
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[max(int(len(values) * p) - 1, 0)] if values else 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--appels', type=int, default=100, help='Appels par tâche')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--taches', default='chat,explication,exercices,curriculum')
+    parser.add_argument('--latence-rapide', default='lognormale:150,0.4', help='Latence du modèle rapide (ms)')
+    parser.add_argument('--latence-riche', default='lognormale:500,0.5', help='Latence du modèle riche (ms)')
+    parser.add_argument('--taux-429-rapide', type=float, default=0.0)
+    parser.add_argument('--taux-429-riche', type=float, default=0.2)
+    parser.add_argument('--graine', type=int, default=1)
+    args = parser.parse_args()
+
+    import django
+    django.setup()
+    logging.disable(logging.WARNING)
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment, override_settings
+    from ia.models import AppelIA
+    from ia.routing import model_router
+    from ia.services import ROUTES, call_groq_safe, get_route
+    from ia.standin import StandInConfig, StandInServer
+    from ia.telemetry import appelant, telemetry_store, cout_estime
+
+    taches = [t for t in args.taches.split(',') if t]
+    for tache in taches:
+        get_route(tache)  # Tâche inconnue : ValueError avant de lancer le serveur
+
+    rapide = settings.IA_MODELE_RAPIDE or settings.GROQ_MODEL
+    riche = settings.IA_MODELE_RICHE
+    server = StandInServer(StandInConfig(seed=args.graine, retry_after=1, models={
+        rapide: {'latency': args.latence_rapide, 'rate_429': args.taux_429_rapide},
+        riche: {'latency': args.latence_riche, 'rate_429': args.taux_429_riche},
+    })).start()
+    state_dir = tempfile.mkdtemp()
+    settings.GROQ_API_KEY = 'bench-key'
+    settings.GROQ_BASE_URL = server.url
+    settings.IA_STATE_DIR = Path(state_dir)
+    settings.IA_RATE_RPM, settings.IA_RATE_TPM = 10 ** 6, 10 ** 9
+
+    # Base de test dans un fichier (télémétrie écrite depuis plusieurs threads)
+    if connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = os.path.join(state_dir, 'bench.sqlite3')
+        connection.settings_dict.setdefault('OPTIONS', {})['timeout'] = 30
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        print(f"Serveur IA local: {server.url}\n"
+              f"  rapide {rapide}: latence {args.latence_rapide}, 429 {args.taux_429_rapide:.0%}\n"
+              f"  riche  {riche}: latence {args.latence_riche}, 429 {args.taux_429_riche:.0%}\n")
+
+        # Modèle unique : toutes les tâches sur GROQ_MODEL, sans repli
+        unique = {tache: {'modeles': [settings.GROQ_MODEL]} for tache in ROUTES}
+        for label, routes in (('routage', {}), ('modèle unique', unique)):
+            print(f"== {label}")
+            model_router.reset()
+            with override_settings(IA_ROUTES=routes):
+                for tache in taches:
+                    run(tache, args, call_groq_safe, appelant, server)
+            telemetry_store.flush()
+            for tache in taches:
+                report(tache, AppelIA.objects.filter(appelant=f'bench:{tache}'), cout_estime)
+            AppelIA.objects.all().delete()
+            print(f"   replis: {model_router.snapshot()['replis'] or '-'}\n")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        server.stop()
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+
+def run(tache, args, call_groq_safe, appelant, server):
+    server.stats.reset()
+
+    def call(i):
+        # Les threads n'héritent pas du contexte : appelant posé dans chaque thread
+        with appelant(f'bench:{tache}'):
+            call_groq_safe(
+                f"{PROMPTS[tache]} ({i})", classe='ce2', cache=False, json_mode=tache in JSON_TASKS, tache=tache,
+            )
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(call, range(args.appels)))
+
+
+def report(tache, appels, cout):
+    rows = list(appels.values_list('modele', 'succes', 'duree_ms', 'rejeux', 'tokens_prompt', 'tokens_reponse'))
+    if not rows:
+        return
+    durees = [r[2] for r in rows]
+    modeles = Counter(r[0] for r in rows if r[1])
+    total = sum(cout(r[0], r[4], r[5]) for r in rows)
+    print(f"   {tache:<12} n={len(rows):<4} échecs={sum(not r[1] for r in rows):<3} "
+          f"p50={percentile(durees, 0.5):6} ms  p95={percentile(durees, 0.95):6} ms  "
+          f"rejeux={sum(r[3] for r in rows):<4} coût=${total:.5f}  modèles={dict(modeles)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""
+Service des fichiers de MEDIA_ROOT (audios, avatars) en production, depuis
+gunicorn, sans serveur web séparé.
+
+- Range : une plage d'octets par requête (206, 416 hors du fichier), pour
+  que les lecteurs mobiles avancent dans un audio sans tout télécharger.
+- ETag fort : la clé d'un audio du stockage (ia.audiostore), comme la
+  version d'un paquet hors ligne (ia.bundles), est déjà le hash de son
+  contenu ; pour les autres fichiers, SHA-256 du contenu calculé une fois
+  par (taille, date de modification). If-None-Match -> 304, If-Range respecté.
+- Cache : les fichiers adressés par leur contenu ne changent jamais
+  (Cache-Control immutable, un an) ; les autres sont revalidés après
+  MEDIA_CACHE_MAX_AGE secondes.
+- Zéro copie : le fichier est rendu au serveur WSGI (wsgi.file_wrapper),
+  que gunicorn envoie par sendfile(), plage comprise. Derrière nginx,
+  MEDIA_ACCEL_REDIRECT délègue l'envoi (X-Accel-Redirect).
+- Stockage partagé (MEDIA_STORAGE=s3) : un fichier absent de ce nœud mais
+  publié par un autre est servi par redirection vers le bucket.
+"""
+import re
+import hashlib
+import mimetypes
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotAllowed, HttpResponseRedirect
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags, quote_etag
+
+# audio/ab/cd/<clé>.mp3 et ses variantes (<clé>.opus, <clé>.bas.mp3), paquets
+# hors ligne bundles/<portée>/<format>/<version>.zip (voir ia.bundles)
+_CONTENT_ADDRESSED = re.compile(
+    r'^(?:audio/[0-9a-f]{2}/[0-9a-f]{2}|bundles/[a-z0-9-]+/[a-z0-9-]+)/([0-9a-f]{64}(?:\.[a-z0-9]+)+)$'
+)
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+_TYPES = {'.mp3': 'audio/mpeg', '.opus': 'audio/ogg'}
+
+_hashes = {}  # chemin -> (taille, mtime_ns, etag)
+_hashes_lock = threading.Lock()
+
+
+def cache_control(path):
+    """Cache-Control d'un fichier de MEDIA_ROOT (aussi posé sur les objets S3, voir tuteur_intelligent.storage)."""
+    return IMMUTABLE if _CONTENT_ADDRESSED.match(path) else f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}'
+
+
+def serve_media(request, path):
+    """Sert MEDIA_ROOT/<path> (GET, HEAD) avec Range, ETag et cache."""
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    try:
+        fullpath = Path(safe_join(settings.MEDIA_ROOT, path))
+    except SuspiciousFileOperation:  # Hors de MEDIA_ROOT
+        raise Http404("Fichier introuvable")
+    if not fullpath.is_file():
+        return _shared_copy(path)
+    stat = fullpath.stat()
+
+    immutable = _CONTENT_ADDRESSED.match(path)
+    etag = quote_etag(immutable.group(1) if immutable else _content_hash(fullpath, stat))
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': cache_control(path),
+        'Accept-Ranges': 'bytes',
+    }
+
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+    if etag in if_none_match or '*' in if_none_match:
+        return _with_headers(HttpResponse(status=304), headers)
+
+    size = stat.st_size
+    start, length = 0, size
+    range_header = request.headers.get('Range')
+    if range_header and request.headers.get('If-Range', etag) == etag:
+        byte_range = _parse_range(range_header, size)
+        if byte_range is None:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return _with_headers(response, headers)
+        if byte_range != (0, size):
+            start, length = byte_range
+            headers['Content-Range'] = f'bytes {start}-{start + length - 1}/{size}'
+
+    content_type = _TYPES.get(fullpath.suffix) or mimetypes.guess_type(fullpath.name)[0] or 'application/octet-stream'
+    status = 206 if 'Content-Range' in headers else 200
+
+    if request.method == 'HEAD':
+        response = HttpResponse(status=status, content_type=content_type)
+    elif settings.MEDIA_ACCEL_REDIRECT:
+        # nginx envoie le fichier (et traite lui-même la plage demandée)
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = f"{settings.MEDIA_ACCEL_REDIRECT.rstrip('/')}/{path}"
+        headers.pop('Content-Range', None)
+        return _with_headers(response, headers)
+    else:
+        response = FileResponse(_RangeFile(fullpath.open('rb'), start, length), status=status, content_type=content_type)
+    response['Content-Length'] = length
+    return _with_headers(response, headers)
+
+
+def _shared_copy(path):
+    """Redirection vers le fichier publié par un autre nœud, sinon 404."""
+    from tuteur_intelligent import storage  # tuteur_intelligent.storage importe ce module
+
+    if not storage.is_remote() or not storage.media_storage().exists(path):
+        raise Http404("Fichier introuvable")
+    response = HttpResponseRedirect(storage.media_storage().url(path))
+    response['Cache-Control'] = cache_control(path)
+    return response
+
+
+def _with_headers(response, headers):
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+def _parse_range(header, size):
+    """
+    Une seule plage « bytes=a-b », « bytes=a- » ou « bytes=-n ».
+
+    Returns:
+        tuple: (début, longueur) ; (0, size) pour un en-tête ignoré (plusieurs
+        plages, syntaxe inconnue), None pour une plage hors du fichier (416)
+    """
+    match = _RANGE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return 0, size
+    first, last = match.groups()
+    if not first:
+        length = min(int(last), size)
+        return (size - length, length) if length else None
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return None
+    return start, end - start + 1
+
+
+def _content_hash(path, stat):
+    key = str(path)
+    with _hashes_lock:
+        cached = _hashes.get(key)
+    if cached and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+        return cached[2]
+    digest = hashlib.sha256()
+    with path.open('rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    etag = digest.hexdigest()
+    with _hashes_lock:
+        _hashes[key] = (stat.st_size, stat.st_mtime_ns, etag)
+    return etag
+
+
+class _RangeFile:
+    """
+    Fichier limité à `length` octets à partir de `start`. Expose fileno() :
+    gunicorn envoie alors la plage par sendfile() depuis la position
+    courante, sur Content-Length octets.
+    """
+
+    def __init__(self, f, start, length):
+        f.seek(start)
+        self._file = f
+        self._remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,235 @@
+"""
+Serveur local qui imite le sous-ensemble de l'API S3 utilisé par
+tuteur_intelligent.storage (tests, développement sans compte S3).
+
+Adressage par chemin (http://hôte:port/<bucket>/<clé>), objets en mémoire,
+signatures non vérifiées : PUT/GET (plages comprises)/HEAD/DELETE d'objets, création de
+bucket et envois multipart (création, parties, finalisation, abandon).
+Les compteurs (`stats`) permettent de vérifier ce que le client a envoyé.
+
+Usage: python manage.py serveur_s3_local (voir la commande), ou dans un test :
+
+    with S3StandInServer() as server:
+        with override_settings(MEDIA_S3_ENDPOINT_URL=server.url, ...): ...
+"""
+import re
+import uuid
+import hashlib
+import threading
+from urllib.parse import urlsplit, parse_qs, unquote
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_XMLNS = 'http://s3.amazonaws.com/doc/2006-03-01/'
+
+
+class S3StandInHandler(BaseHTTPRequestHandler):
+    """Requêtes S3 en adressage par chemin, en HTTP/1.1 pour autoriser le keep-alive."""
+    protocol_version = 'HTTP/1.1'
+    server_version = 'S3StandIn/1.0'
+
+    def _parse(self):
+        url = urlsplit(self.path)
+        bucket, _, key = url.path.lstrip('/').partition('/')
+        return unquote(bucket), unquote(key), parse_qs(url.query, keep_blank_values=True)
+
+    def do_PUT(self):
+        bucket, key, query = self._parse()
+        body = self._body()
+        store = self.server.store
+        if not key:
+            store.buckets.add(bucket)
+            return self._send(200)
+        if bucket not in store.buckets:
+            return self._error(404, 'NoSuchBucket')
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if 'uploadId' in query:
+            upload = store.uploads.get(query['uploadId'][0])
+            if upload is None:
+                return self._error(404, 'NoSuchUpload')
+            upload[int(query['partNumber'][0])] = body
+            store.add('parties')
+        else:
+            store.objects[(bucket, key)] = (body, etag, self.headers.get('Content-Type', ''),
+                                            self.headers.get('Cache-Control', ''))
+            store.add('put')
+        self._send(200, headers={'ETag': etag})
+
+    def do_POST(self):
+        bucket, key, query = self._parse()
+        body = self._body()
+        store = self.server.store
+        if 'uploads' in query:
+            upload_id = uuid.uuid4().hex
+            store.uploads[upload_id] = {}
+            store.pending[upload_id] = (self.headers.get('Content-Type', ''), self.headers.get('Cache-Control', ''))
+            store.add('multipart')
+            return self._send_xml(
+                f'<InitiateMultipartUploadResult xmlns="{_XMLNS}"><Bucket>{escape(bucket)}</Bucket>'
+                f'<Key>{escape(key)}</Key><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>'
+            )
+        if 'uploadId' in query:
+            upload_id = query['uploadId'][0]
+            parts = store.uploads.pop(upload_id, None)
+            if parts is None:
+                return self._error(404, 'NoSuchUpload')
+            numbers = [int(e.text) for e in ElementTree.fromstring(body).iter() if e.tag.endswith('PartNumber')]
+            data = b''.join(parts[n] for n in sorted(numbers))
+            content_type, cache_control = store.pending.pop(upload_id)
+            etag = f'"{hashlib.md5(data).hexdigest()}-{len(numbers)}"'
+            store.objects[(bucket, key)] = (data, etag, content_type, cache_control)
+            return self._send_xml(
+                f'<CompleteMultipartUploadResult xmlns="{_XMLNS}"><Bucket>{escape(bucket)}</Bucket>'
+                f'<Key>{escape(key)}</Key><ETag>{escape(etag)}</ETag></CompleteMultipartUploadResult>'
+            )
+        self._error(400, 'InvalidRequest')
+
+    def do_GET(self):
+        self._get(head=False)
+
+    def do_HEAD(self):
+        self._get(head=True)
+
+    def _get(self, head):
+        bucket, key, _ = self._parse()
+        store = self.server.store
+        store.add('head' if head else 'get')
+        entry = store.objects.get((bucket, key))
+        if entry is None:
+            return self._error(404, 'NoSuchKey', head=head)
+        body, etag, content_type, cache_control = entry
+        headers = {'ETag': etag, 'Content-Type': content_type or 'binary/octet-stream', 'Accept-Ranges': 'bytes'}
+        if cache_control:
+            headers['Cache-Control'] = cache_control
+        status, size = 200, len(body)
+        match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+        if match:  # Téléchargements en parties de boto3
+            start = int(match.group(1))
+            end = min(int(match.group(2) or size - 1), size - 1)
+            status, body = 206, body[start:end + 1]
+            headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+        self._send(status, b'' if head else body, headers, length=len(body))
+
+    def do_DELETE(self):
+        bucket, key, query = self._parse()
+        store = self.server.store
+        if 'uploadId' in query:
+            store.uploads.pop(query['uploadId'][0], None)
+            store.pending.pop(query['uploadId'][0], None)
+        else:
+            store.objects.pop((bucket, key), None)
+            store.add('delete')
+        self._send(204)
+
+    def _body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            data = self._read_chunked()
+        else:
+            data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if 'aws-chunked' in self.headers.get('Content-Encoding', ''):
+            data = _decode_aws_chunked(data)
+        return data
+
+    def _read_chunked(self):
+        data = b''
+        while True:
+            size = int(self.rfile.readline().split(b';')[0], 16)
+            if not size:
+                while self.rfile.readline() not in (b'\r\n', b''):
+                    pass
+                return data
+            data += self.rfile.read(size)
+            self.rfile.readline()
+
+    def _error(self, status, code, head=False):
+        body = b'' if head else f'<Error><Code>{code}</Code><Message>{code}</Message></Error>'.encode()
+        self._send(status, body, {'Content-Type': 'application/xml'})
+
+    def _send_xml(self, xml):
+        self._send(200, f'<?xml version="1.0" encoding="UTF-8"?>{xml}'.encode(), {'Content-Type': 'application/xml'})
+
+    def _send(self, status, body=b'', headers=None, length=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body) if length is None else length))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _decode_aws_chunked(data):
+    """Corps « aws-chunked » (taille;signature CRLF données CRLF ... 0 CRLF en-têtes finaux)."""
+    out, pos = b'', 0
+    while True:
+        end = data.index(b'\r\n', pos)
+        size = int(data[pos:end].split(b';')[0], 16)
+        if not size:
+            return out
+        out += data[end + 2:end + 2 + size]
+        pos = end + 2 + size + 2
+
+
+class S3Store:
+    """Buckets, objets et envois multipart en cours, plus les compteurs de requêtes."""
+
+    def __init__(self, buckets=()):
+        self._lock = threading.Lock()
+        self.buckets = set(buckets)
+        self.objects = {}   # (bucket, clé) -> (données, etag, content-type, cache-control)
+        self.uploads = {}   # upload_id -> {numéro de partie: données}
+        self.pending = {}   # upload_id -> (content-type, cache-control)
+        self.counters = {'put': 0, 'get': 0, 'head': 0, 'delete': 0, 'multipart': 0, 'parties': 0}
+
+    def add(self, key, value=1):
+        with self._lock:
+            self.counters[key] += value
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+class S3StandInServer:
+    """Serveur S3 local dans un thread (daemon) ; utilisable comme context manager."""
+
+    def __init__(self, buckets=('medias',), host='127.0.0.1', port=0):
+        self.httpd = ThreadingHTTPServer((host, port), S3StandInHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.store = S3Store(buckets)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def store(self):
+        return self.httpd.store
+
+    @property
+    def stats(self):
+        return self.httpd.store.snapshot()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -50,6 +50,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'ia.telemetry.TelemetryMiddleware',
+    'ia.variants.AudioVariantMiddleware',
 ]
 
 ROOT_URLCONF = 'tuteur_intelligent.urls'
@@ -128,6 +130,22 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 # Media files (Audio, Images uploads)
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Service de MEDIA_ROOT par Django, aussi en production (voir tuteur_intelligent.media)
+MEDIA_SERVE = os.getenv('MEDIA_SERVE', 'True') == 'True'
+MEDIA_CACHE_MAX_AGE = int(os.getenv('MEDIA_CACHE_MAX_AGE', '3600'))  # Fichiers non adressés par leur contenu (avatars)
+MEDIA_ACCEL_REDIRECT = os.getenv('MEDIA_ACCEL_REDIRECT', '')  # Ex. /protected-media/ : envoi délégué à nginx
+# Stockage partagé des médias entre conteneurs (voir tuteur_intelligent.storage) : local ou s3
+MEDIA_STORAGE = os.getenv('MEDIA_STORAGE', 'local')
+MEDIA_S3_BUCKET = os.getenv('MEDIA_S3_BUCKET', '')
+MEDIA_S3_PREFIX = os.getenv('MEDIA_S3_PREFIX', '')  # Ex. prod/ : les objets sont rangés sous ce préfixe
+MEDIA_S3_REGION = os.getenv('MEDIA_S3_REGION', 'us-east-1')
+MEDIA_S3_ENDPOINT_URL = os.getenv('MEDIA_S3_ENDPOINT_URL', '')  # MinIO, R2... (vide = AWS)
+MEDIA_S3_PUBLIC_URL = os.getenv('MEDIA_S3_PUBLIC_URL', '')  # CDN devant le bucket
+MEDIA_S3_ACCESS_KEY = os.getenv('MEDIA_S3_ACCESS_KEY', '')  # Vide = chaîne boto3 (AWS_ACCESS_KEY_ID, rôle IAM...)
+MEDIA_S3_SECRET_KEY = os.getenv('MEDIA_S3_SECRET_KEY', '')
+MEDIA_S3_MULTIPART_MB = int(os.getenv('MEDIA_S3_MULTIPART_MB', '8'))
+MEDIA_UPLOAD_CONCURRENCY = int(os.getenv('MEDIA_UPLOAD_CONCURRENCY', '4'))
+MEDIA_EXISTS_TTL = int(os.getenv('MEDIA_EXISTS_TTL', '3600'))
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -177,10 +195,121 @@ CSRF_TRUSTED_ORIGINS = os.getenv('CSRF_TRUSTED_ORIGINS',
 # Groq API
 GROQ_API_KEY = os.getenv('GROQ_API_KEY', '')
 GROQ_MODEL = os.getenv('GROQ_MODEL', 'llama-3.1-8b-instant')
+GROQ_BASE_URL = os.getenv('GROQ_BASE_URL') or None  # None = URL par défaut du SDK
+# Fournisseur des appels IA (classe avec create/acreate, voir ia.services.GroqProvider).
+# Pour travailler hors ligne : GROQ_BASE_URL vers le serveur local (manage.py serveur_ia_local)
+IA_PROVIDER = os.getenv('IA_PROVIDER', 'ia.services.GroqProvider')
+
+# Pool de connexions Groq (un client keep-alive partagé par processus)
+GROQ_POOL_MAX_CONNECTIONS = int(os.getenv('GROQ_POOL_MAX_CONNECTIONS', '10'))
+GROQ_POOL_MAX_KEEPALIVE = int(os.getenv('GROQ_POOL_MAX_KEEPALIVE', '5'))
+GROQ_POOL_KEEPALIVE_EXPIRY = float(os.getenv('GROQ_POOL_KEEPALIVE_EXPIRY', '60'))
+GROQ_TIMEOUT = float(os.getenv('GROQ_TIMEOUT', '60'))
+GROQ_CONNECT_TIMEOUT = float(os.getenv('GROQ_CONNECT_TIMEOUT', '5'))
+GROQ_MAX_RETRIES = int(os.getenv('GROQ_MAX_RETRIES', '2'))
+# Appels interactifs (requêtes HTTP) : bornés sous le timeout des workers gunicorn (120 s)
+GROQ_TIMEOUT_INTERACTIVE = float(os.getenv('GROQ_TIMEOUT_INTERACTIVE', '20'))  # Par tentative (s)
+GROQ_MAX_RETRIES_INTERACTIVE = int(os.getenv('GROQ_MAX_RETRIES_INTERACTIVE', '1'))
+IA_INTERACTIVE_DEADLINE = float(os.getenv('IA_INTERACTIVE_DEADLINE', '60'))  # Plus de nouvelle tentative au-delà (s)
+
+# Nombre d'appels IA simultanés pour les générations en masse (commandes)
+IA_CONCURRENCY = int(os.getenv('IA_CONCURRENCY', '4'))
+
+# Cache des réponses IA (LRU mémoire par processus + table ReponseIACache)
+IA_CACHE_ENABLED = os.getenv('IA_CACHE_ENABLED', 'True') == 'True'
+IA_CACHE_TTL = int(os.getenv('IA_CACHE_TTL', str(30 * 24 * 3600)))  # secondes
+IA_CACHE_LRU_SIZE = int(os.getenv('IA_CACHE_LRU_SIZE', '256'))
+IA_CACHE_MAX_ENTRIES = int(os.getenv('IA_CACHE_MAX_ENTRIES', '5000'))
+IA_CACHE_EVICTION_INTERVAL = 50  # Éviction toutes les N écritures
+
+# État partagé entre workers et commandes (limiteur de débit, etc.)
+IA_STATE_DIR = Path(os.getenv('IA_STATE_DIR', BASE_DIR / 'var' / 'ia'))
+
+# Limiteur de débit Groq (partagé entre processus)
+IA_RATE_RPM = int(os.getenv('IA_RATE_RPM', '30'))  # Requêtes par minute
+IA_RATE_TPM = int(os.getenv('IA_RATE_TPM', '6000'))  # Tokens par minute
+IA_RATE_RESERVE_INTERACTIVE = float(os.getenv('IA_RATE_RESERVE_INTERACTIVE', '0.2'))  # Part réservée au trafic interactif
+IA_RATE_MAX_WAIT_INTERACTIVE = float(os.getenv('IA_RATE_MAX_WAIT_INTERACTIVE', '5'))  # secondes
+IA_RATE_MAX_WAIT_BATCH = float(os.getenv('IA_RATE_MAX_WAIT_BATCH', '300'))
+IA_RATE_MAX_BACKOFF = 60
+
+# Disjoncteur IA (partagé entre processus) : repli immédiat quand Groq est en panne
+IA_BREAKER_FAILURE_THRESHOLD = int(os.getenv('IA_BREAKER_FAILURE_THRESHOLD', '5'))  # Échecs consécutifs
+IA_BREAKER_RESET_TIMEOUT = float(os.getenv('IA_BREAKER_RESET_TIMEOUT', '30'))  # secondes avant un essai
+IA_BREAKER_SLOW_CALL = float(os.getenv('IA_BREAKER_SLOW_CALL', '20'))  # Appel interactif plus lent = échec
+
+# Génération à la demande coalescée entre workers (une seule par topic)
+IA_SINGLE_FLIGHT_WAIT = float(os.getenv('IA_SINGLE_FLIGHT_WAIT', '15'))  # Attente max des autres requêtes (s)
+IA_SINGLE_FLIGHT_TTL = 300  # Verrou repris au-delà (détenteur mort)
+
+# Tâches de fond (table TacheFond, exécutées par manage.py run_worker)
+IA_JOBS_CONCURRENCY = int(os.getenv('IA_JOBS_CONCURRENCY', '2'))  # Threads par worker
+IA_JOBS_POLL = 2  # Attente entre deux recherches de tâches (s)
+IA_JOBS_LEASE = 300  # Bail d'une tâche : reprise par un autre worker au-delà (s)
+IA_JOBS_HEARTBEAT = 60  # Prolongation des baux des tâches en cours (s)
+IA_JOBS_MAX_TENTATIVES = 3
+IA_JOBS_RETRY_DELAY = 30  # Délai avant le 2e essai, doublé ensuite (s)
+IA_JOBS_RETENTION_DAYS = 7  # Tâches terminées conservées
+# Explications générées en tâche de fond (202 + URL de statut) au lieu de pendant la requête ;
+# un client peut aussi le demander avec l'en-tête « Prefer: respond-async »
+IA_EXPLICATION_EN_FOND = os.getenv('IA_EXPLICATION_EN_FOND', 'False') == 'True'
+
+# Prompt du chat (estimations à ~4 caractères par token)
+IA_CHAT_PROMPT_BUDGET = int(os.getenv('IA_CHAT_PROMPT_BUDGET', '1200'))  # Tokens max envoyés (hors réponse)
+IA_CHAT_MESSAGE_MAX_TOKENS = 300  # Un message plus long est tronqué
+IA_CHAT_HISTORY_TURNS = 6  # Derniers messages gardés tels quels
+IA_CHAT_MEMO_TOKENS = 80  # Mémo des échanges plus anciens
+IA_CHAT_MAX_TOKENS = int(os.getenv('IA_CHAT_MAX_TOKENS', '600'))  # Réponse (ancrée dans les extraits du cours)
+
+# Routage des modèles par tâche (table ROUTES de ia.services) : JSON structuré sur le
+# modèle rapide, chat et explications sur le modèle riche, repli sur l'autre en cas de 429 / erreur
+IA_MODELE_RAPIDE = os.getenv('IA_MODELE_RAPIDE') or None  # None = GROQ_MODEL
+IA_MODELE_RICHE = os.getenv('IA_MODELE_RICHE', 'llama-3.3-70b-versatile')
+IA_ROUTES = {}  # Surcharges par tâche, ex. {'chat': {'modeles': ['rapide'], 'temperature': 0.5}}
+IA_ROUTAGE_PAUSE = 30  # Modèle évité après un 429 sans Retry-After ou une erreur (s)
+
+# Extraits de cours injectés dans le chat (index BM25 local par classe)
+IA_RETRIEVAL_TOP_K = int(os.getenv('IA_RETRIEVAL_TOP_K', '3'))
+IA_RETRIEVAL_PASSAGE_TOKENS = 80  # Taille max d'un passage
+IA_RETRIEVAL_REFRESH_INTERVAL = 300  # Vérification des topics modifiés par d'autres processus (s)
+
+# Exercices quasi-dupliqués : similarité de Jaccard (MinHash) à partir de laquelle
+# un exercice généré est ignoré
+IA_DEDUP_THRESHOLD = float(os.getenv('IA_DEDUP_THRESHOLD', '0.9'))
+
+# Génération groupée d'exercices (--pack) : plusieurs topics d'une classe/matière par appel
+IA_PACK_MAX_TOKENS = int(os.getenv('IA_PACK_MAX_TOKENS', '4000'))  # Budget de réponse d'un appel
+IA_PACK_TOKENS_EXERCICE = 150  # Tokens estimés d'un exercice JSON
+IA_PACK_PROMPT_BUDGET = 1200  # Tokens max des sections de topics dans le prompt
+IA_PACK_MAX_TOPICS = 8
+
+# Cache FAQ du chat : réponses réutilisées pour les questions similaires d'une classe
+IA_FAQ_THRESHOLD = float(os.getenv('IA_FAQ_THRESHOLD', '0.85'))  # Similarité cosinus TF-IDF minimale
+IA_FAQ_TTL = int(os.getenv('IA_FAQ_TTL', str(7 * 24 * 3600)))  # secondes
+IA_FAQ_MAX_ENTRIES = int(os.getenv('IA_FAQ_MAX_ENTRIES', '5000'))
+IA_FAQ_MAX_QUESTION_TOKENS = 40  # Au-delà, la question est trop spécifique pour être partagée
+IA_FAQ_RELOAD_INTERVAL = 60  # Rechargement de l'index depuis la base (entrées des autres workers)
+
+# Télémétrie des appels IA (table AppelIA, voir manage.py telemetrie_ia)
+IA_TELEMETRY_RETENTION_DAYS = int(os.getenv('IA_TELEMETRY_RETENTION_DAYS', '14'))
+IA_TELEMETRY_BATCH_SIZE = 50  # Mesures écrites par lot
+IA_TELEMETRY_FLUSH_INTERVAL = 30  # Écriture au plus tard après N secondes (s)
+# Prix en USD par million de tokens (prompt, réponse) pour l'estimation des coûts
+IA_PRIX_MODELES = {
+    'llama-3.1-8b-instant': (0.05, 0.08),
+    'llama-3.3-70b-versatile': (0.59, 0.79),
+}
 
 # Audio settings
 AUDIO_STORAGE_PATH = BASE_DIR / 'media' / 'audio'
 AUDIO_STORAGE_PATH.mkdir(parents=True, exist_ok=True)
+AUDIO_CONCURRENCY = int(os.getenv('AUDIO_CONCURRENCY', '4'))  # Rendus gTTS simultanés (generer_audio)
+# Textes longs : découpés en morceaux d'au plus N caractères, rendus en parallèle puis joints
+AUDIO_CHUNK_CARACTERES = int(os.getenv('AUDIO_CHUNK_CARACTERES', '300'))
+AUDIO_CHUNK_CONCURRENCY = int(os.getenv('AUDIO_CHUNK_CONCURRENCY', '4'))
+# Variantes légères transcodées par ffmpeg (voir ia.variants), vide pour désactiver
+AUDIO_VARIANTES = [v.strip() for v in os.getenv('AUDIO_VARIANTES', 'opus,mp3-bas').split(',') if v.strip()]
+FFMPEG_BIN = os.getenv('FFMPEG_BIN', 'ffmpeg')
 
 # Classes sans IA (CP1 et CP2)
 CLASSES_SANS_IA = ['cp1', 'cp2']
@@ -243,7 +372,7 @@ LOGGING = {
             'level': 'DEBUG' if DEBUG else 'INFO',
             'propagate': False,
         },
-        # Réduire le bruit gTTS et urllib3
+        # Réduire le bruit gTTS, urllib3 et boto3 (stockage S3)
         'gtts': {
             'handlers': ['console'],
             'level': 'WARNING',
@@ -254,6 +383,21 @@ LOGGING = {
             'level': 'WARNING',
             'propagate': False,
         },
+        'boto3': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'botocore': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        's3transfer': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
     },
 }
 
@@ -0,0 +1,287 @@
+"""
+Stockage partagé des médias (audios générés, variantes, avatars) : disque
+local ou S3 (AWS, MinIO, R2... : MEDIA_S3_ENDPOINT_URL).
+
+Plusieurs conteneurs ne partagent pas de disque. Avec MEDIA_STORAGE=s3, les
+fichiers sont publiés dans un bucket et chaque nœud garde les siens (ou ceux
+qu'il a rapatriés) dans son dossier local, qui sert alors de cache :
+
+- S3Storage : stockage Django (avatars : champ photo_profil) ; au-delà de
+  MEDIA_S3_MULTIPART_MB, envoi multipart en parties parallèles (s3transfer).
+- Existence en cache : un objet présent le reste pendant MEDIA_EXISTS_TTL
+  secondes (les audios sont adressés par leur contenu), une absence est
+  revérifiée après une minute ; un HEAD S3 par fichier au plus.
+- publish : envois en arrière-plan (MEDIA_UPLOAD_CONCURRENCY threads, trois
+  essais), le rendu des audios continue pendant ce temps. Les noms sont
+  relatifs à MEDIA_ROOT (audio/ab/cd/<clé>.mp3, avatars/...).
+
+Avec MEDIA_STORAGE=local (défaut), tout reste dans MEDIA_ROOT et publish,
+fetch et remove ne font rien.
+"""
+import os
+import time
+import uuid
+import logging
+import mimetypes
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import Storage, default_storage
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import LazyObject, empty
+
+from tuteur_intelligent.media import cache_control
+
+logger = logging.getLogger(__name__)
+
+ABSENCE_TTL = 60
+
+
+class ExistenceCache:
+    """Réponses « existe / n'existe pas » par nom, avec une durée de vie. Thread-safe."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}  # nom -> (existe, expiration)
+
+    def get(self, name):
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+
+    def set(self, name, exists):
+        ttl = self.ttl if exists else min(self.ttl, ABSENCE_TTL)
+        with self._lock:
+            self._entries[name] = (exists, time.monotonic() + ttl)
+
+
+@deconstructible
+class S3Storage(Storage):
+    """Stockage Django sur un bucket S3 (ou compatible), réglé par les paramètres MEDIA_S3_*."""
+
+    def __init__(self):
+        self.bucket = settings.MEDIA_S3_BUCKET
+        self.prefix = settings.MEDIA_S3_PREFIX
+        self.cache = ExistenceCache(settings.MEDIA_EXISTS_TTL)
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                import boto3
+                from botocore.config import Config
+
+                self._client = boto3.client(
+                    's3',
+                    endpoint_url=settings.MEDIA_S3_ENDPOINT_URL or None,
+                    region_name=settings.MEDIA_S3_REGION,
+                    aws_access_key_id=settings.MEDIA_S3_ACCESS_KEY or None,
+                    aws_secret_access_key=settings.MEDIA_S3_SECRET_KEY or None,
+                    config=Config(
+                        s3={'addressing_style': 'path' if settings.MEDIA_S3_ENDPOINT_URL else 'auto'},
+                        max_pool_connections=max(settings.MEDIA_UPLOAD_CONCURRENCY * 4, 10),
+                        retries={'max_attempts': 3, 'mode': 'standard'},
+                    ),
+                )
+            return self._client
+
+    @property
+    def transfer_config(self):
+        from boto3.s3.transfer import TransferConfig
+
+        size = settings.MEDIA_S3_MULTIPART_MB * 1024 * 1024
+        return TransferConfig(multipart_threshold=size, multipart_chunksize=size, max_concurrency=4)
+
+    def _key(self, name):
+        return f"{self.prefix}{name}"
+
+    def _extra_args(self, name):
+        return {
+            'ContentType': mimetypes.guess_type(name)[0] or 'application/octet-stream',
+            'CacheControl': cache_control(name),
+        }
+
+    def _open(self, name, mode='rb'):
+        body = self.client.get_object(Bucket=self.bucket, Key=self._key(name))['Body'].read()
+        return ContentFile(body, name=name)
+
+    def _save(self, name, content):
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        self.client.upload_fileobj(
+            content, self.bucket, self._key(name), ExtraArgs=self._extra_args(name), Config=self.transfer_config,
+        )
+        self.cache.set(name, True)
+        return name
+
+    def save_file(self, name, path):
+        """Envoie un fichier local sous `name` (multipart au-delà de MEDIA_S3_MULTIPART_MB)."""
+        self.client.upload_file(
+            str(path), self.bucket, self._key(name), ExtraArgs=self._extra_args(name), Config=self.transfer_config,
+        )
+        self.cache.set(name, True)
+
+    def download(self, name, path):
+        self.client.download_file(self.bucket, self._key(name), str(path), Config=self.transfer_config)
+
+    def exists(self, name):
+        cached = self.cache.get(name)
+        if cached is not None:
+            return cached
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(name))
+            exists = True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') not in ('404', 'NoSuchKey', 'NotFound'):
+                raise
+            exists = False
+        self.cache.set(name, exists)
+        return exists
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(name))
+        self.cache.set(name, False)
+
+    def size(self, name):
+        return self.client.head_object(Bucket=self.bucket, Key=self._key(name))['ContentLength']
+
+    def url(self, name):
+        base = settings.MEDIA_S3_PUBLIC_URL
+        if not base and settings.MEDIA_S3_ENDPOINT_URL:
+            base = f"{settings.MEDIA_S3_ENDPOINT_URL.rstrip('/')}/{self.bucket}"
+        if not base:
+            base = f"https://{self.bucket}.s3.{settings.MEDIA_S3_REGION}.amazonaws.com"
+        return f"{base.rstrip('/')}/{self._key(name)}"
+
+
+class MediaStorage(LazyObject):
+    """Stockage des médias selon MEDIA_STORAGE, choisi au premier usage (comme default_storage)."""
+
+    def _setup(self):
+        self._wrapped = S3Storage() if is_remote() else default_storage
+
+
+_media = MediaStorage()
+_uploads = None
+_state_lock = threading.Lock()
+
+
+def media_storage():
+    """Stockage des médias (appelable : champ photo_profil, évalué au chargement des modèles)."""
+    return _media
+
+
+def is_remote():
+    return settings.MEDIA_STORAGE == 's3'
+
+
+@receiver(setting_changed)
+def _reset(setting, **kwargs):
+    global _uploads
+    if setting.startswith('MEDIA_'):
+        with _state_lock:
+            _media._wrapped = empty
+            if _uploads is not None:
+                _uploads.shutdown(wait=False)
+            _uploads = None
+
+
+def publish(files):
+    """
+    Envoie en arrière-plan les fichiers locaux absents du stockage partagé.
+
+    Args:
+        files: (nom, chemin local) à publier
+
+    Returns:
+        list: Futures des envois (à attendre avant de rendre une URL publique) ; vide en local
+    """
+    if not is_remote():
+        return []
+    global _uploads
+    with _state_lock:
+        if _uploads is None:
+            _uploads = ThreadPoolExecutor(max_workers=settings.MEDIA_UPLOAD_CONCURRENCY, thread_name_prefix='envoi')
+        pool = _uploads
+    return [pool.submit(_upload, name, path) for name, path in files]
+
+
+def _upload(name, path):
+    storage = media_storage()
+    for attempt in range(3):
+        try:
+            if not storage.exists(name):
+                storage.save_file(name, path)
+            return name
+        except Exception as e:
+            if attempt == 2:
+                raise
+            logger.warning(f"Envoi de {name} impossible ({e}), nouvel essai")
+            time.sleep(2 ** attempt)
+
+
+def wait_published(futures):
+    """Attend les envois ; lève l'erreur du premier en échec."""
+    for future in futures:
+        future.result()
+
+
+def exists(name, path=None):
+    """Vrai si le fichier est en local (`path`) ou dans le stockage partagé (existence en cache)."""
+    if path is not None and path.exists():
+        return True
+    return is_remote() and media_storage().exists(name)
+
+
+def fetch(name, path):
+    """
+    Rapatrie depuis le stockage partagé un fichier absent en local (rendu par un autre nœud).
+
+    Returns:
+        bool: Vrai si le fichier local existe désormais
+    """
+    if not is_remote():
+        return False
+    storage = media_storage()
+    try:
+        if not storage.exists(name):
+            return False
+        with atomic_file(path) as tmp:
+            storage.download(name, tmp)
+        return True
+    except Exception as e:
+        logger.warning(f"Récupération de {name} impossible: {e}")
+        return False
+
+
+def remove(names):
+    """Supprime des fichiers du stockage partagé (les fichiers locaux restent à la charge de l'appelant)."""
+    if not is_remote():
+        return
+    storage = media_storage()
+    for name in names:
+        storage.delete(name)
+
+
+@contextmanager
+def atomic_file(path):
+    """Fichier temporaire du même dossier, renommé en `path` si le bloc réussit."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.stem}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
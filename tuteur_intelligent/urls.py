@@ -2,9 +2,10 @@
 URL configuration for tuteur_intelligent project.
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
+
+from tuteur_intelligent.media import serve_media
 
 from django.http import JsonResponse
 
@@ -17,5 +18,9 @@ urlpatterns = [
     path('', home_view), # Route pour la racine /
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Audios et avatars servis par Django (Range, ETag, cache), aussi en production :
+# inutile si un serveur web ou un CDN sert déjà MEDIA_URL
+if (settings.DEBUG or settings.MEDIA_SERVE) and '://' not in settings.MEDIA_URL:
+    urlpatterns += [
+        re_path(rf"^{settings.MEDIA_URL.strip('/')}/(?P<path>.+)$", serve_media),
+    ]